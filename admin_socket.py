@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+admin_socket.py
+
+Comandos de operação por socket Unix, sem reiniciar o servidor: uma
+linha de texto por conexão, resposta em texto e a conexão fecha.
+
+    profile start [Hz]   liga o profiler por amostragem
+    profile stop         desliga e devolve o caminho do .folded
+    stacks               pilhas de todas as threads agora
+    stalls               travamentos vistos pelo watchdog e seus dumps
+    sendq                fila de envio SIP: profundidade, lotes, latência
+    upload               envio ao S3: pendentes, enviados, bytes, falhas
+    trace                grava o ring do call_trace em traces/
+    status               chamadas, portas livres, atraso do loop
+
+O sip_dispatcher.py usa o mesmo socket para backends/add/remove.
+
+Cliente:
+    python admin_socket.py /tmp/siprec-admin.sock profile start 200
+"""
+
+import os
+import socket
+import sys
+import threading
+
+ADMIN_SOCKET = "/tmp/siprec-admin.sock"
+
+
+class AdminSocket:
+
+    def __init__(self, path=ADMIN_SOCKET):
+        self.path = path
+        self.commands = {}      # nome → função(args) → texto
+
+        if os.path.exists(path):
+            os.unlink(path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        # Só o dono do processo fala com o socket
+        os.chmod(path, 0o600)
+
+    def command(self, name, fn):
+        self.commands[name] = fn
+
+    # ---------------------------------------------------------------
+    def start(self):
+        self.sock.listen(8)
+        print(f"🛠 Comandos de operação em {self.path}")
+        threading.Thread(target=self._accept_loop, name="admin", daemon=True).start()
+
+    def stop(self):
+        self.sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    # ---------------------------------------------------------------
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            # Um comando por vez: são raros e alguns (profile) têm estado
+            with conn:
+                conn.settimeout(5.0)
+                try:
+                    line = conn.makefile("rb").readline(1024).decode(errors="ignore")
+                    conn.sendall(self.execute(line).encode() + b"\n")
+                except OSError:
+                    pass
+
+    def execute(self, line):
+        words = line.split()
+        if not words:
+            return "ERR comando vazio"
+        fn = self.commands.get(words[0])
+        if fn is None:
+            return f"ERR comando desconhecido: {words[0]} (há: {', '.join(sorted(self.commands))})"
+        try:
+            return fn(words[1:])
+        except Exception as e:
+            return f"ERR {type(e).__name__}: {e}"
+
+
+def send_command(path, line):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    sock.sendall(line.encode() + b"\n")
+    reply = b""
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        reply += chunk
+    sock.close()
+    return reply.decode()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("uso: python admin_socket.py <socket> <comando> [args...]")
+        sys.exit(1)
+    print(send_command(sys.argv[1], " ".join(sys.argv[2:])), end="")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+admission.py
+
+Overload control na frente do handle_invite.
+
+Antes de aceitar um INVITE novo verifica:
+- INVITEs ainda em processamento (fila de trabalho)
+- sessões vivas
+- portas de mídia livres
+- atraso do loop de recepção (medido por uma thread sentinela)
+- mensagens esperando na fila de envio SIP (send_queue.py)
+
+Acima dos limites responde 503 Service Unavailable com Retry-After,
+montado a partir de partes já codificadas. OPTIONS não passa por aqui,
+então os health checks do SBC continuam respondidos. O invite_handler
+usa o mesmo reject() quando a mídia de um INVITE aceito não abre
+(motivo "midia").
+"""
+
+import threading
+import time
+
+from sip_parser import CRLF
+
+# Partes fixas do 503, codificadas uma vez só
+_STATUS_503 = b"SIP/2.0 503 Service Unavailable" + CRLF.encode()
+_TO_TAG = b";tag=ovl503"
+
+
+class LagMonitor:
+    """
+    Mede quanto uma thread que dorme `interval` acorda atrasada — sob
+    contenção do GIL é o mesmo atraso que o loop de recvfrom sofre.
+    """
+
+    def __init__(self, interval=0.05, decay=0.8):
+        self.interval = interval
+        self.decay = decay
+        self.lag_ms = 0.0
+        self._running = False
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self._running = False
+
+    def _run(self):
+        while self._running:
+            t0 = time.monotonic()
+            time.sleep(self.interval)
+            late = (time.monotonic() - t0 - self.interval) * 1000
+            # Média móvel: sobe rápido com picos, desce devagar
+            self.lag_ms = max(late, self.decay * self.lag_ms)
+
+
+class AdmissionControl:
+
+    def __init__(self, max_pending=50, max_sessions=2000,
+                 min_free_ports=20, max_lag_ms=250, max_send_queue=2000,
+                 retry_after=5):
+        self.max_pending = max_pending
+        self.max_sessions = max_sessions
+        self.min_free_ports = min_free_ports
+        self.max_lag_ms = max_lag_ms
+        self.max_send_queue = max_send_queue
+
+        self.lag = LagMonitor()
+        self.rejected = {}          # motivo → contador
+        self._tail = (
+            f"Retry-After: {retry_after}{CRLF}"
+            f"Content-Length: 0{CRLF}{CRLF}"
+        ).encode()
+
+    # ---------------------------------------------------------------
+    @property
+    def rejected_total(self):
+        return sum(self.rejected.values())
+
+    # ---------------------------------------------------------------
+    def check(self, server):
+        """
+        Retorna o motivo da recusa, ou None se o INVITE pode entrar.
+        """
+        if server.pending_invites >= self.max_pending:
+            return "fila"
+        if len(server.calls) >= self.max_sessions:
+            return "sessoes"
+        if server.ports.free < self.min_free_ports:
+            return "portas"
+        if self.lag.lag_ms > self.max_lag_ms:
+            return "atraso"
+        if server.outbound is not None and server.outbound.depth >= self.max_send_queue:
+            return "envio"
+        return None
+
+    # ---------------------------------------------------------------
+    def encode_503(self, sip):
+        hdr = sip["headers"]
+        vias = hdr.get("Via", "")
+        if not isinstance(vias, list):
+            vias = [vias]
+
+        head = (
+            "".join(f"Via: {v}{CRLF}" for v in vias)
+            + f"From: {hdr.get('From', '')}{CRLF}"
+            + f"To: {hdr.get('To', '')}"
+        ).encode()
+        rest = (
+            f"{CRLF}Call-ID: {hdr.get('Call-ID', '')}{CRLF}"
+            f"CSeq: {hdr.get('CSeq', '')}{CRLF}"
+        ).encode()
+        return _STATUS_503 + head + _TO_TAG + rest + self._tail
+
+    # ---------------------------------------------------------------
+    def reject(self, server, sip, addr, reason):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        server.send(self.encode_503(sip), addr)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+bench/catalog_query.py
+
+Catálogo de gravações em escala: popula N chamadas sintéticas (dois
+participantes cada, espalhadas por --days dias, --aors AoRs distintos) em
+lotes pelo mesmo insert do RecordingCatalog e mede as consultas típicas
+com o banco já frio para o processo (conexão nova).
+
+Uso (a partir da raiz do repositório):
+    python -m bench.catalog_query --calls 10000000 --db /tmp/catalog.db
+    python -m bench.catalog_query --db /tmp/catalog.db --skip-fill
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import time
+
+from recording_catalog import RecordingCatalog
+
+
+def _aor(n):
+    return f"sip:+55119{n:08d}@carrier.example.com"
+
+
+def _summaries(start, count, now, days, aors, rng):
+    for n in range(start, start + count):
+        started = now - rng.random() * days * 86400
+        a, b = rng.randrange(aors), rng.randrange(aors)
+        yield {
+            "call_id": f"{n:012x}@10.1.1.20",
+            "session_id": f"s{n:012x}",
+            "from": "<sip:SRC@10.1.1.20>;tag=x",
+            "to": "<sip:srs@10.0.0.10>",
+            "participants": [{"aor": _aor(a), "name": None},
+                             {"aor": _aor(b), "name": None}],
+            "labels": ["1", "2"],
+            "codec": "PCMU",
+            "started": started,
+            "ended": started + 180,
+            "streams": [
+                {"label": "1", "path": f"recordings/{n:012x}_1.raw", "packets": 9000},
+                {"label": "2", "path": f"recordings/{n:012x}_2.raw", "packets": 9000},
+            ],
+        }
+
+
+def fill(path, calls, days, aors, batch=50000):
+    catalog = RecordingCatalog(path)
+    catalog.close()         # só o esquema; a carga usa uma conexão direta
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous=OFF")
+    rng = random.Random(1)
+    now = time.time()
+    t0 = time.perf_counter()
+    for start in range(0, calls, batch):
+        with conn:
+            RecordingCatalog.insert(
+                conn, _summaries(start, min(batch, calls - start), now, days, aors, rng)
+            )
+    elapsed = time.perf_counter() - t0
+    conn.close()
+    return elapsed
+
+
+def _timed(fn, runs):
+    samples = []
+    rows = 0
+    for arg in runs:
+        t0 = time.perf_counter()
+        rows += len(fn(arg))
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p99_ms": round(samples[int(len(samples) * 0.99) - 1], 3),
+        "avg_rows": round(rows / len(samples), 1),
+    }
+
+
+def query(path, aors, runs=200):
+    catalog = RecordingCatalog(path)
+    rng = random.Random(2)
+    now = time.time()
+    total = catalog.count()
+    some = catalog._reader.execute(
+        "SELECT call_id FROM calls WHERE id % 9973 = 0 LIMIT ?", (runs,)
+    ).fetchall()
+
+    out = {
+        "calls": total,
+        "aor_last_24h": _timed(
+            lambda a: catalog.by_aor(a, since=now - 86400),
+            [_aor(rng.randrange(aors)) for _ in range(runs)]),
+        "aor_all_time_limit_100": _timed(
+            lambda a: catalog.by_aor(a, limit=100),
+            [_aor(rng.randrange(aors)) for _ in range(runs)]),
+        "call_id": _timed(catalog.by_call_id, [r[0] for r in some]),
+        "last_5_min": _timed(
+            lambda t: catalog.between(t - 300, t, limit=1000),
+            [now - rng.random() * 86400 for _ in range(runs)]),
+    }
+    catalog.close()
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Consultas no catálogo em escala")
+    ap.add_argument("--db", default="/tmp/catalog_bench.db")
+    ap.add_argument("--calls", type=int, default=1_000_000)
+    ap.add_argument("--days", type=int, default=90)
+    ap.add_argument("--aors", type=int, default=200_000)
+    ap.add_argument("--skip-fill", action="store_true")
+    args = ap.parse_args(argv)
+
+    result = {}
+    if not args.skip_fill:
+        if os.path.exists(args.db):
+            os.remove(args.db)
+        elapsed = fill(args.db, args.calls, args.days, args.aors)
+        result["fill_s"] = round(elapsed, 1)
+        result["insert_calls_per_s"] = round(args.calls / elapsed)
+    result["db_mb"] = round(os.path.getsize(args.db) / 2**20)
+    result.update(query(args.db, args.aors))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+bench/corpus.py
+
+Corpus de mensagens SIPREC realistas para os microbenchmarks:
+- INVITE Cisco (o mesmo de test_bye_response.py)
+- INVITE Oracle SBC (Acme Packet)
+- INVITE com cabeçalhos compactos (RFC 3261 §7.3.3)
+- INVITE com rs-metadata grande (muitos participantes)
+- INVITE com SDP de muitos fluxos (gravação de conferência)
+- OPTIONS e BYE
+"""
+
+from sip_parser import CRLF
+from test_bye_response import sip_invite_raw_cisco
+
+
+# ============================================================
+# MONTAGEM
+# ============================================================
+def _sdp(streams, host="10.1.1.20", first_port=20000):
+    lines = [
+        "v=0",
+        f"o=- 1 1 IN IP4 {host}",
+        "s=SIPREC",
+        f"c=IN IP4 {host}",
+        "t=0 0",
+    ]
+    for i in range(streams):
+        lines += [
+            f"m=audio {first_port + 2 * i} RTP/AVP 0 8 101",
+            "a=rtpmap:0 PCMU/8000",
+            "a=rtpmap:8 PCMA/8000",
+            "a=rtpmap:101 telephone-event/8000",
+            "a=fmtp:101 0-15",
+            "a=ptime:20",
+            "a=sendonly",
+            f"a=label:{i + 1}",
+        ]
+    return CRLF.join(lines) + CRLF
+
+
+def _metadata(participants):
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<recording xmlns="urn:ietf:params:xml:ns:recording:1">',
+        "  <datamode>complete</datamode>",
+        '  <session session_id="5Kx2Fp0pEeaXtAAMKUkHJg==">',
+        "    <start-time>2024-03-01T12:00:00Z</start-time>",
+        "  </session>",
+    ]
+    for i in range(participants):
+        pid = f"p{i:04d}AAAAAAAAAAAAAAAA=="
+        parts += [
+            f'  <participant participant_id="{pid}">',
+            f'    <nameID aor="sip:+55119{i:08d}@carrier.example.com">',
+            f'      <name xml:lang="pt">Participante {i}</name>',
+            "    </nameID>",
+            "  </participant>",
+            f'  <stream stream_id="s{i:04d}AAAAAAAAAAAAAAAA==" '
+            'session_id="5Kx2Fp0pEeaXtAAMKUkHJg==">',
+            f"    <label>{i + 1}</label>",
+            "  </stream>",
+            f'  <participantstreamassoc participant_id="{pid}">',
+            f"    <send>s{i:04d}AAAAAAAAAAAAAAAA==</send>",
+            "  </participantstreamassoc>",
+        ]
+    parts.append("</recording>")
+    return CRLF.join(parts) + CRLF
+
+
+def _multipart(sdp, metadata, boundary="OSS-unique-boundary-42"):
+    body = CRLF.join([
+        f"--{boundary}",
+        "Content-Type: application/sdp",
+        "",
+        sdp,
+        f"--{boundary}",
+        "Content-Type: application/rs-metadata+xml",
+        "Content-Disposition: recording-session",
+        "",
+        metadata,
+        f"--{boundary}--",
+        "",
+    ])
+    return body, f"multipart/mixed;boundary={boundary}"
+
+
+def _invite(headers, body):
+    head = CRLF.join(headers + [f"Content-Length: {len(body.encode())}"])
+    return head + CRLF + CRLF + body
+
+
+# ============================================================
+# MENSAGENS
+# ============================================================
+def oracle_invite(streams=2, participants=2):
+    body, ctype = _multipart(_sdp(streams), _metadata(participants))
+    return _invite([
+        "INVITE sip:srs@10.0.0.10:5060;transport=udp SIP/2.0",
+        "Via: SIP/2.0/UDP 10.1.1.20:5060;branch=z9hG4bK2k0ld3301g8hs1sp91c0.1",
+        "From: <sip:SRC@10.1.1.20>;tag=b8f1d3a2c7e64f5b",
+        "To: <sip:srs@10.0.0.10>",
+        "Call-ID: 8a3b1f4e72c9d0a5b6e1f2c3d4a5b6c7@10.1.1.20",
+        "CSeq: 1 INVITE",
+        "Max-Forwards: 70",
+        "Contact: <sip:SRC@10.1.1.20:5060;transport=udp>;+sip.src",
+        "Require: siprec",
+        "Supported: timer",
+        "Session-Expires: 1800;refresher=uac",
+        "Min-SE: 90",
+        "Allow: INVITE, ACK, BYE, CANCEL, OPTIONS, UPDATE",
+        "User-Agent: Oracle-SBC/SCZ9.1.0",
+        "P-Asserted-Identity: <sip:+551130001000@carrier.example.com>",
+        "Record-Route: <sip:10.1.1.20:5060;lr>",
+        f"Content-Type: {ctype}",
+        "MIME-Version: 1.0",
+    ], body)
+
+
+def compact_invite():
+    body, ctype = _multipart(_sdp(2), _metadata(2))
+    return _invite([
+        "INVITE sip:srs@10.0.0.10 SIP/2.0",
+        "v: SIP/2.0/UDP 10.1.1.30:5060;branch=z9hG4bKcmp1;rport",
+        "f: <sip:src@10.1.1.30>;tag=cmp1",
+        "t: <sip:srs@10.0.0.10>",
+        "i: compact-1@10.1.1.30",
+        "CSeq: 1 INVITE",
+        "m: <sip:src@10.1.1.30:5060>;+sip.src",
+        "k: timer",
+        "x: 1800",
+        f"c: {ctype}",
+    ], body).replace("Content-Length:", "l:")
+
+
+OPTIONS = CRLF.join([
+    "OPTIONS sip:srs@10.0.0.10 SIP/2.0",
+    "Via: SIP/2.0/UDP 10.0.0.5:5060;branch=z9hG4bKopt;rport",
+    "From: <sip:ping@10.0.0.5>;tag=1234",
+    "To: <sip:srs@10.0.0.10>",
+    "Call-ID: ping-1@10.0.0.5",
+    "CSeq: 77 OPTIONS",
+    "Max-Forwards: 70",
+    "Content-Length: 0",
+    "", ""
+])
+
+BYE = CRLF.join([
+    "BYE sip:srs@10.0.0.10 SIP/2.0",
+    "Via: SIP/2.0/UDP 10.0.0.9:5060;branch=z9hG4bKbye;rport",
+    "From: <sip:src@10.0.0.9>;tag=777",
+    "To: <sip:srs@10.0.0.10>;tag=999",
+    "Call-ID: callbye@10.0.0.9",
+    "CSeq: 2 BYE",
+    "Max-Forwards: 70",
+    "Content-Length: 0",
+    "", ""
+])
+
+
+CORPUS = {
+    "cisco_invite": sip_invite_raw_cisco,
+    "oracle_invite": oracle_invite(),
+    "compact_invite": compact_invite(),
+    "large_metadata_invite": oracle_invite(streams=2, participants=200),
+    "many_streams_invite": oracle_invite(streams=32, participants=32),
+    "options": OPTIONS,
+    "bye": BYE,
+}
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+bench/fake_s3.py
+
+S3 mínimo em memória para testar object_upload.py sem rede externa:
+PUT/GET de objeto e multipart (create, upload part, complete, abort),
+HTTP/1.1 com keep-alive e assinatura SigV4 conferida em toda requisição
+(assinatura errada → 403 SignatureDoesNotMatch).
+
+Para testes:
+- fail(method, query) → status HTTP a devolver no lugar da resposta
+  (500, 503...) ou None; ex.: falhar a parte 3 na primeira tentativa
+- requests (Counter por operação), connections (TCP aceitas), received
+  (bytes de corpo recebidos)
+
+Uso (a partir da raiz do repositório):
+    python -m bench.fake_s3 --port 9000
+    python object_upload.py --endpoint http://127.0.0.1:9000 --bucket b put arquivo.raw
+"""
+
+import argparse
+import hashlib
+import hmac
+import re
+import threading
+import urllib.parse
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ACCESS_KEY = "test"
+SECRET_KEY = "test-secret"
+REGION = "us-east-1"
+
+_AUTH = re.compile(r"AWS4-HMAC-SHA256 Credential=([^/]+)/(\d{8})/([^/]+)/s3/aws4_request, "
+                   r"SignedHeaders=([^,]+), Signature=([0-9a-f]+)")
+
+
+def _error(code, message=""):
+    return (f'<?xml version="1.0" encoding="UTF-8"?>\n<Error><Code>{code}</Code>'
+            f"<Message>{message}</Message></Error>").encode()
+
+
+class FakeS3(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), access_key=ACCESS_KEY,
+                 secret_key=SECRET_KEY, region=REGION):
+        super().__init__(address, _Handler)
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.objects = {}           # (bucket, chave) → bytes
+        self.uploads = {}           # UploadId → {"key": (bucket, chave), "parts": {n: bytes}}
+        self.fail = lambda method, query: None
+        self.requests = Counter()
+        self.connections = 0
+        self.received = 0
+        self.lock = threading.Lock()
+
+    @property
+    def endpoint(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-s3", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    # ---------------------------------------------------------------
+    def verify(self, method, raw_path, headers, body):
+        """
+        Confere a assinatura SigV4 refazendo a requisição canônica do
+        que chegou na rede. Código de erro S3 ou None.
+        """
+        m = _AUTH.fullmatch(headers.get("Authorization", ""))
+        if not m:
+            return "AccessDenied"
+        access, date, region, signed, signature = m.groups()
+        if access != self.access_key or region != self.region:
+            return "InvalidAccessKeyId"
+        payload_hash = headers.get("x-amz-content-sha256", "")
+        if payload_hash != hashlib.sha256(body).hexdigest():
+            return "XAmzContentSHA256Mismatch"
+
+        path, _, query = raw_path.partition("?")
+        pairs = sorted(urllib.parse.parse_qsl(query, keep_blank_values=True))
+        canonical_query = "&".join(f"{urllib.parse.quote(k, safe='-_.~')}="
+                                   f"{urllib.parse.quote(v, safe='-_.~')}" for k, v in pairs)
+        names = signed.split(";")
+        canonical = "\n".join([
+            method, path, canonical_query,
+            "".join(f"{h}:{(headers.get(h) or '').strip()}\n" for h in names),
+            signed, payload_hash,
+        ])
+        scope = f"{date}/{region}/s3/aws4_request"
+        to_sign = "\n".join(["AWS4-HMAC-SHA256", headers.get("x-amz-date", ""), scope,
+                             hashlib.sha256(canonical.encode()).hexdigest()])
+        key = ("AWS4" + self.secret_key).encode()
+        for part in (date, region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        expected = hmac.new(key, to_sign.encode(), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(expected, signature):
+            return "SignatureDoesNotMatch"
+        return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"       # keep-alive
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    # ---------------------------------------------------------------
+    def _reply(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method):
+        s3 = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        path, _, query_string = self.path.partition("?")
+        query = dict(urllib.parse.parse_qsl(query_string, keep_blank_values=True))
+        bucket, _, key = urllib.parse.unquote(path).lstrip("/").partition("/")
+        obj = (bucket, key)
+
+        error = s3.verify(method, self.path, self.headers, body)
+        if error:
+            return self._reply(403, _error(error))
+        status = s3.fail(method, query)
+        if status:
+            return self._reply(status, _error("InternalError" if status >= 500 else "Injected"))
+
+        with s3.lock:
+            s3.received += len(body)
+            if method == "PUT" and "uploadId" in query:
+                s3.requests["upload_part"] += 1
+                upload = s3.uploads.get(query["uploadId"])
+                if upload is None:
+                    return self._reply(404, _error("NoSuchUpload"))
+                upload["parts"][int(query["partNumber"])] = body
+                return self._reply(200, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+
+            if method == "PUT":
+                s3.requests["put"] += 1
+                s3.objects[obj] = body
+                return self._reply(200, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+
+            if method == "POST" and "uploads" in query:
+                s3.requests["create"] += 1
+                upload_id = uuid.uuid4().hex
+                s3.uploads[upload_id] = {"key": obj, "parts": {}}
+                return self._reply(200, (
+                    f"<InitiateMultipartUploadResult><Bucket>{bucket}</Bucket>"
+                    f"<Key>{key}</Key><UploadId>{upload_id}</UploadId>"
+                    f"</InitiateMultipartUploadResult>").encode())
+
+            if method == "POST" and "uploadId" in query:
+                s3.requests["complete"] += 1
+                upload = s3.uploads.get(query["uploadId"])
+                if upload is None:
+                    return self._reply(404, _error("NoSuchUpload"))
+                listed = re.findall(rb"<PartNumber>(\d+)</PartNumber><ETag>([^<]+)</ETag>", body)
+                data = []
+                for number, etag in listed:
+                    part = upload["parts"].get(int(number))
+                    if part is None or etag.strip(b'"').decode() != hashlib.md5(part).hexdigest():
+                        # Como o S3: 200 com o erro no corpo
+                        return self._reply(200, _error("InvalidPart"))
+                    data.append(part)
+                s3.objects[upload["key"]] = b"".join(data)
+                del s3.uploads[query["uploadId"]]
+                return self._reply(200, (
+                    f'<?xml version="1.0" encoding="UTF-8"?>\n<CompleteMultipartUploadResult>'
+                    f"<Key>{key}</Key></CompleteMultipartUploadResult>").encode())
+
+            if method == "DELETE" and "uploadId" in query:
+                s3.requests["abort"] += 1
+                s3.uploads.pop(query["uploadId"], None)
+                return self._reply(204)
+
+            if method == "GET":
+                s3.requests["get"] += 1
+                if obj not in s3.objects:
+                    return self._reply(404, _error("NoSuchKey"))
+                return self._reply(200, s3.objects[obj])
+
+        self._reply(400, _error("InvalidRequest"))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="S3 em memória para testes")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9000)
+    args = ap.parse_args(argv)
+    server = FakeS3((args.host, args.port))
+    print(f"☁ S3 de teste em {server.endpoint} "
+          f"(AWS_ACCESS_KEY_ID={ACCESS_KEY} AWS_SECRET_ACCESS_KEY={SECRET_KEY})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+bench/hot_restart.py
+
+Hot restart com chamadas no ar: abre --calls chamadas (2 fluxos RTP
+cada) num servidor, mantém RTP a 50 pps por fluxo e um OPTIONS a cada
+10 ms, e no meio sobe um segundo processo que assume socket SIP e
+chamadas (hot_restart.py). No fim, BYE para o processo novo e conta:
+
+- RTP enviado × gravado (bytes dos .raw / 160): perda na passagem
+- OPTIONS enviados × respondidos
+- tempo em que ninguém leu os sockets (conexão → confirmação)
+
+Uso (a partir da raiz do repositório):
+    python -m bench.hot_restart --calls 50 --before 2 --after 2
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import select
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from bench.loadgen import build_in_dialog
+from bench.rtp_streams import open_calls, close_calls, send_streams, SAMPLES
+
+
+# ============================================================
+# PROCESSOS DO SERVIDOR
+# ============================================================
+def _server(host, port, sock=None):
+    from server_siprec import SIPServer
+    from session_journal import SessionJournal
+
+    return SIPServer(host, port, journal=SessionJournal("journal.db"), sock=sock)
+
+
+def _old_main(work_dir, host, port, path, conn):
+    os.chdir(work_dir)
+    sys.stdout = open(os.devnull, "w")
+    from hot_restart import HandoverListener, drain
+
+    server = _server(host, port)
+    listener = HandoverListener(server, path)
+    listener.start()
+    conn.send("ready")
+    server.start()
+    listener.done.wait()
+    drain(server)
+
+
+def _new_main(work_dir, host, port, path, conn):
+    os.chdir(work_dir)
+    sys.stdout = open(os.devnull, "w")
+    from hot_restart import HandoverListener, take_over
+    import server_siprec    # noqa: F401 — import fora da medição
+
+    t0 = time.perf_counter()
+    handover = take_over(path)
+    server = _server(host, port, handover.sip_sock)
+    server.adopt(handover.sessions)
+    handover.confirm()
+    conn.send({
+        "sessions": len(handover.sessions),
+        "takeover_ms": round((time.perf_counter() - t0) * 1000, 1),
+    })
+    HandoverListener(server, path).start()
+    server.start()
+
+
+# ============================================================
+# CLIENTE
+# ============================================================
+def _options(target, stop, result):
+    """
+    Um OPTIONS a cada 10 ms; conta as respostas até `stop`.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((target[0], 0))
+    local = sock.getsockname()
+    sent = answered = 0
+    next_tx = time.monotonic()
+    while not stop.is_set() or select.select([sock], [], [], 0.5)[0]:
+        if not stop.is_set() and time.monotonic() >= next_tx:
+            call = {"from_tag": "hr", "to": f"<sip:srs@{target[0]}>",
+                    "call_id": f"hr-options-{sent}"}
+            sock.sendto(build_in_dialog("OPTIONS", call, local, target, 1,
+                                        f"z9hG4bKhr{sent}"), target)
+            sent += 1
+            next_tx += 0.010
+        if select.select([sock], [], [], 0.002)[0]:
+            if sock.recv(65535).startswith(b"SIP/2.0 200"):
+                answered += 1
+    sock.close()
+    result.update(sent=sent, answered=answered)
+
+
+def run(calls, before, after, restart=True, host="127.0.0.1", port=15070):
+    work_dir = tempfile.mkdtemp(prefix="hot_restart_")
+    path = os.path.join(work_dir, "handover.sock")
+    target = (host, port)
+
+    old_conn, old_child = multiprocessing.Pipe()
+    old = multiprocessing.Process(target=_old_main,
+                                  args=(work_dir, host, port, path, old_child))
+    old.start()
+    old_conn.recv()
+
+    sip = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sip.bind((host, 0))
+    opened = open_calls(sip, target, calls, base=0)
+    ports = [p for _, ps in opened for p in ps]
+
+    stop = threading.Event()
+    options = {}
+    pinger = threading.Thread(target=_options, args=(target, stop, options))
+    pinger.start()
+    rtp = {}
+    sender = threading.Thread(
+        target=lambda: rtp.update(zip(("sent", "late"),
+                                      send_streams(ports, host, before + after))))
+    sender.start()
+
+    time.sleep(before)
+    handover = None
+    server = old
+    if restart:
+        new_conn, new_child = multiprocessing.Pipe()
+        server = multiprocessing.Process(target=_new_main,
+                                         args=(work_dir, host, port, path, new_child))
+        server.start()
+        handover = new_conn.recv()
+        old.join(10)
+
+    sender.join()
+    stop.set()
+    pinger.join()
+    time.sleep(2.0)             # fila dos receptores esvazia antes do BYE
+    # BYEs em lotes: uma rajada de centenas estoura a fila do socket SIP,
+    # e chamada sem BYE não descarrega o fim da gravação
+    for i in range(0, len(opened), 10):
+        close_calls(sip, target, opened[i:i + 10])
+    time.sleep(1.0)             # receptores fecham e gravam
+    server.terminate()
+    server.join()
+
+    sent = sum(rtp["sent"].values())
+    recorded = sum(os.path.getsize(f) for f in
+                   glob.glob(os.path.join(work_dir, "recordings", "*.raw"))) // SAMPLES
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        "calls": len(opened),
+        "streams": len(ports),
+        "handover": handover,
+        "old_exit_code": old.exitcode if restart else None,
+        "rtp_sent": sent,
+        "rtp_recorded": recorded,
+        "rtp_lost": sent - recorded,
+        "generator_late_ticks": rtp["late"],
+        "options_sent": options["sent"],
+        "options_answered": options["answered"],
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Hot restart com chamadas no ar")
+    ap.add_argument("--calls", type=int, default=50)
+    ap.add_argument("--before", type=float, default=2.0,
+                    help="segundos de RTP antes da passagem")
+    ap.add_argument("--after", type=float, default=2.0,
+                    help="segundos de RTP depois da passagem")
+    ap.add_argument("--port", type=int, default=15070)
+    ap.add_argument("--no-restart", action="store_true",
+                    help="controle: a mesma carga sem a passagem")
+    args = ap.parse_args(argv)
+    print(json.dumps(run(args.calls, args.before, args.after,
+                         restart=not args.no_restart, port=args.port), indent=2))
+
+
+if __name__ == "__main__":
+    main()
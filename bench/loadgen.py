@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+bench/loadgen.py
+
+Gerador de carga SIP para o servidor SIPREC (chamadas por segundo).
+
+Reenvia o INVITE Cisco de test_bye_response.py com Call-ID, branch e
+From-tag únicos, manda ACK ao receber o 200 OK e BYE depois do tempo de
+retenção. Mede CPS, latência INVITE→200 (percentis), retransmissões e
+falhas.
+
+Uso (a partir da raiz do repositório):
+    python -m bench.loadgen --local --calls 500 --rate 50 --hold 2
+    python -m bench.loadgen --target 10.0.0.10:5060 --calls 1000 --rate 100
+"""
+
+import argparse
+import heapq
+import json
+import math
+import multiprocessing
+import os
+import re
+import select
+import socket
+import sys
+import time
+
+from sip_parser import CRLF, parse_sip_message
+from test_bye_response import sip_invite_raw_cisco
+
+T1 = 0.5          # RFC 3261 — intervalo inicial de retransmissão
+
+
+# ============================================================
+# MONTAGEM DAS MENSAGENS
+# ============================================================
+def build_invite(n, local_addr, target):
+    """
+    INVITE Cisco com identificadores únicos para a chamada n.
+    """
+    head, body = sip_invite_raw_cisco.split(CRLF + CRLF, 1)
+    call_id = f"load-{n}-{os.getpid()}@{local_addr[0]}"
+    branch = f"z9hG4bKload{n}x{os.getpid()}"
+    from_tag = f"lg{n}"
+
+    head = re.sub(r"^INVITE \S+", f"INVITE sip:srs@{target[0]}:{target[1]}",
+                  head)
+    head = re.sub(r"(?m)^Via: [^\r\n]*",
+                  f"Via: SIP/2.0/UDP {local_addr[0]}:{local_addr[1]};"
+                  f"branch={branch};rport", head)
+    head = re.sub(r"(?m)^From: [^\r\n]*",
+                  f"From: <sip:{local_addr[0]}>;tag={from_tag}", head)
+    head = re.sub(r"(?m)^Call-ID: [^\r\n]*", f"Call-ID: {call_id}", head)
+    # O fixture declara 2470, mas o corpo real é menor
+    head = re.sub(r"(?m)^Content-Length: [^\r\n]*",
+                  f"Content-Length: {len(body.encode())}", head)
+
+    return call_id, from_tag, (head + CRLF + CRLF + body).encode()
+
+
+def build_in_dialog(method, call, local_addr, target, cseq, branch):
+    """
+    ACK (para 2xx) ou BYE dentro do diálogo criado pelo 200 OK.
+    """
+    msg = [
+        f"{method} sip:srs@{target[0]}:{target[1]} SIP/2.0",
+        f"Via: SIP/2.0/UDP {local_addr[0]}:{local_addr[1]};branch={branch};rport",
+        f"From: <sip:{local_addr[0]}>;tag={call['from_tag']}",
+        f"To: {call['to']}",
+        f"Call-ID: {call['call_id']}",
+        f"CSeq: {cseq} {method}",
+        "Max-Forwards: 70",
+        "Content-Length: 0",
+        ""
+    ]
+    return (CRLF.join(msg) + CRLF).encode()
+
+
+# ============================================================
+# ESTATÍSTICA
+# ============================================================
+def percentile(values, p):
+    """
+    Nearest-rank: o menor valor com pelo menos p% da amostra até ele.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    # p * n antes de dividir: 7 / 100 * 100 dá 7.000000000000001 e o
+    # ceil pularia uma posição
+    k = max(0, min(len(values) - 1, math.ceil(p * len(values) / 100) - 1))
+    return values[k]
+
+
+# ============================================================
+# GERADOR
+# ============================================================
+class LoadGenerator:
+
+    def __init__(self, target, calls=100, rate=10.0, hold=2.0, timeout=8.0,
+                 bind_host="127.0.0.1"):
+        self.target = target
+        self.total = calls
+        self.rate = rate
+        self.hold = hold
+        self.timeout = timeout
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((bind_host, 0))
+        self.sock.setblocking(False)
+        self.local = self.sock.getsockname()
+
+        self.calls = {}       # Call-ID → estado da chamada
+        self.timers = []      # heap (instante, seq, ação, Call-ID)
+        self._seq = 0
+
+        self.latencies = []
+        self.retransmissions = 0
+        self.failures = {}
+        self.completed = 0
+        self.started = 0
+        self.active = 0
+        self.first_invite = None
+        self.last_answer = None
+
+    # ---------------------------------------------------------------
+    def _at(self, when, action, call_id):
+        self._seq += 1
+        heapq.heappush(self.timers, (when, self._seq, action, call_id))
+
+    def _send(self, data):
+        try:
+            self.sock.sendto(data, self.target)
+        except BlockingIOError:
+            pass    # buffer cheio — a retransmissão cobre
+
+    def _fail(self, call, reason):
+        call["state"] = "FAILED"
+        self.active -= 1
+        self.failures[reason] = self.failures.get(reason, 0) + 1
+
+    # ---------------------------------------------------------------
+    def _start_call(self, n, now):
+        call_id, from_tag, invite = build_invite(n, self.local, self.target)
+        self.calls[call_id] = {
+            "call_id": call_id,
+            "from_tag": from_tag,
+            "invite": invite,
+            "state": "INVITING",
+            "sent": now,
+            "interval": T1,
+            "to": None,
+        }
+        self.started += 1
+        self.active += 1
+        if self.first_invite is None:
+            self.first_invite = now
+        self._send(invite)
+        self._at(now + T1, "retx_invite", call_id)
+
+    # ---------------------------------------------------------------
+    def _on_timer(self, action, call_id, now):
+        call = self.calls.get(call_id)
+        if call is None:
+            return
+
+        if action == "retx_invite" and call["state"] == "INVITING":
+            if now - call["sent"] >= self.timeout:
+                return self._fail(call, "timeout INVITE")
+            self.retransmissions += 1
+            self._send(call["invite"])
+            call["interval"] = min(call["interval"] * 2, 4.0)
+            self._at(now + call["interval"], "retx_invite", call_id)
+
+        elif action == "retx_invite" and call["state"] == "PROCEEDING":
+            # Recebeu 100 mas nunca o final
+            if now - call["sent"] >= self.timeout:
+                return self._fail(call, "timeout 200 OK")
+            self._at(now + T1, "retx_invite", call_id)
+
+        elif action == "bye" and call["state"] == "CONFIRMED":
+            call["state"] = "BYE_SENT"
+            call["bye"] = build_in_dialog(
+                "BYE", call, self.local, self.target, 102,
+                f"z9hG4bKbye{call_id.split('@')[0]}"
+            )
+            call["bye_sent"] = now
+            call["interval"] = T1
+            self._send(call["bye"])
+            self._at(now + T1, "retx_bye", call_id)
+
+        elif action == "retx_bye" and call["state"] == "BYE_SENT":
+            if now - call["bye_sent"] >= self.timeout:
+                return self._fail(call, "timeout BYE")
+            self.retransmissions += 1
+            self._send(call["bye"])
+            call["interval"] = min(call["interval"] * 2, 4.0)
+            self._at(now + call["interval"], "retx_bye", call_id)
+
+    # ---------------------------------------------------------------
+    def _on_response(self, data, now):
+        sip = parse_sip_message(data.decode("utf-8", errors="ignore"))
+        start = sip["start_line"]
+        if not start.startswith("SIP/2.0"):
+            return
+
+        hdr = sip["headers"]
+        call = self.calls.get(hdr.get("Call-ID"))
+        if call is None:
+            return
+
+        code = int(start.split()[1])
+        method = hdr.get("CSeq", "").split()[-1:]
+        method = method[0] if method else ""
+
+        if method == "INVITE":
+            if code < 200:
+                if call["state"] == "INVITING":
+                    call["state"] = "PROCEEDING"
+                return
+
+            call["to"] = hdr.get("To", "")
+            ack = build_in_dialog(
+                "ACK", call, self.local, self.target, 101,
+                f"z9hG4bKack{call['call_id'].split('@')[0]}"
+            )
+
+            if call["state"] in ("INVITING", "PROCEEDING"):
+                if code >= 300:
+                    self._send(ack)
+                    return self._fail(call, f"{code} INVITE")
+
+                self.latencies.append(now - call["sent"])
+                self.last_answer = now
+                call["state"] = "CONFIRMED"
+                self._send(ack)
+                self._at(now + self.hold, "bye", call["call_id"])
+
+            elif code < 300:
+                # 200 OK retransmitido → ACK de novo
+                self._send(ack)
+
+        elif method == "BYE" and call["state"] == "BYE_SENT":
+            if code >= 200:
+                call["state"] = "DONE"
+                self.completed += 1
+                self.active -= 1
+
+    # ---------------------------------------------------------------
+    def run(self):
+        t0 = time.monotonic()
+        for n in range(self.total):
+            self._at(t0 + n / self.rate, "start", str(n))
+
+        while self.started < self.total or self.active:
+            now = time.monotonic()
+
+            while self.timers and self.timers[0][0] <= now:
+                _, _, action, key = heapq.heappop(self.timers)
+                if action == "start":
+                    self._start_call(int(key), now)
+                else:
+                    self._on_timer(action, key, now)
+
+            wait = self.timers[0][0] - now if self.timers else 0.1
+            readable, _, _ = select.select([self.sock], [], [], max(0, wait))
+
+            if readable:
+                while True:
+                    try:
+                        data, _ = self.sock.recvfrom(65535)
+                    except BlockingIOError:
+                        break
+                    self._on_response(data, time.monotonic())
+
+        return self.report()
+
+    # ---------------------------------------------------------------
+    def report(self):
+        answered = len(self.latencies)
+        span = (self.last_answer - self.first_invite) if answered > 1 else None
+        ms = lambda v: round(v * 1000, 3) if v is not None else None
+
+        return {
+            "calls": self.total,
+            "answered": answered,
+            "completed": self.completed,
+            "failed": sum(self.failures.values()),
+            "failures": self.failures,
+            "retransmissions": self.retransmissions,
+            "cps": round(answered / span, 2) if span else None,
+            "latency_ms": {
+                "p50": ms(percentile(self.latencies, 50)),
+                "p90": ms(percentile(self.latencies, 90)),
+                "p99": ms(percentile(self.latencies, 99)),
+                "max": ms(max(self.latencies) if self.latencies else None),
+            },
+        }
+
+
+# ============================================================
+# SERVIDOR LOCAL (processo separado, para não dividir o GIL)
+# ============================================================
+def _run_local_server(host, port):
+    sys.stdout = open(os.devnull, "w")
+    from server_siprec import SIPServer
+    SIPServer(host, port).start()
+
+
+def start_local_server(host="127.0.0.1", port=15060):
+    proc = multiprocessing.Process(
+        target=_run_local_server, args=(host, port), daemon=True
+    )
+    proc.start()
+
+    # Espera o servidor responder OPTIONS
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    probe.settimeout(0.2)
+    options = CRLF.join([
+        f"OPTIONS sip:{host}:{port} SIP/2.0",
+        "Via: SIP/2.0/UDP 127.0.0.1:1;branch=z9hG4bKprobe",
+        "From: <sip:probe@127.0.0.1>;tag=1",
+        f"To: <sip:{host}>",
+        "Call-ID: probe@127.0.0.1",
+        "CSeq: 1 OPTIONS",
+        "Content-Length: 0",
+        "", ""
+    ]).encode()
+
+    for _ in range(50):
+        probe.sendto(options, (host, port))
+        try:
+            probe.recvfrom(65535)
+            break
+        except socket.timeout:
+            continue
+    probe.close()
+    return proc
+
+
+# ============================================================
+# MAIN
+# ============================================================
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Gerador de carga SIPREC")
+    ap.add_argument("--target", default="127.0.0.1:15060")
+    ap.add_argument("--local", action="store_true",
+                    help="sobe um server_siprec.SIPServer local no --target")
+    ap.add_argument("--calls", type=int, default=100)
+    ap.add_argument("--rate", type=float, default=10.0, help="chamadas/s")
+    ap.add_argument("--hold", type=float, default=2.0, help="segundos até o BYE")
+    ap.add_argument("--timeout", type=float, default=8.0)
+    ap.add_argument("--json", help="grava o relatório neste arquivo")
+    args = ap.parse_args(argv)
+
+    host, port = args.target.rsplit(":", 1)
+    target = (host, int(port))
+
+    proc = start_local_server(*target) if args.local else None
+
+    try:
+        gen = LoadGenerator(target, args.calls, args.rate, args.hold,
+                            args.timeout)
+        result = gen.run()
+    finally:
+        if proc:
+            proc.terminate()
+
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
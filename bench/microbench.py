@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+bench/microbench.py
+
+Microbenchmarks das funções quentes (parser, SDP, Via e respostas SIP)
+sobre o corpus de bench/corpus.py.
+
+Para cada caso mede:
+- ns/op: mediana de --rounds rodadas (cada uma o melhor de 3 repetições,
+  iterações calibradas automaticamente); as rodadas passam por todos os
+  casos em sequência, então ruído de fundo se espalha em vez de cair
+  inteiro num caso só
+- bytes alocados por op (pico do tracemalloc em uma chamada)
+
+A comparação com o baseline normaliza pela carga de referência, medida
+uma vez por rodada (mediana das rodadas) e comum a todos os casos: absorve
+CPUs diferentes sem somar o ruído de uma referência por caso.
+
+Uso (a partir da raiz do repositório):
+    python -m bench.microbench                 # compara com o baseline
+    python -m bench.microbench --save          # grava novo baseline
+    python -m bench.microbench --threshold 0.3 # tolerância de 30%
+
+Sai com código 1 se algum caso regredir além da tolerância.
+"""
+
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from sip_parser import (
+    parse_sip_message,
+    parse_multipart,
+    parse_sdp,
+    reorder_via_params
+)
+from sip_responses import (
+    sip_response_100_trying,
+    sip_response_200_ok_invite_siprec,
+    sip_response_200_ok_options,
+    sip_response_200_ok_bye
+)
+from media_policy import MediaPolicy
+from bench.corpus import CORPUS
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+SERVER_IP = "10.0.0.10"
+PEER = ("10.1.1.20", 5060)
+
+
+# ============================================================
+# CASOS
+# ============================================================
+def _first(value):
+    return value[0] if isinstance(value, list) else value
+
+
+def build_cases():
+    """
+    Retorna {nome: função sem argumentos}. Entradas são preparadas aqui,
+    fora da medição.
+    """
+    cases = {}
+
+    for name, raw in CORPUS.items():
+        cases[f"parse_sip_message/{name}"] = (
+            lambda raw=raw: parse_sip_message(raw)
+        )
+
+        sip = parse_sip_message(raw)
+        hdr = sip["headers"]
+
+        via = _first(hdr.get("Via") or hdr.get("v") or "")
+        if via:
+            cases[f"reorder_via_params/{name}"] = (
+                lambda via=via: reorder_via_params(via)
+            )
+
+        if name.endswith("invite"):
+            ctype = hdr.get("Content-Type") or hdr.get("c", "")
+            cases[f"parse_multipart/{name}"] = (
+                lambda b=sip["body"], c=ctype: parse_multipart(b, c)
+            )
+
+            sdp = parse_multipart(sip["body"], ctype).get("application/sdp", "")
+            cases[f"parse_sdp/{name}"] = lambda sdp=sdp: parse_sdp(sdp)
+
+            cases[f"sip_response_100_trying/{name}"] = (
+                lambda sip=sip: sip_response_100_trying(sip, SERVER_IP)
+            )
+            # Como a SipSession chama: fluxos já negociados
+            streams = MediaPolicy().negotiate(parse_sdp(sdp)["media"])
+            cases[f"sip_response_200_ok_invite_siprec/{name}"] = (
+                lambda sip=sip, streams=streams: sip_response_200_ok_invite_siprec(
+                    sip, SERVER_IP, to_tag="12345", addr=PEER, streams=streams
+                )
+            )
+
+        elif name == "options":
+            cases[f"sip_response_200_ok_options/{name}"] = (
+                lambda sip=sip: sip_response_200_ok_options(
+                    sip, SERVER_IP, to_tag="12345"
+                )
+            )
+
+        elif name == "bye":
+            cases[f"sip_response_200_ok_bye/{name}"] = (
+                lambda sip=sip: sip_response_200_ok_bye(sip)
+            )
+
+    return cases
+
+
+# ============================================================
+# MEDIÇÃO
+# ============================================================
+def calibrate(fn, target=0.02):
+    # Número de iterações para ~target segundos por repetição
+    n = 1
+    while True:
+        t0 = time.perf_counter_ns()
+        for _ in range(n):
+            fn()
+        if time.perf_counter_ns() - t0 >= target * 1e9 or n >= 1 << 20:
+            return n
+        n *= 2
+
+
+def time_ns_per_op(fn, n, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter_ns()
+        for _ in range(n):
+            fn()
+        elapsed = (time.perf_counter_ns() - t0) / n
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def alloc_bytes_per_op(fn):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()                      # aquece caches internos
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - base
+
+
+def _reference():
+    # Carga fixa de referência (split/strip/dict, como o parser)
+    d = {}
+    for line in ("Via: a;b=c", "From: <sip:x>;tag=1", "CSeq: 1 INVITE") * 20:
+        k, v = line.split(":", 1)
+        d[k.strip()] = v.strip()
+    return d
+
+
+def run(cases, only=None, rounds=5):
+    """
+    {"reference_ns": ..., "cases": {nome: {...}}}.
+    """
+    results = {}
+    runnable = {}
+    for name, fn in cases.items():
+        if only and only not in name:
+            continue
+        try:
+            fn()
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+            continue
+        runnable[name] = (fn, calibrate(fn))
+
+    ref_n = calibrate(_reference)
+    samples = {name: [] for name in runnable}
+    reference = []
+    for _ in range(rounds):
+        reference.append(time_ns_per_op(_reference, ref_n))
+        for name, (fn, n) in runnable.items():
+            samples[name].append(time_ns_per_op(fn, n))
+
+    for name, (fn, _) in runnable.items():
+        results[name] = {
+            "ns_per_op": round(statistics.median(samples[name])),
+            "alloc_bytes_per_op": alloc_bytes_per_op(fn),
+        }
+    return {
+        "reference_ns": round(statistics.median(reference)),
+        "cases": dict(sorted(results.items())),
+    }
+
+
+# ============================================================
+# COMPARAÇÃO COM O BASELINE
+# ============================================================
+def compare(results, baseline, threshold):
+    regressions = []
+    if "reference_ns" not in baseline:
+        return regressions          # baseline ainda não gravado
+    scale = results["reference_ns"] / baseline["reference_ns"]
+    for name, r in results["cases"].items():
+        b = baseline["cases"].get(name)
+        if not b or "error" in r or "error" in b:
+            continue
+        for key in ("ns_per_op", "alloc_bytes_per_op"):
+            expected = b[key] * scale if key == "ns_per_op" else b[key]
+            if expected and r[key] > expected * (1 + threshold):
+                regressions.append(
+                    f"{name}: {key} {round(expected)} → {r[key]} "
+                    f"(+{(r[key] / expected - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def print_table(results, baseline):
+    print(f"{'caso':62} {'ns/op':>10} {'base':>10} {'bytes/op':>10}")
+    for name, r in results["cases"].items():
+        if "error" in r:
+            print(f"{name:62} {'—':>10} {'':>10} {r['error']}")
+            continue
+        b = baseline.get("cases", {}).get(name, {}).get("ns_per_op", "")
+        print(f"{name:62} {r['ns_per_op']:>10} {b:>10} "
+              f"{r.get('alloc_bytes_per_op', ''):>10}")
+    print(f"{'referência':62} {results['reference_ns']:>10} "
+          f"{baseline.get('reference_ns', ''):>10}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Microbenchmarks SIPREC")
+    ap.add_argument("--save", action="store_true", help="grava baseline")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--threshold", type=float, default=0.25)
+    ap.add_argument("--only", help="filtra casos por substring")
+    ap.add_argument("--rounds", type=int, default=5,
+                    help="rodadas por caso (vale a mediana)")
+    args = ap.parse_args(argv)
+
+    results = run(build_cases(), args.only, args.rounds)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print_table(results, baseline)
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"✔ Baseline gravado em {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print("\n❌ Regressões acima de "
+              f"{args.threshold * 100:.0f}%:")
+        for r in regressions:
+            print("  ", r)
+        return 1
+
+    print("\n✔ Sem regressões")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+bench/pack_archive.py
+
+Pacotes diários (recording_pack.py) × arquivos soltos por chamada.
+
+1. gera --calls chamadas sintéticas de --seconds segundos (duas pernas
+   PCMU + .meta.json), espalhadas por --days dias;
+2. lê --reads chamadas aleatórias dos arquivos soltos, com o cache de
+   páginas descartado antes de cada uma (posix_fadvise DONTNEED);
+3. empacota tudo pelo PackArchive (o caminho do fim de chamada no
+   servidor) e conta arquivos e bytes antes e depois;
+4. lê as mesmas chamadas do pacote, também a frio;
+5. expira metade das chamadas do dia mais antigo por compactação.
+
+Uso (a partir da raiz do repositório):
+    python -m bench.pack_archive --calls 20000 --seconds 30
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from recording_pack import PackArchive, day_of
+from sip_session import metadata_path
+
+RATE = 8000                 # bytes/s de PCMU
+
+
+def _evict(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def _tree(directory):
+    """
+    (arquivos, bytes alocados em disco) — blocos, não tamanho lógico.
+    """
+    files = size = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            files += 1
+            size += os.stat(os.path.join(root, name)).st_blocks * 512
+    return files, size
+
+
+def generate(rec_dir, calls, seconds, days, rng):
+    audio = bytes(rng.randrange(256) for _ in range(4096))
+    leg = (audio * (seconds * RATE // len(audio) + 1))[:seconds * RATE]
+    now = time.time()
+    summaries = []
+    for n in range(calls):
+        call_id = f"pack-{n:08d}@10.1.1.20"
+        ended = now - days * 86400 + (n + 0.5) * days * 86400 / calls
+        streams = []
+        for label in ("1", "2"):
+            path = os.path.join(rec_dir, f"pack-{n:08d}_10.1.1.20_{label}.raw")
+            with open(path, "wb") as f:
+                f.write(leg)
+            streams.append({"label": label, "path": path, "packets": seconds * 50})
+        summary = {
+            "call_id": call_id, "session_id": f"s{n}", "from": "<sip:SRC@10.1.1.20>",
+            "to": "<sip:srs@10.0.0.10>", "participants": [], "labels": ["1", "2"],
+            "codec": "PCMU", "started": ended - seconds, "ended": ended,
+            "invite_file": None, "streams": streams,
+        }
+        with open(metadata_path(call_id, rec_dir), "w") as f:
+            json.dump(summary, f, indent=2)
+        summaries.append(summary)
+    return summaries
+
+
+def read_loose(summary):
+    data = {}
+    for stream in summary["streams"]:
+        with open(stream["path"], "rb") as f:
+            data[stream["label"]] = f.read()
+    meta = metadata_path(summary["call_id"], os.path.dirname(summary["streams"][0]["path"]))
+    with open(meta) as f:
+        json.load(f)
+    return data
+
+
+def run(calls, seconds, days, reads, seed=1):
+    rng = random.Random(seed)
+    work = tempfile.mkdtemp(prefix="pack_archive_")
+    rec_dir = os.path.join(work, "recordings")
+    arc_dir = os.path.join(work, "archive")
+    os.makedirs(rec_dir)
+    try:
+        t0 = time.perf_counter()
+        summaries = generate(rec_dir, calls, seconds, days, rng)
+        gen_s = time.perf_counter() - t0
+        files_before, bytes_before = _tree(rec_dir)
+        sample = rng.sample(summaries, min(reads, calls))
+
+        loose_ms = []
+        for s in sample:
+            for st in s["streams"]:
+                _evict(st["path"])
+            t = time.perf_counter()
+            read_loose(s)
+            loose_ms.append((time.perf_counter() - t) * 1000)
+
+        archive = PackArchive(arc_dir)
+        t0 = time.perf_counter()
+        for s in summaries:
+            archive.add(s)
+        archive.close()
+        pack_s = time.perf_counter() - t0
+        files_after, bytes_after = _tree(arc_dir)
+        left_behind = _tree(rec_dir)[0]
+
+        archive = PackArchive(arc_dir)
+        for volume in archive.volumes():
+            _evict(archive.pack_path(volume))
+        packed_ms = []
+        for s in sample:
+            t = time.perf_counter()
+            summary, parts = archive.read(s["call_id"], day_of(s["ended"]))
+            packed_ms.append((time.perf_counter() - t) * 1000)
+            assert len(parts) == 2 and summary["call_id"] == s["call_id"]
+
+        oldest = archive.days()[0]
+        ends = sorted(s["ended"] for s in summaries if day_of(s["ended"]) == oldest)
+        middle = ends[len(ends) // 2]
+        t0 = time.perf_counter()
+        removed, freed = archive.expire(middle)
+        expire_s = time.perf_counter() - t0
+        archive.close()
+
+        return {
+            "calls": calls,
+            "seconds_per_call": seconds,
+            "generate_s": round(gen_s, 1),
+            "files_before": files_before,
+            "disk_bytes_before": bytes_before,
+            "files_after": files_after,
+            "disk_bytes_after": bytes_after,
+            "loose_files_left": left_behind,
+            "pack_s": round(pack_s, 2),
+            "pack_calls_per_s": round(calls / pack_s),
+            "pack_mb_per_s": round(bytes_before / pack_s / 1e6, 1),
+            "cold_read_ms_loose": {"p50": round(statistics.median(loose_ms), 3),
+                                   "mean": round(statistics.mean(loose_ms), 3)},
+            "cold_read_ms_pack": {"p50": round(statistics.median(packed_ms), 3),
+                                  "mean": round(statistics.mean(packed_ms), 3)},
+            "expire_removed": removed,
+            "expire_freed_mb": round(freed / 1e6, 1),
+            "expire_s": round(expire_s, 2),
+        }
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pacotes diários × arquivos soltos")
+    ap.add_argument("--calls", type=int, default=5000)
+    ap.add_argument("--seconds", type=int, default=30)
+    ap.add_argument("--days", type=int, default=2)
+    ap.add_argument("--reads", type=int, default=200)
+    args = ap.parse_args(argv)
+    print(json.dumps(run(args.calls, args.seconds, args.days, args.reads), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,560 @@
+#!/usr/bin/env python3
+"""
+bench/pcap_replay.py
+
+Reproduz tráfego SIPREC capturado em produção (.pcap ou .pcapng) contra um
+server_siprec.SIPServer local — sem libpcap, só Python.
+
+O que é reenviado:
+- SIP UDP destinado ao SRS da captura (quem recebeu os INVITEs), vindo de
+  um socket de loopback por SBC original
+- RTP/RTCP destinado às portas que o SRS da captura anunciou no 200 OK;
+  cada porta original é trocada pela porta que o servidor local anunciou
+  no 200 OK dele (mesma ordem de m=)
+
+Respostas e requisições do SRS original são descartadas: quem responde
+agora é o servidor local. SIP sobre TCP não é remontado (só UDP); IPv4
+fragmentado é remontado (INVITEs grandes com rs-metadata).
+
+O que depende do 200 OK local (ACK/BYE e a mídia de uma chamada) espera
+numa fila por chamada até ele chegar, sem segurar a linha do tempo: os
+outros pacotes seguem no ritmo da captura.
+
+Uso (a partir da raiz do repositório):
+    python -m bench.pcap_replay captura.pcapng --local            # tempo original
+    python -m bench.pcap_replay captura.pcap --local --fast       # o mais rápido possível
+    python -m bench.pcap_replay captura.pcap --target 127.0.0.1:5060 --speed 4
+"""
+
+import argparse
+import json
+import re
+import selectors
+import socket
+import struct
+import threading
+import time
+
+from flood_guard import looks_like_sip
+from bench.loadgen import start_local_server
+
+CRLF = "\r\n"
+
+# Tipos de enlace (LINKTYPE_*)
+LINK_NULL = 0
+LINK_ETHERNET = 1
+LINK_RAW = 101
+LINK_LINUX_SLL = 113
+LINK_IPV4 = 228
+LINK_IPV6 = 229
+LINK_LINUX_SLL2 = 276
+# DLT_RAW com o número da plataforma (12; 14 no OpenBSD) em vez de 101
+LINK_DLT_RAW = 12
+LINK_DLT_RAW_OPENBSD = 14
+
+ETH_IPV4 = 0x0800
+ETH_IPV6 = 0x86DD
+ETH_VLAN = (0x8100, 0x88A8)
+IPPROTO_UDP = 17
+
+
+# ============================================================
+# LEITURA PCAP / PCAPNG
+# ============================================================
+def read_capture(path):
+    """
+    Gera (timestamp em s, linktype, quadro) de um .pcap ou .pcapng.
+    Pacote de interface não declarada (pcapng corrompido) sai com
+    linktype None.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(4)
+        f.seek(0)
+        if magic == b"\x0a\x0d\x0d\x0a":
+            yield from _read_pcapng(f)
+        else:
+            yield from _read_pcap(f)
+
+
+def _read_pcap(f):
+    header = f.read(24)
+    magic = header[:4]
+    formats = {
+        b"\xd4\xc3\xb2\xa1": ("<", 1e-6), b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+        b"\x4d\x3c\xb2\xa1": ("<", 1e-9), b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+    }
+    if magic not in formats:
+        raise ValueError("Arquivo não é pcap nem pcapng")
+    endian, resolution = formats[magic]
+    linktype = struct.unpack(endian + "I", header[20:24])[0] & 0x0FFFFFFF
+    record = struct.Struct(endian + "IIII")
+
+    while True:
+        head = f.read(record.size)
+        if len(head) < record.size:
+            return
+        sec, frac, caplen, _ = record.unpack(head)
+        data = f.read(caplen)
+        if len(data) < caplen:
+            return
+        yield sec + frac * resolution, linktype, data
+
+
+def _read_pcapng(f):
+    endian = "<"
+    interfaces = []       # (linktype, resolução do timestamp)
+    last_ts = 0.0
+
+    while True:
+        head = f.read(8)
+        if len(head) < 8:
+            return
+
+        if head[:4] == b"\x0a\x0d\x0d\x0a":
+            # Section Header: define a ordem dos bytes da seção
+            bom = f.read(4)
+            endian = "<" if bom == b"\x4d\x3c\x2b\x1a" else ">"
+            block_len = struct.unpack(endian + "I", head[4:8])[0]
+            f.read(block_len - 12)
+            interfaces = []
+            continue
+
+        block_type, block_len = struct.unpack(endian + "II", head)
+        if block_len < 12:
+            return
+        body = f.read(block_len - 8)[:-4]
+
+        if block_type == 1:                       # Interface Description
+            linktype = struct.unpack_from(endian + "H", body, 0)[0]
+            interfaces.append([linktype, _tsresol(body[8:], endian)])
+
+        elif block_type == 6 and interfaces:      # Enhanced Packet
+            iface, ts_hi, ts_lo, caplen, _ = struct.unpack_from(endian + "IIIII", body, 0)
+            if iface >= len(interfaces):
+                yield last_ts, None, b""
+                continue
+            linktype, resolution = interfaces[iface]
+            last_ts = ((ts_hi << 32) | ts_lo) * resolution
+            yield last_ts, linktype, body[20:20 + caplen]
+
+        elif block_type == 3 and interfaces:      # Simple Packet (sem timestamp)
+            yield last_ts, interfaces[0][0], body[4:]
+
+
+def _tsresol(options, endian):
+    offset = 0
+    while offset + 4 <= len(options):
+        code, length = struct.unpack_from(endian + "HH", options, offset)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            v = options[offset + 4]
+            return 2.0 ** -(v & 0x7F) if v & 0x80 else 10.0 ** -v
+        offset += 4 + (length + 3) // 4 * 4
+    return 1e-6
+
+
+# ============================================================
+# ENLACE → IP → UDP
+# ============================================================
+class UdpDecoder:
+    """
+    Tira enlace e IP e devolve (origem, destino, payload UDP). Fragmentos
+    IPv4 ficam guardados até o datagrama fechar.
+    """
+
+    def __init__(self):
+        self._fragments = {}
+
+    def decode(self, linktype, frame):
+        ip = self._network(linktype, frame)
+        if not ip:
+            return None
+        version = ip[0] >> 4
+        if version == 4:
+            return self._ipv4(ip)
+        if version == 6:
+            return self._ipv6(ip)
+        return None
+
+    # ---------------------------------------------------------------
+    def _network(self, linktype, frame):
+        if linktype == LINK_ETHERNET:
+            ethertype = struct.unpack_from("!H", frame, 12)[0]
+            offset = 14
+            while ethertype in ETH_VLAN:
+                ethertype = struct.unpack_from("!H", frame, offset + 2)[0]
+                offset += 4
+            return frame[offset:] if ethertype in (ETH_IPV4, ETH_IPV6) else None
+        if linktype == LINK_LINUX_SLL:
+            return frame[16:]
+        if linktype == LINK_LINUX_SLL2:
+            return frame[20:]
+        if linktype == LINK_NULL:
+            return frame[4:]
+        if linktype in (LINK_RAW, LINK_IPV4, LINK_IPV6, LINK_DLT_RAW, LINK_DLT_RAW_OPENBSD):
+            return frame
+        return None
+
+    def _ipv4(self, ip):
+        ihl = (ip[0] & 0x0F) * 4
+        total_len, ident, flags_frag, _, proto = struct.unpack_from("!HHHBB", ip, 2)
+        if proto != IPPROTO_UDP:
+            return None
+        src = socket.inet_ntoa(ip[12:16])
+        dst = socket.inet_ntoa(ip[16:20])
+        payload = ip[ihl:total_len]
+
+        more = flags_frag & 0x2000
+        offset = (flags_frag & 0x1FFF) * 8
+        if more or offset:
+            payload = self._reassemble((src, dst, ident), offset, payload, more)
+            if payload is None:
+                return None
+        return self._udp(src, dst, payload)
+
+    def _reassemble(self, key, offset, data, more):
+        parts = self._fragments.setdefault(key, {})
+        parts[offset] = data
+        if not more:
+            parts["end"] = offset + len(data)
+        end = parts.get("end")
+        if end is None:
+            return None
+
+        buf = bytearray()
+        for off in sorted(k for k in parts if k != "end"):
+            if off != len(buf):
+                return None            # ainda falta pedaço
+            buf += parts[off]
+        if len(buf) != end:
+            return None
+        del self._fragments[key]
+        return bytes(buf)
+
+    def _ipv6(self, ip):
+        if ip[6] != IPPROTO_UDP:        # sem cabeçalhos de extensão
+            return None
+        src = socket.inet_ntop(socket.AF_INET6, ip[8:24])
+        dst = socket.inet_ntop(socket.AF_INET6, ip[24:40])
+        return self._udp(src, dst, ip[40:])
+
+    def _udp(self, src, dst, segment):
+        if len(segment) < 8:
+            return None
+        sport, dport, length = struct.unpack_from("!HHH", segment, 0)
+        return (src, sport), (dst, dport), segment[8:length]
+
+
+# ============================================================
+# FLUXOS DA CAPTURA
+# ============================================================
+_CALL_ID = re.compile(r"^(?:Call-ID|i)[ \t]*:[ \t]*([^\r\n]+)", re.IGNORECASE | re.MULTILINE)
+_CSEQ = re.compile(r"^CSeq[ \t]*:[ \t]*\d+[ \t]+(\w+)", re.IGNORECASE | re.MULTILINE)
+_MEDIA = re.compile(r"^m=\w+ (\d+)", re.MULTILINE)     # áudio, vídeo...
+_CONN = re.compile(r"^c=IN IP[46] (\S+)", re.MULTILINE)
+
+
+def sip_call_id(text):
+    m = _CALL_ID.search(text)
+    return m.group(1).strip() if m else None
+
+
+def answer_ports(text):
+    """
+    (Call-ID, [portas de mídia]) de um 200 OK de INVITE com SDP; senão None.
+    Uma porta por m=, na ordem do SDP (0 nos fluxos recusados).
+    """
+    if not text.startswith("SIP/2.0 200"):
+        return None
+    cseq = _CSEQ.search(text)
+    if not cseq or cseq.group(1).upper() != "INVITE":
+        return None
+    ports = [int(p) for p in _MEDIA.findall(text)]
+    return (sip_call_id(text), ports) if ports else None
+
+
+class Capture:
+    """
+    Pacotes UDP da captura, já classificados, e o mapa de mídia do SRS
+    original: (ip, porta anunciada) → (Call-ID, índice do m=).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.packets = []          # (ts, src, dst, payload, é SIP)
+        self.srs = set()           # endereços SIP que receberam INVITE
+        self.media = {}
+        self.read = 0
+        self.bad_interface = 0     # pcapng: pacote de interface inexistente
+        self._load()
+        self.call_ids = {call_id for call_id, _ in self.media.values()}
+
+    def _load(self):
+        decoder = UdpDecoder()
+        for ts, linktype, frame in read_capture(self.path):
+            self.read += 1
+            if linktype is None:
+                self.bad_interface += 1
+                continue
+            try:
+                udp = decoder.decode(linktype, frame)
+            except (struct.error, IndexError, OSError):
+                continue
+            if udp is None:
+                continue
+            src, dst, payload = udp
+            is_sip = looks_like_sip(payload)
+            self.packets.append((ts, src, dst, payload, is_sip))
+
+            if not is_sip:
+                continue
+            text = payload.decode("utf-8", errors="ignore")
+            if text.startswith("INVITE "):
+                self.srs.add(dst)
+            answer = answer_ports(text)
+            if answer:
+                conn = _CONN.search(text)
+                ip = conn.group(1) if conn else src[0]
+                call_id, ports = answer
+                for i, port in enumerate(ports):
+                    if port:
+                        self.media[(ip, port)] = (call_id, i)
+
+    @property
+    def calls(self):
+        return len(self.call_ids)
+
+
+# ============================================================
+# REPLAY
+# ============================================================
+class Replayer:
+
+    def __init__(self, capture, target, speed=1.0, fast=False, answer_timeout=2.0):
+        self.capture = capture
+        self.target = target
+        self.speed = speed
+        self.fast = fast
+        self.answer_timeout = answer_timeout
+
+        self._sip_socks = {}         # SBC original → socket de loopback
+        self._selector = selectors.DefaultSelector()
+        self._sel_lock = threading.Lock()
+        self.media_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.media_sock.bind(("127.0.0.1", 0))
+
+        self._local_ports = {}       # Call-ID → portas do 200 OK local
+        # Call-ID → (prazo, pacotes) esperando o 200 OK local; quem recebe
+        # o 200 OK envia a fila. Vencido o prazo, a chamada entra em
+        # _unanswered e não se espera mais (um 200 OK atrasado ainda vale)
+        self._held = {}
+        self._unanswered = set()
+        self._answered = threading.Lock()
+        self._running = True
+
+        self.counters = {"sip": 0, "rtp": 0, "rtcp": 0, "skipped": 0,
+                         "unmapped": 0, "answers": 0}
+
+    # ---------------------------------------------------------------
+    def _sip_sock(self, src):
+        sock = self._sip_socks.get(src)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(("127.0.0.1", 0))
+            sock.setblocking(False)
+            with self._sel_lock:
+                self._selector.register(sock, selectors.EVENT_READ)
+            self._sip_socks[src] = sock
+        return sock
+
+    def _read_answers(self):
+        while self._running:
+            with self._sel_lock:
+                has_socks = bool(self._selector.get_map())
+            if not has_socks:
+                time.sleep(0.05)
+                continue
+            for key, _ in self._selector.select(timeout=0.1):
+                try:
+                    data, _ = key.fileobj.recvfrom(65535)
+                except OSError:
+                    continue
+                answer = answer_ports(data.decode("utf-8", errors="ignore"))
+                if answer:
+                    call_id, ports = answer
+                    with self._answered:
+                        self._local_ports[call_id] = ports
+                        self.counters["answers"] += 1
+                        held = self._held.pop(call_id, None)
+                        # Sob o lock: o loop de replay não passa na frente
+                        for item in held[1] if held else ():
+                            self._deliver(item, ports)
+
+    # ---------------------------------------------------------------
+    def _media_entry(self, dst):
+        """
+        (Call-ID, índice do m=, "rtp"|"rtcp") da porta de mídia original,
+        ou None.
+        """
+        kind = "rtp"
+        entry = self.capture.media.get(dst)
+        if entry is None:
+            entry = self.capture.media.get((dst[0], dst[1] - 1))
+            kind = "rtcp"
+        if entry is None:
+            return None
+        return entry[0], entry[1], kind
+
+    def _send(self, call_id, item):
+        """
+        Envia já, ou põe na fila da chamada se o 200 OK local ainda não
+        veio. item: ("sip", SBC original, payload) ou
+        ("rtp"|"rtcp", índice do m=, payload).
+        """
+        with self._answered:
+            ports = self._local_ports.get(call_id)
+            held = self._held.get(call_id)
+            if held is None and (ports is not None or call_id in self._unanswered):
+                self._deliver(item, ports)
+                return
+            if held is None:
+                held = self._held[call_id] = (time.monotonic() + self.answer_timeout, [])
+            held[1].append(item)
+
+    def _expire(self, now):
+        """
+        Chamadas sem 200 OK local no prazo: a fila sai sem esperar mais
+        (SIP vai assim mesmo, mídia conta como sem mapa).
+        """
+        with self._answered:
+            for call_id, (deadline, items) in list(self._held.items()):
+                if deadline <= now:
+                    del self._held[call_id]
+                    self._unanswered.add(call_id)
+                    for item in items:
+                        self._deliver(item, None)
+
+    def _deliver(self, item, ports):
+        kind, key, payload = item
+        if kind == "sip":
+            self._sip_sock(key).sendto(payload, self.target)
+            self.counters["sip"] += 1
+            return
+        if ports is None or key >= len(ports) or not ports[key]:
+            self.counters["unmapped"] += 1
+            return
+        try:
+            self.media_sock.sendto(payload, (self.target[0], ports[key] + (kind == "rtcp")))
+        except OSError:
+            self.counters["skipped"] += 1
+            return
+        self.counters[kind] += 1
+
+    # ---------------------------------------------------------------
+    def run(self):
+        threading.Thread(target=self._read_answers, daemon=True).start()
+        packets = self.capture.packets
+        if not packets:
+            return self.report(0.0)
+
+        t0 = packets[0][0]
+        wall0 = time.perf_counter()
+
+        for ts, src, dst, payload, is_sip in packets:
+            if not self.fast:
+                delay = wall0 + (ts - t0) / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            if self._held:
+                self._expire(time.monotonic())
+
+            if is_sip:
+                if dst not in self.capture.srs:
+                    self.counters["skipped"] += 1     # lado do SRS original
+                    continue
+                # ACK/BYE só depois que o servidor local atendeu o INVITE
+                # (no modo --fast eles chegariam antes da sessão existir)
+                call_id = None
+                if not payload.startswith(b"INVITE "):
+                    call_id = sip_call_id(payload.decode("utf-8", errors="ignore"))
+                if call_id in self.capture.call_ids:
+                    self._send(call_id, ("sip", src, payload))
+                else:
+                    with self._answered:
+                        self._deliver(("sip", src, payload), None)
+                continue
+
+            entry = self._media_entry(dst)
+            if entry is None:
+                self.counters["skipped"] += 1
+                continue
+            call_id, index, kind = entry
+            self._send(call_id, (kind, index, payload))
+
+        elapsed = time.perf_counter() - wall0
+        # Filas ainda esperando 200 OK: até o prazo de cada uma
+        while self._held:
+            time.sleep(0.01)
+            self._expire(time.monotonic())
+        time.sleep(0.5)      # últimas respostas
+        self._running = False
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        sent = self.counters["sip"] + self.counters["rtp"] + self.counters["rtcp"]
+        span = (self.capture.packets[-1][0] - self.capture.packets[0][0]
+                if self.capture.packets else 0.0)
+        return {
+            "capture": self.capture.path,
+            "frames": self.capture.read,
+            "udp_packets": len(self.capture.packets),
+            "bad_interface": self.capture.bad_interface,
+            "calls_in_capture": self.capture.calls,
+            "capture_span_s": round(span, 3),
+            "replay_s": round(elapsed, 3),
+            "sent": sent,
+            "pps": round(sent / elapsed) if elapsed else None,
+            **self.counters,
+        }
+
+
+# ============================================================
+# MAIN
+# ============================================================
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay de captura SIPREC")
+    ap.add_argument("capture", help="arquivo .pcap ou .pcapng")
+    ap.add_argument("--target", default="127.0.0.1:15060")
+    ap.add_argument("--local", action="store_true",
+                    help="sobe um server_siprec.SIPServer local no --target")
+    ap.add_argument("--fast", action="store_true",
+                    help="ignora os tempos da captura (o mais rápido possível)")
+    ap.add_argument("--speed", type=float, default=1.0,
+                    help="multiplicador do tempo original (2 = 2x mais rápido)")
+    ap.add_argument("--json", help="grava o relatório neste arquivo")
+    args = ap.parse_args(argv)
+
+    host, port = args.target.rsplit(":", 1)
+    target = (host, int(port))
+
+    capture = Capture(args.capture)
+    print(f"📼 {capture.read} quadros, {len(capture.packets)} UDP, "
+          f"{capture.calls} chamadas, SRS original {sorted(capture.srs)}")
+
+    proc = start_local_server(*target) if args.local else None
+    try:
+        result = Replayer(capture, target, args.speed, args.fast).run()
+    finally:
+        if proc:
+            proc.terminate()
+
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+bench/ring_throughput.py
+
+Vazão do caminho de mídia: threads (um RtpReceiver por label, tudo no
+processo SIP) contra o pipeline multiprocesso (media_pipeline.py).
+
+Um processo emissor manda RTP G.711 (172 B) para N portas na taxa pedida
+(--pps, 0 = o mais rápido possível) por --seconds; o resultado é o que
+chegou ao disco (bytes gravados / 160), a perda em relação ao enviado e o
+CPU gasto do lado que recebe (todos os processos, menos o emissor) por
+pacote gravado.
+
+--ring mede só o ring: um produtor e um consumidor em processos
+separados, sem rede nem disco.
+
+Uso (a partir da raiz do repositório):
+    python -m bench.ring_throughput --mode threads --streams 200 --pps 20000
+    python -m bench.ring_throughput --mode procs --streams 200 --pps 20000
+    python -m bench.ring_throughput --ring
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import socket
+import struct
+import tempfile
+import time
+
+from media_ring import ShmRing, RingReader
+from media_pipeline import MediaPipeline
+from rtp_receiver import RtpReceiver
+
+PAYLOAD = 160
+
+
+def _packet(seq, ssrc):
+    return struct.pack("!BBHII", 0x80, 0, seq & 0xFFFF, seq * PAYLOAD, ssrc) + b"\xff" * PAYLOAD
+
+
+# ============================================================
+# EMISSOR
+# ============================================================
+def _sender(ports, pps, seconds, result):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 << 20)
+    targets = [("127.0.0.1", p) for p in ports]
+    sent = 0
+    seq = 0
+    start = time.perf_counter()
+    end = start + seconds
+    while True:
+        now = time.perf_counter()
+        if now >= end:
+            break
+        if pps and sent >= (now - start) * pps:
+            time.sleep(0.0005)
+            continue
+        # uma rodada: um pacote por porta
+        for i, addr in enumerate(targets):
+            try:
+                sock.sendto(_packet(seq, i), addr)
+                sent += 1
+            except OSError:
+                pass
+        seq += 1
+    result.put((sent, time.process_time()))
+
+
+def _recorded(out_dir):
+    total = 0
+    for name in os.listdir(out_dir):
+        if name.endswith(".raw"):
+            total += os.path.getsize(os.path.join(out_dir, name))
+    return total // PAYLOAD
+
+
+def _drive(ports, pps, seconds):
+    result = multiprocessing.Queue()
+    p = multiprocessing.Process(target=_sender, args=(ports, pps, seconds, result))
+    p.start()
+    sent, cpu = result.get()
+    p.join()
+    _drive.sender_cpu += cpu
+    return sent
+
+
+_drive.sender_cpu = 0.0
+
+
+def _cpu():
+    """
+    CPU do lado que recebe: este processo + filhos já encerrados, menos o
+    emissor.
+    """
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (time.process_time() + children.ru_utime + children.ru_stime
+            - _drive.sender_cpu)
+
+
+# ============================================================
+# MODOS
+# ============================================================
+def run_threads(streams, pps, seconds, out_dir):
+    rxs = [RtpReceiver(f"bench-{n}", "0", host="127.0.0.1", out_dir=out_dir)
+           for n in range(streams)]
+    for rx in rxs:
+        rx.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        rx.start()
+    sent = _drive([rx.port for rx in rxs], pps, seconds)
+    time.sleep(0.5)
+    for rx in rxs:
+        rx.stop()
+    for rx in rxs:
+        rx._thread.join()
+    return sent, {}
+
+
+def run_procs(streams, pps, seconds, out_dir):
+    pipeline = MediaPipeline()
+    pipeline.start()
+    rxs = [pipeline.open_stream(f"bench-{n}", "0", host="127.0.0.1", out_dir=out_dir)
+           for n in range(streams)]
+    sent = _drive([rx.port for rx in rxs], pps, seconds)
+    time.sleep(0.5)
+    for rx in rxs:
+        rx.stop()
+    while pipeline.active:
+        time.sleep(0.05)
+    pipeline.stop()
+    time.sleep(0.1)
+    return sent, {"ring_dropped": pipeline.dropped}
+
+
+# ============================================================
+# SÓ O RING
+# ============================================================
+def _ring_consumer(spec, count, result):
+    ring = ShmRing.attach(spec)
+    reader = RingReader(ring, 0)
+    seen = 0
+    octets = 0
+    while seen < count:
+        batch = reader.poll()
+        if not batch:
+            time.sleep(0.0001)
+            continue
+        for _, _, _, _, view in batch:
+            octets += view.nbytes
+            view.release()
+        seen += len(batch)
+        reader.release()
+    result.put(octets)
+    ring.close()
+
+
+def run_ring(count):
+    ring = ShmRing(slots=16384, slot_size=256, consumers=1)
+    result = multiprocessing.Queue()
+    p = multiprocessing.Process(target=_ring_consumer, args=(ring.spec(), count, result))
+    p.start()
+    packet = _packet(1, 1)
+    start = time.perf_counter()
+    pushed = 0
+    while pushed < count:
+        if ring.push(1, 0, packet, 0.0):
+            pushed += 1
+        else:
+            time.sleep(0.0001)
+    octets = result.get()
+    elapsed = time.perf_counter() - start
+    p.join()
+    ring.close(unlink=True)
+    return {
+        "packets": count,
+        "seconds": round(elapsed, 3),
+        "pps": round(count / elapsed),
+        "mb_per_s": round(octets / elapsed / 2**20, 1),
+        "producer_full_retries": ring.dropped,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Vazão do caminho de mídia")
+    ap.add_argument("--mode", choices=("threads", "procs"), default="threads")
+    ap.add_argument("--streams", type=int, default=100)
+    ap.add_argument("--pps", type=int, default=0, help="taxa total (0 = máxima)")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--ring", action="store_true", help="mede só o ring")
+    ap.add_argument("--packets", type=int, default=1_000_000)
+    args = ap.parse_args(argv)
+
+    if args.ring:
+        print(json.dumps({"ring": run_ring(args.packets), "cpus": os.cpu_count()}, indent=2))
+        return
+
+    out_dir = tempfile.mkdtemp(prefix="ring-bench-")
+    try:
+        run = run_threads if args.mode == "threads" else run_procs
+        cpu0 = _cpu()
+        sent, extra = run(args.streams, args.pps, args.seconds, out_dir)
+        cpu = _cpu() - cpu0
+        recorded = _recorded(out_dir)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    print(json.dumps({
+        "mode": args.mode,
+        "streams": args.streams,
+        "cpus": os.cpu_count(),
+        "sent": sent,
+        "recorded": recorded,
+        "loss_pct": round(100 * (1 - recorded / sent), 2) if sent else 0.0,
+        "recorded_pps": round(recorded / args.seconds),
+        "cpu_s": round(cpu, 2),
+        "cpu_us_per_packet": round(1e6 * cpu / recorded, 1) if recorded else None,
+        **extra,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+bench/rtp_streams.py
+
+Gerador de fluxos RTP G.711 (20 ms) e medição de perda/latência/CPU no
+receptor de mídia do servidor SIPREC.
+
+Para cada ponto da curva:
+  1. abre N/2 chamadas SIPREC no servidor local (2 fluxos por chamada)
+     e lê as portas negociadas no 200 OK;
+  2. envia N fluxos cadenciados (seq/timestamp/SSRC corretos, PCMU ou PCMA),
+     com o instante de envio nos 8 primeiros bytes do payload;
+  3. pede ao processo do servidor contagem recebida, latência adicionada
+     e CPU gasto, e encerra as chamadas com BYE.
+
+O cabeçalho segue o layout de decode_rtp_packet (udp.py): 12 bytes fixos,
+sem CSRC nem extensão.
+
+Uso (a partir da raiz do repositório):
+    python -m bench.rtp_streams --streams 10,50,100,200 --duration 5
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+
+from bench.loadgen import build_invite, build_in_dialog, percentile
+
+PTIME = 0.020
+SAMPLES = 160                  # 20 ms a 8 kHz
+PAYLOAD_TYPES = {"pcmu": 0, "pcma": 8}
+SILENCE = {"pcmu": b"\xff", "pcma": b"\xd5"}
+RTP_HEADER = struct.Struct("!BBHII")
+
+
+# ============================================================
+# PROCESSO DO SERVIDOR (com sonda nos receptores)
+# ============================================================
+def _server_main(host, port, conn):
+    sys.stdout = open(os.devnull, "w")
+
+    from server_siprec import SIPServer
+    from rtp_receiver import RtpReceiver
+
+    stats = {}          # porta → [pacotes, [latências ns]]
+
+    def probe(rx, data, arrival_ns):
+        s = stats.get(rx.port)
+        if s is None:
+            s = stats[rx.port] = [0, []]
+        s[0] += 1
+        s[1].append(arrival_ns - int.from_bytes(data[12:20], "big"))
+
+    RtpReceiver.probe = staticmethod(probe)
+
+    server = SIPServer(host, port)
+    threading.Thread(target=server.start, daemon=True).start()
+    conn.send("ready")
+
+    cpu0 = time.process_time()
+    while True:
+        cmd = conn.recv()
+        if cmd == "reset":
+            stats.clear()
+            cpu0 = time.process_time()
+            conn.send("ok")
+        elif cmd == "report":
+            cpu = time.process_time() - cpu0
+            conn.send({
+                "cpu_s": cpu,
+                "received": {p: s[0] for p, s in stats.items()},
+                "latencies": [v for s in stats.values() for v in s[1]],
+            })
+        elif cmd == "stop":
+            return
+
+
+# ============================================================
+# SINALIZAÇÃO
+# ============================================================
+def open_calls(sock, target, count, base):
+    """
+    Abre `count` chamadas e retorna [(call, [portas])].
+    """
+    local = sock.getsockname()
+    pending = {}
+    invites = []
+    for n in range(count):
+        call_id, from_tag, invite = build_invite(base + n, local, target)
+        pending[call_id] = {"call_id": call_id, "from_tag": from_tag}
+        invites.append(invite)
+
+    calls = []
+    idle = False
+    deadline = time.monotonic() + 10 + count / 20
+    while pending and time.monotonic() < deadline:
+        # Lotes pequenos, o próximo só depois das respostas do anterior
+        # (ou de 0,5 s de silêncio): o servidor perde rajadas de INVITE
+        if invites and (idle or len(pending) <= len(invites)):
+            for invite in invites[:10]:
+                sock.sendto(invite, target)
+            del invites[:10]
+
+        idle = not select.select([sock], [], [], 0.5)[0]
+        if not idle:
+            data = sock.recv(65535).decode("utf-8", errors="ignore")
+            if not data.startswith("SIP/2.0 200"):
+                continue
+            call_id = re.search(r"Call-ID: ([^\r\n]+)", data).group(1)
+            call = pending.pop(call_id, None)
+            if call is None:
+                continue
+            call["to"] = re.search(r"To: ([^\r\n]+)", data).group(1)
+            ports = [int(p) for p in re.findall(r"m=audio (\d+)", data)]
+            sock.sendto(build_in_dialog("ACK", call, local, target, 101,
+                                        f"z9hG4bKack{call_id.split('@')[0]}"),
+                        target)
+            calls.append((call, ports))
+
+    return calls
+
+
+def close_calls(sock, target, calls):
+    local = sock.getsockname()
+    for call, _ in calls:
+        sock.sendto(build_in_dialog("BYE", call, local, target, 102,
+                                    f"z9hG4bKbye{call['call_id'].split('@')[0]}"), target)
+    time.sleep(0.5)
+    while select.select([sock], [], [], 0)[0]:
+        sock.recv(65535)
+
+
+# ============================================================
+# GERADOR RTP
+# ============================================================
+def send_streams(ports, host, duration, codec="pcmu"):
+    """
+    Envia um fluxo cadenciado por porta durante `duration` segundos.
+    Retorna (pacotes enviados por porta, ticks em que o gerador atrasou).
+    """
+    out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    out.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 << 20)
+
+    pt = PAYLOAD_TYPES[codec]
+    filler = SILENCE[codec] * (SAMPLES - 8)
+    streams = [
+        {"addr": (host, p), "seq": i * 1000, "ts": i * 7919,
+         "ssrc": 0x51F00000 + i, "sent": 0}
+        for i, p in enumerate(ports)
+    ]
+
+    ticks = int(duration / PTIME)
+    late = 0
+    t0 = time.monotonic()
+    for tick in range(ticks):
+        for s in streams:
+            marker = 0x80 if tick == 0 else 0
+            header = RTP_HEADER.pack(0x80, marker | pt, s["seq"] & 0xFFFF,
+                                     s["ts"] & 0xFFFFFFFF, s["ssrc"])
+            payload = time.monotonic_ns().to_bytes(8, "big") + filler
+            out.sendto(header + payload, s["addr"])
+            s["seq"] += 1
+            s["ts"] += SAMPLES
+            s["sent"] += 1
+
+        # Cadência absoluta: atraso de um tick não acumula
+        delay = t0 + (tick + 1) * PTIME - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            late += 1
+
+    out.close()
+    return {s["addr"][1]: s["sent"] for s in streams}, late
+
+
+# ============================================================
+# CURVA DE ESCALA
+# ============================================================
+def send_parallel(ports, host, duration, codec, senders):
+    """
+    Divide os fluxos entre `senders` processos geradores.
+    """
+    if senders <= 1:
+        return send_streams(ports, host, duration, codec)
+
+    chunks = [ports[i::senders] for i in range(senders)]
+    with multiprocessing.Pool(senders) as pool:
+        parts = pool.starmap(
+            send_streams, [(c, host, duration, codec) for c in chunks if c]
+        )
+
+    sent = {}
+    for s, _ in parts:
+        sent.update(s)
+    return sent, max(late for _, late in parts)
+
+
+def measure(conn, sock, target, streams, duration, codec, base, senders=1):
+    calls = open_calls(sock, target, (streams + 1) // 2, base)
+    ports = [p for _, ps in calls for p in ps][:streams]
+
+    conn.send("reset")
+    conn.recv()
+    sent, late = send_parallel(ports, target[0], duration, codec, senders)
+    time.sleep(0.3)                 # deixa a fila do receptor esvaziar
+    conn.send("report")
+    report = conn.recv()
+
+    close_calls(sock, target, calls)
+
+    total_sent = sum(sent.values())
+    total_rx = sum(report["received"].get(p, 0) for p in sent)
+    lat = report["latencies"]
+    ms = lambda v: round(v / 1e6, 3) if v is not None else None
+
+    return {
+        "streams": len(ports),
+        "sent": total_sent,
+        "received": total_rx,
+        "loss_pct": round(100 * (1 - total_rx / total_sent), 3) if total_sent else None,
+        "latency_ms": {
+            "p50": ms(percentile(lat, 50)),
+            "p99": ms(percentile(lat, 99)),
+            "max": ms(max(lat) if lat else None),
+        },
+        # Se o próprio gerador atrasou, o ponto mede o gerador, não o servidor
+        "generator_late_ticks": late,
+        "cpu_pct_per_stream": round(
+            100 * report["cpu_s"] / duration / max(1, len(ports)), 3
+        ),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark de fluxos RTP")
+    ap.add_argument("--target", default="127.0.0.1:15062")
+    ap.add_argument("--streams", default="10,50,100,200",
+                    help="lista de quantidades de fluxos")
+    ap.add_argument("--duration", type=float, default=5.0)
+    ap.add_argument("--codec", choices=sorted(PAYLOAD_TYPES), default="pcmu")
+    ap.add_argument("--senders", type=int, default=1,
+                    help="processos geradores (para N grande)")
+    ap.add_argument("--json", help="grava a curva neste arquivo")
+    args = ap.parse_args(argv)
+
+    host, port = args.target.rsplit(":", 1)
+    target = (host, int(port))
+
+    parent, child = multiprocessing.Pipe()
+    proc = multiprocessing.Process(target=_server_main,
+                                   args=(host, int(port), child), daemon=True)
+    proc.start()
+    parent.recv()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((host, 0))
+
+    curve = []
+    try:
+        base = 0
+        for n in [int(x) for x in args.streams.split(",")]:
+            point = measure(parent, sock, target, n, args.duration,
+                            args.codec, base, args.senders)
+            base += n
+            curve.append(point)
+            print(f"{point['streams']:>6} fluxos  perda {point['loss_pct']:>7}%  "
+                  f"lat p50 {point['latency_ms']['p50']} ms  "
+                  f"p99 {point['latency_ms']['p99']} ms  "
+                  f"CPU/fluxo {point['cpu_pct_per_stream']}%  "
+                  f"ticks atrasados {point['generator_late_ticks']}")
+    finally:
+        parent.send("stop")
+        proc.join(timeout=2)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(curve, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+bench/send_burst.py
+
+Rajada de saída SIP (BYE em massa na troca de turno): --threads threads
+de handler mandam --messages mensagens no total para um peer local,
+de dois jeitos:
+
+- direct: cada thread chama sendto no socket, como antes da fila
+- queue:  SendQueue — quem acha a fila livre envia o lote, as outras
+          threads só enfileiram
+
+Mede o tempo que os handlers ficam presos no envio (µs por mensagem), a
+duração da rajada até o último datagrama sair, quantos o peer recebeu e,
+com a fila, lotes e latência fila → sendto.
+
+Uso (a partir da raiz do repositório):
+    python -m bench.send_burst --messages 20000 --threads 16
+"""
+
+import argparse
+import json
+import multiprocessing
+import select
+import socket
+import threading
+import time
+
+from bench.loadgen import build_in_dialog
+from send_queue import SendQueue
+
+
+def _peer_main(host, conn):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 << 20)
+    sock.bind((host, 0))
+    conn.send(sock.getsockname())
+    received = 0
+    # Conta até 1 s sem nada depois do primeiro datagrama
+    while select.select([sock], [], [], 1.0 if received else 30.0)[0]:
+        sock.recv(65535)
+        received += 1
+    conn.send(received)
+
+
+def _message(n, local, peer):
+    call = {"from_tag": f"sb{n}", "to": f"<sip:srs@{peer[0]}>;tag=srs{n}",
+            "call_id": f"burst-{n}@{local[0]}"}
+    return build_in_dialog("BYE", call, local, peer, 102, f"z9hG4bKsb{n}")
+
+
+def run(mode, messages, threads, host="127.0.0.1"):
+    conn, child = multiprocessing.Pipe()
+    peer = multiprocessing.Process(target=_peer_main, args=(host, child))
+    peer.start()
+    target = conn.recv()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((host, 0))
+    local = sock.getsockname()
+    outbound = SendQueue(sock) if mode == "queue" else None
+    send = outbound.send if outbound else sock.sendto
+
+    per_thread = messages // threads
+    batches = [[_message(t * per_thread + i, local, target) for i in range(per_thread)]
+               for t in range(threads)]
+    held = [0] * threads
+    go = threading.Event()
+
+    def handler(t):
+        go.wait()
+        t0 = time.perf_counter_ns()
+        for data in batches[t]:
+            send(data, target)
+        held[t] = time.perf_counter_ns() - t0
+
+    workers = [threading.Thread(target=handler, args=(t,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    t0 = time.perf_counter()
+    go.set()
+    for w in workers:
+        w.join()
+    if outbound:
+        outbound.flush()
+    burst_ms = (time.perf_counter() - t0) * 1000
+
+    received = conn.recv()
+    peer.join()
+    sock.close()
+    result = {
+        "mode": mode,
+        "messages": per_thread * threads,
+        "threads": threads,
+        "burst_ms": round(burst_ms, 1),
+        "handler_us_per_msg": round(sum(held) / (per_thread * threads) / 1000, 2),
+        "received": received,
+    }
+    if outbound:
+        stats = outbound.stats()
+        result.update({k: stats[k] for k in ("batches", "largest_batch", "blocked",
+                                             "latency_us_p50", "latency_us_p99")})
+    return result
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Rajada de saída SIP: direto × fila")
+    ap.add_argument("--messages", type=int, default=20000)
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--mode", choices=("direct", "queue", "both"), default="both")
+    args = ap.parse_args(argv)
+    modes = ("direct", "queue") if args.mode == "both" else (args.mode,)
+    print(json.dumps([run(m, args.messages, args.threads) for m in modes], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+bench/session_memory.py
+
+Bytes por SipSession viva (tracemalloc), sem mídia: cria N sessões a
+partir dos INVITEs do corpus e mede o que fica retido depois que a
+mensagem recebida sai de escopo.
+
+Para comparação, o modo --retain-invite mantém junto de cada sessão o
+INVITE parseado e o sdp_info, que é o que a sessão guardava antes da
+versão compacta.
+
+Uso (a partir da raiz do repositório):
+    python -m bench.session_memory --calls 10000
+"""
+
+import argparse
+import gc
+import json
+import tracemalloc
+
+from sip_parser import parse_sip_message, parse_multipart, parse_sdp
+from sip_session import SipSession
+from media_policy import MediaPolicy
+from clock import CLOCK
+from bench.corpus import CORPUS
+
+
+class _FakeServer:
+    """
+    O mínimo de SIPServer que o construtor da sessão usa.
+    """
+    host = "127.0.0.1"
+    journal = None
+    vad = None
+    fanout = None
+    invite_dir = None
+    catalog = None
+    archive = None
+    uploader = None
+    media_policy = MediaPolicy()
+    clock = CLOCK
+
+    def get_external_ip(self):
+        return "10.0.0.10"
+
+
+def _invite(raw, n):
+    # Call-ID único por chamada, como no tráfego real
+    return raw.replace("Call-ID: ", f"Call-ID: {n:08d}-", 1)
+
+
+def measure(calls, corpus_key, retain_invite=False):
+    server = _FakeServer()
+    raw = CORPUS[corpus_key]
+    peer = ("10.1.1.20", 5060)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    sessions = []
+    for n in range(calls):
+        sip = parse_sip_message(_invite(raw, n))
+        session = SipSession(server, sip, peer)
+        if retain_invite:
+            hdr = sip["headers"]
+            parts = parse_multipart(sip["body"], hdr.get("Content-Type", ""))
+            sdp = parse_sdp(parts.get("application/sdp", ""))
+            sessions.append((session, sip, sdp))
+        else:
+            sessions.append(session)
+
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / calls
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Memória por SipSession")
+    ap.add_argument("--calls", type=int, default=10000)
+    ap.add_argument("--corpus", default="oracle_invite")
+    ap.add_argument("--retain-invite", action="store_true",
+                    help="guarda INVITE + sdp_info junto (layout antigo)")
+    args = ap.parse_args(argv)
+
+    per_session = measure(args.calls, args.corpus, args.retain_invite)
+    print(json.dumps({
+        "calls": args.calls,
+        "corpus": args.corpus,
+        "retain_invite": args.retain_invite,
+        "bytes_per_session": round(per_session),
+        "mb_total": round(per_session * args.calls / 2**20, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+bench/srtp_ingest.py
+
+Custo da recepção SRTP × RTP em claro, por pacote, no caminho do
+receptor (RtpReceiver.handle_packet: estatística RFC 3550 + gravação):
+
+- plain:    pacote RTP direto no handle_packet
+- srtp-1:   SrtpStream.unprotect_batch com um pacote por vez
+- srtp-N:   lotes de --batch pacotes, como o receptor tira do socket
+            (keystream do lote numa chamada só de AES)
+
+--packets pacotes de --payload bytes; o AES usado (openssl/python) vai
+no resultado.
+
+Uso (a partir da raiz do repositório):
+    python -m bench.srtp_ingest --packets 50000 --batch 32
+"""
+
+import argparse
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+
+import srtp
+from rtp_receiver import RtpReceiver
+from srtp import SrtpStream
+
+RTP_HEADER = struct.Struct("!BBHII")
+
+
+def _receiver(out_dir):
+    rx = RtpReceiver("bench-srtp", "1", host="127.0.0.1", out_dir=out_dir)
+    rx.sock.close()
+    return rx
+
+
+def _per_packet(fn, packets, batch):
+    t0 = time.perf_counter()
+    for i in range(0, len(packets), batch):
+        fn(packets[i:i + batch])
+    return (time.perf_counter() - t0) / len(packets) * 1e6
+
+
+def run(packets, batch, payload, repeat=3):
+    key, salt = os.urandom(16), os.urandom(14)
+    clear = [RTP_HEADER.pack(0x80, 0, seq & 0xFFFF, seq * 160, 0x5EC) + os.urandom(payload)
+             for seq in range(packets)]
+    sealed = SrtpStream(key, salt).protect_batch(clear)
+    out_dir = tempfile.mkdtemp(prefix="srtp_ingest_")
+    try:
+        def plain(group):
+            for packet in group:
+                rx.handle_packet(packet)
+
+        def decrypt(group):
+            for packet in rx.srtp.unprotect_batch(group):
+                rx.handle_packet(packet)
+
+        results = {}
+        for mode, fn, data, size in (("plain", plain, clear, batch),
+                                     ("srtp-1", decrypt, sealed, 1),
+                                     (f"srtp-{batch}", decrypt, sealed, batch)):
+            best = None
+            for _ in range(repeat):
+                rx = _receiver(out_dir)
+                rx.srtp = SrtpStream(key, salt)
+                us = _per_packet(fn, data, size)
+                rx._file.close()
+                os.unlink(rx.path)
+                assert rx.packets == packets
+                best = us if best is None else min(best, us)
+            results[mode] = round(best, 2)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    return {
+        "aes": srtp.backend(),
+        "packets": packets,
+        "payload": payload,
+        "us_per_packet": results,
+        "srtp_overhead_pct": round(100 * (results[f"srtp-{batch}"] / results["plain"] - 1)),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Recepção SRTP × RTP em claro")
+    ap.add_argument("--packets", type=int, default=50000)
+    ap.add_argument("--batch", type=int, default=32)
+    ap.add_argument("--payload", type=int, default=160)
+    args = ap.parse_args(argv)
+    print(json.dumps(run(args.packets, args.batch, args.payload), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+bench/vad_cost.py
+
+Custo de CPU e economia de disco do VAD (voice_activity.py) numa perna
+sintética G.711: trechos de "fala" (tom modulado + ruído) alternados com
+silêncio de fundo, como numa conversa em que um lado só escuta.
+
+Mede, para o backend disponível (NumPy ou Python puro):
+- CPU por stream: segundos de CPU por segundo de áudio (× 100 = % de um core)
+- fração do áudio classificada como fala
+- bytes gravados com e sem corte de silêncio
+
+Uso (a partir da raiz do repositório):
+    python -m bench.vad_cost --seconds 120 --trim 500
+"""
+
+import argparse
+import json
+import math
+import random
+import time
+
+from voice_activity import VoiceActivityDetector, SAMPLE_RATE, np
+
+
+def _ulaw_encode(sample):
+    bias, clip = 0x84, 32635
+    sign = 0x80 if sample < 0 else 0
+    sample = min(abs(sample), clip) + bias
+    exp = 7
+    for e in range(7, -1, -1):
+        if sample & (0x4000 >> (7 - e)):
+            exp = e
+            break
+    mant = (sample >> (exp + 3)) & 0x0F
+    return ~(sign | (exp << 4) | mant) & 0xFF
+
+
+def synthetic_leg(seconds, seed=1):
+    """
+    Alterna 1–4 s de fala com 1–6 s de silêncio. Retorna (bytes μ-law,
+    segundos de fala gerados).
+    """
+    rnd = random.Random(seed)
+    table = [_ulaw_encode(s) for s in range(-32768, 32768)]
+    out = bytearray()
+    talk = 0.0
+    speaking = False
+    total = seconds * SAMPLE_RATE
+
+    while len(out) < total:
+        dur = rnd.uniform(1, 4) if speaking else rnd.uniform(1, 6)
+        n = min(int(dur * SAMPLE_RATE), total - len(out))
+        f0 = rnd.uniform(120, 250)
+        for i in range(n):
+            if speaking:
+                env = 0.5 + 0.5 * math.sin(2 * math.pi * 4 * i / SAMPLE_RATE)
+                s = 8000 * env * math.sin(2 * math.pi * f0 * i / SAMPLE_RATE)
+                s += rnd.gauss(0, 300)
+            else:
+                s = rnd.gauss(0, 30)
+            out.append(table[int(max(-32768, min(32767, s))) + 32768])
+        if speaking:
+            talk += n / SAMPLE_RATE
+        speaking = not speaking
+
+    return bytes(out), talk
+
+
+def run(leg, trim_ms):
+    vad = VoiceActivityDetector(max_silence_ms=trim_ms)
+    stored = 0
+    t0 = time.process_time()
+    for i in range(0, len(leg), 160):        # um pacote RTP = 20 ms
+        stored += len(vad.feed(leg[i:i + 160], 0))
+    stored += len(vad.finish())
+    cpu = time.process_time() - t0
+    return vad.stats(), stored, cpu
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Custo do VAD por stream")
+    ap.add_argument("--seconds", type=int, default=120)
+    ap.add_argument("--trim", type=int, default=500,
+                    help="max_silence_ms usado no corte")
+    args = ap.parse_args(argv)
+
+    leg, talk = synthetic_leg(args.seconds)
+    stats, stored, cpu = run(leg, args.trim)
+    audio_s = len(leg) / SAMPLE_RATE
+
+    report = {
+        "backend": "numpy" if np is not None else "python",
+        "audio_s": audio_s,
+        "generated_talk_s": round(talk, 1),
+        "detected_talk_s": stats["talk_ms"] / 1000,
+        "segments": len(stats["segments"]),
+        "bytes_raw": len(leg),
+        "bytes_stored": stored,
+        "saved_pct": round(100 * (1 - stored / len(leg)), 1),
+        "cpu_pct_per_stream": round(100 * cpu / audio_s, 3),
+        "streams_per_core": int(audio_s / cpu) if cpu else None,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
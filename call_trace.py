@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+call_trace.py
+
+Linha do tempo por chamada (Call-ID) em ring buffer pré-alocado.
+
+Cada evento ocupa uma entrada de tamanho fixo:
+    (timestamp monotônico em ns, código do evento, índice da sessão, argumento)
+
+Gravar um evento custa algumas atribuições em arrays já alocados — ninguém
+lê o buffer até que alguém peça um dump (SIGUSR1) ou consulte por Call-ID.
+
+Uso offline:
+    python call_trace.py traces/trace-1234.jsonl <Call-ID>
+"""
+
+import itertools
+import json
+import os
+import signal
+import sys
+import time
+from array import array
+
+
+# ============================================================
+# CÓDIGOS DE EVENTO
+# ============================================================
+INVITE_RX = 1
+TRYING_TX = 2
+OK_TX = 3
+ACK_RX = 4
+RTP_FIRST = 5      # arg = índice do label
+BYE_RX = 6
+BYE_OK_TX = 7
+FILE_DONE = 8      # arg = índice do label
+
+EVENT_NAMES = {
+    INVITE_RX: "INVITE recebido",
+    TRYING_TX: "100 Trying enviado",
+    OK_TX: "200 OK enviado",
+    ACK_RX: "ACK recebido",
+    RTP_FIRST: "primeiro RTP",
+    BYE_RX: "BYE recebido",
+    BYE_OK_TX: "200 OK (BYE) enviado",
+    FILE_DONE: "gravação finalizada",
+}
+
+TRACE_DIR = "traces"
+
+
+# ============================================================
+# RING BUFFER
+# ============================================================
+class CallTrace:
+
+    def __init__(self, size=65536, max_calls=8192):
+        if size & (size - 1):
+            raise ValueError("size precisa ser potência de 2")
+
+        self.size = size
+        self._mask = size - 1
+
+        # Colunas pré-alocadas (zeradas) — nada é alocado por evento
+        self._ts = array("q", bytes(8 * size))
+        self._ev = array("B", bytes(size))
+        self._sess = array("q", bytes(8 * size))
+        self._arg = array("i", bytes(4 * size))
+        self._pos = itertools.count()
+
+        # Índice da sessão → (índice, Call-ID, labels), também circular
+        self._calls = [None] * max_calls
+        self._next_session = itertools.count(1)
+
+    # ---------------------------------------------------------------
+    def register(self, call_id, labels=()):
+        """
+        Reserva um índice de sessão para o Call-ID. O índice (não o Call-ID)
+        é o que vai em cada entrada do ring.
+        """
+        idx = next(self._next_session)
+        self._calls[idx % len(self._calls)] = (idx, call_id, tuple(labels))
+        return idx
+
+    # ---------------------------------------------------------------
+    def record(self, event, session_idx, arg=0, ts=None):
+        # next() em itertools.count é atômico sob o GIL
+        i = next(self._pos) & self._mask
+        self._ts[i] = ts if ts is not None else time.monotonic_ns()
+        self._ev[i] = event
+        self._sess[i] = session_idx
+        self._arg[i] = arg
+
+    # ---------------------------------------------------------------
+    def _lookup(self, idx):
+        entry = self._calls[idx % len(self._calls)]
+        if entry and entry[0] == idx:
+            return entry
+        return None
+
+    # ---------------------------------------------------------------
+    def entries(self, call_id=None):
+        """
+        Retorna os eventos ainda presentes no ring, em ordem de tempo.
+        Se call_id for informado, filtra por ele.
+        """
+        out = []
+        for i in range(self.size):
+            ev = self._ev[i]
+            if not ev:
+                continue
+
+            entry = self._lookup(self._sess[i])
+            cid, labels = (entry[1], entry[2]) if entry else (None, ())
+            if call_id is not None and cid != call_id:
+                continue
+
+            arg = self._arg[i]
+            label = None
+            if ev in (RTP_FIRST, FILE_DONE) and arg < len(labels):
+                label = labels[arg]
+
+            out.append({
+                "ts_ns": self._ts[i],
+                "event": EVENT_NAMES.get(ev, str(ev)),
+                "session": self._sess[i],
+                "call_id": cid,
+                "label": label,
+            })
+
+        out.sort(key=lambda e: e["ts_ns"])
+        return out
+
+    # ---------------------------------------------------------------
+    def dump(self, path=None):
+        """
+        Grava o conteúdo do ring em JSON lines e retorna o caminho.
+        """
+        if path is None:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            path = os.path.join(
+                TRACE_DIR, f"trace-{os.getpid()}-{int(time.time())}.jsonl"
+            )
+
+        with open(path, "w") as f:
+            for e in self.entries():
+                f.write(json.dumps(e) + "\n")
+
+        return path
+
+
+# Instância única usada por sessões, handlers e receptores RTP
+TRACE = CallTrace()
+
+
+# ============================================================
+# DUMP POR SINAL
+# ============================================================
+def install_dump_signal(sig=signal.SIGUSR1):
+    """
+    `kill -USR1 <pid>` grava o ring em traces/ sem parar o servidor.
+    """
+    def _handler(signum, frame):
+        path = TRACE.dump()
+        print(f"🧾 Trace gravado em {path}")
+
+    signal.signal(sig, _handler)
+
+
+# ============================================================
+# FORMATAÇÃO / CONSULTA
+# ============================================================
+def format_timeline(events):
+    """
+    Formata eventos de uma chamada com tempo relativo ao primeiro (ms).
+    """
+    if not events:
+        return "(nenhum evento)"
+
+    t0 = events[0]["ts_ns"]
+    lines = []
+    for e in events:
+        delta = (e["ts_ns"] - t0) / 1e6
+        label = f" [label {e['label']}]" if e.get("label") is not None else ""
+        lines.append(f"+{delta:10.3f} ms  {e['event']}{label}")
+    return "\n".join(lines)
+
+
+def load_dump(path, call_id=None):
+    events = []
+    with open(path) as f:
+        for line in f:
+            e = json.loads(line)
+            if call_id is None or e["call_id"] == call_id:
+                events.append(e)
+    return events
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("uso: python call_trace.py <dump.jsonl> <Call-ID>")
+        sys.exit(1)
+
+    print(format_timeline(load_dump(sys.argv[1], sys.argv[2])))
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+clock.py
+
+Fonte de tempo e de timers do servidor, injetável (SIPServer(clock=...)).
+
+- Clock: o tempo real. time/monotonic/sleep são as funções do sistema;
+  os timers (call_at/call_later) ficam num heap servido por uma thread
+  só, criada no primeiro uso; spawn() roda uma função numa thread
+- SimClock: tempo virtual, para simulação (ver sim_network.py). Nada
+  bloqueia: timers e spawn() viram eventos num heap, e advance()/run()
+  os executam em ordem na thread de quem chama, pulando o relógio de
+  evento em evento. Mesma entrada, mesma sequência: horas de tráfego em
+  segundos, e reproduzível
+
+CLOCK é o relógio real compartilhado, usado por quem não recebe outro.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+import traceback
+
+
+class Timer:
+
+    __slots__ = ("when", "fn", "args", "cancelled")
+
+    def __init__(self, when, fn, args):
+        self.when = when          # instante monotônico do disparo
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        # Fica no heap até vencer; só não roda
+        self.cancelled = True
+
+
+# ============================================================
+# RELÓGIO REAL
+# ============================================================
+class Clock:
+
+    simulated = False
+
+    def __init__(self):
+        # As funções do sistema direto no objeto: clock.monotonic() custa
+        # o mesmo que time.monotonic()
+        self.time = time.time
+        self.monotonic = time.monotonic
+        self.monotonic_ns = time.monotonic_ns
+        self.sleep = time.sleep
+
+        self._heap = []           # (instante, seq, Timer)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    # ---------------------------------------------------------------
+    def call_at(self, when, fn, *args):
+        """
+        fn(*args) na thread de timers, no instante monotônico `when`.
+        Callbacks rodam um de cada vez: devem ser curtos.
+        """
+        timer = Timer(when, fn, args)
+        with self._cond:
+            heapq.heappush(self._heap, (when, next(self._seq), timer))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="timers", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return timer
+
+    def call_later(self, delay, fn, *args):
+        return self.call_at(self.monotonic() + delay, fn, *args)
+
+    def spawn(self, fn, *args):
+        threading.Thread(target=fn, args=args, daemon=True).start()
+
+    @property
+    def pending(self):
+        return len(self._heap)
+
+    # ---------------------------------------------------------------
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                _, _, timer = heapq.heappop(self._heap)
+
+            if timer.cancelled:
+                continue
+            try:
+                timer.fn(*timer.args)
+            except Exception:
+                # Um timer com defeito não para os outros
+                traceback.print_exc()
+
+
+CLOCK = Clock()
+
+
+# ============================================================
+# RELÓGIO SIMULADO
+# ============================================================
+class SimClock:
+
+    simulated = True
+
+    def __init__(self, epoch=1_700_000_000.0):
+        self.epoch = epoch        # time() = epoch + now
+        self.now = 0.0            # monotonic()
+        self.events = 0           # eventos já executados
+
+        self._heap = []
+        self._seq = itertools.count()
+
+    # ---------------------------------------------------------------
+    def time(self):
+        return self.epoch + self.now
+
+    def monotonic(self):
+        return self.now
+
+    def monotonic_ns(self):
+        return round(self.now * 1e9)
+
+    def sleep(self, seconds):
+        """
+        Só para o código que dirige a simulação: avança o relógio rodando
+        o que vencer no caminho.
+        """
+        self.advance(seconds)
+
+    # ---------------------------------------------------------------
+    def call_at(self, when, fn, *args):
+        timer = Timer(when, fn, args)
+        heapq.heappush(self._heap, (when, next(self._seq), timer))
+        return timer
+
+    def call_later(self, delay, fn, *args):
+        return self.call_at(self.now + delay, fn, *args)
+
+    def spawn(self, fn, *args):
+        # "Outra thread" = o próximo evento, no mesmo instante
+        return self.call_at(self.now, fn, *args)
+
+    @property
+    def pending(self):
+        return len(self._heap)
+
+    # ---------------------------------------------------------------
+    def advance(self, seconds):
+        return self.run(until=self.now + seconds)
+
+    def run(self, until=None):
+        """
+        Executa os eventos em ordem (instante, ordem de agendamento) até
+        `until`, ou até o heap esvaziar — com um gerador periódico
+        agendado, sem `until` não termina. Devolve quantos rodaram.
+        Exceção num evento sobe para quem chamou.
+        """
+        ran = 0
+        while self._heap and (until is None or self._heap[0][0] <= until):
+            when, _, timer = heapq.heappop(self._heap)
+            if timer.cancelled:
+                continue
+            if when > self.now:
+                self.now = when
+            ran += 1
+            timer.fn(*timer.args)
+        if until is not None and until > self.now:
+            self.now = until
+        self.events += ran
+        return ran
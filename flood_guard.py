@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+flood_guard.py
+
+Filtro barato na entrada da porta SIP, antes de decode/parse/thread.
+
+Olha só os primeiros bytes do datagrama:
+- descarta o que não começa com um método SIP ou "SIP/2.0"
+- com rate, aplica token bucket por IP de origem (tabela limitada,
+  despejo LRU); sem rate (padrão) não há limite: um SBC manda todas as
+  chamadas de um IP só
+- IPs da allowlist (SBCs confiáveis) não passam pelo limite
+- mensagens de diálogo existente (Call-ID em dialogs, o server.calls)
+  também não: ACK e BYE de chamada aceita nunca são descartados
+"""
+
+import re
+from collections import OrderedDict
+
+from clock import CLOCK
+
+SIP_TOKENS = frozenset([
+    b"INVITE", b"ACK", b"BYE", b"CANCEL", b"OPTIONS", b"REGISTER",
+    b"PRACK", b"UPDATE", b"INFO", b"NOTIFY", b"SUBSCRIBE", b"REFER",
+    b"MESSAGE", b"SIP/2.0",
+])
+
+
+def looks_like_sip(data):
+    """
+    Verifica só a primeira palavra (até 10 bytes) do datagrama.
+    """
+    head = data[:10]
+    sp = head.find(b" ")
+    return sp > 0 and head[:sp] in SIP_TOKENS
+
+
+_CALL_ID = re.compile(rb"\n(?:Call-ID|i)[ \t]*:[ \t]*([^\r\n]*)", re.IGNORECASE)
+
+
+def call_id_of(data):
+    """
+    Call-ID do datagrama sem parse completo (None se não houver).
+    """
+    m = _CALL_ID.search(data)
+    return m.group(1).strip().decode("utf-8", "ignore") if m else None
+
+
+class FloodGuard:
+
+    def __init__(self, rate=None, burst=None, max_sources=10000,
+                 allowlist=(), report_every=10.0, clock=None, dialogs=None):
+        # Mensagens/s por IP (None ou 0: sem limite); burst padrão: 2 s
+        self.rate = rate
+        self.burst = burst or 2 * (rate or 0)
+        self.max_sources = max_sources
+        self.allowlist = set(allowlist)
+        self.report_every = report_every
+        self.clock = clock or CLOCK
+        # Call-IDs de diálogos existentes (o SIPServer liga no server.calls)
+        self.dialogs = dialogs
+
+        # IP → [tokens, último instante]; a ordem é a do uso mais recente
+        self._buckets = OrderedDict()
+
+        self.dropped = 0      # não-SIP
+        self.limited = 0      # acima da taxa
+        self._last_report = self.clock.monotonic()
+
+    # ---------------------------------------------------------------
+    def allow(self, data, addr):
+        if not looks_like_sip(data):
+            self.dropped += 1
+            self._maybe_report()
+            return False
+
+        ip = addr[0]
+        if not self.rate or ip in self.allowlist:
+            return True
+
+        now = self.clock.monotonic()
+        bucket = self._buckets.get(ip)
+        if bucket is None:
+            if len(self._buckets) >= self.max_sources:
+                self._buckets.popitem(last=False)
+            bucket = self._buckets[ip] = [self.burst, now]
+        else:
+            self._buckets.move_to_end(ip)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] < 1:
+            # Só aqui (fonte já acima da taxa) o Call-ID é procurado
+            if self.dialogs is not None and call_id_of(data) in self.dialogs:
+                return True
+            self.limited += 1
+            self._maybe_report()
+            return False
+
+        bucket[0] -= 1
+        return True
+
+    # ---------------------------------------------------------------
+    def stats(self):
+        return {
+            "dropped": self.dropped,
+            "limited": self.limited,
+            "sources": len(self._buckets),
+        }
+
+    # ---------------------------------------------------------------
+    def _maybe_report(self):
+        # Só o caminho de descarte paga por isso, e no máximo a cada N s
+        now = self.clock.monotonic()
+        if now - self._last_report >= self.report_every:
+            self._last_report = now
+            print(f"🛡 Flood guard: {self.dropped} descartados (não-SIP), "
+                  f"{self.limited} limitados, {len(self._buckets)} origens")
@@ -3,11 +3,14 @@
 from sip_responses import sip_response_200_ok_bye
 
 def handle_bye(server, sip, addr):
-    msg = sip_response_200_ok_bye(sip)
-    server.sock.sendto(msg.encode(), addr)
-
     call_id = sip["headers"].get("Call-ID")
-    if call_id in server.calls:
-        del server.calls[call_id]
+    session = server.calls.pop(call_id, None)
+
+    if session:
+        # Sessão responde o BYE e fecha os arquivos de gravação
+        session.receive_bye(sip)
+    else:
+        msg = sip_response_200_ok_bye(sip)
+        server.send(msg.encode(), addr)
 
     print("➡ BYE recebido e sessão removida")
@@ -1,12 +1,38 @@
 # handlers/invite_handler.py
 
+from sip_parser import header_tag
 from sip_session import SipSession
 
 def handle_invite(server, sip, addr):
     print("➡ INVITE recebido de", addr)
 
+    current = server.calls.get(sip["headers"].get("Call-ID"))
+    if current is not None:
+        to_tag = header_tag(sip["headers"].get("To"))
+        if to_tag == current.to_tag:
+            # re-INVITE do mesmo diálogo: refresh do Session-Expires
+            current.refresh(sip)
+        elif to_tag is None:
+            # Retransmissão do INVITE inicial
+            current.retransmitted()
+        else:
+            print(f"◻ INVITE com To-tag desconhecido ignorado: {current.call_id}")
+        return
+
     session = SipSession(server, sip, addr)
     server.calls[session.call_id] = session
 
     session.send_trying()
+    try:
+        session.start_media()
+    except (OSError, RuntimeError) as e:
+        # Sem mídia não há chamada: sai de server.calls (a retransmissão
+        # do INVITE tenta de novo) e o SBC recebe a resposta final
+        print(f"⚠ Mídia de {session.call_id} não abriu: {e}")
+        server.calls.pop(session.call_id, None)
+        server.admission.reject(server, sip, addr, "midia")
+        return
     session.send_200_ok()
+
+    if server.reaper:
+        server.reaper.watch(session)
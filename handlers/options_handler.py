@@ -15,5 +15,5 @@ def handle_options(server, sip, addr):
         to_tag=to_tag
     )
 
-    server.sock.sendto(msg.encode(), addr)
+    server.send(msg.encode(), addr)
     print(f"✔ Respondido OPTIONS 200 OK para {addr}")
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+hot_restart.py
+
+Troca de versão do servidor sem derrubar as chamadas em andamento.
+
+O processo em execução escuta em HANDOVER_SOCKET (Unix, 0600). O novo
+sobe com --hot-restart, conecta e recebe:
+
+  1. o estado das sessões (SipSession.to_record + contagem e estatística
+     de cada fluxo), em JSON;
+  2. os sockets — SIP UDP, RTP e RTCP de cada fluxo — por SCM_RIGHTS.
+
+São os mesmos sockets do kernel, não cópias: o que chega durante a
+passagem fica na fila e é lido pelo processo novo, então nenhum pacote
+SIP ou RTP se perde. Os receptores reabrem os mesmos arquivos em append.
+
+Lado antigo (hand_over): para o loop UDP depois da mensagem atual,
+espera os INVITEs em andamento, solta os receptores sem fechar nada,
+esvazia o journal e envia. Com a confirmação do novo, drain() espera as
+gravações que já estavam terminando e o processo sai.
+
+Se a passagem falhar depois que o lado antigo parou, o journal já está
+em disco: take_over espera o processo antigo sair (soltando a 5060 e as
+portas de mídia) e levanta OSError/ValueError; o servidor sobe normal e
+retoma as chamadas pelo recover(). Recusa antes de parar qualquer coisa
+é RuntimeError: o processo antigo continua atendendo e o novo desiste.
+
+Fora do escopo: conexões SIP TCP/TLS (o SBC reconecta) e o pipeline
+multiprocesso (--media-procs), cujos sockets de mídia estão em outro
+processo.
+"""
+
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+HANDOVER_SOCKET = "/tmp/siprec-handover.sock"
+
+# Sockets por mensagem: o Linux aceita até 253 (SCM_MAX_FD)
+MAX_FDS = 250
+
+_LEN = struct.Struct("!I")
+
+
+def _send_json(conn, obj):
+    body = json.dumps(obj).encode()
+    conn.sendall(_LEN.pack(len(body)) + body)
+
+
+def _recv_exact(conn, n):
+    # Nunca lê além do pedido: o byte seguinte pode carregar sockets
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = conn.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("conexão de hot restart fechada no meio")
+        buf += chunk
+    return bytes(buf)
+
+
+def _recv_json(conn):
+    size = _LEN.unpack(_recv_exact(conn, _LEN.size))[0]
+    return json.loads(_recv_exact(conn, size))
+
+
+def wake(sock):
+    """
+    Datagrama vazio para o próprio socket: tira do recvfrom a thread que
+    está lendo (o loop UDP e os receptores ignoram datagramas vazios).
+    """
+    host, port = sock.getsockname()[:2]
+    if host == "0.0.0.0":
+        host = "127.0.0.1"
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.sendto(b"", (host, port))
+    except OSError:
+        pass        # sem o atalho, o receptor sai no timeout do recvfrom
+    finally:
+        s.close()
+
+
+# ============================================================
+# LADO ANTIGO
+# ============================================================
+class HandoverListener:
+    """
+    Espera o processo novo; done fica setado quando a passagem aconteceu
+    e este processo deve sair.
+    """
+
+    def __init__(self, server, path=HANDOVER_SOCKET):
+        self.server = server
+        self.path = path
+        self.done = threading.Event()
+
+        if os.path.exists(path):
+            os.unlink(path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        os.chmod(path, 0o600)
+
+    def start(self):
+        self.sock.listen(1)
+        threading.Thread(target=self._accept_loop, name="handover", daemon=True).start()
+
+    # ---------------------------------------------------------------
+    def _accept_loop(self):
+        while not self.done.is_set():
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with conn:
+                conn.settimeout(60.0)
+                self._serve(conn)
+        # Sem unlink: o caminho agora é do processo novo
+        self.sock.close()
+
+    def _serve(self, conn):
+        try:
+            hello = _recv_json(conn)
+        except (OSError, ValueError) as e:
+            print(f"⚠ Hot restart: pedido inválido ({e})")
+            return
+
+        if self.server.media_pipeline is not None:
+            _send_json(conn, {"ok": False, "error": "pipeline de mídia multiprocesso "
+                                                    "(--media-procs) não passa os sockets"})
+            return
+
+        print(f"🔁 Hot restart: passando as chamadas para o PID {hello.get('pid')}")
+        try:
+            hand_over(self.server, conn)
+        except (OSError, ValueError) as e:
+            print(f"⚠ Hot restart falhou no meio ({e}); as chamadas ficam no journal")
+        self.done.set()
+
+
+def hand_over(server, conn):
+    """
+    Para este processo e envia sessões e sockets pela conexão; volta
+    quando o processo novo confirma que assumiu.
+    """
+    t0 = time.monotonic()
+
+    # 1. SIP: o loop UDP sai depois da mensagem que estiver tratando
+    server._serving = False
+    wake(server.sock)
+    server.loop_done.wait()
+
+    # 2. INVITEs em andamento terminam (200 OK enviado, receptores abertos)
+    deadline = time.monotonic() + 10
+    while server.pending_invites and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    # 3. Nada mais mexe nas sessões: receptores soltos, journal em disco
+    if server.reaper:
+        server.reaper.stop()
+    server.rtcp.stop()
+    sessions = [s for s in server.calls.values() if s.state != "TERMINATED"]
+    receivers = [rx for s in sessions for rx in s.receivers]
+    for rx in receivers:
+        rx.detach()
+        wake(rx.sock)
+    for rx in receivers:
+        rx.join()
+    if server.journal:
+        server.journal.close()
+    if server.outbound is not None:
+        # O que já foi respondido sai por este processo
+        server.outbound.flush()
+    if server.uploader is not None:
+        # O processo novo retoma os envios pelo SQLite
+        server.uploader.stop()
+
+    # 4. Estado (índices na lista de sockets) e sockets
+    fds = [server.sock.fileno()]
+    records = []
+    for session in sessions:
+        record = session.to_record()
+        record["media"] = []
+        for rx in session.receivers:
+            media = {"fd": len(fds), "rtcp_fd": None, "packets": rx.packets,
+                     "stats": rx.stats.snapshot(),
+                     "srtp": rx.srtp.snapshot() if rx.srtp is not None else None}
+            fds.append(rx.sock.fileno())
+            if rx.rtcp_sock is not None:
+                media["rtcp_fd"] = len(fds)
+                fds.append(rx.rtcp_sock.fileno())
+            record["media"].append(media)
+        records.append(record)
+
+    _send_json(conn, {"ok": True, "fds": len(fds), "sessions": records})
+    for i in range(0, len(fds), MAX_FDS):
+        socket.send_fds(conn, [b"F"], fds[i:i + MAX_FDS])
+
+    reply = _recv_json(conn)
+    print(f"🔁 Hot restart: {len(records)} sessões e {len(fds)} sockets entregues, "
+          f"{reply.get('sessions')} retomadas no PID novo; "
+          f"SIP parado por {(time.monotonic() - t0) * 1000:.0f} ms")
+
+
+def drain(server, grace=1.0):
+    """
+    Fim do processo antigo: receptores de chamadas que já tinham recebido
+    BYE fecham em até um timeout de recvfrom (0,5 s) e ainda gravam
+    metadados, catálogo e pacote do dia (este com trava de arquivo: o
+    processo novo escreve no mesmo).
+    """
+    time.sleep(grace)
+    if server.catalog is not None:
+        server.catalog.close()
+    if server.archive is not None:
+        server.archive.close()
+    if server.uploader is not None:
+        server.uploader.close()
+
+
+# ============================================================
+# LADO NOVO
+# ============================================================
+class Handover:
+    """
+    O que o processo novo herdou: o socket SIP e as sessões no formato
+    de SIPServer.adopt (em "media", os sockets já no lugar dos índices).
+    """
+
+    def __init__(self, conn, sip_sock, sessions):
+        self.conn = conn
+        self.sip_sock = sip_sock
+        self.sessions = sessions
+
+    def confirm(self):
+        """
+        Avisa o processo antigo que as sessões estão de pé; ele sai.
+        """
+        try:
+            _send_json(self.conn, {"ok": True, "sessions": len(self.sessions)})
+        finally:
+            self.conn.close()
+
+
+def _peer_pid(conn):
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", creds)[0]
+
+
+def _wait_exit(pid, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                # Zumbi já fechou tudo, só falta o pai recolher
+                if f.read().rpartition(")")[2].split()[0] == "Z":
+                    return True
+        except (FileNotFoundError, ProcessLookupError):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def take_over(path=HANDOVER_SOCKET, timeout=60.0):
+    """
+    Conecta no processo em execução e herda SIP, sessões e mídia.
+    None se não há ninguém escutando (primeira subida: fluxo normal).
+
+    RuntimeError: recusado, o processo antigo segue no ar. OSError ou
+    ValueError: falhou no meio; o antigo já saiu e as chamadas estão no
+    journal.
+    """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.settimeout(timeout)
+    try:
+        conn.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        conn.close()
+        return None
+    old_pid = _peer_pid(conn)
+
+    fds = []
+    try:
+        _send_json(conn, {"pid": os.getpid()})
+        state = _recv_json(conn)
+        if not state["ok"]:
+            conn.close()
+            raise RuntimeError(f"hot restart recusado: {state['error']}")
+
+        while len(fds) < state["fds"]:
+            msg, got, _, _ = socket.recv_fds(conn, 1, MAX_FDS)
+            if not msg:
+                raise ConnectionError("conexão de hot restart fechada no meio")
+            fds.extend(got)
+    except (OSError, ValueError):
+        # O antigo já parou e vai sair: nada herdado fica aberto aqui, e
+        # a subida normal só faz bind quando ele tiver soltado as portas
+        conn.close()
+        for fd in fds:
+            os.close(fd)
+        if not _wait_exit(old_pid, timeout):
+            print(f"⚠ Hot restart: PID {old_pid} ainda não saiu")
+        raise
+
+    socks = [socket.socket(fileno=fd) for fd in fds]
+    sip_sock = socks[0]
+    sip_sock.setblocking(True)
+    for record in state["sessions"]:
+        for media in record["media"]:
+            media["sock"] = socks[media.pop("fd")]
+            rtcp_fd = media.pop("rtcp_fd")
+            media["rtcp_sock"] = socks[rtcp_fd] if rtcp_fd is not None else None
+
+    print(f"🔁 Hot restart: herdados {len(state['sessions'])} sessões e {len(fds)} sockets")
+    return Handover(conn, sip_sock, state["sessions"])
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+media_fanout.py
+
+Áudio ao vivo das pernas SIPREC para consumidores locais (analytics),
+durante a chamada.
+
+Protocolo (socket Unix, stream):
+    cliente → "SUB <Call-ID> <label> [g711|pcm]\\n"   ("ulaw": o mesmo que g711)
+    servidor → "OK <pcmu|pcma|pcm>\\n" e depois quadros:
+        !IBI  tamanho do payload, payload type, timestamp RTP do 1º pacote
+        payload  (G.711 como chegou, ou PCM 16 bits little-endian)
+    quadro de tamanho 0 = fim do fluxo (BYE); a conexão é fechada em seguida.
+    Fluxo que não existe (perna ainda sem receptor, ou já encerrada) →
+    "ERR ...": o servidor não guarda nada por assinatura sem chamada.
+
+O codec do OK é o negociado no SDP (primeiro da resposta); o payload type
+de cada quadro diz o que chegou de fato.
+
+O receptor RTP junta batch_packets pacotes (100 ms) e publica um quadro
+só: os mesmos bytes imutáveis entram na fila de todos os assinantes, sem
+cópia por assinante (PCM é decodificado uma vez por lote, só se alguém
+pediu). A fila de cada assinante é limitada: cheia, o quadro mais antigo
+cai; quem acumula max_drops perdas é desconectado. Consumidor lento nunca
+segura o recvfrom do RTP.
+
+Cliente de teste:
+    python media_fanout.py /tmp/siprec-live.sock <Call-ID> <label> > perna.raw
+"""
+
+import os
+import socket
+import struct
+import sys
+import threading
+from array import array
+from collections import deque
+
+from voice_activity import ULAW_TABLE, ALAW_TABLE, PT_PCMA
+
+LIVE_SOCKET = "/tmp/siprec-live.sock"
+
+_FRAME = struct.Struct("!IBI")
+_EOF = _FRAME.pack(0, 0, 0)
+
+_PCM_TABLES = {
+    False: [array("h", [s]).tobytes() for s in ULAW_TABLE],
+    True: [array("h", [s]).tobytes() for s in ALAW_TABLE],
+}
+
+
+def g711_to_pcm(payload, alaw=False):
+    table = _PCM_TABLES[alaw]
+    return b"".join(table[b] for b in payload)
+
+
+# ============================================================
+# ASSINANTE
+# ============================================================
+class Subscriber:
+
+    def __init__(self, conn, fmt, queue_frames, max_drops, send_timeout):
+        self.conn = conn
+        self.fmt = fmt
+        self.max_drops = max_drops
+        self.dropped = 0
+        self.sent = 0
+        self.closed = False
+
+        self._queue = deque(maxlen=queue_frames)
+        self._cond = threading.Condition()
+        conn.settimeout(send_timeout)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def push(self, frame):
+        """
+        Chamado pela thread do receptor RTP: nunca bloqueia além do lock.
+        """
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1      # deque(maxlen) descarta o mais antigo
+                if self.dropped >= self.max_drops:
+                    self.closed = True
+            self._queue.append(frame)
+            self._cond.notify()
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self._queue and not self.closed:
+                        self._cond.wait()
+                    if self.closed and (not self._queue or self.dropped >= self.max_drops):
+                        break
+                    frame = self._queue.popleft()
+
+                self.conn.sendall(frame)
+                self.sent += 1
+                if frame is _EOF:
+                    break
+        except OSError:
+            pass
+        finally:
+            self.closed = True
+            if self.dropped >= self.max_drops:
+                print(f"🐢 Assinante lento desconectado ({self.dropped} quadros perdidos)")
+            try:
+                self.conn.close()
+            except OSError:
+                pass
+
+    def finish(self):
+        self.push(_EOF)
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+
+# ============================================================
+# FLUXO (um por Call-ID + label)
+# ============================================================
+class _Stream:
+
+    __slots__ = ("subs", "buf", "packets", "timestamp", "payload_type", "codec")
+
+    def __init__(self, codec):
+        self.codec = codec      # "pcmu"/"pcma", do SDP negociado
+        self.subs = ()          # tupla trocada inteira (copy-on-write)
+        self.buf = bytearray()
+        self.packets = 0
+        self.timestamp = 0
+        self.payload_type = 0
+
+
+class MediaFanout:
+
+    def __init__(self, path=LIVE_SOCKET, batch_packets=5, queue_frames=50,
+                 max_drops=250, send_timeout=5.0):
+        self.path = path
+        self.batch_packets = batch_packets
+        self.queue_frames = queue_frames
+        self.max_drops = max_drops
+        self.send_timeout = send_timeout
+
+        self._streams = {}      # (Call-ID, label) → _Stream
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            os.unlink(path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+
+    # ---------------------------------------------------------------
+    def start(self):
+        self.sock.listen(64)
+        print(f"🎧 Áudio ao vivo em {self.path}")
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def stop(self):
+        self.sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    # ---------------------------------------------------------------
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handshake, args=(conn,), daemon=True).start()
+
+    def _handshake(self, conn):
+        try:
+            conn.settimeout(5.0)
+            line = conn.makefile("rb").readline(1024).decode(errors="ignore").split()
+            if len(line) < 3 or line[0] != "SUB":
+                conn.sendall(b"ERR uso: SUB <Call-ID> <label> [g711|pcm]\n")
+                conn.close()
+                return
+            fmt = line[3] if len(line) > 3 else "g711"
+            fmt = "g711" if fmt == "ulaw" else fmt
+            if fmt not in ("g711", "pcm"):
+                conn.sendall(b"ERR formato deve ser g711 ou pcm\n")
+                conn.close()
+                return
+            stream = self._streams.get((line[1], line[2]))
+            if stream is None:
+                conn.sendall(b"ERR fluxo desconhecido\n")
+                conn.close()
+                return
+            conn.sendall(f"OK {stream.codec if fmt == 'g711' else 'pcm'}\n".encode())
+        except OSError:
+            conn.close()
+            return
+
+        if self.subscribe(line[1], line[2], conn, fmt) is None:
+            # Encerrou entre o OK e a assinatura: só o fim do fluxo
+            try:
+                conn.sendall(_EOF)
+            except OSError:
+                pass
+            conn.close()
+
+    # ---------------------------------------------------------------
+    def open_stream(self, call_id, label, codec="pcmu"):
+        """
+        Perna com receptor: a partir daqui aceita assinantes.
+        """
+        with self._lock:
+            if (call_id, label) not in self._streams:
+                self._streams[(call_id, label)] = _Stream(codec)
+
+    def subscribe(self, call_id, label, conn, fmt="g711"):
+        """
+        None se a perna não existe (sem open_stream, ou já encerrada).
+        """
+        with self._lock:
+            stream = self._streams.get((call_id, label))
+            if stream is None:
+                return None
+            sub = Subscriber(conn, fmt, self.queue_frames, self.max_drops,
+                             self.send_timeout)
+            stream.subs = tuple(s for s in stream.subs if not s.closed) + (sub,)
+        print(f"🎧 Assinante em {call_id}/{label} ({fmt})")
+        return sub
+
+    # ---------------------------------------------------------------
+    def publish(self, call_id, label, rtp):
+        """
+        Caminho quente (thread do receptor): sem assinante, só um get().
+        """
+        stream = self._streams.get((call_id, label))
+        if stream is None or not stream.subs:
+            return
+
+        if stream.packets == 0:
+            stream.timestamp = rtp["timestamp"]
+            stream.payload_type = rtp["payload_type"]
+        stream.buf += rtp["payload"]
+        stream.packets += 1
+
+        if stream.packets >= self.batch_packets:
+            self._flush(stream)
+
+    def _flush(self, stream):
+        payload = bytes(stream.buf)
+        stream.buf.clear()
+        stream.packets = 0
+
+        frames = {}
+        live = False
+        for sub in stream.subs:
+            if sub.closed:
+                continue
+            live = True
+            frame = frames.get(sub.fmt)
+            if frame is None:
+                data = payload if sub.fmt == "g711" else g711_to_pcm(
+                    payload, stream.payload_type == PT_PCMA)
+                frame = frames[sub.fmt] = (
+                    _FRAME.pack(len(data), stream.payload_type, stream.timestamp)
+                    + data
+                )
+            sub.push(frame)
+
+        if not live:
+            with self._lock:
+                stream.subs = tuple(s for s in stream.subs if not s.closed)
+
+    # ---------------------------------------------------------------
+    def close_stream(self, call_id, label):
+        """
+        Fim da perna: entrega o resto do lote, manda EOF e esquece o fluxo.
+        """
+        with self._lock:
+            stream = self._streams.pop((call_id, label), None)
+        if stream is None:
+            return
+        if stream.packets:
+            self._flush(stream)
+        for sub in stream.subs:
+            sub.finish()
+
+    # ---------------------------------------------------------------
+    def stats(self):
+        subs = [s for st in list(self._streams.values()) for s in st.subs]
+        return {
+            "streams": len(self._streams),
+            "subscribers": sum(not s.closed for s in subs),
+            "dropped": sum(s.dropped for s in subs),
+        }
+
+
+# ============================================================
+# CLIENTE DE TESTE
+# ============================================================
+def consume(path, call_id, label, fmt="g711", out=None):
+    out = out or sys.stdout.buffer
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    sock.sendall(f"SUB {call_id} {label} {fmt}\n".encode())
+    f = sock.makefile("rb")
+    reply = f.readline().decode().split()
+    if not reply or reply[0] != "OK":
+        raise RuntimeError(" ".join(reply))
+    print(f"🎧 {call_id}/{label}: {reply[1]}", file=sys.stderr)
+
+    frames = 0
+    while True:
+        head = f.read(_FRAME.size)
+        if len(head) < _FRAME.size:
+            break
+        size, _, _ = _FRAME.unpack(head)
+        if size == 0:
+            break
+        out.write(f.read(size))
+        frames += 1
+    sock.close()
+    return frames
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("uso: python media_fanout.py <socket> <Call-ID> <label> [g711|pcm]")
+        sys.exit(1)
+    n = consume(*sys.argv[1:5])
+    print(f"{n} quadros recebidos", file=sys.stderr)
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+media_pipeline.py
+
+Caminho de mídia em processos separados, ligados por um ShmRing
+(media_ring.py):
+
+    ingestão  ──ring──►  gravador   (payload → .raw)
+                   └──►  analytics  (perda/jitter RFC 3550 → StreamTable)
+
+- ingestão: um processo, um selector para todos os sockets RTP;
+  recv_into direto no slot do ring (o pacote não passa por bytes Python)
+- gravador e analytics leem os mesmos slots, cada um com o seu cursor
+- entre processos só passam descritores: (fluxo, label, tamanho) no slot,
+  e mensagens de controle pequenas (abrir/fechar fluxo, caminho do arquivo)
+
+O processo SIP continua dono das portas (PortPool), do trace e das
+sessões; cada fluxo aparece para a SipSession como um PipelineStream, com
+a mesma interface do RtpReceiver (port, path, packets, last_rx, stats,
+stop, on_done). VAD, fan-out ao vivo e RTCP continuam só no modo de
+threads (RtpReceiver).
+
+SRTP (srtp.py): o gravador decifra. Os pacotes de cada fluxo cifrado num
+lote do ring vão juntos para SrtpStream.unprotect_batch; a analytics lê
+só o cabeçalho, que vai em claro.
+"""
+
+import multiprocessing
+import os
+import selectors
+import socket
+import struct
+import threading
+import time
+
+from media_ring import ShmRing, RingReader, StreamTable, FLAG_END
+from rtcp import RtpStats
+from rtp_receiver import RECORDINGS_DIR, RTP_LENGTH, recording_path
+from srtp import SrtpStream
+from call_trace import TRACE, RTP_FIRST, FILE_DONE
+
+RTP_HEADER = struct.Struct("!BBHII")   # V/P/X/CC, M/PT, seq, timestamp, SSRC
+
+RECORDER = 0      # índices dos cursores no ring
+ANALYTICS = 1
+
+STATS_EVERY = 50  # pacotes entre publicações da estatística (~1 s a 20 ms)
+
+
+# ============================================================
+# PROCESSO DE INGESTÃO (produtor)
+# ============================================================
+def _ingest_main(ring_spec, table_name, max_streams, conn, events):
+    ring = ShmRing.attach(ring_spec)
+    table = StreamTable(table_name, max_streams, create=False)
+    sel = selectors.DefaultSelector()
+    sel.register(conn, selectors.EVENT_READ, None)
+    scratch = bytearray(2048)     # destino dos pacotes descartados (ring cheio)
+    socks = {}                    # fluxo → socket
+    packets = {}                  # fluxo → contador local
+
+    def push_end(sid, label):
+        # O marcador de fim não pode se perder: espera vaga no ring
+        while not ring.push(sid, label, b"", time.monotonic(), FLAG_END):
+            time.sleep(0.001)
+
+    running = True
+    while running:
+        for key, _ in sel.select(timeout=0.5):
+            if key.data is None:
+                msg = conn.recv()
+                op = msg[0]
+                if op == "open":
+                    _, sid, label, host, port = msg
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    try:
+                        sock.bind((host, port))
+                    except OSError as e:
+                        sock.close()
+                        conn.send(("bound", sid, str(e), port))
+                        continue
+                    sock.setblocking(False)
+                    socks[sid] = sock
+                    packets[sid] = 0
+                    sel.register(sock, selectors.EVENT_READ, (sid, label))
+                    conn.send(("bound", sid, None, sock.getsockname()[1]))
+                elif op == "close":
+                    _, sid, label = msg
+                    sock = socks.pop(sid, None)
+                    if sock is not None:
+                        sel.unregister(sock)
+                        sock.close()
+                    packets.pop(sid, None)
+                    push_end(sid, label)
+                elif op == "quit":
+                    running = False
+                continue
+
+            sid, label = key.data
+            sock = key.fileobj
+            # Esvazia o socket em lote: um select() para vários pacotes
+            while True:
+                view = ring.reserve()
+                try:
+                    n = sock.recv_into(view if view is not None else scratch)
+                except (BlockingIOError, OSError):
+                    break
+                finally:
+                    if view is not None:
+                        view.release()
+                if view is None:
+                    # Ring cheio e um datagrama lido em scratch: esse se perdeu
+                    ring.drop()
+                    continue
+                now = time.monotonic()
+                ring.commit(sid, label, n, now)
+                count = packets[sid] = packets[sid] + 1
+                table.set(sid, "last_rx", now)
+                table.set(sid, "packets", count)
+                if count == 1:
+                    events.put(("first", sid, time.monotonic_ns()))
+
+    for sock in socks.values():
+        sock.close()
+    events.put(("dropped", ring.dropped))
+    table.close()
+    ring.close()
+
+
+# ============================================================
+# CONSUMIDORES
+# ============================================================
+def _drain_control(conn, handler):
+    while conn.poll():
+        msg = conn.recv()
+        if msg[0] == "quit":
+            return False
+        handler(msg)
+    return True
+
+
+def _recorder_main(ring_spec, conn, events):
+    ring = ShmRing.attach(ring_spec)
+    reader = RingReader(ring, RECORDER)
+    paths = {}    # fluxo → (caminho, tipo), vindo do processo SIP antes do 1º pacote
+    files = {}    # fluxo → (arquivo, grava o pacote inteiro?)
+    srtp = {}     # fluxo → SrtpStream (só os cifrados)
+    sealed = {}   # fluxo cifrado → pacotes deste lote, em ordem
+
+    def control(msg):
+        _, sid, path, kind, crypto = msg
+        paths[sid] = (path, kind)
+        if crypto is not None:
+            suite, inline, roc_search = crypto
+            srtp[sid] = SrtpStream.from_inline(suite, inline, roc_search=roc_search)
+
+    def write(sid, packet):
+        entry = files.get(sid)
+        if entry is None:
+            # Gravador do fluxo só nasce com o primeiro pacote
+            path, kind = paths[sid]
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            entry = files[sid] = (open(path, "ab"), kind != "audio")
+        f, whole = entry
+        if whole:
+            f.write(RTP_LENGTH.pack(len(packet)))
+            f.write(packet)
+        else:
+            f.write(packet[12:])
+
+    def unseal(sid):
+        for packet in srtp[sid].unprotect_batch(sealed.pop(sid)):
+            write(sid, packet)
+
+    while _drain_control(conn, control):
+        batch = reader.poll()
+        if not batch:
+            time.sleep(0.001)
+            continue
+        for sid, label, flags, arrival, view in batch:
+            if flags & FLAG_END:
+                if sid in sealed:
+                    unseal(sid)
+                entry = files.pop(sid, None)
+                if entry is not None:
+                    entry[0].close()
+                paths.pop(sid, None)
+                srtp.pop(sid, None)
+                events.put(("recorded", sid))
+            elif sid in srtp:
+                sealed.setdefault(sid, []).append(bytes(view))
+            elif view.nbytes > 12:
+                write(sid, view)
+            view.release()
+        for sid in list(sealed):
+            unseal(sid)
+        reader.release()
+
+    for f, _ in files.values():
+        f.close()
+    ring.close()
+
+
+def _analytics_main(ring_spec, table_name, max_streams, conn, events):
+    ring = ShmRing.attach(ring_spec)
+    reader = RingReader(ring, ANALYTICS)
+    table = StreamTable(table_name, max_streams, create=False)
+    streams = {}  # fluxo → RtpStats
+    rates = {}    # fluxo → clock RTP, vindo do processo SIP antes do 1º pacote
+
+    def control(msg):
+        _, sid, rate = msg
+        rates[sid] = rate
+
+    def publish(sid, st):
+        table.set(sid, "ssrc", st.ssrc or 0)
+        table.set(sid, "received", st.received)
+        table.set(sid, "expected", st.expected)
+        table.set(sid, "lost", st.lost)
+        table.set(sid, "jitter_ms", 1000 * st.jitter / st.clock_rate)
+
+    while _drain_control(conn, control):
+        batch = reader.poll()
+        if not batch:
+            time.sleep(0.001)
+            continue
+        for sid, label, flags, arrival, view in batch:
+            if flags & FLAG_END:
+                st = streams.pop(sid, None)
+                rates.pop(sid, None)
+                if st is not None:
+                    publish(sid, st)
+                events.put(("analyzed", sid))
+            elif view.nbytes >= 12:
+                _, _, seq, ts, ssrc = RTP_HEADER.unpack_from(view)
+                st = streams.get(sid)
+                if st is None:
+                    st = streams[sid] = RtpStats(rates.get(sid, 8000))
+                st.update(ssrc, seq, ts, arrival)
+                if st.received % STATS_EVERY == 0:
+                    publish(sid, st)
+            view.release()
+        reader.release()
+
+    table.close()
+    ring.close()
+
+
+# ============================================================
+# LADO SIP
+# ============================================================
+class _TableStats:
+    """
+    Mesma forma de RtpStats.summary(), lida da StreamTable.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def summary(self):
+        row = self.stream._row()
+        expected = int(row["expected"])
+        lost = int(row["lost"])
+        return {
+            "ssrc": int(row["ssrc"]) if expected else None,
+            "received": int(row["received"]),
+            "expected": expected,
+            "lost": lost,
+            "loss_pct": round(100 * lost / expected, 2) if expected else 0.0,
+            "jitter_ms": round(row["jitter_ms"], 3),
+        }
+
+
+class PipelineStream:
+    """
+    Um fluxo no pipeline, com a interface de RtpReceiver usada pela
+    SipSession e pelo reaper.
+    """
+
+    def __init__(self, pipeline, sid, call_id, label, port, path, pool,
+                 trace_idx, label_index, kind="audio"):
+        self.pipeline = pipeline
+        self.sid = sid
+        self.call_id = call_id
+        self.label = label
+        self.kind = kind
+        self.port = port
+        self.path = path
+        self.pool = pool
+        self.trace_idx = trace_idx
+        self.label_index = label_index
+        self.stats = _TableStats(self)
+        self.on_done = None
+        self._final = None      # linha da tabela congelada no fim do fluxo
+        self._stopped = False
+
+    def _row(self):
+        if self._final is not None:
+            return self._final
+        return self.pipeline.table.row(self.sid)
+
+    @property
+    def packets(self):
+        return int(self._row()["packets"])
+
+    @property
+    def last_rx(self):
+        return self._row()["last_rx"]
+
+    def start(self):
+        # A ingestão já está recebendo desde o open_stream
+        pass
+
+    def stop(self):
+        """
+        Não bloqueia: gravador e analytics fecham o fluxo quando o marcador
+        de fim passa por eles; _finish roda na thread de eventos.
+        """
+        if not self._stopped:
+            self._stopped = True
+            self.pipeline._close(self)
+
+    def _finish(self):
+        self._final = self.pipeline.table.row(self.sid)
+        if self.pool is not None:
+            self.pool.release(self.port)
+        if self._final["packets"]:
+            TRACE.record(FILE_DONE, self.trace_idx, self.label_index)
+        if self.on_done is not None:
+            self.on_done(self)
+
+
+class MediaPipeline:
+
+    # Slot cabe um datagrama de MTU 1500 inteiro (vídeo); pacote maior
+    # que o slot é truncado pelo recv_into
+    def __init__(self, slots=16384, slot_size=1536, max_streams=4096):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.max_streams = max_streams
+        self.ring = None
+        self.table = None
+        self.dropped = 0
+        self._free = list(range(max_streams - 1, -1, -1))
+        self._streams = {}      # fluxo → PipelineStream
+        self._pending = {}      # fluxo → consumidores que ainda não fecharam
+        self._lock = threading.Lock()
+        self._procs = []
+
+    # ---------------------------------------------------------------
+    def start(self):
+        self.ring = ShmRing(slots=self.slots, slot_size=self.slot_size, consumers=2)
+        self.table = StreamTable(max_streams=self.max_streams)
+        spec = self.ring.spec()
+        self._events = multiprocessing.Queue()
+
+        self._ingest, ingest_child = multiprocessing.Pipe()
+        self._recorder, recorder_child = multiprocessing.Pipe()
+        self._analytics, analytics_child = multiprocessing.Pipe()
+
+        self._procs = [
+            multiprocessing.Process(
+                target=_ingest_main, name="rtp-ingest", daemon=True,
+                args=(spec, self.table.name, self.max_streams, ingest_child, self._events)),
+            multiprocessing.Process(
+                target=_recorder_main, name="rtp-recorder", daemon=True,
+                args=(spec, recorder_child, self._events)),
+            multiprocessing.Process(
+                target=_analytics_main, name="rtp-analytics", daemon=True,
+                args=(spec, self.table.name, self.max_streams, analytics_child, self._events)),
+        ]
+        for p in self._procs:
+            p.start()
+        self._event_thread = threading.Thread(target=self._event_loop, daemon=True)
+        self._event_thread.start()
+        print(f"🧵 Pipeline de mídia: {len(self._procs)} processos, "
+              f"ring {self.slots}×{self.slot_size} B")
+
+    def stop(self):
+        for conn in (self._ingest, self._recorder, self._analytics):
+            conn.send(("quit",))
+        for p in self._procs:
+            p.join(timeout=5)
+        self._events.put(None)
+        self._event_thread.join()
+        self.table.close(unlink=True)
+        self.ring.close(unlink=True)
+
+    # ---------------------------------------------------------------
+    def open_stream(self, call_id, label, host="0.0.0.0", port=0, pool=None,
+                    trace_idx=0, label_index=0, out_dir=RECORDINGS_DIR,
+                    kind="audio", srtp=None, clock_rate=8000):
+        """
+        Reserva um índice de fluxo e abre a porta no processo de ingestão.
+        Mesma política de portas do RtpReceiver: porta explícita é usada
+        como está; com pool, tenta as livres até uma aceitar o bind.
+        srtp: (suíte, chave inline, roc_search) de um fluxo cifrado.
+        clock_rate: clock RTP do codec, para o jitter na análise.
+        """
+        with self._lock:
+            if not self._free:
+                raise RuntimeError("Pipeline de mídia sem índice de fluxo livre")
+            sid = self._free.pop()
+            self.table.reset(sid)
+            self.table.set(sid, "last_rx", time.monotonic())
+
+            path = recording_path(call_id, label, out_dir, kind)
+            # O gravador precisa do caminho antes do primeiro pacote
+            self._recorder.send(("open", sid, path, kind, srtp))
+            self._analytics.send(("open", sid, clock_rate))
+
+            if port or pool is None:
+                if port and pool is not None:
+                    pool.reserve(port)
+                err, port = self._bind(sid, label_index, host, port)
+                if err:
+                    if port and pool is not None:
+                        pool.release(port)
+                    self._free.append(sid)
+                    raise OSError(err)
+            else:
+                for _ in range(pool.free):
+                    port = pool.allocate()
+                    if self._bind(sid, label_index, host, port)[0] is None:
+                        break
+                    pool.release(port)
+                else:
+                    self._free.append(sid)
+                    raise RuntimeError("Nenhuma porta de mídia disponível")
+
+            stream = PipelineStream(self, sid, call_id, label, port, path, pool,
+                                    trace_idx, label_index, kind)
+            self._streams[sid] = stream
+            self._pending[sid] = 2
+        return stream
+
+    def _bind(self, sid, label_index, host, port):
+        """
+        (erro ou None, porta efetiva) — porta 0 deixa o SO escolher.
+        """
+        self._ingest.send(("open", sid, label_index, host, port))
+        _, _, err, bound = self._ingest.recv()
+        return err, bound
+
+    def _close(self, stream):
+        with self._lock:
+            self._ingest.send(("close", stream.sid, stream.label_index))
+
+    # ---------------------------------------------------------------
+    def _event_loop(self):
+        while True:
+            ev = self._events.get()
+            if ev is None:
+                return
+            kind = ev[0]
+            if kind == "first":
+                stream = self._streams.get(ev[1])
+                if stream is not None:
+                    TRACE.record(RTP_FIRST, stream.trace_idx, stream.label_index, ts=ev[2])
+            elif kind in ("recorded", "analyzed"):
+                self._consumer_closed(ev[1])
+            elif kind == "dropped":
+                self.dropped = ev[1]
+
+    def _consumer_closed(self, sid):
+        with self._lock:
+            self._pending[sid] -= 1
+            if self._pending[sid]:
+                return
+            del self._pending[sid]
+            stream = self._streams.pop(sid)
+        # Fora do lock: on_done pode gravar metadados
+        stream._finish()
+        with self._lock:
+            self._free.append(sid)
+
+    # ---------------------------------------------------------------
+    @property
+    def active(self):
+        return len(self._streams)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+media_policy.py
+
+Quais fluxos de uma oferta SIPREC são gravados.
+
+Cada m= do SDP vira um MediaStream, aceito ou recusado pela política; a
+resposta tem um m= para cada m= da oferta, na mesma ordem (RFC 3264 §6),
+com porta 0 nos recusados.
+
+- áudio: aceito se a oferta tiver um codec que gravamos (PCMU/PCMA);
+  a resposta lista só esses, na ordem da oferta
+- vídeo: aceito se a política permitir; a resposta repete os formatos
+  oferecidos (o pacote RTP é gravado inteiro, ver rtp_receiver.py)
+- o resto (application, text, m= com porta 0, além de max_streams) é
+  recusado
+- RTP/SAVP(F): só com um a=crypto que sabemos decifrar (srtp.py); a
+  resposta leva a=crypto com a mesma tag e suíte e uma chave nossa
+"""
+
+import sys
+from collections import namedtuple
+
+from srtp import SAVP, answer_crypto, choose_crypto
+
+# Payload types de áudio gravados como .raw (G.711 8 kHz)
+AUDIO_CODECS = {"0": "PCMU/8000", "8": "PCMA/8000"}
+
+MediaStream = namedtuple(
+    "MediaStream",
+    "index kind label accepted proto fmts attrs crypto",
+    defaults=(None,),
+)
+MediaStream.__doc__ = """
+Um m= da oferta. fmts: payload types da resposta; attrs: linhas a=
+(sem o "a=") que acompanham esses formatos na resposta; crypto: para
+SRTP, (suíte, chave inline da oferta, valor do a=crypto da resposta).
+"""
+
+
+class MediaPolicy:
+
+    def __init__(self, kinds=("audio", "video"), max_streams=16):
+        self.kinds = frozenset(kinds)
+        self.max_streams = max_streams
+        # fmts/attrs se repetem entre chamadas (mesmo SBC, mesma oferta):
+        # uma tupla compartilhada por combinação, não uma por sessão
+        self._shared = {}
+
+    def _share(self, value):
+        # Limitado: fmtp de vídeo (sprop-parameter-sets) muda a cada chamada
+        if len(self._shared) < 1024:
+            return self._shared.setdefault(value, value)
+        return self._shared.get(value, value)
+
+    # ---------------------------------------------------------------
+    def negotiate(self, media):
+        """
+        media: lista de parse_sdp()["media"]. Devolve uma tupla de
+        MediaStream, um por m=.
+        """
+        streams = []
+        accepted = 0
+        for i, m in enumerate(media):
+            label = m["label"] or str(i + 1)
+            kind = m["type"]
+            fmts, attrs = self._formats(m)
+            crypto = None
+            if m["protocol"] in SAVP:
+                offered = choose_crypto(m["attributes"].get("crypto", []))
+                if offered is not None:
+                    tag, suite, inline = offered
+                    crypto = (suite, inline, answer_crypto(tag, suite))
+            ok = (
+                kind in self.kinds
+                and m["port"] != 0
+                and bool(fmts)
+                and (crypto is not None or m["protocol"] not in SAVP)
+                and accepted < self.max_streams
+            )
+            if ok:
+                accepted += 1
+            else:
+                # Recusado: a resposta só precisa repetir um formato da oferta
+                fmts, attrs, crypto = tuple(m["codecs"][:1]) or ("0",), (), None
+            streams.append(MediaStream(
+                i, sys.intern(kind), sys.intern(label), ok,
+                sys.intern(m["protocol"]),
+                self._share(fmts),
+                self._share(attrs),
+                crypto,
+            ))
+        return tuple(streams)
+
+    def _formats(self, m):
+        offered = m["codecs"]
+        if m["type"] == "audio":
+            fmts = tuple(pt for pt in offered if pt in AUDIO_CODECS)
+            return fmts, tuple(f"rtpmap:{pt} {AUDIO_CODECS[pt]}" for pt in fmts)
+
+        if m["type"] == "video":
+            rtpmap = m["attributes"].get("rtpmap", {})
+            fmtp = m["attributes"].get("fmtp", {})
+            attrs = []
+            for pt in offered:
+                if pt in rtpmap:
+                    attrs.append(f"rtpmap:{pt} {rtpmap[pt]}")
+                if pt in fmtp:
+                    attrs.append(f"fmtp:{pt} {fmtp[pt]}")
+            return tuple(offered), tuple(attrs)
+
+        return (), ()
+
+
+def answer_lines(stream, port):
+    """
+    Linhas do m= da resposta para um fluxo (port ignorada se recusado).
+    """
+    lines = [f"m={stream.kind} {port if stream.accepted else 0} "
+             f"{stream.proto} {' '.join(stream.fmts)}"]
+    lines += [f"a={a}" for a in stream.attrs]
+    if stream.crypto is not None:
+        lines.append(f"a=crypto:{stream.crypto[2]}")
+    lines.append(f"a=label:{stream.label}")
+    lines.append("a=recvonly" if stream.accepted else "a=inactive")
+    return lines
+
+
+def clock_rate(stream):
+    """
+    Clock RTP do fluxo (Hz), para o jitter: rtpmap do primeiro formato
+    da resposta; sem rtpmap (payload type estático), 90 kHz para vídeo e
+    8 kHz para áudio (RFC 3551 §6).
+    """
+    if stream.fmts:
+        prefix = f"rtpmap:{stream.fmts[0]} "
+        for attr in stream.attrs:
+            if attr.startswith(prefix):
+                rate = attr[len(prefix):].split("/")
+                if len(rate) > 1 and rate[1].isdigit():
+                    return int(rate[1])
+    return 90000 if stream.kind == "video" else 8000
+
+
+def legacy_streams(labels):
+    """
+    Fluxos de um registro antigo do journal (só labels): áudio G.711.
+    """
+    return tuple(
+        MediaStream(i, "audio", label, True, "RTP/AVP", ("0", "8"),
+                    tuple(f"rtpmap:{pt} {AUDIO_CODECS[pt]}" for pt in ("0", "8")))
+        for i, label in enumerate(labels)
+    )
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+media_ports.py
+
+Pool de portas de mídia (RTP) do servidor SIPREC.
+Entrega só portas pares — a ímpar seguinte fica reservada para RTCP.
+"""
+
+import threading
+from collections import deque
+
+
+class PortPool:
+
+    def __init__(self, first=10000, last=20000):
+        first += first % 2
+        self.first = first
+        self.last = last
+        self._free = deque(range(first, last, 2))
+        self._used = set()
+        self._lock = threading.Lock()
+
+    # ---------------------------------------------------------------
+    @property
+    def free(self):
+        return len(self._free)
+
+    # ---------------------------------------------------------------
+    def allocate(self):
+        """
+        Retira a porta livre mais antiga (FIFO: uma porta recém-liberada
+        só volta a ser usada depois de todas as outras).
+        """
+        with self._lock:
+            if not self._free:
+                raise RuntimeError("Sem portas de mídia livres")
+            port = self._free.popleft()
+            self._used.add(port)
+            return port
+
+    # ---------------------------------------------------------------
+    def allocate_many(self, count):
+        """
+        As portas de uma chamada inteira numa passada só pelo lock; sem
+        portas para todos os fluxos, não retira nenhuma.
+        """
+        with self._lock:
+            if len(self._free) < count:
+                raise RuntimeError("Sem portas de mídia livres")
+            ports = [self._free.popleft() for _ in range(count)]
+            self._used.update(ports)
+            return ports
+
+    # ---------------------------------------------------------------
+    def reserve(self, port):
+        """
+        Marca uma porta específica como em uso (retomada após restart).
+        Porta que já saiu do pool (allocate_many) não custa nada.
+        """
+        with self._lock:
+            if port in self._used:
+                return
+            try:
+                self._free.remove(port)
+            except ValueError:
+                pass
+            self._used.add(port)
+
+    # ---------------------------------------------------------------
+    def release(self, port):
+        with self._lock:
+            self._used.discard(port)
+            self._free.append(port)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+media_ring.py
+
+Ring de pacotes em multiprocessing.shared_memory, para separar o caminho
+de mídia em processos (ver media_pipeline.py).
+
+Layout do bloco compartilhado:
+    [cursor de escrita][cursor do leitor 0][cursor do leitor 1]...  (64 B cada)
+    [slot 0][slot 1]...[slot N-1]
+    slot = cabeçalho 24 B (seq, chegada, fluxo, label, flags, tamanho) + pacote
+
+Um produtor (o processo de ingestão) e um cursor por consumidor (gravador,
+analytics): cada par produtor/consumidor é SPSC, só o dono escreve no seu
+cursor. O produtor escreve o slot e só então publica o cursor de escrita;
+o consumidor lê o slot direto da memória compartilhada (memoryview, sem
+cópia) e só então avança o próprio cursor. Slot livre = todos os
+consumidores já passaram por ele; com o ring cheio o pacote é descartado
+(a ingestão nunca espera por gravador lento).
+
+Cursores são inteiros de 64 bits alinhados: a escrita é atômica em x86-64
+e aarch64, e o CPython não reordena as duas escritas do produtor.
+"""
+
+import struct
+from multiprocessing import shared_memory
+
+CURSOR = struct.Struct("<Q")
+CURSOR_STRIDE = 64                     # um cursor por linha de cache
+SLOT_HEADER = struct.Struct("<QdIBBH")  # seq, chegada (s), fluxo, label, flags, tamanho
+
+FLAG_END = 1      # fim do fluxo: consumidores fecham arquivo / publicam estatística
+
+
+class ShmRing:
+
+    def __init__(self, name=None, slots=16384, slot_size=256, consumers=2,
+                 create=True):
+        if slots & (slots - 1):
+            raise ValueError("slots precisa ser potência de 2")
+
+        self.slots = slots
+        self.slot_size = slot_size
+        self.consumers = consumers
+        self._mask = slots - 1
+        self.header = CURSOR_STRIDE * (1 + consumers)
+        size = self.header + slots * slot_size
+
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.shm.buf[:self.header] = bytes(self.header)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+        self.payload_max = slot_size - SLOT_HEADER.size
+
+        # Estado local do produtor
+        self._write = self._cursor(0)
+        self._free_until = 0
+        self.dropped = 0
+
+    def spec(self):
+        """
+        O que um processo filho precisa para abrir o mesmo ring.
+        """
+        return {"name": self.name, "slots": self.slots,
+                "slot_size": self.slot_size, "consumers": self.consumers}
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(spec["name"], spec["slots"], spec["slot_size"],
+                   spec["consumers"], create=False)
+
+    # ---------------------------------------------------------------
+    def _cursor(self, i):
+        return CURSOR.unpack_from(self.buf, i * CURSOR_STRIDE)[0]
+
+    def _set_cursor(self, i, value):
+        CURSOR.pack_into(self.buf, i * CURSOR_STRIDE, value)
+
+    def _slot(self, seq):
+        return self.header + (seq & self._mask) * self.slot_size
+
+    # ---------------------------------------------------------------
+    # PRODUTOR
+    # ---------------------------------------------------------------
+    def reserve(self):
+        """
+        memoryview da área de pacote do próximo slot, ou None com o ring
+        cheio. Os cursores dos leitores só são relidos quando a folga
+        conhecida acaba. None não é descarte: quem de fato jogou um pacote
+        fora chama drop() (o recv_into pode nem ter pacote para ler).
+        """
+        seq = self._write
+        if seq >= self._free_until:
+            oldest = min(self._cursor(1 + c) for c in range(self.consumers))
+            self._free_until = oldest + self.slots
+            if seq >= self._free_until:
+                return None
+        start = self._slot(seq) + SLOT_HEADER.size
+        return self.buf[start:start + self.payload_max]
+
+    def commit(self, stream, label, length, arrival, flags=0):
+        seq = self._write
+        SLOT_HEADER.pack_into(self.buf, self._slot(seq), seq, arrival,
+                              stream, label, flags, length)
+        self._write = seq + 1
+        self._set_cursor(0, seq + 1)      # publica depois do slot pronto
+
+    def drop(self):
+        self.dropped += 1
+
+    def push(self, stream, label, data, arrival, flags=0):
+        """
+        Copia data para o próximo slot (fora do caminho recv_into).
+        """
+        view = self.reserve()
+        if view is None:
+            self.drop()
+            return False
+        n = min(len(data), self.payload_max)
+        view[:n] = data[:n]
+        view.release()
+        self.commit(stream, label, n, arrival, flags)
+        return True
+
+    # ---------------------------------------------------------------
+    def close(self, unlink=False):
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class RingReader:
+    """
+    Cursor de um consumidor. poll() devolve memoryviews dos slots
+    prontos; release() libera os slots lidos para o produtor.
+    """
+
+    def __init__(self, ring, index):
+        self.ring = ring
+        self.index = index
+        self._read = ring._cursor(1 + index)
+        self._pending = self._read
+
+    def poll(self, max_batch=256):
+        ring = self.ring
+        available = ring._cursor(0) - self._read
+        out = []
+        for seq in range(self._read, self._read + min(available, max_batch)):
+            off = ring._slot(seq)
+            _, arrival, stream, label, flags, length = SLOT_HEADER.unpack_from(ring.buf, off)
+            start = off + SLOT_HEADER.size
+            out.append((stream, label, flags, arrival, ring.buf[start:start + length]))
+        self._pending = self._read + len(out)
+        return out
+
+    def release(self):
+        self._read = self._pending
+        self.ring._set_cursor(1 + self.index, self._read)
+
+
+# ============================================================
+# TABELA DE FLUXOS (estatística compartilhada, um escritor por coluna)
+# ============================================================
+class StreamTable:
+
+    FIELDS = ("last_rx", "packets", "ssrc", "received", "expected", "lost",
+              "jitter_ms")
+
+    def __init__(self, name=None, max_streams=4096, create=True):
+        self.max_streams = max_streams
+        self.width = len(self.FIELDS)
+        size = 8 * self.width * max_streams
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.shm.buf[:size] = bytes(size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.cells = self.shm.buf.cast("d")
+        self._col = {f: i for i, f in enumerate(self.FIELDS)}
+
+    def get(self, stream, field):
+        return self.cells[stream * self.width + self._col[field]]
+
+    def set(self, stream, field, value):
+        self.cells[stream * self.width + self._col[field]] = value
+
+    def reset(self, stream):
+        base = stream * self.width
+        for i in range(self.width):
+            self.cells[base + i] = 0.0
+
+    def row(self, stream):
+        base = stream * self.width
+        return {f: self.cells[base + i] for i, f in enumerate(self.FIELDS)}
+
+    def close(self, unlink=False):
+        self.cells.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
@@ -0,0 +1,735 @@
+#!/usr/bin/env python3
+"""
+object_upload.py
+
+Envio das gravações encerradas para object storage compatível com S3
+(AWS, MinIO, Ceph RGW...), só com a biblioteca padrão.
+
+- S3Client: requisições assinadas com SigV4, endereçamento por caminho
+  (endpoint/bucket/chave) e um pool de conexões HTTP keep-alive
+- Uploader: estágio de envio com N workers. Arquivo até part_size vai
+  num PUT só; maior vai em multipart, e as partes de todos os arquivos
+  disputam os mesmos workers — um arquivo de 2 GB não segura os outros
+  atrás dele. O estado de cada upload (UploadId e ETag de cada parte
+  confirmada) fica num SQLite: depois de um crash, start() retoma do
+  ponto em que parou, sem reenviar partes já aceitas
+- limite de banda (token bucket) sobre os bytes enviados por todos os
+  workers juntos, para a subida não disputar a rede com o RTP
+- com o objeto confirmado (PUT ou CompleteMultipartUpload), o arquivo
+  local é apagado — se não mudou durante o envio; se mudou, sobe de novo
+
+No servidor (--upload-bucket): sem --archive cada chamada encerrada tem
+seus arquivos enviados (add_call); com --archive os pacotes dos dias já
+fechados são selados (PackArchive.seal) e sobem, .pack e .idx, cada
+geração com chave própria: uma chamada do dia que chegue depois vai
+para um pacote novo, sem sobrescrever o que já foi enviado.
+
+Credenciais de AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY / AWS_REGION.
+
+Uso:
+    python object_upload.py --endpoint http://127.0.0.1:9000 --bucket gravacoes \\
+        put recordings/*.raw
+    python object_upload.py --endpoint ... --bucket ... resume
+"""
+
+import hashlib
+import hmac
+import http.client
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+from recording_pack import call_files, day_of
+
+UPLOAD_STATE = "siprec_uploads.db"
+
+PART_SIZE = 8 << 20          # S3: mínimo de 5 MiB por parte (menos a última)
+MAX_PARTS = 10000
+_SEND_CHUNK = 64 << 10       # granularidade do limite de banda
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    path       TEXT PRIMARY KEY,
+    key        TEXT NOT NULL,
+    upload_id  TEXT,
+    size       INTEGER,
+    mtime      REAL,
+    part_size  INTEGER,
+    remove     INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS parts (
+    path       TEXT NOT NULL,
+    number     INTEGER NOT NULL,
+    upload_id  TEXT NOT NULL,
+    etag       TEXT NOT NULL,
+    PRIMARY KEY (path, number)
+) WITHOUT ROWID;
+"""
+
+_UNRESERVED = "-_.~"
+
+
+class S3Error(Exception):
+
+    def __init__(self, status, body, method, path):
+        code = re.search(rb"<Code>([^<]*)</Code>", body or b"")
+        self.status = status
+        self.code = code.group(1).decode() if code else None
+        super().__init__(f"{method} {path}: HTTP {status} {self.code or ''}".strip())
+
+    @property
+    def retryable(self):
+        return self.status is None or self.status >= 500 or self.status in (408, 429)
+
+
+# ============================================================
+# CLIENTE S3 (SigV4)
+# ============================================================
+def _quote(value, safe=""):
+    return urllib.parse.quote(value, safe=_UNRESERVED + safe)
+
+
+def _hmac(key, msg):
+    return hmac.new(key, msg.encode(), hashlib.sha256).digest()
+
+
+class S3Client:
+
+    def __init__(self, endpoint, bucket, access_key=None, secret_key=None,
+                 region=None, pool_size=8, timeout=60.0):
+        url = urllib.parse.urlsplit(endpoint)
+        self.https = url.scheme == "https"
+        self.host = url.netloc
+        self.bucket = bucket
+        self.access_key = access_key or os.environ.get("AWS_ACCESS_KEY_ID", "")
+        self.secret_key = secret_key or os.environ.get("AWS_SECRET_ACCESS_KEY", "")
+        self.region = region or os.environ.get("AWS_REGION", "us-east-1")
+        self.timeout = timeout
+
+        # Conexões keep-alive reaproveitadas entre os workers
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self.connections = 0        # abertas desde o início (reuso = poucas)
+        self._signing = {}          # data → chave de assinatura do dia
+
+    # ---------------------------------------------------------------
+    def _connection(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            self.connections += 1
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            return cls(self.host, timeout=self.timeout)
+
+    def _release(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _signing_key(self, date):
+        key = self._signing.get(date)
+        if key is None:
+            key = _hmac(("AWS4" + self.secret_key).encode(), date)
+            for part in (self.region, "s3", "aws4_request"):
+                key = _hmac(key, part)
+            self._signing = {date: key}
+        return key
+
+    def sign(self, method, path, query, headers, payload_hash, now=None):
+        """
+        Acrescenta Authorization, x-amz-date e x-amz-content-sha256 a
+        headers (AWS Signature Version 4, cabeçalhos host + x-amz-*).
+        """
+        amz_date = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(now))
+        date = amz_date[:8]
+        headers["x-amz-date"] = amz_date
+        headers["x-amz-content-sha256"] = payload_hash
+        signed = sorted(["host"] + [h.lower() for h in headers if h.lower().startswith("x-amz-")])
+        values = {"host": self.host, **{h.lower(): str(v).strip() for h, v in headers.items()}}
+
+        canonical = "\n".join([
+            method,
+            _quote(path, "/"),
+            "&".join(f"{_quote(k)}={_quote(v)}" for k, v in sorted(query.items())),
+            "".join(f"{h}:{values[h]}\n" for h in signed),
+            ";".join(signed),
+            payload_hash,
+        ])
+        scope = f"{date}/{self.region}/s3/aws4_request"
+        to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, scope,
+            hashlib.sha256(canonical.encode()).hexdigest(),
+        ])
+        signature = hmac.new(self._signing_key(date), to_sign.encode(),
+                             hashlib.sha256).hexdigest()
+        headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={';'.join(signed)}, Signature={signature}"
+        )
+
+    # ---------------------------------------------------------------
+    def request(self, method, key, query=None, body=b"", throttle=None):
+        """
+        (status, cabeçalhos, corpo). body são bytes; throttle(n) é chamado
+        antes de cada pedaço enviado (limite de banda). S3Error se não 2xx.
+        """
+        query = query or {}
+        path = f"/{self.bucket}/{key}"
+        headers = {"Content-Length": str(len(body))}
+        self.sign(method, path, query, headers, hashlib.sha256(body).hexdigest())
+        url = _quote(path, "/")
+        if query:
+            url += "?" + "&".join(f"{_quote(k)}={_quote(v)}" if v else _quote(k)
+                                  for k, v in sorted(query.items()))
+
+        for attempt in (0, 1):
+            reused = not self._pool.empty()
+            conn = self._connection()
+            try:
+                response, data = self._exchange(conn, method, url, headers, body, throttle)
+                break
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                # Conexão do pool fechada pelo servidor (keep-alive
+                # expirado): uma nova tentativa na hora, com conexão nova
+                if not (reused and attempt == 0):
+                    raise S3Error(None, str(e).encode(), method, path) from e
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+
+        # CompleteMultipartUpload pode responder 200 com <Error> no corpo
+        failed = method == "POST" and data.lstrip().startswith(b"<?xml") \
+            and b"<Error>" in data[:256]
+        if response.status >= 300 or failed:
+            raise S3Error(response.status if response.status >= 300 else 500,
+                          data, method, path)
+        return response.status, response.headers, data
+
+    @staticmethod
+    def _exchange(conn, method, url, headers, body, throttle):
+        conn.putrequest(method, url, skip_accept_encoding=True)
+        for name, value in headers.items():
+            conn.putheader(name, value)
+        conn.endheaders()
+        view = memoryview(body)
+        for i in range(0, len(view), _SEND_CHUNK):
+            chunk = view[i:i + _SEND_CHUNK]
+            if throttle is not None:
+                throttle(len(chunk))
+            conn.send(chunk)
+        response = conn.getresponse()
+        return response, response.read()
+
+    # ---------------------------------------------------------------
+    # Resposta 2xx sem o que o envio precisa (proxy ou serviço
+    # "compatível" quebrado) vira S3Error com status 502: tentativa de novo
+    @staticmethod
+    def _etag(headers, method, key):
+        etag = headers.get("ETag")
+        if etag is None:
+            raise S3Error(502, b"<Code>MissingETag</Code>", method, key)
+        return etag
+
+    def put_object(self, key, body, throttle=None):
+        return self._etag(self.request("PUT", key, body=body, throttle=throttle)[1],
+                          "PUT", key)
+
+    def create_multipart(self, key):
+        data = self.request("POST", key, {"uploads": ""})[2]
+        m = re.search(rb"<UploadId>([^<]+)</UploadId>", data)
+        if m is None:
+            raise S3Error(502, b"<Code>MissingUploadId</Code>", "POST", key)
+        return m.group(1).decode()
+
+    def upload_part(self, key, upload_id, number, body, throttle=None):
+        query = {"partNumber": str(number), "uploadId": upload_id}
+        return self._etag(self.request("PUT", key, query, body, throttle)[1], "PUT", key)
+
+    def complete_multipart(self, key, upload_id, etags):
+        parts = "".join(f"<Part><PartNumber>{n}</PartNumber><ETag>{etag}</ETag></Part>"
+                        for n, etag in sorted(etags.items()))
+        body = f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>".encode()
+        self.request("POST", key, {"uploadId": upload_id}, body)
+
+    def abort_multipart(self, key, upload_id):
+        self.request("DELETE", key, {"uploadId": upload_id})
+
+    def get_object(self, key):
+        return self.request("GET", key)[2]
+
+
+# ============================================================
+# LIMITE DE BANDA
+# ============================================================
+class TokenBucket:
+    """
+    bytes/s somados de todos os workers, com rajada de até `burst`
+    segundos de crédito.
+    """
+
+    def __init__(self, rate, burst=0.1):
+        self.rate = rate
+        self.burst = burst
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, n):
+        with self._lock:
+            now = time.monotonic()
+            # Instante em que estes bytes "terminam" de sair no ritmo pedido
+            self._next = max(self._next, now - self.burst) + n / self.rate
+            wait = self._next - now
+        if wait > 0:
+            time.sleep(wait)
+
+
+# ============================================================
+# ESTÁGIO DE ENVIO
+# ============================================================
+class _Upload:
+    """
+    Multipart em andamento: partes que faltam e ETags confirmadas.
+    """
+
+    def __init__(self, path, key, upload_id, size, mtime, part_size, etags, remove):
+        self.path = path
+        self.key = key
+        self.upload_id = upload_id
+        self.size = size
+        self.mtime = mtime
+        self.part_size = part_size
+        self.etags = etags
+        self.remove = remove
+        self.parts = (size + part_size - 1) // part_size
+        self.failed = False
+        self.lock = threading.Lock()
+
+
+class Uploader:
+
+    def __init__(self, client, state_path=UPLOAD_STATE, workers=4,
+                 part_size=PART_SIZE, bandwidth=None, prefix="", retries=5,
+                 retry_after=60.0, sweep_interval=300.0):
+        self.client = client
+        self.prefix = prefix        # início de todas as chaves
+        self.workers = workers
+        self.part_size = part_size
+        self.retries = retries
+        self.retry_after = retry_after
+        # De tempos em tempos: pendentes gravados por outro processo (hot
+        # restart) e dias fechados do arquivo (watch)
+        self.sweep_interval = sweep_interval
+        self.archive = None
+        # bytes/s (None: sem limite)
+        self.bandwidth = TokenBucket(bandwidth) if bandwidth else None
+
+        self.uploaded = 0           # objetos confirmados
+        self.bytes_sent = 0
+        self.failed = 0
+
+        self._db = sqlite3.connect(state_path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+        self._db_lock = threading.Lock()
+
+        self._queue = queue.Queue()
+        self._threads = []
+        self._running = True
+        self._wake = threading.Event()
+        self._active = set()        # caminhos na fila, em envio ou agendados
+        self._active_lock = threading.Lock()
+
+    # ---------------------------------------------------------------
+    def start(self):
+        """
+        Sobe os workers e retoma o que ficou pela metade.
+        """
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"upload-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        n = self.resume()
+        if n:
+            print(f"☁ Retomando {n} envios pendentes")
+        if self.sweep_interval:
+            threading.Thread(target=self._sweep, name="upload-sweep", daemon=True).start()
+
+    def resume(self):
+        """
+        Enfileira os envios registrados no SQLite que não estão em
+        andamento aqui. Quantos entraram.
+        """
+        with self._db_lock:
+            pending = self._db.execute("SELECT path FROM uploads").fetchall()
+        return sum(self._enqueue(path) for (path,) in pending)
+
+    def watch(self, archive):
+        """
+        Envia os pacotes de archive (PackArchive) conforme os dias fecham.
+        """
+        self.archive = archive
+        self.add_sealed_days(archive)
+
+    def add(self, path, key, remove=True):
+        """
+        Envia path para a chave key (apagando o arquivo local depois, se
+        remove). Persistido antes de voltar: sobrevive a um crash.
+        """
+        with self._db_lock, self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO uploads (path, key, remove) VALUES (?, ?, ?)",
+                (path, key, int(remove))
+            )
+        self._enqueue(path)
+
+    def add_call(self, summary):
+        """
+        Arquivos de uma chamada encerrada (SipSession.summary()): pernas,
+        .vad.json, .meta.json e INVITE, em <prefixo>AAAA/MM/DD/<arquivo>.
+        """
+        day = time.strftime("%Y/%m/%d/", time.gmtime(summary.get("ended") or time.time()))
+        for name, path in call_files(summary, with_meta=True):
+            self.add(path, f"{self.prefix}{day}{name}")
+
+    def add_sealed_days(self, archive):
+        """
+        Sela os pacotes (recording_pack.py) dos dias UTC já encerrados e
+        envia os selados: .pack e .idx em <prefixo>packs/AAAA-MM-DD.<geração>.
+        Seguro repetir: o que já está na fila não entra de novo.
+        """
+        # Uma hora de folga: chamadas que terminaram antes da meia-noite
+        # ainda podem estar na fila do arquivo (as que vierem depois disso
+        # abrem uma geração nova do dia)
+        closed = day_of(time.time() - 3600)
+        for day in archive.days():
+            if day < closed:
+                archive.seal(day)
+        n = 0
+        for volume in archive.sealed():
+            for path in (archive.pack_path(volume), archive.index_path(volume)):
+                if os.path.exists(path) and path not in self._active:
+                    self.add(path, f"{self.prefix}packs/{os.path.basename(path)}")
+                    n += 1
+        return n
+
+    def _enqueue(self, path):
+        with self._active_lock:
+            if path in self._active:
+                return False
+            self._active.add(path)
+        self._queue.put(("file", path, None))
+        return True
+
+    def _release(self, path):
+        with self._active_lock:
+            self._active.discard(path)
+
+    # ---------------------------------------------------------------
+    def pending(self):
+        with self._db_lock:
+            return self._db.execute("SELECT count(*) FROM uploads").fetchone()[0]
+
+    def wait(self, timeout=None):
+        """
+        Espera a fila esvaziar (tudo enviado ou com falha agendada).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self):
+        return {
+            "pending": self.pending(),
+            "queued": self._queue.qsize(),
+            "uploaded": self.uploaded,
+            "bytes_sent": self.bytes_sent,
+            "failed": self.failed,
+            "connections": self.client.connections,
+        }
+
+    def stop(self):
+        """
+        Não começa mais nenhum envio (hot restart: o processo novo retoma
+        pelo SQLite); as partes já em envio terminam.
+        """
+        self._running = False
+        self._wake.set()
+
+    def close(self):
+        """
+        stop() e espera as partes em envio; o resto fica no SQLite e
+        start() retoma no próximo processo.
+        """
+        self.stop()
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+        self._db.close()
+
+    # ---------------------------------------------------------------
+    def _sweep(self):
+        while not self._wake.wait(self.sweep_interval):
+            try:
+                self.resume()
+                if self.archive is not None:
+                    self.add_sealed_days(self.archive)
+            except (sqlite3.Error, OSError) as e:
+                print(f"⚠ Envio: falha na varredura: {e}")
+
+    def _worker(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+                if not self._running:
+                    continue
+                kind, path, arg = task
+                if kind == "file":
+                    self._start_file(path)
+                else:
+                    self._send_part(arg, path)
+            except Exception as e:
+                # Sem isto o caminho ficaria em _active para sempre (resume
+                # e a varredura o pulam): mesma falha com nova tentativa
+                print(f"⚠ Envio: erro inesperado em {path}: {type(e).__name__}: {e}")
+                if kind == "part":
+                    upload = arg[0]
+                    with upload.lock:
+                        first = not upload.failed
+                        upload.failed = True
+                    if not first:
+                        continue
+                self._release(path)
+                self._fail(path, e)
+            finally:
+                self._queue.task_done()
+
+    def _retry(self, fn, *args):
+        delay = 0.5
+        for attempt in range(self.retries):
+            try:
+                return fn(*args)
+            except S3Error as e:
+                if not e.retryable or attempt == self.retries - 1:
+                    raise
+                time.sleep(delay)
+                delay *= 2
+
+    def _throttle(self, n):
+        self.bytes_sent += n
+        if self.bandwidth is not None:
+            self.bandwidth.take(n)
+
+    def _fail(self, path, e):
+        self.failed += 1
+        print(f"⚠ Envio de {path} falhou ({e}); nova tentativa em {self.retry_after:.0f} s")
+        timer = threading.Timer(self.retry_after, self._retry_later, (path,))
+        timer.daemon = True
+        timer.start()
+
+    def _retry_later(self, path):
+        self._release(path)
+        self._enqueue(path)
+
+    # ---------------------------------------------------------------
+    def _start_file(self, path):
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT key, upload_id, size, mtime, part_size, remove FROM uploads"
+                " WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            self._release(path)
+            return
+        key, upload_id, size, mtime, part_size, remove = row
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            # Já enviado e apagado antes do registro sair (crash): nada a fazer
+            self._forget(path)
+            return
+
+        try:
+            if st.st_size <= self.part_size:
+                with open(path, "rb") as f:
+                    body = f.read()
+                self._retry(self.client.put_object, key, body, self._throttle)
+                self._done(path, remove, st.st_size, st.st_mtime)
+                return
+
+            if upload_id is not None and (size, mtime) != (st.st_size, st.st_mtime):
+                # Arquivo mudou desde o início do upload: recomeça
+                self._abandon(path, key, upload_id)
+                upload_id = None
+            if upload_id is None:
+                part_size = max(self.part_size, -(-st.st_size // MAX_PARTS))
+                upload_id = self._retry(self.client.create_multipart, key)
+                with self._db_lock, self._db:
+                    self._db.execute(
+                        "UPDATE uploads SET upload_id = ?, size = ?, mtime = ?, part_size = ?"
+                        " WHERE path = ?",
+                        (upload_id, st.st_size, st.st_mtime, part_size, path))
+        except (S3Error, OSError) as e:
+            self._fail(path, e)
+            return
+
+        with self._db_lock:
+            etags = dict(self._db.execute(
+                "SELECT number, etag FROM parts WHERE path = ? AND upload_id = ?",
+                (path, upload_id)).fetchall())
+        upload = _Upload(path, key, upload_id, st.st_size, st.st_mtime, part_size,
+                         etags, remove)
+        missing = [n for n in range(1, upload.parts + 1) if n not in etags]
+        if not missing:
+            self._complete(upload)
+            return
+        for n in missing:
+            self._queue.put(("part", path, (upload, n)))
+
+    def _send_part(self, job, path):
+        upload, number = job
+        if upload.failed:
+            return
+        offset = (number - 1) * upload.part_size
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                body = os.pread(fd, min(upload.part_size, upload.size - offset), offset)
+            finally:
+                os.close(fd)
+            etag = self._retry(self.client.upload_part, upload.key, upload.upload_id,
+                               number, body, self._throttle)
+        except (S3Error, OSError) as e:
+            with upload.lock:
+                first = not upload.failed
+                upload.failed = True
+            if getattr(e, "code", None) == "NoSuchUpload":
+                # Upload abortado do lado do S3 (lifecycle): recomeça do zero
+                self._reset(path)
+            if first:
+                self._fail(path, e)
+            return
+
+        with self._db_lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO parts VALUES (?, ?, ?, ?)",
+                             (path, number, upload.upload_id, etag))
+        with upload.lock:
+            upload.etags[number] = etag
+            last = len(upload.etags) == upload.parts
+        if last:
+            self._complete(upload)
+
+    def _complete(self, upload):
+        try:
+            self._retry(self.client.complete_multipart, upload.key, upload.upload_id,
+                        upload.etags)
+        except S3Error as e:
+            if e.code == "NoSuchUpload":
+                self._reset(upload.path)
+            self._fail(upload.path, e)
+            return
+        self._done(upload.path, upload.remove, upload.size, upload.mtime, upload)
+
+    # ---------------------------------------------------------------
+    def _done(self, path, remove, size, mtime, upload=None):
+        if remove:
+            try:
+                st = os.stat(path)
+                changed = (st.st_size, st.st_mtime) != (size, mtime)
+            except FileNotFoundError:
+                changed = False
+            if changed:
+                # Cresceu durante o envio: o objeto não tem tudo. O arquivo
+                # fica e sobe de novo, inteiro, na mesma chave
+                print(f"☁ {path} mudou durante o envio: reenviando")
+                if upload is not None:
+                    self._abandon(path, upload.key, upload.upload_id)
+                else:
+                    self._reset(path)
+                self._release(path)
+                self._enqueue(path)
+                return
+        # Registro sai antes do arquivo: crash entre os dois deixa só um
+        # arquivo já enviado, nunca um registro sem arquivo reenviado
+        self._forget(path)
+        self.uploaded += 1
+        if remove:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _forget(self, path):
+        with self._db_lock, self._db:
+            self._db.execute("DELETE FROM parts WHERE path = ?", (path,))
+            self._db.execute("DELETE FROM uploads WHERE path = ?", (path,))
+        self._release(path)
+
+    def _reset(self, path):
+        with self._db_lock, self._db:
+            self._db.execute("DELETE FROM parts WHERE path = ?", (path,))
+            self._db.execute("UPDATE uploads SET upload_id = NULL WHERE path = ?", (path,))
+
+    def _abandon(self, path, key, upload_id):
+        try:
+            self.client.abort_multipart(key, upload_id)
+        except S3Error:
+            pass        # o lifecycle do bucket limpa uploads incompletos
+        self._reset(path)
+
+
+# ============================================================
+# CLI
+# ============================================================
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Envio de gravações para S3")
+    ap.add_argument("--endpoint", required=True, help="ex.: https://s3.us-east-1.amazonaws.com")
+    ap.add_argument("--bucket", required=True)
+    ap.add_argument("--state", default=UPLOAD_STATE)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--part-mb", type=float, default=PART_SIZE / (1 << 20))
+    ap.add_argument("--mbps", type=float, help="limite de banda em Mbit/s")
+    ap.add_argument("--prefix", default="")
+    ap.add_argument("--keep", action="store_true", help="não apaga os arquivos enviados")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    q = sub.add_parser("put", help="envia arquivos")
+    q.add_argument("files", nargs="+")
+    sub.add_parser("resume", help="só retoma os envios pendentes")
+    args = ap.parse_args(argv)
+
+    uploader = Uploader(
+        S3Client(args.endpoint, args.bucket, pool_size=args.workers),
+        args.state, workers=args.workers, part_size=int(args.part_mb * (1 << 20)),
+        bandwidth=args.mbps * 125000 if args.mbps else None, prefix=args.prefix,
+        sweep_interval=0,
+    )
+    t0 = time.perf_counter()
+    uploader.start()
+    if args.cmd == "put":
+        for path in args.files:
+            uploader.add(path, uploader.prefix + os.path.basename(path), remove=not args.keep)
+    uploader.wait()
+    elapsed = time.perf_counter() - t0
+    print(f"☁ {uploader.uploaded} objetos, {uploader.bytes_sent / 1e6:.1f} MB em "
+          f"{elapsed:.1f} s ({uploader.bytes_sent * 8 / 1e6 / max(elapsed, 1e-9):.1f} Mbit/s), "
+          f"{uploader.pending()} pendentes")
+    uploader.close()
+
+
+if __name__ == "__main__":
+    main()
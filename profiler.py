@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+profiler.py
+
+Diagnóstico em produção, ligado e desligado sem reiniciar o servidor.
+
+- SamplingProfiler: uma thread amostra sys._current_frames() a cada
+  `interval` e conta as pilhas; ao parar grava o formato "collapsed"
+  (uma linha "thread;mod:func;mod:func N" por pilha), que o
+  flamegraph.pl / speedscope leem direto
+- StallWatchdog: cada loop de recepção marca quando começou a tratar a
+  mensagem atual (LoopProbe); se passar de threshold_ms sem terminar, as
+  pilhas de todas as threads vão para profiles/stall-*.txt enquanto o
+  travamento ainda acontece. O atraso do próprio watchdog ao acordar
+  (GIL preso) também dispara um dump
+- install_profile_signal: `kill -USR2 <pid>` liga/desliga o profiler
+
+O custo com o profiler desligado é zero; com o watchdog, duas escritas de
+atributo por mensagem recebida.
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+PROFILES_DIR = "profiles"
+
+
+def _stamp():
+    return time.strftime("%Y%m%d-%H%M%S")
+
+
+def format_stacks(reason=""):
+    """
+    Pilhas de todas as threads (menos a que chama), com o nome de cada.
+    """
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    lines = [f"# {reason}", f"# {time.strftime('%Y-%m-%d %H:%M:%S')}", ""]
+    for ident, frame in sys._current_frames().items():
+        if ident == me:
+            continue
+        lines.append(f"--- {names.get(ident, ident)} ({ident})")
+        lines.extend(s.rstrip("\n") for s in traceback.format_stack(frame))
+        lines.append("")
+    return "\n".join(lines)
+
+
+# ============================================================
+# PROFILER POR AMOSTRAGEM
+# ============================================================
+class SamplingProfiler:
+
+    def __init__(self, interval=0.01, out_dir=PROFILES_DIR):
+        self.interval = interval
+        self.out_dir = out_dir
+        self.samples = 0
+        self._stacks = Counter()
+        self._labels = {}        # code object → "módulo:função"
+        self._running = False
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._running
+
+    # ---------------------------------------------------------------
+    def start(self, interval=None):
+        with self._lock:
+            if self._running:
+                return False
+            if interval:
+                self.interval = interval
+            self._stacks.clear()
+            self.samples = 0
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+        print(f"🔬 Profiler ligado ({1 / self.interval:.0f} Hz)")
+        return True
+
+    def stop(self):
+        """
+        Para a amostragem e grava o collapsed; devolve o caminho (ou None
+        se não estava ligado).
+        """
+        with self._lock:
+            if not self._running:
+                return None
+            self._running = False
+            self._thread.join()
+            path = self.write()
+        print(f"🔬 Profiler desligado: {self.samples} amostras em {path}")
+        return path
+
+    def toggle(self):
+        return self.stop() if self._running else self.start()
+
+    # ---------------------------------------------------------------
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            # co_qualname (3.11+): Classe.método, não só o nome da função
+            name = getattr(code, "co_qualname", code.co_name)
+            label = self._labels[code] = f"{module}:{name}"
+        return label
+
+    def _run(self):
+        me = threading.get_ident()
+        # frame → pilha até ele, da amostra anterior. Threads paradas no
+        # recvfrom têm os mesmos frames de uma amostra para a outra: a
+        # pilha sai do cache sem percorrer a cadeia. Só vale por uma
+        # amostra (segurar frames mais tempo seguraria seus locais)
+        prefixes = {}
+        while self._running:
+            time.sleep(self.interval)
+            names = {t.ident: t.name for t in threading.enumerate()}
+            seen = {}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                head = names.get(ident, str(ident))
+                pending = []
+                while frame is not None:
+                    known = prefixes.get(frame) or seen.get(frame)
+                    if known is not None and known[0] == head:
+                        break
+                    pending.append(frame)
+                    frame = frame.f_back
+                stack = known[1] if frame is not None else head
+                for f in reversed(pending):
+                    stack = f"{stack};{self._label(f.f_code)}"
+                    seen[f] = (head, stack)
+                if frame is not None:
+                    seen[frame] = known
+                self._stacks[stack] += 1
+            prefixes = seen
+            self.samples += 1
+
+    # ---------------------------------------------------------------
+    def collapsed(self):
+        return "".join(f"{stack} {n}\n" for stack, n in self._stacks.most_common())
+
+    def write(self, path=None):
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = path or os.path.join(self.out_dir, f"profile-{_stamp()}.folded")
+        with open(path, "w") as f:
+            f.write(self.collapsed())
+        return path
+
+
+def install_profile_signal(profiler, sig=signal.SIGUSR2):
+    """
+    `kill -USR2 <pid>` liga; o próximo desliga e grava o .folded.
+    """
+    def _handler(signum, frame):
+        # stop() faz join da thread: roda fora do handler
+        threading.Thread(target=profiler.toggle, daemon=True).start()
+
+    signal.signal(sig, _handler)
+
+
+# ============================================================
+# WATCHDOG DE TRAVAMENTO
+# ============================================================
+class LoopProbe:
+    """
+    Marcador de um loop de recepção: busy_since = instante (monotônico)
+    em que começou a tratar a mensagem atual; 0.0 = esperando no recvfrom.
+    """
+
+    __slots__ = ("name", "busy_since", "_dumped")
+
+    def __init__(self, name):
+        self.name = name
+        self.busy_since = 0.0
+        self._dumped = 0.0
+
+
+class StallWatchdog:
+
+    def __init__(self, threshold_ms=200, out_dir=PROFILES_DIR, max_dumps=50):
+        self.threshold = threshold_ms / 1000
+        self.out_dir = out_dir
+        self.max_dumps = max_dumps
+        self.stalls = 0
+        self.dumps = []
+        self._probes = []
+        self._running = False
+
+    def probe(self, name):
+        p = LoopProbe(name)
+        self._probes.append(p)
+        return p
+
+    # ---------------------------------------------------------------
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._run, name="watchdog", daemon=True).start()
+
+    def stop(self):
+        self._running = False
+
+    def _run(self):
+        period = self.threshold / 4
+        while self._running:
+            t0 = time.monotonic()
+            time.sleep(period)
+            now = time.monotonic()
+
+            late = now - t0 - period
+            if late > self.threshold:
+                self._stall(f"watchdog acordou {late * 1000:.0f} ms atrasado (GIL preso)")
+
+            for p in self._probes:
+                since = p.busy_since
+                if since and now - since > self.threshold and p._dumped != since:
+                    # Um dump por travamento, enquanto ele ainda acontece
+                    p._dumped = since
+                    self._stall(f"loop {p.name} parado há {(now - since) * 1000:.0f} ms")
+
+    def _stall(self, reason):
+        self.stalls += 1
+        print(f"🐢 Travamento: {reason}")
+        if len(self.dumps) >= self.max_dumps:
+            return
+        self.dumps.append(self.dump(reason))
+
+    # ---------------------------------------------------------------
+    def dump(self, reason=""):
+        """
+        Pilhas de todas as threads (menos o watchdog) em profiles/.
+        """
+        text = format_stacks(reason)
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f"stall-{_stamp()}-{self.stalls}.txt")
+        with open(path, "w") as f:
+            f.write(text)
+        return path
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+recording_catalog.py
+
+Catálogo das gravações (SQLite em modo WAL), alimentado no fim de cada
+sessão com o resumo da SipSession (o mesmo dict do <Call-ID>.meta.json).
+
+- calls: uma linha por chamada (Call-ID, From/To, Session-ID do SBC,
+  início/fim/duração, codec, labels e arquivos)
+- participants: uma linha por AoR do rs-metadata, chave (aor, started,
+  call) sem rowid — "chamadas do AoR X nas últimas 24 h" é uma varredura
+  de intervalo no índice, sem tocar no resto da tabela
+- archive: {"day", "key"} depois que o recording_pack.py empacota a
+  chamada e apaga os arquivos soltos de files (PackArchive.read(key, day))
+
+Escrita write-behind como no session_journal.py: add() só enfileira; uma
+thread grava o lote numa transação. Consultas usam conexão própria (WAL:
+leitura não espera a escrita).
+
+Uso:
+    python recording_catalog.py aor sip:+551130001000@carrier.example.com --hours 24
+    python recording_catalog.py call <Call-ID>
+    python recording_catalog.py import recordings/
+"""
+
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+CATALOG_PATH = "siprec_catalog.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id          INTEGER PRIMARY KEY,
+    call_id     TEXT NOT NULL,
+    session_id  TEXT,
+    from_uri    TEXT,
+    to_uri      TEXT,
+    started     REAL NOT NULL,
+    ended       REAL,
+    duration    REAL,
+    codec       TEXT,
+    labels      TEXT,
+    files       TEXT,
+    archive     TEXT
+);
+CREATE INDEX IF NOT EXISTS calls_started ON calls(started);
+CREATE INDEX IF NOT EXISTS calls_call_id ON calls(call_id);
+CREATE INDEX IF NOT EXISTS calls_session_id ON calls(session_id);
+
+CREATE TABLE IF NOT EXISTS participants (
+    aor      TEXT NOT NULL,
+    started  REAL NOT NULL,
+    call     INTEGER NOT NULL,
+    name     TEXT,
+    PRIMARY KEY (aor, started, call)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS participants_call ON participants(call);
+"""
+
+_CALL_COLUMNS = ("id", "call_id", "session_id", "from_uri", "to_uri", "started",
+                 "ended", "duration", "codec", "labels", "files", "archive")
+
+
+def normalize_aor(uri):
+    """
+    AoR comparável: sem <>, display name e parâmetros; esquema e host em
+    minúsculas. "Fulano <sip:+5511@Carrier.com;user=phone>" →
+    "sip:+5511@carrier.com".
+    """
+    if not uri:
+        return None
+    m = re.search(r"<([^>]*)>", uri)
+    uri = (m.group(1) if m else uri).split(";", 1)[0].strip()
+    if "@" in uri:
+        user, host = uri.rsplit("@", 1)
+        scheme, sep, user = user.partition(":")
+        return f"{scheme.lower()}{sep}{user}@{host.lower()}"
+    return uri.lower()
+
+
+class RecordingCatalog:
+
+    def __init__(self, path=CATALOG_PATH, flush_interval=0.5, max_batch=1000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        self._queue = queue.SimpleQueue()
+        self._conn = self._connect()
+        self._reader = self._connect()
+        self._read_lock = threading.Lock()
+        self._running = True
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    # ---------------------------------------------------------------
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        # Bancos de antes da coluna archive
+        if "archive" not in {r[1] for r in conn.execute("PRAGMA table_info(calls)")}:
+            conn.execute("ALTER TABLE calls ADD COLUMN archive TEXT")
+        # Uma linha por chamada (Call-ID, início): reimportar o mesmo
+        # diretório não duplica. Bancos de antes do índice perdem as cópias
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index'"
+                        " AND name = 'calls_unique'").fetchone() is None:
+            conn.execute("DELETE FROM calls WHERE id NOT IN"
+                         " (SELECT min(id) FROM calls GROUP BY call_id, started)")
+            conn.execute("DELETE FROM participants WHERE call NOT IN (SELECT id FROM calls)")
+            conn.execute("CREATE UNIQUE INDEX calls_unique ON calls(call_id, started)")
+        conn.commit()
+        return conn
+
+    # ---------------------------------------------------------------
+    def add(self, summary):
+        """
+        Enfileira o resumo de uma chamada encerrada (SipSession.summary()
+        ou um .meta.json lido do disco).
+        """
+        self._queue.put(summary)
+
+    def archived(self, summary, day, key):
+        """
+        A chamada foi para o pacote do dia (recording_pack.py) sob esta
+        chave; os arquivos soltos da linha não existem mais.
+        """
+        self._queue.put((summary["call_id"], summary["started"],
+                         json.dumps({"day": day, "key": key})))
+
+    # ---------------------------------------------------------------
+    def _writer(self):
+        while self._running or not self._queue.empty():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._apply(batch)
+
+    def _apply(self, batch):
+        # Na ordem da fila: o INSERT de uma chamada vem antes do archived()
+        summaries = [s for s in batch if isinstance(s, dict)]
+        moved = [(where, cid, started) for cid, started, where in
+                 (item for item in batch if not isinstance(item, dict))]
+        try:
+            with self._conn:
+                self.insert(self._conn, summaries)
+                self._conn.executemany(
+                    "UPDATE calls SET archive = ? WHERE call_id = ? AND started = ?", moved)
+        except sqlite3.Error as e:
+            print(f"⚠ Catálogo: falha ao gravar lote de {len(batch)}: {e}")
+
+    @staticmethod
+    def insert(conn, summaries):
+        """
+        Grava os resumos com a conexão dada (a transação é de quem chama).
+        """
+        cur = conn.cursor()
+        people = []
+        for s in summaries:
+            started = s["started"]
+            ended = s.get("ended")
+            cur.execute(
+                "INSERT OR IGNORE INTO calls (call_id, session_id, from_uri, to_uri, started,"
+                " ended, duration, codec, labels, files)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    s["call_id"],
+                    s.get("session_id"),
+                    normalize_aor(s.get("from")),
+                    normalize_aor(s.get("to")),
+                    started,
+                    ended,
+                    ended - started if ended else None,
+                    s.get("codec"),
+                    json.dumps(s.get("labels", [])),
+                    json.dumps([{k: st.get(k) for k in ("label", "path", "packets")}
+                                for st in s.get("streams", [])]),
+                )
+            )
+            if cur.rowcount == 0:
+                continue        # já no catálogo (reimportação)
+            call = cur.lastrowid
+            seen = set()
+            for p in s.get("participants", []):
+                aor = normalize_aor(p.get("aor"))
+                if aor and aor not in seen:
+                    seen.add(aor)
+                    people.append((aor, started, call, p.get("name")))
+        if people:
+            cur.executemany(
+                "INSERT OR IGNORE INTO participants VALUES (?, ?, ?, ?)", people
+            )
+
+    # ---------------------------------------------------------------
+    # CONSULTAS
+    # ---------------------------------------------------------------
+    def _query(self, sql, args):
+        with self._read_lock:
+            rows = self._reader.execute(sql, args).fetchall()
+            calls = [dict(zip(_CALL_COLUMNS, r)) for r in rows]
+            if calls:
+                ids = [c["id"] for c in calls]
+                marks = ",".join("?" * len(ids))
+                people = {}
+                for aor, call, name in self._reader.execute(
+                        f"SELECT aor, call, name FROM participants WHERE call IN ({marks})",
+                        ids):
+                    people.setdefault(call, []).append({"aor": aor, "name": name})
+        for c in calls:
+            c["labels"] = json.loads(c["labels"] or "[]")
+            c["files"] = json.loads(c["files"] or "[]")
+            c["archive"] = json.loads(c["archive"]) if c["archive"] else None
+            c["participants"] = people.get(c.pop("id"), [])
+        return calls
+
+    def by_aor(self, aor, since=None, until=None, limit=1000):
+        """
+        Chamadas com o participante aor, mais recentes primeiro.
+        since/until em epoch (padrão: tudo).
+        """
+        return self._query(
+            "SELECT c.* FROM participants p JOIN calls c ON c.id = p.call"
+            " WHERE p.aor = ? AND p.started >= ? AND p.started < ?"
+            " ORDER BY p.started DESC LIMIT ?",
+            (normalize_aor(aor), since or 0, until or float("inf"), limit)
+        )
+
+    def by_call_id(self, call_id):
+        return self._query("SELECT * FROM calls WHERE call_id = ?", (call_id,))
+
+    def by_session_id(self, session_id):
+        return self._query("SELECT * FROM calls WHERE session_id = ?", (session_id,))
+
+    def between(self, since, until, limit=1000):
+        return self._query(
+            "SELECT * FROM calls WHERE started >= ? AND started < ?"
+            " ORDER BY started DESC LIMIT ?",
+            (since, until, limit)
+        )
+
+    def count(self):
+        with self._read_lock:
+            return self._reader.execute("SELECT count(*) FROM calls").fetchone()[0]
+
+    # ---------------------------------------------------------------
+    def import_dir(self, directory):
+        """
+        Carga retroativa a partir dos .meta.json de um diretório de
+        gravações. Devolve quantos foram enfileirados; chamadas que já
+        estão no catálogo são ignoradas na gravação.
+        """
+        n = 0
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".meta.json"):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    self.add(json.load(f))
+                n += 1
+            except (OSError, ValueError) as e:
+                print(f"⚠ {name} ignorado: {e}")
+        return n
+
+    # ---------------------------------------------------------------
+    def close(self):
+        """
+        Esvazia a fila e fecha o banco.
+        """
+        self._running = False
+        self._thread.join()
+        self._conn.close()
+        self._reader.close()
+
+
+# ============================================================
+# CLI
+# ============================================================
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Catálogo de gravações SIPREC")
+    ap.add_argument("--db", default=CATALOG_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    q = sub.add_parser("aor", help="chamadas de um participante")
+    q.add_argument("aor")
+    q.add_argument("--hours", type=float, default=24.0)
+    q.add_argument("--limit", type=int, default=100)
+
+    q = sub.add_parser("call", help="por Call-ID")
+    q.add_argument("call_id")
+
+    q = sub.add_parser("session", help="por Session-ID do SBC")
+    q.add_argument("session_id")
+
+    q = sub.add_parser("import", help="carrega os .meta.json de um diretório")
+    q.add_argument("directory")
+
+    args = ap.parse_args(argv)
+    catalog = RecordingCatalog(args.db)
+
+    t0 = time.perf_counter()
+    if args.cmd == "import":
+        n = catalog.import_dir(args.directory)
+        catalog.close()
+        print(f"🗂 {n} chamadas importadas para {args.db}")
+        return
+    if args.cmd == "aor":
+        rows = catalog.by_aor(args.aor, since=time.time() - args.hours * 3600,
+                              limit=args.limit)
+    elif args.cmd == "call":
+        rows = catalog.by_call_id(args.call_id)
+    else:
+        rows = catalog.by_session_id(args.session_id)
+    elapsed = (time.perf_counter() - t0) * 1000
+
+    print(json.dumps(rows, indent=2, ensure_ascii=False))
+    print(f"🔎 {len(rows)} chamadas em {elapsed:.1f} ms")
+    catalog.close()
+
+
+if __name__ == "__main__":
+    main()
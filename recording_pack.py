@@ -0,0 +1,791 @@
+#!/usr/bin/env python3
+"""
+recording_pack.py
+
+Arquivo das gravações encerradas em pacotes diários: em vez de 3 a 6
+arquivos pequenos por chamada (.raw de cada perna, .vad.json,
+.meta.json, .invite.json), um archive/AAAA-MM-DD.pack só de append com
+as chamadas do dia e um .idx compacto ao lado. Menos inodes, menos
+metadados de sistema de arquivos, e o backup varre um arquivo por dia.
+
+Bloco de uma chamada no .pack (dia UTC do fim da chamada):
+    "SRPK" | tamanho do cabeçalho (4) | cabeçalho JSON | partes...
+  cabeçalho: chave (o Call-ID), o resumo da chamada (o mesmo do
+  .meta.json) e as partes [{"name", "size"}] na ordem em que seguem
+
+Call-ID repetido no dia (SBC que reusa o Call-ID, dois INVITEs da mesma
+chamada): se o bloco que já existe tem as mesmas partes (nome e tamanho)
+é a mesma chamada reenfileirada depois de um crash, e os arquivos só são
+apagados; senão a chamada entra com a chave "<Call-ID>#2", "#3"... e
+read() aceita a chave. Com um catálogo (recording_catalog.py), cada
+chamada empacotada tem lá o dia e a chave no pacote, já que os arquivos
+soltos listados na linha deixam de existir.
+
+Entrada no .idx (18 bytes + Call-ID):
+    offset (8) | tamanho do bloco (4) | fim da chamada (4, epoch) |
+    tamanho do Call-ID (2) | Call-ID
+
+read(call_id) acha o bloco pelo .idx (em memória depois da primeira
+leitura do dia) e lê a chamada inteira com um pread só.
+
+Escrita write-behind como no recording_catalog.py: add() só enfileira o
+resumo; uma thread copia as partes para o .pack, faz fsync, acrescenta
+ao .idx (fsync) e só então apaga os arquivos pequenos. Se o processo
+cair no meio, os arquivos continuam onde estavam (pack_dir os recolhe)
+e os bytes sem entrada no .idx são cortados do .pack na próxima escrita
+do dia.
+
+Expiração por compactação: compact(day, drop) reescreve o pacote sem as
+chamadas escolhidas (.tmp + rename), expire(before) apaga dias inteiros
+e compacta o dia de fronteira. Se o processo cair entre os renames do
+.pack e do .idx, o .idx é refeito varrendo o .pack.
+
+Selagem (para o envio ao object storage, object_upload.py): seal(day)
+renomeia o pacote aberto do dia para AAAA-MM-DD.<geração>.pack/.idx,
+que não recebe mais nada; uma chamada do dia que chegue depois abre um
+pacote novo, selado e enviado numa geração seguinte. Leitura, compactação
+e expiração passam por todos os pacotes do dia (volumes()).
+
+Uso:
+    python recording_pack.py get <Call-ID> [--day AAAA-MM-DD] [--out DIR]
+    python recording_pack.py pack recordings/
+    python recording_pack.py expire --days 90
+    python recording_pack.py stats
+"""
+
+import calendar
+import fcntl
+import json
+import os
+import queue
+import struct
+import threading
+import time
+
+from rtp_receiver import RECORDINGS_DIR
+from sip_session import metadata_path
+
+ARCHIVE_DIR = "archive"
+
+_MAGIC = b"SRPK"
+_BLOCK = struct.Struct("!4sI")            # magia, tamanho do cabeçalho
+_ENTRY = struct.Struct("!QIIH")           # offset, tamanho, fim, len(Call-ID)
+_COPY_CHUNK = 1 << 20
+
+
+def day_of(epoch):
+    return time.strftime("%Y-%m-%d", time.gmtime(epoch))
+
+
+def _day_start(day):
+    return calendar.timegm(time.strptime(day, "%Y-%m-%d"))
+
+
+def _fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _open_locked(path, mode):
+    """
+    Arquivo aberto e travado (flock exclusivo, solto no close). Se uma
+    compactação trocou ou apagou o arquivo enquanto esperava a trava,
+    abre o novo.
+    """
+    while True:
+        f = open(path, mode)
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            if os.stat(path).st_ino == os.fstat(f.fileno()).st_ino:
+                return f
+        except FileNotFoundError:
+            pass
+        f.close()
+
+
+def meta_file(summary):
+    """
+    Caminho do .meta.json de uma chamada (ao lado das pernas).
+    """
+    streams = summary.get("streams") or [{}]
+    out_dir = os.path.dirname(streams[0].get("path") or "")
+    return metadata_path(summary["call_id"], out_dir or RECORDINGS_DIR)
+
+
+def call_files(summary, with_meta=False):
+    """
+    [(nome, caminho)] dos arquivos da chamada que existem: pernas,
+    .vad.json e INVITE (e o .meta.json, se with_meta).
+    """
+    files = []
+    for stream in summary.get("streams", []):
+        path = stream.get("path")
+        if not path:
+            continue
+        files.append(path)
+        files.append(os.path.splitext(path)[0] + ".vad.json")
+    if summary.get("invite_file"):
+        files.append(summary["invite_file"])
+    if with_meta:
+        files.append(meta_file(summary))
+    return [(os.path.basename(p), p) for p in files if os.path.exists(p)]
+
+
+def parse_block(data):
+    """
+    (cabeçalho, {nome: memoryview}) de um bloco lido do .pack; as partes
+    são fatias do próprio bloco, sem cópia.
+    """
+    magic, hlen = _BLOCK.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("bloco de pacote inválido")
+    start = _BLOCK.size
+    header = json.loads(data[start:start + hlen])
+    view = memoryview(data)
+    parts = {}
+    pos = start + hlen
+    for part in header["parts"]:
+        parts[part["name"]] = view[pos:pos + part["size"]]
+        pos += part["size"]
+    return header, parts
+
+
+class PackArchive:
+
+    def __init__(self, directory=ARCHIVE_DIR, retention_days=None,
+                 flush_interval=0.5, max_batch=100, catalog=None):
+        self.directory = directory
+        # RecordingCatalog opcional: recebe onde cada chamada foi parar
+        self.catalog = catalog
+        self.retention_days = retention_days
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        os.makedirs(directory, exist_ok=True)
+
+        # dia → {Call-ID: (offset, tamanho, fim)}; só os dias já lidos
+        self._index = {}
+        self._index_lock = threading.RLock()
+        self._next_expire = 0.0
+        self._generation = 0        # última geração selada (seal)
+
+        self._queue = queue.SimpleQueue()
+        self._running = True
+        self._thread = threading.Thread(target=self._writer, name="archive", daemon=True)
+        self._thread.start()
+
+    # ---------------------------------------------------------------
+    def pack_path(self, day):
+        return os.path.join(self.directory, f"{day}.pack")
+
+    def index_path(self, day):
+        return os.path.join(self.directory, f"{day}.idx")
+
+    def days(self):
+        return sorted({volume[:10] for volume in self.volumes()})
+
+    def volumes(self, day=None):
+        """
+        Pacotes no diretório (nomes sem extensão): em cada dia, os selados
+        (AAAA-MM-DD.<geração>) antes do aberto (AAAA-MM-DD).
+        """
+        names = [name[:-5] for name in os.listdir(self.directory)
+                 if name.endswith(".pack") and (day is None or name[:10] == day)]
+        return sorted(names, key=lambda v: (v[:10], v == v[:10], v))
+
+    def sealed(self):
+        return [v for v in self.volumes() if v != v[:10]]
+
+    # ---------------------------------------------------------------
+    def add(self, summary):
+        """
+        Enfileira uma chamada encerrada (SipSession.summary() ou um
+        .meta.json lido do disco) para entrar no pacote do dia.
+        """
+        self._queue.put(("add", summary, None))
+
+    def compact(self, day, drop):
+        """
+        Reescreve o pacote do dia sem as chamadas em que
+        drop(call_id, fim) é verdadeiro. Devolve (chamadas removidas,
+        bytes liberados). Roda na thread de escrita; espera terminar.
+        """
+        return self._call("compact", (day, drop))
+
+    def expire(self, before):
+        """
+        Remove as chamadas encerradas antes de `before` (epoch).
+        """
+        return self._call("expire", before)
+
+    def delete(self, call_ids):
+        call_ids = set(call_ids)
+        return self._call("delete", call_ids)
+
+    def seal(self, day):
+        """
+        Fecha o pacote aberto do dia: vira AAAA-MM-DD.<geração> e não
+        recebe mais chamadas. Devolve o nome do pacote selado, ou None se
+        o dia não tinha pacote aberto.
+        """
+        return self._call("seal", day)
+
+    def _call(self, op, arg):
+        result = {}
+        done = threading.Event()
+        self._queue.put((op, arg, (result, done)))
+        done.wait()
+        if "error" in result:
+            raise result["error"]
+        return result["value"]
+
+    # ---------------------------------------------------------------
+    # LEITURA
+    # ---------------------------------------------------------------
+    def lookup(self, call_id, day=None):
+        """
+        (pacote, offset, tamanho) do bloco da chamada, ou None. Sem dia,
+        procura do mais recente para o mais antigo.
+        """
+        for d in reversed(self.volumes(day)):
+            with self._index_lock:
+                entry = self._day_index(d).get(call_id)
+            if entry is not None:
+                return d, entry[0], entry[1]
+        return None
+
+    def keys(self, call_id, day=None):
+        """
+        Chaves das chamadas com este Call-ID: ele mesmo e "<Call-ID>#n"
+        (Call-ID repetido no mesmo pacote).
+        """
+        return list(dict.fromkeys(k for _, k in self._day_keys(day, call_id, {})))
+
+    def read(self, call_id, day=None):
+        """
+        (resumo da chamada, {nome da parte: memoryview}) ou None. call_id
+        pode ser uma chave "<Call-ID>#n" (keys()).
+        """
+        for attempt in (0, 1):
+            with self._index_lock:
+                found = self.lookup(call_id, day)
+                if found is None:
+                    return None
+                d, offset, size = found
+                try:
+                    fd = os.open(self.pack_path(d), os.O_RDONLY)
+                except FileNotFoundError:
+                    # Dia enviado ao object storage e apagado (object_upload.py)
+                    self._index.pop(d, None)
+                    return None
+            try:
+                data = os.pread(fd, size, offset)
+            finally:
+                os.close(fd)
+            try:
+                header, parts = parse_block(data)
+                if header["call_id"] == call_id:
+                    return header["summary"], parts
+            except (ValueError, struct.error):
+                pass
+            # Outro processo compactou entre o .idx e o .pack: relê o dia
+            with self._index_lock:
+                self._index.pop(d, None)
+        raise ValueError(f"pacote {d} inconsistente para {call_id}")
+
+    def _day_index(self, day):
+        index = self._index.get(day)
+        if index is None:
+            index = self._index[day] = self._load_index(day)
+        return index
+
+    def _load_index(self, day):
+        try:
+            with open(self.index_path(day), "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            raw = None
+        try:
+            pack_size = os.path.getsize(self.pack_path(day))
+        except FileNotFoundError:
+            return {}
+        if raw is None:
+            if day != day[:10] and pack_size:
+                # Selado sem .idx (crash entre os renames do seal): ninguém
+                # mais escreve nele, o .idx sai do próprio .pack
+                return self._rebuild_index(day)
+            raw = b""
+
+        index = {}
+        pos = 0
+        while pos + _ENTRY.size <= len(raw):
+            offset, size, ended, n = _ENTRY.unpack_from(raw, pos)
+            call_id = raw[pos + _ENTRY.size:pos + _ENTRY.size + n]
+            if len(call_id) < n:
+                break       # entrada cortada no meio: a escrita não terminou
+            if offset + size > pack_size:
+                # .idx de outra versão do .pack (crash na compactação)
+                return self._rebuild_index(day)
+            index[call_id.decode()] = (offset, size, ended)
+            pos += _ENTRY.size + n
+        return index
+
+    def _rebuild_index(self, day):
+        """
+        Refaz o .idx varrendo os blocos do .pack (eles se descrevem).
+        """
+        index = {}
+        entries = []
+        with open(self.pack_path(day), "rb") as f:
+            total = os.fstat(f.fileno()).st_size
+            pos = 0
+            while True:
+                head = f.read(_BLOCK.size)
+                if len(head) < _BLOCK.size:
+                    break
+                magic, hlen = _BLOCK.unpack(head)
+                header = f.read(hlen)
+                if magic != _MAGIC or len(header) < hlen:
+                    break
+                header = json.loads(header)
+                size = _BLOCK.size + hlen + sum(p["size"] for p in header["parts"])
+                if pos + size > total:
+                    break       # bloco cortado no meio
+                ended = int(header["summary"].get("ended") or 0)
+                index[header["call_id"]] = (pos, size, ended)
+                entries.append(self._entry(header["call_id"], pos, size, ended))
+                pos += size
+                f.seek(pos)
+        tmp = self.index_path(day) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(entries))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.index_path(day))
+        print(f"🗜 Índice de {day} refeito: {len(index)} chamadas")
+        return index
+
+    @staticmethod
+    def _entry(call_id, offset, size, ended):
+        cid = call_id.encode()
+        return _ENTRY.pack(offset, size, int(ended), len(cid)) + cid
+
+    # ---------------------------------------------------------------
+    # ESCRITA (thread "archive")
+    # ---------------------------------------------------------------
+    def _writer(self):
+        while self._running or not self._queue.empty():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                self._maybe_expire()
+                continue
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            adds = [s for op, s, _ in batch if op == "add"]
+            if adds:
+                self._append(adds)
+            for op, arg, reply in batch:
+                if op != "add":
+                    self._run_op(op, arg, reply)
+            self._maybe_expire()
+
+    def _run_op(self, op, arg, reply):
+        result, done = reply
+        try:
+            if op == "compact":
+                result["value"] = self._compact(*arg)
+            elif op == "expire":
+                result["value"] = self._expire(arg)
+            elif op == "delete":
+                result["value"] = self._delete(arg)
+            elif op == "seal":
+                result["value"] = self._seal(arg)
+        except Exception as e:
+            result["error"] = e
+        done.set()
+
+    def _maybe_expire(self):
+        if self.retention_days is None or time.time() < self._next_expire:
+            return
+        self._next_expire = time.time() + 3600
+        try:
+            removed, freed = self._expire(time.time() - self.retention_days * 86400)
+            if removed:
+                print(f"🗜 Arquivo: {removed} chamadas expiradas, {freed >> 20} MB liberados")
+        except OSError as e:
+            print(f"⚠ Arquivo: falha na expiração: {e}")
+
+    # ---------------------------------------------------------------
+    def _append(self, summaries):
+        by_day = {}
+        for summary in summaries:
+            ended = summary.get("ended") or summary.get("started") or time.time()
+            by_day.setdefault(day_of(ended), []).append(summary)
+
+        for day, group in by_day.items():
+            try:
+                self._append_day(day, group)
+            except OSError as e:
+                # Os arquivos ficam onde estão; pack_dir tenta de novo
+                print(f"⚠ Arquivo: falha ao empacotar {len(group)} chamadas em {day}: {e}")
+
+    def _append_day(self, day, summaries):
+        entries = []
+        done = []
+        pending = {}    # chave → partes dos blocos deste lote
+        # Exclusivo entre processos: no hot restart o antigo ainda fecha
+        # chamadas enquanto o novo já empacota
+        with _open_locked(self.pack_path(day), "ab") as pack:
+            index, end = self._sync_end(day, pack)
+            for summary in summaries:
+                call_id = summary["call_id"]
+                files = call_files(summary)
+                parts = [(n, os.path.getsize(p)) for n, p in files]
+                key = self._packed(day, call_id, parts, pending)
+                if key is not None:
+                    # Já empacotada (crash antes de apagar): só limpa
+                    done.append((summary, files, key))
+                    continue
+                key = self._free_key(day, call_id, pending)
+                try:
+                    size = self._write_block(pack, key, summary, files)
+                except OSError as e:
+                    # Desfaz o bloco pela metade; os arquivos ficam soltos
+                    pack.flush()
+                    pack.truncate(end)
+                    print(f"⚠ Arquivo: {call_id} não empacotada: {e}")
+                    continue
+                entries.append((key, end, size, int(summary.get("ended") or 0)))
+                pending[key] = parts
+                done.append((summary, files, key))
+                end += size
+            pack.flush()
+            os.fsync(pack.fileno())
+
+            if entries:
+                with open(self.index_path(day), "ab") as idx:
+                    idx.write(b"".join(self._entry(*e) for e in entries))
+                    idx.flush()
+                    os.fsync(idx.fileno())
+                with self._index_lock:
+                    for call_id, offset, size, ended in entries:
+                        index[call_id] = (offset, size, ended)
+
+        # Só depois do .pack e do .idx em disco
+        for summary, files, key in done:
+            for _, path in files:
+                self._unlink(path)
+            self._unlink(meta_file(summary))
+            if self.catalog is not None:
+                self.catalog.archived(summary, day, key)
+
+    def _day_keys(self, day, call_id, pending):
+        """
+        [(pacote, chave)] do Call-ID nos pacotes do dia (todos, sem dia); pacote
+        None para os blocos do lote atual, ainda fora do índice. Só
+        consultas diretas ao dicionário: Call-ID, #2, #3... até faltar.
+        """
+        with self._index_lock:
+            indexes = [(None, pending)] + [(v, self._day_index(v))
+                                           for v in self.volumes(day)]
+            keys = []
+            key, n = call_id, 1
+            while True:
+                found = [(volume, key) for volume, index in indexes if key in index]
+                if not found:
+                    return keys
+                keys += found
+                n += 1
+                key = f"{call_id}#{n}"
+
+    def _packed(self, day, call_id, parts, pending):
+        """
+        Chave de um bloco do dia com as mesmas partes (nome, tamanho), ou
+        None. Sem arquivo solto nenhum, qualquer bloco do Call-ID serve:
+        não há o que perder.
+        """
+        for volume, key in self._day_keys(day, call_id, pending):
+            if not parts:
+                return key
+            if volume is None:
+                existing = pending[key]
+            else:
+                with self._index_lock:
+                    offset, _, _ = self._day_index(volume)[key]
+                existing = self._block_parts(volume, offset)
+            if existing == parts:
+                return key
+        return None
+
+    def _free_key(self, day, call_id, pending):
+        taken = {k for _, k in self._day_keys(day, call_id, pending)}
+        key, n = call_id, 1
+        while key in taken:
+            n += 1
+            key = f"{call_id}#{n}"
+        return key
+
+    def _block_parts(self, volume, offset):
+        fd = os.open(self.pack_path(volume), os.O_RDONLY)
+        try:
+            magic, hlen = _BLOCK.unpack(os.pread(fd, _BLOCK.size, offset))
+            header = json.loads(os.pread(fd, hlen, offset + _BLOCK.size))
+        finally:
+            os.close(fd)
+        return [(p["name"], p["size"]) for p in header["parts"]]
+
+    def _write_block(self, pack, call_id, summary, files):
+        sizes = [os.path.getsize(p) for _, p in files]
+        header = json.dumps({
+            "call_id": call_id,
+            "summary": summary,
+            "parts": [{"name": n, "size": s} for (n, _), s in zip(files, sizes)],
+        }).encode()
+        pack.write(_BLOCK.pack(_MAGIC, len(header)) + header)
+        for (_, path), size in zip(files, sizes):
+            with open(path, "rb") as f:
+                # Só os bytes contados no cabeçalho
+                left = size
+                while left:
+                    chunk = f.read(min(left, _COPY_CHUNK))
+                    if not chunk:
+                        raise OSError(f"{path} encolheu durante o empacotamento")
+                    pack.write(chunk)
+                    left -= len(chunk)
+        return _BLOCK.size + len(header) + sum(sizes)
+
+    def _sync_end(self, day, pack):
+        """
+        (índice do dia, fim do último bloco), com o .pack já travado. Se o
+        arquivo não termina onde o índice em memória diz: outro processo
+        acrescentou (relê o .idx) ou houve crash entre o fsync do .pack e
+        o do .idx (blocos inteiros voltam ao índice, o resto é cortado).
+        """
+        size = pack.seek(0, os.SEEK_END)
+        with self._index_lock:
+            index = self._day_index(day)
+            end = max((o + s for o, s, _ in index.values()), default=0)
+            if size != end:
+                index = self._index[day] = self._load_index(day)
+                end = max((o + s for o, s, _ in index.values()), default=0)
+            if size > end:
+                index = self._index[day] = self._rebuild_index(day)
+                end = max((o + s for o, s, _ in index.values()), default=0)
+        if size > end:
+            pack.truncate(end)
+            print(f"🗜 Pacote {day}: {size - end} bytes órfãos cortados")
+        return index, end
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    # ---------------------------------------------------------------
+    def _compact(self, day, drop):
+        pack_path, index_path = self.pack_path(day), self.index_path(day)
+        try:
+            src = _open_locked(pack_path, "rb")
+        except FileNotFoundError:
+            return 0, 0
+        with src:
+            with self._index_lock:
+                # Do disco: outro processo pode ter acrescentado ao dia
+                index = self._index[day] = self._load_index(day)
+            gone = {cid for cid, (_, _, ended) in index.items() if drop(cid, ended)}
+            if not gone:
+                return 0, 0
+
+            old_size = os.fstat(src.fileno()).st_size
+            keep = sorted((o, s, e, cid) for cid, (o, s, e) in index.items()
+                          if cid not in gone)
+            if not keep:
+                with self._index_lock:
+                    self._unlink(pack_path)
+                    self._unlink(index_path)
+                    self._index.pop(day, None)
+                return len(gone), old_size
+
+            new_index = {}
+            entries = []
+            with open(pack_path + ".tmp", "wb") as dst:
+                pos = 0
+                for offset, size, ended, cid in keep:
+                    src.seek(offset)
+                    left = size
+                    while left:
+                        chunk = src.read(min(left, _COPY_CHUNK))
+                        dst.write(chunk)
+                        left -= len(chunk)
+                    new_index[cid] = (pos, size, ended)
+                    entries.append(self._entry(cid, pos, size, ended))
+                    pos += size
+                dst.flush()
+                os.fsync(dst.fileno())
+            with open(index_path + ".tmp", "wb") as f:
+                f.write(b"".join(entries))
+                f.flush()
+                os.fsync(f.fileno())
+
+            with self._index_lock:
+                os.replace(pack_path + ".tmp", pack_path)
+                os.replace(index_path + ".tmp", index_path)
+                self._index[day] = new_index
+        _fsync_dir(self.directory)
+        return len(gone), old_size - pos
+
+    def _seal(self, day):
+        if not os.path.exists(self.pack_path(day)):
+            return None
+        with _open_locked(self.pack_path(day), "ab") as pack:
+            # Com a trava: quem acrescentar depois abre um .pack novo
+            _, end = self._sync_end(day, pack)
+            pack.flush()
+            # Nunca repete (a chave no object storage sai daqui)
+            generation = max(int(time.time()), self._generation + 1)
+            while os.path.exists(self.pack_path(f"{day}.{generation}")):
+                generation += 1
+            self._generation = generation
+            volume = f"{day}.{generation}"
+            with self._index_lock:
+                if end == 0:
+                    self._unlink(self.pack_path(day))
+                    self._unlink(self.index_path(day))
+                    volume = None
+                else:
+                    os.replace(self.pack_path(day), self.pack_path(volume))
+                    if os.path.exists(self.index_path(day)):
+                        os.replace(self.index_path(day), self.index_path(volume))
+                    self._index.pop(volume, None)
+                self._index.pop(day, None)
+        _fsync_dir(self.directory)
+        return volume
+
+    def _expire(self, before):
+        removed = freed = 0
+        for day in self.volumes():
+            start = _day_start(day[:10])
+            if start >= before:
+                continue
+            if start + 86400 <= before:
+                drop = lambda cid, ended: True
+            else:
+                drop = lambda cid, ended: ended < before
+            n, b = self._compact(day, drop)
+            removed += n
+            freed += b
+        return removed, freed
+
+    def _delete(self, call_ids):
+        removed = freed = 0
+        for day in self.volumes():
+            with self._index_lock:
+                index = self._day_index(day)
+            if call_ids.isdisjoint(index):
+                continue
+            n, b = self._compact(day, lambda cid, ended: cid in call_ids)
+            removed += n
+            freed += b
+        return removed, freed
+
+    # ---------------------------------------------------------------
+    def pack_dir(self, directory):
+        """
+        Recolhe as chamadas encerradas que ficaram soltas num diretório de
+        gravações (pelo .meta.json). Devolve quantas foram enfileiradas.
+        """
+        n = 0
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".meta.json"):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    self.add(json.load(f))
+                n += 1
+            except (OSError, ValueError) as e:
+                print(f"⚠ {name} ignorado: {e}")
+        return n
+
+    def stats(self):
+        volumes = self.volumes()
+        calls = 0
+        for volume in volumes:
+            with self._index_lock:
+                calls += len(self._day_index(volume))
+        size = sum(os.path.getsize(self.pack_path(v)) for v in volumes)
+        return {"days": len(self.days()), "calls": calls, "bytes": size}
+
+    # ---------------------------------------------------------------
+    def close(self):
+        """
+        Esvazia a fila e para a thread de escrita.
+        """
+        self._running = False
+        self._thread.join()
+
+
+# ============================================================
+# CLI
+# ============================================================
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Pacotes diários de gravações SIPREC")
+    ap.add_argument("--dir", default=ARCHIVE_DIR)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    q = sub.add_parser("get", help="extrai os arquivos de uma chamada")
+    q.add_argument("call_id")
+    q.add_argument("--day", help="AAAA-MM-DD (padrão: procura em todos)")
+    q.add_argument("--out", default=".")
+
+    q = sub.add_parser("pack", help="empacota as chamadas soltas de um diretório")
+    q.add_argument("directory")
+
+    q = sub.add_parser("expire", help="remove chamadas mais antigas que --days")
+    q.add_argument("--days", type=float, required=True)
+
+    sub.add_parser("stats", help="dias, chamadas e bytes arquivados")
+
+    args = ap.parse_args(argv)
+    archive = PackArchive(args.dir)
+
+    if args.cmd == "get":
+        t0 = time.perf_counter()
+        found = archive.read(args.call_id, args.day)
+        elapsed = (time.perf_counter() - t0) * 1000
+        if found is None:
+            print(f"❌ {args.call_id} não está no arquivo")
+        else:
+            summary, parts = found
+            os.makedirs(args.out, exist_ok=True)
+            for name, data in parts.items():
+                with open(os.path.join(args.out, name), "wb") as f:
+                    f.write(data)
+            with open(metadata_path(args.call_id, args.out), "w") as f:
+                json.dump(summary, f, indent=2)
+            print(f"📦 {len(parts)} partes em {args.out} ({elapsed:.1f} ms)")
+    elif args.cmd == "pack":
+        n = archive.pack_dir(args.directory)
+        archive.close()
+        print(f"📦 {n} chamadas empacotadas em {args.dir}")
+        return
+    elif args.cmd == "expire":
+        removed, freed = archive.expire(time.time() - args.days * 86400)
+        print(f"🗜 {removed} chamadas removidas, {freed >> 20} MB liberados")
+    else:
+        print(json.dumps(archive.stats(), indent=2))
+    archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+rtcp.py
+
+Qualidade dos fluxos gravados: estatística RTP incremental (RFC 3550) e
+recepção de RTCP na porta ímpar (porta RTP + 1).
+
+- RtpStats: perda acumulada (A.1/A.3) e jitter entre chegadas (A.8),
+  atualizados em O(1) por pacote, sem guardar histórico
+- parse_rtcp: SR/RR de um pacote RTCP composto (SDES/BYE são pulados)
+- RtcpMonitor: uma thread só (selectors) para os sockets RTCP de todas as
+  chamadas; o loop de RTP não ganha syscall nenhuma. Fluxo SRTP: o que
+  chega é SRTCP, decifrado pelo SrtpStream do fluxo antes do parse
+"""
+
+import queue
+import selectors
+import struct
+import threading
+import time
+
+RTP_SEQ_MOD = 1 << 16
+MAX_DROPOUT = 3000
+MAX_MISORDER = 100
+
+RTCP_SR = 200
+RTCP_RR = 201
+
+_SR_INFO = struct.Struct("!IIIIII")       # SSRC, NTP msw/lsw, RTP ts, pacotes, octetos
+_REPORT_BLOCK = struct.Struct("!IIIIII")  # SSRC, perda, seq, jitter, LSR, DLSR
+
+
+# ============================================================
+# ESTATÍSTICA RTP (RFC 3550, apêndice A)
+# ============================================================
+class RtpStats:
+
+    __slots__ = (
+        "clock_rate", "ssrc", "base_seq", "max_seq", "cycles", "bad_seq",
+        "received", "transit", "jitter", "sender", "remote_reports",
+    )
+
+    def __init__(self, clock_rate=8000):
+        self.clock_rate = clock_rate
+        self.ssrc = None
+        self.base_seq = 0
+        self.max_seq = 0
+        self.cycles = 0
+        self.bad_seq = RTP_SEQ_MOD + 1
+        self.received = 0
+        self.transit = None
+        self.jitter = 0.0
+        self.sender = None          # último SR do SBC
+        self.remote_reports = []    # blocos do último RR/SR recebido
+
+    # ---------------------------------------------------------------
+    def _init_seq(self, seq):
+        self.base_seq = seq
+        self.max_seq = seq
+        self.cycles = 0
+        self.bad_seq = RTP_SEQ_MOD + 1
+        self.received = 0
+        self.transit = None
+
+    def update(self, ssrc, seq, timestamp, arrival):
+        """
+        Um pacote RTP; arrival em segundos (monotônico).
+        """
+        if self.ssrc != ssrc:
+            # Primeiro pacote, ou o SBC trocou de fonte: recomeça a contagem
+            self.ssrc = ssrc
+            self._init_seq(seq)
+        else:
+            udelta = (seq - self.max_seq) % RTP_SEQ_MOD
+            if udelta < MAX_DROPOUT:
+                if seq < self.max_seq:
+                    self.cycles += RTP_SEQ_MOD
+                self.max_seq = seq
+            elif udelta <= RTP_SEQ_MOD - MAX_MISORDER:
+                # salto grande: só aceita se o próximo confirmar
+                if seq != self.bad_seq:
+                    self.bad_seq = (seq + 1) % RTP_SEQ_MOD
+                    return
+                self._init_seq(seq)
+            # senão: duplicado ou fora de ordem — conta, não mexe no max
+
+        self.received += 1
+
+        # Jitter (A.8), em unidades de timestamp; diferença em 32 bits
+        transit = int(arrival * self.clock_rate) - timestamp
+        if self.transit is not None:
+            d = (transit - self.transit + (1 << 31)) % (1 << 32) - (1 << 31)
+            self.jitter += (abs(d) - self.jitter) / 16
+        self.transit = transit
+
+    # ---------------------------------------------------------------
+    @property
+    def expected(self):
+        if self.ssrc is None:
+            return 0
+        return self.cycles + self.max_seq - self.base_seq + 1
+
+    @property
+    def lost(self):
+        return max(0, self.expected - self.received)
+
+    # ---------------------------------------------------------------
+    def on_rtcp(self, reports):
+        for report in reports:
+            if report["type"] == RTCP_SR:
+                self.sender = {
+                    k: report[k] for k in ("ssrc", "ntp", "rtp_ts", "packets", "octets")
+                }
+            if report["blocks"]:
+                self.remote_reports = report["blocks"]
+
+    # ---------------------------------------------------------------
+    # Estado da contagem para continuar em outro processo (hot_restart.py);
+    # SR/RR recebidos não vão junto, o próximo relatório os repõe
+    _STATE = ("ssrc", "base_seq", "max_seq", "cycles", "bad_seq",
+              "received", "transit", "jitter")
+
+    def snapshot(self):
+        return {k: getattr(self, k) for k in self._STATE}
+
+    def load(self, state):
+        for k in self._STATE:
+            setattr(self, k, state[k])
+
+    def summary(self):
+        expected = self.expected
+        out = {
+            "ssrc": self.ssrc,
+            "received": self.received,
+            "expected": expected,
+            "lost": self.lost,
+            "loss_pct": round(100 * self.lost / expected, 2) if expected else 0.0,
+            "jitter_ms": round(1000 * self.jitter / self.clock_rate, 3),
+        }
+        if self.sender is not None:
+            out["sender_report"] = self.sender
+        if self.remote_reports:
+            out["remote_reports"] = self.remote_reports
+        return out
+
+
+# ============================================================
+# PARSE RTCP
+# ============================================================
+def _blocks(data, offset, count):
+    blocks = []
+    for _ in range(count):
+        if offset + _REPORT_BLOCK.size > len(data):
+            break
+        ssrc, lost_word, ext_seq, jitter, lsr, dlsr = _REPORT_BLOCK.unpack_from(data, offset)
+        cumulative = lost_word & 0xFFFFFF
+        if cumulative & 0x800000:           # 24 bits com sinal
+            cumulative -= 1 << 24
+        blocks.append({
+            "ssrc": ssrc,
+            "fraction_lost": (lost_word >> 24) / 256,
+            "cumulative_lost": cumulative,
+            "highest_seq": ext_seq,
+            "jitter": jitter,
+            "lsr": lsr,
+            "dlsr": dlsr,
+        })
+        offset += _REPORT_BLOCK.size
+    return blocks
+
+
+def parse_rtcp(data):
+    """
+    Lista de relatórios SR/RR de um pacote RTCP (composto ou não).
+    Pacote malformado devolve o que deu para ler até ali.
+    """
+    reports = []
+    offset = 0
+    while offset + 8 <= len(data):
+        b0, pt, length = struct.unpack_from("!BBH", data, offset)
+        if b0 >> 6 != 2:
+            break
+        count = b0 & 0x1F
+        end = offset + 4 * (length + 1)
+        if end > len(data):
+            break
+
+        if pt == RTCP_SR and offset + 4 + _SR_INFO.size <= end:
+            ssrc, ntp_msw, ntp_lsw, rtp_ts, packets, octets = _SR_INFO.unpack_from(data, offset + 4)
+            reports.append({
+                "type": RTCP_SR,
+                "ssrc": ssrc,
+                "ntp": ntp_msw + ntp_lsw / (1 << 32),
+                "rtp_ts": rtp_ts,
+                "packets": packets,
+                "octets": octets,
+                "blocks": _blocks(data[:end], offset + 4 + _SR_INFO.size, count),
+            })
+        elif pt == RTCP_RR:
+            ssrc = struct.unpack_from("!I", data, offset + 4)[0]
+            reports.append({
+                "type": RTCP_RR,
+                "ssrc": ssrc,
+                "blocks": _blocks(data[:end], offset + 8, count),
+            })
+
+        offset = end
+    return reports
+
+
+# ============================================================
+# MONITOR (todos os sockets RTCP numa thread)
+# ============================================================
+class RtcpMonitor:
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        # Registro/remoção vindos de outras threads são aplicados pela
+        # própria thread do monitor, entre duas chamadas de select()
+        self._ops = queue.SimpleQueue()
+        self._running = False
+        self.packets = 0
+
+    def add(self, sock, stats, srtp=None):
+        self._ops.put(("add", sock, (stats, srtp)))
+
+    def remove(self, sock):
+        """
+        O monitor fecha o socket depois de tirá-lo do selector.
+        """
+        self._ops.put(("del", sock, None))
+
+    # ---------------------------------------------------------------
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self._running = False
+
+    def _apply_ops(self):
+        while True:
+            try:
+                op, sock, data = self._ops.get_nowait()
+            except queue.Empty:
+                return
+            if op == "add":
+                sock.setblocking(False)
+                self._selector.register(sock, selectors.EVENT_READ, data)
+            else:
+                try:
+                    self._selector.unregister(sock)
+                except (KeyError, ValueError):
+                    pass
+                sock.close()
+
+    def _run(self):
+        while self._running:
+            self._apply_ops()
+            if not self._selector.get_map():
+                time.sleep(0.2)
+                continue
+
+            events = self._selector.select(timeout=0.2)
+
+            for key, _ in events:
+                try:
+                    data, _ = key.fileobj.recvfrom(2048)
+                except OSError:
+                    continue
+                self.packets += 1
+                stats, srtp = key.data
+                if srtp is not None:
+                    data = srtp.unprotect_rtcp(data)
+                    if data is None:
+                        continue
+                stats.on_rtcp(parse_rtcp(data))
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+rtp_receiver.py
+
+Recebe um fluxo RTP SIPREC (um label) e grava o payload em arquivo .raw
+(G.711 8 kHz mono — o mesmo formato que o 'conversor de raw.py' converte).
+
+Vídeo não tem payload gravável direto (o quadro vem fatiado em vários
+pacotes): vai para um .rtp com cada pacote RTP inteiro precedido do
+tamanho em 2 bytes (big-endian), para depacketizar depois.
+
+Fluxo SRTP (srtp.py): a thread tira do socket tudo o que já chegou (até
+SRTP_BATCH pacotes) e decifra o lote de uma vez; o resto do caminho
+(estatística, VAD, arquivo) recebe os pacotes já em claro.
+"""
+
+import os
+import re
+import select
+import socket
+import struct
+import threading
+import time
+
+from udp import decode_rtp_packet
+from call_trace import TRACE, RTP_FIRST, FILE_DONE
+from rtcp import RtpStats
+from clock import CLOCK
+
+RECORDINGS_DIR = "recordings"
+
+# Extensão do arquivo por tipo de mídia (m=)
+RECORDING_EXT = {"audio": ".raw", "video": ".rtp"}
+
+RTP_LENGTH = struct.Struct("!H")     # prefixo de cada pacote no .rtp
+
+SRTP_BATCH = 32                      # pacotes por lote de decifragem
+
+
+def safe_call_id(call_id):
+    """
+    Call-ID utilizável como nome de arquivo.
+    """
+    return re.sub(r"[^A-Za-z0-9._-]", "_", call_id or "sem-call-id")
+
+
+def recording_path(call_id, label, out_dir=RECORDINGS_DIR, kind="audio"):
+    """
+    Caminho do arquivo de gravação de um label da chamada.
+    """
+    ext = RECORDING_EXT.get(kind, ".rtp")
+    return os.path.join(out_dir, f"{safe_call_id(call_id)}_{label}{ext}")
+
+
+class RtpReceiver:
+
+    # Gancho opcional chamado com (receptor, pacote, chegada em ns) — usado
+    # pelos benchmarks de mídia; None em produção
+    probe = None
+
+    def __init__(self, call_id, label, host="0.0.0.0", port=0, pool=None,
+                 trace_idx=0, label_index=0, out_dir=RECORDINGS_DIR,
+                 vad=None, fanout=None, rtcp=None, kind="audio",
+                 sock=None, rtcp_sock=None, clock=None, network=None, srtp=None,
+                 clock_rate=8000):
+        self.call_id = call_id
+        self.label = label
+        self.kind = kind
+        self.trace_idx = trace_idx
+        self.label_index = label_index
+        self.path = recording_path(call_id, label, out_dir, kind)
+        # VoiceActivityDetector opcional (voice_activity.py): decide o que
+        # vai para o disco e gera o .vad.json com o tempo de fala
+        self.vad = vad
+        # MediaFanout opcional (media_fanout.py): áudio ao vivo para analytics
+        self.fanout = fanout
+        self.packets = 0
+        self.clock = clock or CLOCK
+        # SimNetwork (sim_network.py): socket em memória, pacotes entregues
+        # por callback no relógio simulado, sem thread
+        self.network = network
+        # Instante (monotônico) do último pacote; o reaper (session_reaper.py)
+        # conta a inatividade a partir daqui — começa na abertura da porta
+        self.last_rx = self.clock.monotonic()
+        # Perda/jitter (RFC 3550) e último SR/RR do SBC (rtcp.py); jitter na
+        # unidade do clock do codec (vídeo: 90 kHz)
+        self.stats = RtpStats(clock_rate)
+        # Chamado com o receptor no fim de _finish (ex.: metadados da chamada)
+        self.on_done = None
+        # SrtpStream (srtp.py) se o m= foi negociado como RTP/SAVP, ou None
+        self.srtp = srtp
+
+        self.pool = pool
+        if sock is None:
+            if network is not None:
+                self.sock = network.socket()
+            else:
+                self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.port = self._bind(host, port)
+        else:
+            # Herdado de outro processo (hot_restart.py): já está no bind,
+            # com os pacotes que chegaram durante a passagem na fila
+            self.sock = sock
+            self.port = sock.getsockname()[1]
+            if pool is not None:
+                pool.reserve(self.port)
+        self.sock.settimeout(0.5)
+
+        self.rtcp = rtcp
+        self.rtcp_sock = None
+        if rtcp is not None:
+            if rtcp_sock is not None:
+                self.rtcp_sock = rtcp_sock
+                rtcp.add(rtcp_sock, self.stats, srtp)
+            else:
+                self.rtcp_sock = self._bind_rtcp(host)
+
+        self._file = None
+        self._running = False
+        self._detached = False
+        self._thread = None
+
+    # ---------------------------------------------------------------
+    def _bind(self, host, port):
+        """
+        Porta pedida explicitamente (ou sem pool: 0 = o SO escolhe) é usada
+        como está. Com pool, tenta as portas livres até achar uma que
+        ninguém mais ocupe.
+        """
+        if port or self.pool is None:
+            if port and self.pool is not None:
+                self.pool.reserve(port)
+            try:
+                self.sock.bind((host, port))
+            except OSError:
+                if port and self.pool is not None:
+                    self.pool.release(port)
+                self.sock.close()
+                raise
+            return self.sock.getsockname()[1]
+
+        for _ in range(self.pool.free):
+            port = self.pool.allocate()
+            try:
+                self.sock.bind((host, port))
+                return port
+            except OSError:
+                self.pool.release(port)
+
+        self.sock.close()
+        raise RuntimeError("Nenhuma porta de mídia disponível")
+
+    # ---------------------------------------------------------------
+    def _bind_rtcp(self, host):
+        """
+        RTCP na porta ímpar seguinte (o pool só entrega pares). Sem ela a
+        gravação segue normalmente, só sem os relatórios do SBC.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.bind((host, self.port + 1))
+        except OSError as e:
+            sock.close()
+            print(f"⚠ RTCP {self.port + 1} indisponível ({self.call_id}): {e}")
+            return None
+        self.rtcp.add(sock, self.stats, self.srtp)
+        return sock
+
+    # ---------------------------------------------------------------
+    def start(self):
+        self._running = True
+        if self.network is not None:
+            self.sock.on_datagram = self._on_datagram
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _on_datagram(self, data, addr):
+        if self._running:
+            if self.srtp is not None:
+                for packet in self.srtp.unprotect_batch((data,)):
+                    self.handle_packet(packet)
+            else:
+                self.handle_packet(data)
+
+    # ---------------------------------------------------------------
+    def _run(self):
+        if self.srtp is not None:
+            self._run_batched()
+            return
+        while self._running:
+            try:
+                data, addr = self.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            if self.probe is not None:
+                self.probe(self, data, time.monotonic_ns())
+            self.handle_packet(data)
+
+        self._exit()
+
+    def _run_batched(self):
+        # Socket sem timeout: espera no select, esvazia com recvfrom até
+        # EAGAIN ou SRTP_BATCH, e o lote inteiro vai para a decifragem
+        sock = self.sock
+        sock.settimeout(0)
+        recvfrom = sock.recvfrom
+        probe = self.probe
+        while self._running:
+            try:
+                if not select.select([sock], [], [], 0.5)[0]:
+                    continue
+            except (OSError, ValueError):
+                break
+            batch = []
+            try:
+                while len(batch) < SRTP_BATCH:
+                    data, addr = recvfrom(2048)
+                    if probe is not None:
+                        probe(self, data, time.monotonic_ns())
+                    batch.append(data)
+            except BlockingIOError:
+                pass
+            except OSError:
+                break
+            for packet in self.srtp.unprotect_batch(batch):
+                self.handle_packet(packet)
+        self._exit()
+
+    def _exit(self):
+        if self._detached:
+            self._release_file()
+        else:
+            self._finish()
+
+    # ---------------------------------------------------------------
+    def handle_packet(self, data):
+        if len(data) < 12:
+            return
+
+        rtp = decode_rtp_packet(data)
+        now = self.last_rx = self.clock.monotonic()
+        self.stats.update(rtp["ssrc"], rtp["sequence_number"], rtp["timestamp"], now)
+
+        # Arquivo só é criado quando chega o primeiro pacote
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, "ab")
+            TRACE.record(RTP_FIRST, self.trace_idx, self.label_index)
+
+        if self.kind != "audio":
+            self._file.write(RTP_LENGTH.pack(len(data)))
+            self._file.write(data)
+            self.packets += 1
+            return
+
+        if self.fanout is not None:
+            self.fanout.publish(self.call_id, self.label, rtp)
+
+        payload = rtp["payload"]
+        if self.vad is not None:
+            payload = self.vad.feed(payload, rtp["payload_type"])
+        if payload:
+            self._file.write(payload)
+        self.packets += 1
+
+    # ---------------------------------------------------------------
+    def stop(self):
+        """
+        Não bloqueia: a thread do receptor fecha socket e arquivo ao sair
+        do loop (em até um timeout de recvfrom).
+        """
+        self._running = False
+        if self._thread is None:
+            self._finish()
+
+    # ---------------------------------------------------------------
+    def detach(self):
+        """
+        Passagem para outro processo (hot_restart.py): como stop(), mas
+        sem fechar nada — a thread sai do loop e só descarrega o arquivo;
+        socket e porta ficam como estão para serem enviados. Não bloqueia:
+        join() espera a saída.
+        """
+        self._detached = True
+        self._running = False
+
+    def join(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    def _release_file(self):
+        # O processo novo reabre o mesmo arquivo em append. O VAD esvazia
+        # o que segurava; o do processo novo começa do zero
+        if self._file is not None:
+            if self.vad is not None:
+                self._file.write(self.vad.finish())
+            self._file.close()
+            self._file = None
+
+    # ---------------------------------------------------------------
+    def _finish(self):
+        self.sock.close()
+        if self.pool is not None:
+            self.pool.release(self.port)
+        if self.fanout is not None:
+            self.fanout.close_stream(self.call_id, self.label)
+        if self.rtcp_sock is not None:
+            self.rtcp.remove(self.rtcp_sock)
+
+        if self._file is not None:
+            if self.vad is not None:
+                self._file.write(self.vad.finish())
+                self.vad.write_stats(os.path.splitext(self.path)[0] + ".vad.json")
+            self._file.close()
+            TRACE.record(FILE_DONE, self.trace_idx, self.label_index)
+
+        if self.on_done is not None:
+            self.on_done(self)
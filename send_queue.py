@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+send_queue.py
+
+Saída UDP do servidor SIP com um dono só de cada vez.
+
+Os handlers (loop UDP, threads de INVITE, reaper, timers) colocam a
+mensagem numa fila. Quem encontra a fila sem dono vira o dono: envia a
+própria mensagem e tudo o que as outras threads enfileirarem enquanto
+isso, num laço curto de sendto, até a fila esvaziar. As outras só
+enfileiram e voltam. Sem disputa, é um sendto direto como antes; numa
+rajada (BYE em massa na troca de turno, retransmissões de 200 OK) uma
+thread envia o lote e as demais seguem trabalhando.
+
+Não há thread de envio dedicada: no CPython cada sendto solta e retoma o
+GIL, e uma thread de envio disputando o GIL com o loop UDP atrasa os
+dois — medido em bench/send_burst.py e num BYE em massa de 300 chamadas.
+
+Cada datagrama UDP leva uma mensagem SIP só (RFC 3261, 18.1.1): não há
+como juntar mensagens no mesmo pacote, e o Python não expõe sendmmsg.
+
+Quem envia pode ser o loop UDP, e o loop UDP nunca espera: o dono manda
+no máximo max_batch mensagens; se sobrar fila ou o buffer do socket
+encher (EAGAIN/ENOBUFS), a mensagem volta para a frente da fila e o lote
+passa para uma thread de contrapressão, criada na primeira vez e parada
+no resto do tempo (não disputa o GIL fora de rajada).
+
+Contrapressão (só na thread de contrapressão, e no flush):
+- sendto com MSG_DONTWAIT; buffer cheio → espera o socket ficar gravável
+  e tenta de novo a mesma mensagem, sem reordenar; depois de
+  BLOCK_TIMEOUT ela é descartada (o UAC retransmite)
+- fila acima de max_depth → a mensagem nova é descartada e contada;
+  AdmissionControl recusa INVITEs novos bem antes disso (motivo "envio")
+
+stats(): profundidade da fila, enviados, lotes (mensagens que esperaram
+na fila, enviadas de uma vez) e o maior deles, descartes, esperas por
+buffer cheio, lotes passados à thread de contrapressão e latência
+fila → sendto da mensagem mais antiga de cada lote (p50/p99/máx).
+"""
+
+import errno
+import select
+import socket
+import threading
+import time
+from collections import deque
+
+# Espera máxima por espaço no buffer do socket para uma mensagem
+BLOCK_TIMEOUT = 1.0
+
+_DONTWAIT = socket.MSG_DONTWAIT
+_FULL = (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS)
+
+
+class SendQueue:
+
+    def __init__(self, sock, max_depth=20000, max_batch=256, samples=4096):
+        self.sock = sock
+        self.max_depth = max_depth
+        # Mensagens que quem chamou send() envia antes de passar o resto
+        self.max_batch = max_batch
+
+        self.sent = 0
+        self.batches = 0
+        self.dropped = 0            # fila cheia
+        self.expired = 0            # buffer do socket cheio por BLOCK_TIMEOUT
+        self.errors = 0             # outros erros de sendto
+        self.blocked = 0            # esperas por EAGAIN/ENOBUFS
+        self.handoffs = 0           # lotes passados à thread de contrapressão
+        self.largest_batch = 0
+        # Latência fila → sendto dos últimos lotes (a mensagem mais antiga
+        # de cada um), em ns
+        self._latency = deque(maxlen=samples)
+
+        # deque: append/popleft atômicos, sem lock para quem só enfileira
+        self._pending = deque()
+        self._owner = threading.Lock()
+        # Fila com a thread de contrapressão: quem chama send() só enfileira
+        self._stalled = False
+        self._wake = threading.Event()
+        self._flusher = None
+
+    # ---------------------------------------------------------------
+    @property
+    def depth(self):
+        return len(self._pending)
+
+    def send(self, data, addr):
+        """
+        Envia o datagrama, ou o enfileira se outra thread estiver
+        enviando. Nunca espera o socket. False se foi descartado (fila
+        cheia).
+        """
+        pending = self._pending
+        owner = self._owner
+        if not pending and owner.acquire(False):
+            # Sem disputa: direto, sem passar pela fila
+            try:
+                try:
+                    self.sock.sendto(data, _DONTWAIT, addr)
+                    self.sent += 1
+                except OSError as e:
+                    if e.errno not in _FULL:
+                        self._failed(addr, e)
+                    else:
+                        self.blocked += 1
+                        pending.appendleft((data, addr, time.monotonic_ns()))
+                        self._hand_off()
+                self._drain_or_hand_off()
+            finally:
+                owner.release()
+        else:
+            if len(pending) >= self.max_depth:
+                self.dropped += 1
+                return False
+            pending.append((data, addr, time.monotonic_ns()))
+        # O dono anterior pode ter soltado a fila logo depois de uma
+        # mensagem chegar: confere de novo depois de cada lote
+        while pending and not self._stalled and owner.acquire(False):
+            try:
+                self._drain_or_hand_off()
+            finally:
+                owner.release()
+        return True
+
+    def flush(self):
+        """
+        Espera o dono atual terminar e envia o que restar.
+        """
+        with self._owner:
+            self._drain()
+
+    # ---------------------------------------------------------------
+    def _drain_or_hand_off(self):
+        if not self._stalled and not self._drain(self.max_batch):
+            self._hand_off()
+
+    def _hand_off(self):
+        # Sobrou fila ou o buffer encheu: a espera fica com outra thread
+        self._stalled = True
+        self.handoffs += 1
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop,
+                                             name="sip-sendq", daemon=True)
+            self._flusher.start()
+        self._wake.set()
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._owner:
+                self._drain()
+                self._stalled = False
+            # Chegou algo entre o fim do lote e a liberação do dono
+            if self._pending:
+                self._wake.set()
+
+    def _drain(self, limit=None):
+        """
+        Envia a fila em ordem. Com limit (quem chamou send()): para no
+        limite ou no primeiro buffer cheio, com a mensagem de volta na
+        frente. True se a fila ficou vazia.
+        """
+        pending = self._pending
+        if not pending:
+            return True
+        popleft = pending.popleft
+        sendto = self.sock.sendto
+        oldest_ns = pending[0][2]
+        n = sent = 0
+        while pending and n != limit:
+            item = popleft()
+            data, addr, _ = item
+            try:
+                sendto(data, _DONTWAIT, addr)
+                sent += 1
+            except OSError as e:
+                if limit is not None and e.errno in _FULL:
+                    self.blocked += 1
+                    pending.appendleft(item)
+                    break
+                sent += self._retry(data, addr, e)
+            n += 1
+
+        self.sent += sent
+        if n:
+            self.batches += 1
+            if n > self.largest_batch:
+                self.largest_batch = n
+            self._latency.append(time.monotonic_ns() - oldest_ns)
+        return not pending
+
+    def _retry(self, data, addr, e):
+        # True se a mensagem acabou saindo
+        if e.errno not in _FULL:
+            self._failed(addr, e)
+            return False
+        return self._wait_and_send(data, addr)
+
+    def _wait_and_send(self, data, addr):
+        # Buffer do socket cheio: a mesma mensagem de novo quando houver
+        # espaço, até BLOCK_TIMEOUT
+        deadline = time.monotonic() + BLOCK_TIMEOUT
+        while True:
+            self.blocked += 1
+            left = deadline - time.monotonic()
+            if left <= 0:
+                self.expired += 1
+                return False
+            select.select([], [self.sock], [], left)
+            try:
+                self.sock.sendto(data, _DONTWAIT, addr)
+                return True
+            except OSError as e:
+                if e.errno not in _FULL:
+                    self._failed(addr, e)
+                    return False
+
+    def _failed(self, addr, e):
+        # Destino inalcançável, mensagem grande demais...: só esta se perde
+        self.errors += 1
+        print(f"⚠ Envio SIP para {addr} falhou: {e}")
+
+    # ---------------------------------------------------------------
+    def stats(self):
+        samples = sorted(self._latency)
+
+        def pct(p):
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(p / 100 * len(samples)))] / 1000
+
+        return {
+            "depth": self.depth,
+            "largest_batch": self.largest_batch,
+            "sent": self.sent,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "expired": self.expired,
+            "errors": self.errors,
+            "blocked": self.blocked,
+            "handoffs": self.handoffs,
+            "latency_us_p50": round(pct(50), 1),
+            "latency_us_p99": round(pct(99), 1),
+            "latency_us_max": round(samples[-1] / 1000, 1) if samples else 0.0,
+        }
@@ -6,27 +6,99 @@ Servidor SIPREC mínimo – recebe pacotes e encaminha para handlers.
 
 import socket
 import threading
+import time
 from sip_parser import parse_sip_message
 from handlers.invite_handler import handle_invite
 from handlers.ack_handler import handle_ack
 from handlers.bye_handler import handle_bye
 from handlers.options_handler import handle_options
+from call_trace import install_dump_signal
+from media_ports import PortPool
+from admission import AdmissionControl
+from flood_guard import FloodGuard
+from session_journal import SessionJournal
+from recording_catalog import RecordingCatalog
+from session_reaper import SessionReaper
+from rtcp import RtcpMonitor
+from media_policy import MediaPolicy
+from clock import CLOCK
+from send_queue import SendQueue
+from sip_session import SipSession
 
 
 class SIPServer:
 
-    def __init__(self, host="0.0.0.0", port=5060):
+    def __init__(self, host="0.0.0.0", port=5060, admission=None, guard=None,
+                 journal=None, rtp_timeout=60.0, vad=None, fanout=None,
+                 invite_dir=None, media_pipeline=None, catalog=None,
+                 media_policy=None, watchdog=None, sock=None, clock=None,
+                 network=None, archive=None, uploader=None):
         self.host = host
         self.port = port
+        # Tempo, timers e "threads" (clock.py); SimClock + SimNetwork
+        # (sim_network.py) rodam o servidor inteiro em tempo virtual
+        self.clock = clock or CLOCK
+        self.network = network
         self.calls = {}    # Call-ID → SipSession
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.bind((host, port))
+        self.ports = PortPool()
+        self.admission = admission or AdmissionControl()
+        self.guard = guard or FloodGuard(clock=self.clock)
+        if self.guard.dialogs is None:
+            # ACK/BYE/re-INVITE de chamada aceita passam mesmo acima da taxa
+            self.guard.dialogs = self.calls
+        self.journal = journal     # SessionJournal ou None
+        # Encerra chamadas sem RTP / com Session-Expires vencido (0 desliga)
+        self.reaper = SessionReaper(self, rtp_timeout) if rtp_timeout else None
+        self.vad = vad             # kwargs do VoiceActivityDetector ou None
+        self.fanout = fanout       # MediaFanout (áudio ao vivo) ou None
+        self.invite_dir = invite_dir  # onde guardar o INVITE original (ou None)
+        self.rtcp = RtcpMonitor()  # SR/RR de todas as chamadas, uma thread
+        # MediaPipeline (ingestão/gravação/analytics em processos) ou None:
+        # um RtpReceiver com thread própria por label
+        self.media_pipeline = media_pipeline
+        self.catalog = catalog     # RecordingCatalog (fim de cada chamada) ou None
+        # PackArchive (recording_pack.py): gravações encerradas vão para o
+        # pacote do dia e os arquivos soltos são apagados; None = ficam
+        self.archive = archive
+        # Uploader (object_upload.py): gravações encerradas (ou, com
+        # archive, os pacotes dos dias fechados) vão para o S3; None = não
+        self.uploader = uploader
+        # Quais m= da oferta são gravados (o resto vai com porta 0)
+        self.media_policy = media_policy or MediaPolicy()
+        self.watchdog = watchdog   # StallWatchdog (profiler.py) ou None
+        self.pending_invites = 0
+        self._pending_lock = threading.Lock()
+        self.streams = {}  # (ip, porta) → conexão TCP/TLS (tcp_transport.py)
+        if sock is None:
+            if network is not None:
+                sock = network.socket()
+            else:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((host, port))
+        # Herdado no hot restart (hot_restart.py): já no bind, com a fila
+        # do processo anterior
+        self.sock = sock
+        # Porta de fato em uso (port=0 ou socket herdado) por transporte;
+        # TCP/TLS entram quando o listener sobe. Vai no Contact do 200 OK
+        self.port = sock.getsockname()[1]
+        self.listen_ports = {"udp": self.port}
+        if network is not None:
+            # Sem loop de recepção: a rede simulada entrega direto
+            sock.on_datagram = self.receive
+        # Saída UDP: respostas e BYEs de todos os handlers numa fila com um
+        # dono só por vez (send_queue.py); na rede simulada o envio é direto
+        self.outbound = SendQueue(sock) if network is None else None
+        # O loop UDP roda até uma passagem de hot restart desligar isto
+        self._serving = True
+        self.loop_done = threading.Event()
 
     def get_external_ip(self):
         """
         Obtém o IP da interface de saída real do servidor.
         Funciona tanto em servidores locais quanto em EC2, DO, GCP, etc.
         """
+        if self.network is not None:
+            return self.host
         try:
             s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             s.connect(("8.8.8.8", 80))  # não envia nada, só escolhe a rota
@@ -36,37 +108,336 @@ class SIPServer:
         except:
             return "127.0.0.1"
 
+    def send(self, data, addr):
+        """
+        Envia uma mensagem SIP pelo mesmo transporte por onde o peer chegou:
+        a conexão TCP/TLS dele, se houver, senão UDP.
+        """
+        conn = self.streams.get(addr)
+        if conn is not None:
+            conn.send(data)
+        elif self.outbound is not None:
+            self.outbound.send(data, addr)
+        else:
+            self.sock.sendto(data, addr)
+
+    def transport_of(self, addr):
+        conn = self.streams.get(addr)
+        return conn.transport if conn is not None else "udp"
+
+    def recover(self):
+        """
+        Reconstrói server.calls a partir do journal (subida após crash).
+        Sessões estabelecidas voltam a gravar nas mesmas portas e arquivos
+        (as mortas o reaper encerra pelo prazo do RTP); as demais são
+        encerradas e saem do journal.
+        """
+        if not self.journal:
+            return
+
+        resumed = closed = 0
+        for record in self.journal.load():
+            session = SipSession.restore(self, record)
+            alive = record["state"] in ("AWAITING_ACK", "CONFIRMED")
+
+            if alive:
+                try:
+                    session.resume_media(record["ports"])
+                    self.calls[session.call_id] = session
+                    if self.reaper:
+                        self.reaper.watch(session)
+                    resumed += 1
+                    continue
+                except (OSError, RuntimeError) as e:
+                    print(f"⚠ Não deu para retomar {session.call_id}: {e}")
+                    session.stop_media()
+
+            session.close_out(record["recordings"])
+            self.journal.remove(session.call_id)
+            closed += 1
+
+        print(f"♻ Journal: {resumed} sessões retomadas, {closed} encerradas")
+
+    def adopt(self, records):
+        """
+        Sessões recebidas do processo anterior num hot restart
+        (hot_restart.py): os próprios sockets de mídia e os mesmos
+        arquivos, sem passar pelo journal nem por bind.
+        """
+        for record in records:
+            session = SipSession.restore(self, record)
+            session.resume_media(record["ports"], record["media"])
+            self.calls[session.call_id] = session
+            if self.reaper:
+                self.reaper.watch(session)
+        print(f"♻ Hot restart: {len(records)} sessões herdadas")
+
+    def _run_invite(self, sip, addr):
+        try:
+            handle_invite(self, sip, addr)
+        finally:
+            with self._pending_lock:
+                self.pending_invites -= 1
+
     def start(self):
         print(f"📡 SIP server listening on {self.host}:{self.port}")
-        while True:
+        self.admission.lag.start()
+        self.rtcp.start()
+        if self.reaper:
+            self.reaper.start()
+        probe = None
+        if self.watchdog:
+            probe = self.watchdog.probe("udp")
+            self.watchdog.start()
+        while self._serving:
             data, addr = self.sock.recvfrom(65535)
-            text = data.decode("utf-8", errors="ignore")
+            if not data:
+                continue    # datagrama vazio: só acorda o loop (hot_restart.py)
+            if probe is not None:
+                probe.busy_since = time.monotonic()
+            self.receive(data, addr)
+            if probe is not None:
+                probe.busy_since = 0.0
+        self.loop_done.set()
 
-            sip = parse_sip_message(text)
-            start = sip["start_line"]
+    def receive(self, data, addr):
+        """
+        Um datagrama do socket SIP: do loop de start() ou entregue pela
+        rede simulada.
+        """
+        if self.guard.allow(data, addr):
+            self.dispatch(data, addr)
 
+    def dispatch(self, data, addr):
+        """
+        Entrada comum dos transportes: uma mensagem SIP completa (datagrama
+        UDP ou mensagem já delimitada pelo TCP) vinda de addr.
+        """
+        received_ns = self.clock.monotonic_ns()
+        text = data.decode("utf-8", errors="ignore")
 
+        sip = parse_sip_message(text)
+        sip["received_ns"] = received_ns
+        start = sip["start_line"]
 
-            if start.startswith("INVITE"):
-                threading.Thread(
-                    target=handle_invite,
-                    args=(self, sip, addr),
-                    daemon=True
-                ).start()
+        if start.startswith("INVITE"):
+            # re-INVITE de diálogo existente não passa pelo controle
+            if sip["headers"].get("Call-ID") not in self.calls:
+                reason = self.admission.check(self)
+                if reason:
+                    self.admission.reject(self, sip, addr, reason)
+                    return
 
-            elif start.startswith("ACK"):
-                handle_ack(self, sip, addr)
+            with self._pending_lock:
+                self.pending_invites += 1
+            self.clock.spawn(self._run_invite, sip, addr)
 
-            elif start.startswith("BYE"):
-                handle_bye(self, sip, addr)
+        elif start.startswith("ACK"):
+            handle_ack(self, sip, addr)
 
-            elif start.startswith("OPTIONS"):
-                handle_options(self, sip, addr)
+        elif start.startswith("BYE"):
+            handle_bye(self, sip, addr)
 
-            else:
-                print("◻ Ignorado:", start)
+        elif start.startswith("OPTIONS"):
+            handle_options(self, sip, addr)
+
+        else:
+            print("◻ Ignorado:", start)
+
+
+def install_admin(server, admin, profiler):
+    """
+    Comandos de operação do servidor no AdminSocket (admin_socket.py).
+    """
+    from call_trace import TRACE
+    from profiler import format_stacks
+
+    def profile(args):
+        if args[:1] == ["start"]:
+            hz = float(args[1]) if len(args) > 1 else None
+            started = profiler.start(1 / hz if hz else None)
+            return "OK ligado" if started else "ERR já ligado"
+        if args[:1] == ["stop"]:
+            path = profiler.stop()
+            return f"OK {path}" if path else "ERR não estava ligado"
+        return "ERR uso: profile start [Hz] | profile stop"
+
+    def stalls(args):
+        wd = server.watchdog
+        if wd is None:
+            return "ERR watchdog desligado"
+        return "\n".join([f"{wd.stalls} travamentos"] + wd.dumps)
+
+    def sendq(args):
+        if server.outbound is None:
+            return "ERR sem fila de envio"
+        return " ".join(f"{k}={v}" for k, v in server.outbound.stats().items())
+
+    def upload(args):
+        if server.uploader is None:
+            return "ERR envio desligado"
+        return " ".join(f"{k}={v}" for k, v in server.uploader.stats().items())
+
+    def status(args):
+        depth = server.outbound.depth if server.outbound is not None else 0
+        return (f"chamadas={len(server.calls)} portas_livres={server.ports.free} "
+                f"invites_pendentes={server.pending_invites} fila_envio={depth} "
+                f"lag_ms={server.admission.lag.lag_ms:.1f} "
+                f"profiler={'ligado' if profiler.running else 'desligado'}")
+
+    admin.command("profile", profile)
+    admin.command("stacks", lambda args: format_stacks("admin"))
+    admin.command("stalls", stalls)
+    admin.command("sendq", sendq)
+    admin.command("upload", upload)
+    admin.command("trace", lambda args: f"OK {TRACE.dump()}")
+    admin.command("status", status)
 
 
 if __name__ == "__main__":
-    s = SIPServer()
+    import argparse
+    from tcp_transport import TcpTransport
+    from media_fanout import MediaFanout
+    from media_pipeline import MediaPipeline
+    from profiler import SamplingProfiler, StallWatchdog, install_profile_signal
+    from admin_socket import AdminSocket
+    from hot_restart import HANDOVER_SOCKET, HandoverListener, take_over, drain
+    from recording_pack import PackArchive
+    from object_upload import S3Client, Uploader
+
+    ap = argparse.ArgumentParser(description="Servidor SIPREC")
+    ap.add_argument("--tcp", action="store_true", help="escuta TCP na 5060")
+    ap.add_argument("--tls-cert", help="certificado PEM (liga TLS na 5061)")
+    ap.add_argument("--tls-key", help="chave privada PEM")
+    ap.add_argument("--flood-rate", type=float, default=0,
+                    help="mensagens SIP/s por IP de origem fora de diálogo "
+                         "(0 desliga o limite)")
+    ap.add_argument("--flood-burst", type=int, default=0,
+                    help="rajada por IP acima da taxa (padrão: 2 s de taxa)")
+    ap.add_argument("--allow", default="",
+                    help="IPs de SBC confiáveis, sem limite de taxa, "
+                         "separados por vírgula")
+    ap.add_argument("--journal", default="siprec_journal.db",
+                    help="banco do journal de sessões ('' desliga); guarda as "
+                         "chaves SRTP das ofertas, criado 0600")
+    ap.add_argument("--catalog", default="siprec_catalog.db",
+                    help="catálogo de gravações consultável ('' desliga)")
+    ap.add_argument("--rtp-timeout", type=float, default=60.0,
+                    help="segundos sem RTP até encerrar a chamada (0 desliga)")
+    ap.add_argument("--vad", action="store_true",
+                    help="detecção de voz e estatística de fala por perna")
+    ap.add_argument("--trim-silence", type=int, metavar="MS",
+                    help="com --vad, corta silêncios mais longos que MS")
+    ap.add_argument("--archive", metavar="DIR",
+                    help="empacota as gravações encerradas em pacotes diários em DIR")
+    ap.add_argument("--retention-days", type=float,
+                    help="com --archive, remove chamadas mais antigas que isso")
+    ap.add_argument("--upload-endpoint", metavar="URL",
+                    help="object storage S3 (credenciais em AWS_ACCESS_KEY_ID/"
+                         "AWS_SECRET_ACCESS_KEY/AWS_REGION)")
+    ap.add_argument("--upload-bucket", help="com --upload-endpoint, bucket de destino")
+    ap.add_argument("--upload-prefix", default="", help="início das chaves no bucket")
+    ap.add_argument("--upload-mbps", type=float, default=50,
+                    help="limite de banda do envio em Mbit/s (0: sem limite)")
+    ap.add_argument("--keep-invites", metavar="DIR",
+                    help="grava o INVITE original de cada chamada em DIR")
+    ap.add_argument("--live-socket", metavar="PATH",
+                    help="socket Unix para assinar o áudio ao vivo")
+    ap.add_argument("--media", default="audio,video",
+                    help="tipos de m= gravados, separados por vírgula")
+    ap.add_argument("--max-streams", type=int, default=16,
+                    help="fluxos aceitos por chamada (os demais: porta 0)")
+    ap.add_argument("--stall-ms", type=float, default=200,
+                    help="loop UDP parado por mais que isso gera dump de pilhas (0 desliga)")
+    ap.add_argument("--admin-socket", metavar="PATH",
+                    help="socket Unix de comandos (profile, stacks, stalls...)")
+    ap.add_argument("--media-procs", action="store_true",
+                    help="ingestão RTP, gravação e analytics em processos "
+                         "separados (ring em memória compartilhada)")
+    ap.add_argument("--handover-socket", default=HANDOVER_SOCKET,
+                    help="socket Unix do hot restart ('' desliga)")
+    ap.add_argument("--hot-restart", action="store_true",
+                    help="assume socket SIP e chamadas do processo que "
+                         "escuta em --handover-socket (se houver)")
+    args = ap.parse_args()
+    if bool(args.upload_endpoint) != bool(args.upload_bucket):
+        ap.error("--upload-endpoint e --upload-bucket vão juntos")
+    if args.hot_restart and (args.tcp or args.tls_cert or args.media_procs):
+        ap.error("--hot-restart só passa SIP UDP e receptores em thread "
+                 "(sem --tcp, --tls-cert, --media-procs)")
+
+    install_dump_signal()
+    profiler = SamplingProfiler()
+    install_profile_signal(profiler)
+    allow = [ip for ip in args.allow.split(",") if ip]
+    journal = SessionJournal(args.journal) if args.journal else None
+    catalog = RecordingCatalog(args.catalog) if args.catalog else None
+    archive = (PackArchive(args.archive, retention_days=args.retention_days,
+                           catalog=catalog)
+               if args.archive else None)
+    uploader = None
+    if args.upload_endpoint:
+        uploader = Uploader(S3Client(args.upload_endpoint, args.upload_bucket),
+                            bandwidth=args.upload_mbps * 125000 or None,
+                            prefix=args.upload_prefix)
+    vad = {"max_silence_ms": args.trim_silence} if args.vad else None
+    fanout = MediaFanout(args.live_socket) if args.live_socket else None
+    pipeline = MediaPipeline() if args.media_procs else None
+    if pipeline:
+        # Antes do recover: sessões retomadas reabrem as portas no pipeline
+        pipeline.start()
+    handover = None
+    if args.hot_restart and args.handover_socket:
+        try:
+            handover = take_over(args.handover_socket)
+        except RuntimeError as e:
+            # Nada foi parado: o processo em execução continua atendendo
+            ap.exit(1, f"⚠ {e}\n")
+        except (OSError, ValueError) as e:
+            # O antigo parou e saiu: as chamadas voltam pelo journal
+            print(f"⚠ Hot restart falhou ({e}): subida normal pelo journal")
+        else:
+            if handover is None:
+                print("🔁 Nenhum processo para assumir: subida normal")
+    guard = FloodGuard(args.flood_rate, args.flood_burst, allowlist=allow)
+    s = SIPServer(guard=guard, journal=journal,
+                  rtp_timeout=args.rtp_timeout, vad=vad, fanout=fanout,
+                  invite_dir=args.keep_invites, media_pipeline=pipeline,
+                  catalog=catalog, archive=archive, uploader=uploader,
+                  media_policy=MediaPolicy(args.media.split(","), args.max_streams),
+                  watchdog=StallWatchdog(args.stall_ms) if args.stall_ms else None,
+                  sock=handover.sip_sock if handover else None)
+    if handover:
+        s.adopt(handover.sessions)
+        handover.confirm()
+    else:
+        s.recover()
+    listener = None
+    if args.handover_socket:
+        listener = HandoverListener(s, args.handover_socket)
+        listener.start()
+    if fanout:
+        fanout.start()
+    if uploader:
+        uploader.start()
+        if archive:
+            uploader.watch(archive)
+    if args.admin_socket:
+        admin = AdminSocket(args.admin_socket)
+        install_admin(s, admin, profiler)
+        admin.start()
+    listeners = []
+    if args.tcp:
+        listeners.append(TcpTransport(s, s.host, 5060))
+    if args.tls_cert:
+        listeners.append(TcpTransport(s, s.host, 5061,
+                                      certfile=args.tls_cert, keyfile=args.tls_key))
+    for t in listeners:
+        s.listen_ports[t.transport] = t.port
+        t.start()
     s.start()
+    # start() só volta numa passagem de hot restart: espera o processo
+    # novo confirmar e sai
+    if listener:
+        listener.done.wait()
+    drain(s)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+session_journal.py
+
+Journal durável das sessões SIPREC (SQLite em modo WAL).
+
+Write-behind: quem chama (INVITE, ACK, BYE) só coloca um snapshot numa
+fila em memória; uma thread escritora junta o que chegou e grava tudo em
+uma única transação. Nenhum I/O de disco síncrono no caminho do INVITE.
+
+Na subida do servidor, load() devolve as sessões que estavam vivas para
+que o SIPServer reconstrua server.calls (ver SIPServer.recover).
+
+O registro de cada sessão leva os fluxos negociados, e com SRTP isso
+inclui a chave mestra e o salt (SDES) da oferta, em claro: quem lê o
+banco decifra as gravações. Banco, -wal e -shm ficam só para o dono
+(0600), como os sockets de admin_socket.py e hot_restart.py.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+JOURNAL_PATH = "siprec_journal.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    call_id  TEXT PRIMARY KEY,
+    record   TEXT NOT NULL,
+    updated  REAL NOT NULL
+)
+"""
+
+
+class SessionJournal:
+
+    def __init__(self, path=JOURNAL_PATH, flush_interval=0.2, max_batch=1000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        self._queue = queue.SimpleQueue()
+        self._conn = self._connect()
+        self._running = True
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    # ---------------------------------------------------------------
+    def _connect(self):
+        # Criado já 0600 (o SQLite cria -wal/-shm com o modo do banco);
+        # banco de antes disso tem o modo corrigido
+        os.close(os.open(self.path, os.O_CREAT | os.O_WRONLY, 0o600))
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: um fsync por checkpoint, não por commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(_SCHEMA)
+        conn.commit()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.chmod(self.path + suffix, 0o600)
+        return conn
+
+    # ---------------------------------------------------------------
+    def record(self, session):
+        """
+        Enfileira o estado atual da sessão (sem tocar no disco).
+        """
+        self._queue.put(("put", session.call_id, session.to_record()))
+
+    def remove(self, call_id):
+        self._queue.put(("del", call_id, None))
+
+    # ---------------------------------------------------------------
+    def load(self):
+        """
+        Sessões gravadas, para a recuperação na subida (síncrono).
+        """
+        rows = self._conn.execute("SELECT record FROM sessions").fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    # ---------------------------------------------------------------
+    def _writer(self):
+        while self._running or not self._queue.empty():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+
+            # Junta o que mais estiver pendente na mesma transação
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self._apply(batch)
+
+    def _apply(self, batch):
+        # Só o último estado de cada Call-ID importa
+        latest = {}
+        for op, call_id, record in batch:
+            latest[call_id] = (op, record)
+
+        now = time.time()
+        puts = [(cid, json.dumps(rec), now)
+                for cid, (op, rec) in latest.items() if op == "put"]
+        dels = [(cid,) for cid, (op, _) in latest.items() if op == "del"]
+
+        try:
+            with self._conn:
+                if puts:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", puts
+                    )
+                if dels:
+                    self._conn.executemany(
+                        "DELETE FROM sessions WHERE call_id = ?", dels
+                    )
+        except sqlite3.Error as e:
+            print(f"⚠ Journal: falha ao gravar lote de {len(batch)}: {e}")
+
+    # ---------------------------------------------------------------
+    def close(self):
+        """
+        Esvazia a fila e fecha o banco.
+        """
+        self._running = False
+        # Acorda o escritor já (op desconhecida: _apply ignora), sem esperar
+        # o flush_interval
+        self._queue.put(("wake", None, None))
+        self._thread.join()
+        self._conn.close()
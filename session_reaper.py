@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+session_reaper.py
+
+Encerra chamadas mortas: BYE perdido, SBC que caiu, Session-Expires
+vencido sem refresh, 200 OK nunca confirmado. Sem isso a sessão fica em
+server.calls e segura as portas de mídia para sempre.
+
+Cada sessão tem até três prazos, agendados no relógio do servidor
+(clock.py):
+- "ack": 200 OK sem ACK em ack_timeout segundos (64*T1, RFC 3261
+  §13.3.1.4): a chamada não se estabeleceu e recebe BYE
+- "rtp": nenhum pacote em nenhum label por rtp_timeout segundos
+- "timer": Session-Expires sem re-INVITE de refresh, só quando o
+  refresher é o SBC (SipSession.expires; ver sip_responses.session_timer)
+
+Nada de varredura periódica: a thread de timers dorme até o prazo mais
+próximo. Quando um prazo vence, a sessão é conferida (o receptor só
+anota o instante do último pacote); se ainda está viva, o prazo é
+recolocado adiante. Custo O(log n) por verificação, no máximo uma por
+sessão a cada rtp_timeout.
+"""
+
+# 64 * T1 (0,5 s): fim das retransmissões do 2xx
+ACK_TIMEOUT = 32.0
+
+
+class SessionReaper:
+
+    def __init__(self, server, rtp_timeout=60.0, ack_timeout=ACK_TIMEOUT):
+        self.server = server
+        self.clock = server.clock
+        self.rtp_timeout = rtp_timeout
+        self.ack_timeout = ack_timeout
+
+        self._timers = {}          # (Call-ID, tipo) → Timer ainda não vencido
+        # Os prazos correm desde o watch(); start() só religa após stop()
+        self._running = True
+        self.reaped = {"ack": 0, "rtp": 0, "timer": 0}
+
+    # ---------------------------------------------------------------
+    def watch(self, session):
+        """
+        Começa a vigiar a sessão (chamado depois do 200 OK).
+        """
+        now = self.clock.monotonic()
+        if session.state == "AWAITING_ACK":
+            self._schedule(now + self.ack_timeout, session.call_id, "ack")
+        self._schedule(now + self.rtp_timeout, session.call_id, "rtp")
+        if session.expires is not None:
+            self._schedule(session.refreshed + session.expires, session.call_id, "timer")
+
+    def _schedule(self, deadline, call_id, kind):
+        self._timers[call_id, kind] = self.clock.call_at(deadline, self._check, call_id, kind)
+
+    # ---------------------------------------------------------------
+    def start(self):
+        self._running = True
+
+    def stop(self):
+        """
+        Cancela todos os prazos (hot restart: as sessões vão para outro
+        processo).
+        """
+        self._running = False
+        for timer in list(self._timers.values()):
+            timer.cancel()
+        self._timers.clear()
+
+    # ---------------------------------------------------------------
+    def _check(self, call_id, kind):
+        self._timers.pop((call_id, kind), None)
+        if not self._running:
+            return
+        session = self.server.calls.get(call_id)
+        if session is None or session.state == "TERMINATED":
+            return      # BYE normal chegou antes: prazo descartado aqui
+
+        if kind == "ack":
+            if session.state != "AWAITING_ACK":
+                return
+            deadline = 0.0
+            reason = f"ACK não recebido em {self.ack_timeout:.0f}s"
+        elif kind == "rtp":
+            deadline = session.last_media() + self.rtp_timeout
+            reason = f"sem RTP há {self.rtp_timeout:.0f}s"
+        else:
+            if session.expires is None:
+                return  # re-INVITE renegociou sem timer
+            deadline = session.refreshed + session.expires
+            reason = f"Session-Expires ({session.expires}s) sem refresh"
+
+        if deadline > self.clock.monotonic():
+            self._schedule(deadline, call_id, kind)
+            return
+
+        if self.server.calls.pop(call_id, None) is session:
+            self.reaped[kind] += 1
+            print(f"💀 Encerrando {call_id}: {reason}")
+            session.hang_up(reason)
+
+    # ---------------------------------------------------------------
+    @property
+    def pending(self):
+        return len(self._timers)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+sim_network.py
+
+Rede de datagramas em memória para rodar o servidor inteiro sob um
+SimClock (clock.py): SIP, handlers, sessões e RTP sem socket de verdade
+e sem thread.
+
+    clock = SimClock()
+    net = SimNetwork(clock, latency=0.002)
+    server = SIPServer("10.0.0.10", 5060, clock=clock, network=net)
+    sbc = net.socket()
+    sbc.bind(("10.1.1.20", 5060))
+    sbc.sendto(invite, ("10.0.0.10", 5060))
+    clock.advance(1.0)
+    data, addr = sbc.recvfrom(65535)
+
+Cada sendto vira um evento no relógio, entregue depois de `latency`
+(perda opcional, determinística: random.Random(seed)). Na entrega o
+socket de destino chama on_datagram(data, addr), se tiver um (o
+servidor, os receptores RTP), ou guarda o datagrama para recvfrom.
+"""
+
+import errno
+import itertools
+import random
+from collections import deque
+
+
+class SimSocket:
+
+    def __init__(self, network):
+        self.network = network
+        self.addr = None
+        # Callback de entrega (data, addr); None = fila para recvfrom
+        self.on_datagram = None
+        self.inbox = deque()
+
+    # ---------------------------------------------------------------
+    def bind(self, addr):
+        self.network._bind(self, (addr[0], addr[1]))
+
+    def getsockname(self):
+        if self.addr is None:
+            return ("0.0.0.0", 0)
+        return self.addr
+
+    def settimeout(self, timeout):
+        pass
+
+    def setblocking(self, flag):
+        pass
+
+    def close(self):
+        self.network._unbind(self)
+
+    # ---------------------------------------------------------------
+    def sendto(self, data, addr):
+        if self.addr is None:
+            self.bind(("0.0.0.0", 0))
+        self.network._send(data, self.addr, addr)
+        return len(data)
+
+    def recvfrom(self, bufsize):
+        if not self.inbox:
+            raise BlockingIOError(errno.EAGAIN, "nenhum datagrama na fila")
+        data, addr = self.inbox.popleft()
+        return data[:bufsize], addr
+
+
+class SimNetwork:
+
+    def __init__(self, clock, latency=0.001, loss=0.0, seed=0):
+        self.clock = clock
+        self.latency = latency
+        self.loss = loss
+        self._rng = random.Random(seed)
+        self._bound = {}            # (ip, porta) → SimSocket
+        self._ephemeral = itertools.count(40000)
+
+        self.sent = 0
+        self.lost = 0
+        self.delivered = 0
+        self.unreachable = 0        # sem socket no destino
+
+    def socket(self):
+        return SimSocket(self)
+
+    # ---------------------------------------------------------------
+    def _bind(self, sock, addr):
+        host, port = addr
+        if port == 0:
+            port = next(p for p in self._ephemeral if (host, p) not in self._bound)
+        key = (host, port)
+        if key in self._bound:
+            raise OSError(errno.EADDRINUSE, "Address already in use")
+        self._bound[key] = sock
+        sock.addr = key
+
+    def _unbind(self, sock):
+        if sock.addr is not None and self._bound.get(sock.addr) is sock:
+            del self._bound[sock.addr]
+
+    # ---------------------------------------------------------------
+    def _send(self, data, src, dst):
+        self.sent += 1
+        if self.loss and self._rng.random() < self.loss:
+            self.lost += 1
+            return
+        self.clock.call_later(self.latency, self._deliver, bytes(data), src, (dst[0], dst[1]))
+
+    def _deliver(self, data, src, dst):
+        sock = self._bound.get(dst) or self._bound.get(("0.0.0.0", dst[1]))
+        if sock is None:
+            self.unreachable += 1
+            return
+        self.delivered += 1
+        if sock.on_datagram is not None:
+            sock.on_datagram(data, src)
+        else:
+            sock.inbox.append((data, src))
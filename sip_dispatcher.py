@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+sip_dispatcher.py
+
+Front SIP sem estado de chamada para escalar horizontalmente: recebe na
+5060 e escolhe um SIPServer de backend por hash consistente do Call-ID.
+
+Roteamento:
+- INVITE inicial → anel só com backends ativos; ganha um Record-Route
+  <sip:dispatcher;lr;bk=host-porta> que o backend devolve no 200 OK
+- ACK/BYE do diálogo chegam com Route apontando para o dispatcher; o
+  parâmetro bk leva direto ao mesmo nó, mesmo que o anel tenha mudado
+- sem Route (SBC que ignora Record-Route) → anel com ativos + drenando
+- respostas: o dispatcher tira a própria Via e segue a próxima
+
+Backends são verificados com OPTIONS; um nó removido fica "drenando"
+(não recebe chamadas novas, continua recebendo as do diálogo). Membros
+entram e saem em operação pelo socket de comandos (admin_socket.py):
+
+    backends             nós, estado e desde quando drenam
+    add host:porta       nó novo (ou de volta) no anel
+    remove host:porta    nó drenando até drain_timeout
+
+O loop de recepção não toma o lock: lê um retrato imutável dos membros
+(_view), trocado inteiro a cada mudança.
+
+Uso:
+    python sip_dispatcher.py --backends 10.0.0.11:5060,10.0.0.12:5060
+    python sip_dispatcher.py --spawn 3       # 3 backends locais (loopback)
+    python sip_dispatcher.py --backends ... --admin-socket /tmp/dispatcher.sock
+    python admin_socket.py /tmp/dispatcher.sock remove 10.0.0.12:5060
+"""
+
+import argparse
+import bisect
+import hashlib
+import multiprocessing
+import os
+import re
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from sip_parser import CRLF
+
+_BK_PARAM = re.compile(r";bk=([\w.\-]+)")
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+def backend_name(addr):
+    return f"{addr[0]}-{addr[1]}"
+
+
+# ============================================================
+# ANEL DE HASH CONSISTENTE
+# ============================================================
+class HashRing:
+
+    def __init__(self, nodes=(), vnodes=160):
+        self.vnodes = vnodes
+        self._ring = ([], [])
+        self.rebuild(nodes)
+
+    def rebuild(self, nodes):
+        ring = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in nodes
+            for i in range(self.vnodes)
+        )
+        # Troca única: lookup sem lock nunca vê pontos e donos de versões diferentes
+        self._ring = ([p for p, _ in ring], [n for _, n in ring])
+
+    def lookup(self, key):
+        points, owners = self._ring
+        if not points:
+            return None
+        i = bisect.bisect(points, _hash(key)) % len(points)
+        return owners[i]
+
+
+# ============================================================
+# MANIPULAÇÃO DE CABEÇALHOS (sem parse completo)
+# ============================================================
+def split_message(text):
+    head, sep, body = text.partition(CRLF + CRLF)
+    return head.split(CRLF), body
+
+
+def header_value(lines, *names):
+    names = tuple(n.lower() for n in names)
+    for line in lines[1:]:
+        k, _, v = line.partition(":")
+        if k.strip().lower() in names:
+            return v.strip()
+    return None
+
+
+def header_index(lines, *names):
+    names = tuple(n.lower() for n in names)
+    for i, line in enumerate(lines[1:], 1):
+        if line.partition(":")[0].strip().lower() in names:
+            return i
+    return None
+
+
+def via_target(via):
+    """
+    Endereço para onde a resposta deve seguir, pela Via (RFC 3581).
+    """
+    sent_by = via.split()[1].split(";")[0]
+    host, _, port = sent_by.partition(":")
+    params = dict(
+        p.split("=", 1) if "=" in p else (p, "")
+        for p in via.split(";")[1:]
+    )
+    host = params.get("received") or host
+    port = params.get("rport") or port or "5060"
+    return host, int(port)
+
+
+# ============================================================
+# DISPATCHER
+# ============================================================
+class Dispatcher:
+
+    def __init__(self, host="0.0.0.0", port=5060, backends=(),
+                 advertise_ip=None, check_interval=2.0, fail_after=3,
+                 drain_timeout=1800):
+        self.host = host
+        self.port = port
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.port = self.sock.getsockname()[1]
+        self.ip = advertise_ip or (host if host != "0.0.0.0" else "127.0.0.1")
+
+        self.check_interval = check_interval
+        self.fail_after = fail_after
+        self.drain_timeout = drain_timeout
+
+        # nome → {"addr", "state", "missed", "drain_since"}; só com _lock
+        self.backends = {}
+        # Retrato para o loop de recepção: (nome → (addr, estado),
+        # addr → nome); refeito em _rebuild, nunca alterado depois
+        self._view = ({}, {})
+        self._ring_new = HashRing()       # chamadas novas: só ativos
+        self._ring_dialog = HashRing()    # diálogo: ativos + drenando
+        self._lock = threading.Lock()
+
+        # Call-ID → SBC, só para requisições que nascem no backend (BYE do SRS)
+        self._origins = OrderedDict()
+        self.max_origins = 100000
+
+        self.forwarded = 0
+        self.malformed = 0
+        for addr in backends:
+            self.add_backend(addr)
+
+    # ---------------------------------------------------------------
+    # MEMBROS
+    # ---------------------------------------------------------------
+    def _rebuild(self):
+        # Sempre com _lock
+        self._view = (
+            {n: (b["addr"], b["state"]) for n, b in self.backends.items()},
+            {b["addr"]: n for n, b in self.backends.items()},
+        )
+        active = [n for n, b in self.backends.items() if b["state"] == "active"]
+        serving = active + [
+            n for n, b in self.backends.items() if b["state"] == "draining"
+        ]
+        self._ring_new.rebuild(active)
+        self._ring_dialog.rebuild(serving)
+
+    def add_backend(self, addr):
+        addr = (addr[0], int(addr[1]))
+        with self._lock:
+            self.backends[backend_name(addr)] = {
+                "addr": addr, "state": "active", "missed": 0,
+                "drain_since": None,
+            }
+            self._rebuild()
+        print(f"➕ Backend {addr[0]}:{addr[1]} ativo")
+
+    def remove_backend(self, addr):
+        """
+        Não remove de imediato: o nó para de receber chamadas novas e
+        continua atendendo os diálogos até drain_timeout.
+        """
+        name = backend_name((addr[0], int(addr[1])))
+        with self._lock:
+            b = self.backends.get(name)
+            if b is None:
+                return False
+            b["state"] = "draining"
+            b["drain_since"] = time.monotonic()
+            self._rebuild()
+        print(f"⏳ Backend {addr[0]}:{addr[1]} drenando")
+        return True
+
+    def members(self):
+        """
+        [(nome, estado, segundos drenando ou None)].
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [(n, b["state"],
+                     round(now - b["drain_since"]) if b["drain_since"] is not None else None)
+                    for n, b in sorted(self.backends.items())]
+
+    # ---------------------------------------------------------------
+    # ROTEAMENTO
+    # ---------------------------------------------------------------
+    def pick_backend(self, lines):
+        """
+        Backend de uma requisição vinda do SBC.
+        """
+        route_idx = header_index(lines, "Route")
+        if route_idx is not None:
+            m = _BK_PARAM.search(lines[route_idx])
+            b = self._view[0].get(m.group(1)) if m else None
+            if b and b[1] != "down":
+                return m.group(1)
+
+        call_id = header_value(lines, "Call-ID", "i") or ""
+        to_hdr = header_value(lines, "To", "t") or ""
+        if ";tag=" in to_hdr:
+            return self._ring_dialog.lookup(call_id)
+        return self._ring_new.lookup(call_id)
+
+    def _our_via(self, lines):
+        # Branch determinístico: retransmissões geram a mesma Via
+        seed = "|".join(
+            header_value(lines, n) or "" for n in ("Via", "Call-ID", "CSeq")
+        )
+        branch = "z9hG4bKdsp" + hashlib.md5(seed.encode()).hexdigest()[:16]
+        return f"Via: SIP/2.0/UDP {self.ip}:{self.port};branch={branch}"
+
+    def forward_request(self, lines, body, addr):
+        method = lines[0].split(" ", 1)[0]
+        members, addrs = self._view
+        from_backend = addrs.get(addr)
+
+        if from_backend:
+            # BYE gerado pelo SRS: volta para o SBC que abriu a chamada
+            call_id = header_value(lines, "Call-ID", "i")
+            target = self._origins.get(call_id)
+            if target is None:
+                print(f"⚠ Sem origem conhecida para {call_id}")
+                return
+        else:
+            name = self.pick_backend(lines)
+            member = members.get(name)
+            if member is None:
+                print("⚠ Nenhum backend disponível")
+                return
+            target = member[0]
+
+            # Tira o nosso Route do topo (loose routing)
+            route_idx = header_index(lines, "Route")
+            if route_idx is not None and f"{self.ip}:{self.port}" in lines[route_idx]:
+                del lines[route_idx]
+
+            # rport/received na Via do SBC (RFC 3581), já que somos o 1º salto
+            via_idx = header_index(lines, "Via", "v")
+            if via_idx is not None:
+                lines[via_idx] = re.sub(
+                    r";rport(?=;|$)",
+                    f";rport={addr[1]};received={addr[0]}",
+                    lines[via_idx]
+                )
+
+            if method == "INVITE" and from_backend is None:
+                call_id = header_value(lines, "Call-ID", "i")
+                self._remember_origin(call_id, addr)
+                if ";tag=" not in (header_value(lines, "To", "t") or ""):
+                    lines.insert(1, f"Record-Route: <sip:{self.ip}:{self.port};"
+                                    f"lr;bk={name}>")
+
+        mf_idx = header_index(lines, "Max-Forwards")
+        if mf_idx is not None:
+            mf = int(lines[mf_idx].split(":", 1)[1]) - 1
+            if mf < 0:
+                return
+            lines[mf_idx] = f"Max-Forwards: {mf}"
+
+        lines.insert(1, self._our_via(lines))
+        self._send(lines, body, target)
+
+    def forward_response(self, lines, body):
+        via_idx = header_index(lines, "Via", "v")
+        if via_idx is None or f"{self.ip}:{self.port}" not in lines[via_idx]:
+            return
+        del lines[via_idx]
+
+        next_via = header_index(lines, "Via", "v")
+        if next_via is None:
+            return
+        target = via_target(lines[next_via].split(":", 1)[1].strip())
+        self._send(lines, body, target)
+
+    def _remember_origin(self, call_id, addr):
+        self._origins[call_id] = addr
+        self._origins.move_to_end(call_id)
+        if len(self._origins) > self.max_origins:
+            self._origins.popitem(last=False)
+
+    def _send(self, lines, body, target):
+        data = (CRLF.join(lines) + CRLF + CRLF + body).encode()
+        self.sock.sendto(data, target)
+        self.forwarded += 1
+
+    # ---------------------------------------------------------------
+    # HEALTH CHECK
+    # ---------------------------------------------------------------
+    def _health_loop(self):
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                changed = False
+                for name, b in list(self.backends.items()):
+                    if (b["state"] == "draining"
+                            and now - b["drain_since"] > self.drain_timeout):
+                        del self.backends[name]
+                        changed = True
+                        print(f"➖ Backend {name} removido após drenar")
+                        continue
+
+                    b["missed"] += 1
+                    if b["missed"] > self.fail_after and b["state"] == "active":
+                        b["state"] = "down"
+                        changed = True
+                        print(f"❌ Backend {name} sem resposta — fora do anel")
+                if changed:
+                    self._rebuild()
+
+            for name, (addr, _) in self._view[0].items():
+                self.sock.sendto(self._options(name, addr), addr)
+
+            time.sleep(self.check_interval)
+
+    def _options(self, name, addr):
+        host, port = addr
+        return CRLF.join([
+            f"OPTIONS sip:{host}:{port} SIP/2.0",
+            f"Via: SIP/2.0/UDP {self.ip}:{self.port};branch=z9hG4bKhc{int(time.time())}",
+            f"From: <sip:dispatcher@{self.ip}>;tag=hc",
+            f"To: <sip:{host}:{port}>",
+            f"Call-ID: hc-{name}@{self.ip}",
+            "CSeq: 1 OPTIONS",
+            "Max-Forwards: 70",
+            "Content-Length: 0",
+            "", ""
+        ]).encode()
+
+    def _health_reply(self, call_id):
+        name = call_id[3:].split("@")[0]
+        with self._lock:
+            b = self.backends.get(name)
+            if b is None:
+                return
+            b["missed"] = 0
+            if b["state"] == "down":
+                b["state"] = "active"
+                self._rebuild()
+                print(f"✔ Backend {name} voltou")
+
+    # ---------------------------------------------------------------
+    def start(self):
+        print(f"📡 SIP dispatcher listening on {self.host}:{self.port}")
+        threading.Thread(target=self._health_loop, daemon=True).start()
+
+        while True:
+            data, addr = self.sock.recvfrom(65535)
+            # Uma mensagem malformada (Max-Forwards não numérico, Via sem
+            # sent-by, destino que não resolve) é descartada; o loop é o
+            # único caminho de tráfego para todos os backends
+            try:
+                self.handle(data, addr)
+            except (ValueError, IndexError, OSError) as e:
+                self.malformed += 1
+                print(f"⚠ Mensagem de {addr[0]}:{addr[1]} descartada: "
+                      f"{type(e).__name__}: {e}")
+
+    def handle(self, data, addr):
+        text = data.decode("utf-8", errors="ignore")
+        lines, body = split_message(text)
+        if not lines or not lines[0]:
+            return
+
+        if lines[0].startswith("SIP/2.0"):
+            call_id = header_value(lines, "Call-ID", "i") or ""
+            if call_id.startswith("hc-"):
+                self._health_reply(call_id)
+            else:
+                self.forward_response(lines, body)
+        else:
+            self.forward_request(lines, body, addr)
+
+
+# ============================================================
+# COMANDOS DE OPERAÇÃO
+# ============================================================
+def install_admin(dispatcher, admin):
+    """
+    Membros do anel pelo AdminSocket (admin_socket.py).
+    """
+    def parse(args):
+        host, _, port = (args[0] if args else "").rpartition(":")
+        if not host or not port.isdigit():
+            raise ValueError("uso: add|remove host:porta")
+        return host, int(port)
+
+    def backends(args):
+        return "\n".join(
+            f"{name} {state}" + (f" {since}s" if since is not None else "")
+            for name, state, since in dispatcher.members()
+        ) or "nenhum backend"
+
+    def add(args):
+        dispatcher.add_backend(parse(args))
+        return "OK"
+
+    def remove(args):
+        return "OK drenando" if dispatcher.remove_backend(parse(args)) else "ERR backend desconhecido"
+
+    admin.command("backends", backends)
+    admin.command("add", add)
+    admin.command("remove", remove)
+
+
+# ============================================================
+# BACKENDS LOCAIS (teste em loopback)
+# ============================================================
+def _run_backend(host, port):
+    sys.stdout = open(os.devnull, "w")
+    from server_siprec import SIPServer
+    SIPServer(host, port).start()
+
+
+def spawn_backends(count, host="127.0.0.1", first_port=5071):
+    procs, addrs = [], []
+    for i in range(count):
+        addr = (host, first_port + i)
+        p = multiprocessing.Process(target=_run_backend, args=addr, daemon=True)
+        p.start()
+        procs.append(p)
+        addrs.append(addr)
+    return procs, addrs
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Dispatcher SIPREC por Call-ID")
+    ap.add_argument("--listen", default="0.0.0.0:5060")
+    ap.add_argument("--advertise", help="IP anunciado em Via/Record-Route")
+    ap.add_argument("--backends", default="",
+                    help="host:porta separados por vírgula")
+    ap.add_argument("--spawn", type=int, default=0,
+                    help="sobe N backends locais em 127.0.0.1:5071+")
+    ap.add_argument("--admin-socket", metavar="PATH",
+                    help="socket Unix de comandos (backends, add, remove)")
+    ap.add_argument("--drain-timeout", type=float, default=1800,
+                    help="segundos que um backend removido ainda atende diálogos")
+    args = ap.parse_args()
+
+    backends = [
+        (h, int(p)) for h, p in
+        (b.rsplit(":", 1) for b in args.backends.split(",") if b)
+    ]
+    if args.spawn:
+        backends += spawn_backends(args.spawn)[1]
+
+    host, port = args.listen.rsplit(":", 1)
+    dispatcher = Dispatcher(host, int(port), backends, advertise_ip=args.advertise,
+                            drain_timeout=args.drain_timeout)
+    if args.admin_socket:
+        from admin_socket import AdminSocket
+        admin = AdminSocket(args.admin_socket)
+        install_admin(dispatcher, admin)
+        admin.start()
+    dispatcher.start()
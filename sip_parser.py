@@ -8,11 +8,13 @@ Suporta:
 - Via params reordering
 - Multipart/mixed SIPREC (SDP + XML)
 - SDP com múltiplas mídias (SIPREC dual stream)
+- rs-metadata (RFC 7865): session_id e participantes
 
 Autor: Maicon Roger
 """
 
 import re
+import xml.etree.ElementTree as ET
 
 CRLF = "\r\n"
 
@@ -64,6 +66,14 @@ def parse_sip_message(raw: str):
     }
 
 
+def header_tag(value):
+    """
+    Parâmetro tag de um From/To ("<sip:a@b>;tag=x" → "x"), ou None.
+    """
+    m = re.search(r";\s*tag=([^;>\s]+)", value or "")
+    return m.group(1) if m else None
+
+
 # ============================================================
 # 2) REORDER VIA PARAMETERS
 # ============================================================
@@ -239,7 +249,50 @@ def parse_sdp(raw_sdp: str):
 
 
 # ============================================================
-# 5) TESTE LOCAL
+# 5) PARSER RS-METADATA (RFC 7865)
+# ============================================================
+def _local(tag):
+    # "{urn:ietf:params:xml:ns:recording:1}participant" → "participant"
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_rs_metadata(raw_xml: str):
+    """
+    Retorna:
+    {
+        "session_id": "MIgZ2nTLEemWFaQi1vyb4Q==" | None,
+        "participants": [ {"id": ..., "aor": ..., "name": ...}, ... ]
+    }
+    XML inválido devolve a estrutura vazia.
+    """
+    result = {"session_id": None, "participants": []}
+    if not raw_xml or not raw_xml.strip():
+        return result
+    try:
+        root = ET.fromstring(raw_xml.strip())
+    except ET.ParseError:
+        return result
+
+    for node in root:
+        tag = _local(node.tag)
+        if tag == "session" and result["session_id"] is None:
+            result["session_id"] = node.get("session_id")
+        elif tag == "participant":
+            for name_id in node:
+                if _local(name_id.tag) != "nameID":
+                    continue
+                name = next((c.text for c in name_id if _local(c.tag) == "name"), None)
+                result["participants"].append({
+                    "id": node.get("participant_id"),
+                    "aor": name_id.get("aor"),
+                    "name": name.strip() if name else None,
+                })
+
+    return result
+
+
+# ============================================================
+# 6) TESTE LOCAL
 # ============================================================
 if __name__ == "__main__":
     print("✔ Módulo sip_parser carregado corretamente.")
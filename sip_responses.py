@@ -6,12 +6,79 @@ Funções profissionais para montar respostas SIP para SIPREC UAS.
 Todas as funções recebem parâmetros externos (sem make_tag interno).
 """
 
+import random
+
 from sip_parser import (
     CRLF,
     reorder_via_params,
     parse_multipart,
     parse_sdp
 )
+from media_policy import MediaPolicy, answer_lines, legacy_streams
+
+# Session-Expires pedido quando o UAC suporta timer sem propor um valor
+SESSION_EXPIRES = 1800
+
+
+# ============================================================
+# VIA / RECORD-ROUTE (podem vir repetidos quando há proxy no meio)
+# ============================================================
+def split_vias(hdr):
+    """
+    Retorna (Via do topo, [Vias seguintes]). Só o topo é ajustado
+    (rport/received); as demais voltam como vieram, na mesma ordem.
+    """
+    vias = hdr.get("Via", "")
+    if isinstance(vias, list):
+        return vias[0], vias[1:]
+    return vias, []
+
+
+def header_lines(hdr, name):
+    """
+    Linhas "Nome: valor" de um cabeçalho que pode se repetir.
+    """
+    values = hdr.get(name)
+    if values is None:
+        return []
+    if not isinstance(values, list):
+        values = [values]
+    return [f"{name}: {v}" for v in values]
+
+
+def _header(hdr, name, compact):
+    value = hdr.get(name, hdr.get(compact))
+    return value[0] if isinstance(value, list) else value
+
+
+# ============================================================
+# SESSION TIMER (RFC 4028)
+# ============================================================
+def session_timer(hdr):
+    """
+    Session timer da resposta ao INVITE: (segundos, refresher) ou None.
+
+    Não mandamos refresh: com o UAC suportando timer, o refresher é ele
+    ("uac", com Require: timer na resposta) e o reaper encerra a chamada
+    se o re-INVITE não vier. Se o UAC pediu refresher=uas, a resposta
+    repete (§9), mas o prazo não é nosso. Sem suporte do UAC: sem timer.
+    """
+    supported = _header(hdr, "Supported", "k") or ""
+    if "timer" not in [s.strip() for s in supported.split(",")]:
+        return None
+
+    interval, refresher = SESSION_EXPIRES, "uac"
+    offered = _header(hdr, "Session-Expires", "x")
+    if offered:
+        value, *params = [p.strip() for p in offered.split(";")]
+        if value.isdigit():
+            interval = min(interval, int(value))     # pode reduzir, não aumentar
+        if "refresher=uas" in [p.lower().replace(" ", "") for p in params]:
+            refresher = "uas"
+    min_se = _header(hdr, "Min-SE", "Min-SE")
+    if min_se and min_se.split(";", 1)[0].strip().isdigit():
+        interval = max(interval, int(min_se.split(";", 1)[0]))
+    return interval, refresher
 
 
 # ============================================================
@@ -22,7 +89,7 @@ def sip_response_100_trying(sip, server_ip):
     Gera SIP/2.0 100 Trying (UAS responding to INVITE).
     """
     hdr = sip["headers"]
-    via = hdr.get("Via", "")
+    via, other_vias = split_vias(hdr)
     from_hdr = hdr.get("From", "")
     to_hdr = hdr.get("To", "")
     call_id = hdr.get("Call-ID", "")
@@ -35,6 +102,7 @@ def sip_response_100_trying(sip, server_ip):
     resp = [
         "SIP/2.0 100 Trying",
         f"Via: {via}",
+        *[f"Via: {v}" for v in other_vias],
         f"From: {from_hdr}",
         f"To: {to_hdr}",
         f"Call-ID: {call_id}",
@@ -52,20 +120,41 @@ def sip_response_100_trying(sip, server_ip):
 def sip_response_200_ok_invite_siprec(invite, server_ip, to_tag,
                                       addr=None,
                                       media_port1=10000,
-                                      media_port2=10002):
+                                      media_port2=10002,
+                                      transport=None,
+                                      labels=None,
+                                      streams=None,
+                                      ports=None,
+                                      timer=None,
+                                      contact_port=None):
     """
     Gera SIP/2.0 200 OK para INVITE SIPREC.
-    Inclui SDP SIPREC (dual stream).
+    Inclui SDP SIPREC com um m= por m= da oferta (N fluxos, áudio e vídeo;
+    recusados com porta 0 — ver media_policy.py).
+    Com transport="tcp"/"tls" o Contact pede que o diálogo siga no mesmo
+    transporte (ACK/BYE pela conexão persistente).
+    streams/ports: MediaStream já negociados e {índice do m=: porta} (é
+    o que a SipSession passa). Sem streams: labels dos fluxos conhecidos
+    (áudio G.711), ou a oferta lida do SDP do INVITE com a política
+    padrão; as portas saem de media_port1, media_port2, +2...
+    timer: (segundos, refresher) já negociado; sem ele, session_timer()
+    do INVITE.
+    contact_port: porta em que o servidor escuta nesse transporte (padrão
+    5060, ou 5061 em TLS).
     """
     hdr = invite["headers"]
 
-    via = hdr.get("Via", "")
+    via, other_vias = split_vias(hdr)
     from_hdr = hdr.get("From", "")
     to_hdr = hdr.get("To", "")
     call_id = hdr.get("Call-ID", "")
     cseq = hdr.get("CSeq", "")
 
-    contact = f"<sip:{server_ip}:5060>;sip.srs"
+    if contact_port is None:
+        contact_port = 5061 if transport == "tls" else 5060
+    contact = f"<sip:{server_ip}:{contact_port}>;sip.srs"
+    if transport in ("tcp", "tls"):
+        contact = f"<sip:{server_ip}:{contact_port};transport={transport}>;sip.srs"
 
     # Ajuste rport/received
     if "rport" in via:
@@ -74,10 +163,27 @@ def sip_response_200_ok_invite_siprec(invite, server_ip, to_tag,
 
     via = reorder_via_params(via)
 
-    # SDP recebido (para extrair labels dos fluxos)
-    parts = parse_multipart(invite["body"], hdr.get("Content-Type", ""))
-    raw_sdp = parts.get("application/sdp", "")
-    sdp_info = parse_sdp(raw_sdp)
+    # Fluxos da oferta
+    if streams is None:
+        if labels is not None:
+            streams = legacy_streams(labels)
+        else:
+            parts = parse_multipart(invite["body"], hdr.get("Content-Type", ""))
+            raw_sdp = parts.get("application/sdp", "")
+            streams = MediaPolicy().negotiate(parse_sdp(raw_sdp)["media"])
+    if ports is None:
+        ports = {}
+        accepted = [st.index for st in streams if st.accepted]
+        for n, index in enumerate(accepted):
+            ports[index] = media_port1 if n == 0 else media_port2 + 2 * (n - 1)
+
+    if timer is None:
+        timer = session_timer(hdr)
+    timer_lines = []
+    if timer is not None:
+        timer_lines.append(f"Session-Expires: {timer[0]};refresher={timer[1]}")
+        if timer[1] == "uac":
+            timer_lines.append("Require: timer")
 
     # Construção do SDP de resposta
     session_block = [
@@ -88,34 +194,26 @@ def sip_response_200_ok_invite_siprec(invite, server_ip, to_tag,
         "t=0 0",
     ]
 
-    sdp1 = [
-        f"m=audio {media_port1} RTP/AVP 0 8",
-        "a=rtpmap:0 PCMU/8000",
-        "a=rtpmap:8 PCMA/8000",
-        f"a=label:{sdp_info['media'][0]['label']}",
-        "a=recvonly",
-    ]
-
-    sdp2 = [
-        f"m=audio {media_port2} RTP/AVP 0 8",
-        "a=rtpmap:0 PCMU/8000",
-        "a=rtpmap:8 PCMA/8000",
-        f"a=label:{sdp_info['media'][1]['label']}",
-        "a=recvonly",
-    ]
+    media_blocks = []
+    for st in streams:
+        media_blocks += answer_lines(st, ports.get(st.index, 0))
 
-    body = CRLF.join(session_block + sdp1 + sdp2)
+    body = CRLF.join(session_block + media_blocks)
 
     resp = [
         "SIP/2.0 200 OK",
         f"Via: {via}",
+        *[f"Via: {v}" for v in other_vias],
+        # RFC 3261 §12.1.1: Record-Route volta igual, para o diálogo
+        # seguir pelos proxies (ex.: sip_dispatcher.py)
+        *header_lines(hdr, "Record-Route"),
         f"From: {from_hdr}",
         f"To: {to_hdr};tag={to_tag}",
         f"Call-ID: {call_id}",
         f"CSeq: {cseq}",
         "Supported: siprec,timer",
         f"Contact: {contact}",
-        "Session-Expires: 1800;refresher=uas",
+        *timer_lines,
         "Content-Type: application/sdp",
         f"Content-Length: {len(body.encode())}",
         "",
@@ -135,7 +233,8 @@ def sip_response_200_ok_options(options, server_ip, to_tag):
     """
     hdr = options["headers"]
 
-    via = reorder_via_params(hdr.get("Via", ""))
+    via, other_vias = split_vias(hdr)
+    via = reorder_via_params(via)
     from_hdr = hdr.get("From", "")
     to_hdr = hdr.get("To", "")
     call_id = hdr.get("Call-ID", "")
@@ -144,6 +243,7 @@ def sip_response_200_ok_options(options, server_ip, to_tag):
     resp = [
         "SIP/2.0 200 OK",
         f"Via: {via}",
+        *[f"Via: {v}" for v in other_vias],
         f"From: {from_hdr}",
         f"To: {to_hdr};tag={to_tag}",
         f"Call-ID: {call_id}",
@@ -172,7 +272,8 @@ def sip_response_200_ok_bye(sip):
     """
     hdr = sip["headers"]
 
-    via = reorder_via_params(hdr.get("Via", ""))
+    via, other_vias = split_vias(hdr)
+    via = reorder_via_params(via)
     from_hdr = hdr.get("From", "")
     to_hdr = hdr.get("To", "")
     call_id = hdr.get("Call-ID", "")
@@ -181,6 +282,7 @@ def sip_response_200_ok_bye(sip):
     resp = [
         "SIP/2.0 200 OK",
         f"Via: {via}",
+        *[f"Via: {v}" for v in other_vias],
         f"From: {from_hdr}",
         f"To: {to_hdr}",
         f"Call-ID: {call_id}",
@@ -190,3 +292,85 @@ def sip_response_200_ok_bye(sip):
     ]
 
     return CRLF.join(resp) + CRLF
+
+
+# ============================================================
+# 488 (re-INVITE com mídia que não acompanhamos)
+# ============================================================
+def sip_response_488(sip):
+    """
+    Gera SIP/2.0 488 Not Acceptable Here para um re-INVITE: a oferta
+    nova é recusada e o diálogo segue com a mídia que já tinha
+    (RFC 3261 §14.2). O To já traz o nosso tag.
+    """
+    hdr = sip["headers"]
+
+    via, other_vias = split_vias(hdr)
+    via = reorder_via_params(via)
+
+    resp = [
+        "SIP/2.0 488 Not Acceptable Here",
+        f"Via: {via}",
+        *[f"Via: {v}" for v in other_vias],
+        f"From: {hdr.get('From', '')}",
+        f"To: {hdr.get('To', '')}",
+        f"Call-ID: {hdr.get('Call-ID', '')}",
+        f"CSeq: {hdr.get('CSeq', '')}",
+        "Content-Length: 0",
+        ""
+    ]
+
+    return CRLF.join(resp) + CRLF
+
+
+# ============================================================
+# BYE (nosso lado encerrando o diálogo)
+# ============================================================
+def build_bye(invite, server_ip, addr=None, to_tag=None, reason=None,
+              local_port=5060):
+    """
+    Monta uma requisição BYE válida para o peer do INVITE.
+
+    Com to_tag, o BYE sai do nosso lado do diálogo (UAS encerrando a
+    chamada): Via própria, From/To invertidos e Request-URI no Contact do
+    peer. reason vira um cabeçalho Reason (RFC 3326).
+    """
+    hdr = invite["headers"]
+    via, _ = split_vias(hdr)
+    from_hdr = hdr.get("From", "")
+    to_hdr = hdr.get("To", "")
+    call_id = hdr.get("Call-ID", "")
+    cseq_num = int(hdr.get("CSeq", "1").split()[0])
+    cseq = f"{cseq_num + 1} BYE"
+
+    # Usa o endereço real do peer se disponível
+    peer_uri = f"sip:{addr[0]}:{addr[1]}" if addr else "sip:callee@server"
+    contact = hdr.get("Contact", f"<sip:{server_ip}>")
+
+    if to_tag is not None:
+        if "<" in contact:
+            peer_uri = contact.split("<", 1)[1].split(">", 1)[0]
+        branch = "z9hG4bK" + str(random.randint(10**9, 10**10))
+        via = f"SIP/2.0/UDP {server_ip}:{local_port};rport;branch={branch}"
+        from_hdr, to_hdr = f"{to_hdr};tag={to_tag}", from_hdr
+        cseq = "1 BYE"
+        contact = f"<sip:{server_ip}:{local_port}>"
+
+    req = [
+        f"BYE {peer_uri} SIP/2.0",
+        f"Via: {via}",
+        "Max-Forwards: 70",
+        f"From: {from_hdr}",
+        f"To: {to_hdr}",
+        f"Call-ID: {call_id}",
+        f"CSeq: {cseq}",
+        f"Contact: {contact}",
+    ]
+    if reason:
+        req.append(f'Reason: SIP;cause=200;text="{reason}"')
+    req += [
+        "Content-Length: 0",
+        ""
+    ]
+
+    return CRLF.join(req) + CRLF
@@ -3,81 +3,627 @@
 sip_session.py
 
 Controla sessão criada por INVITE SIPREC.
+
+A sessão é compacta (__slots__): guarda só o necessário para o diálogo —
+Call-ID internado, cabeçalhos de diálogo, tag, peer, fluxos, receptores e
+estado (e, para o catálogo, Session-ID, codec e participantes). O INVITE
+completo (corpo com SDP e rs-metadata) não fica em memória; com
+server.invite_dir ele é gravado em disco e relido sob demanda
+(load_invite).
 """
 
-import time
+import enum
+import json
+import os
+import sys
 import threading
 
 from sip_responses import (
     sip_response_100_trying,
     sip_response_200_ok_invite_siprec,
-    sip_response_200_ok_bye
+    sip_response_200_ok_bye,
+    sip_response_488,
+    build_bye,
+    session_timer,
+    SESSION_EXPIRES
 )
 
-from sip_parser import parse_multipart, parse_sdp
+from sip_parser import parse_multipart, parse_sdp, parse_rs_metadata
 from utils import make_tag
+from rtp_receiver import RtpReceiver, RECORDINGS_DIR, safe_call_id
+from voice_activity import VoiceActivityDetector
+from media_policy import AUDIO_CODECS, MediaStream, clock_rate, legacy_streams
+from srtp import SrtpStream
+from call_trace import (
+    TRACE, INVITE_RX, TRYING_TX, OK_TX, ACK_RX, BYE_RX, BYE_OK_TX, FILE_DONE
+)
+
+# Cabeçalhos do INVITE necessários para continuar o diálogo (respostas,
+# BYE, restart); o resto do INVITE é descartado
+DIALOG_HEADERS = ("Via", "From", "To", "Call-ID", "CSeq", "Contact",
+                  "Record-Route")
+
+# Sessão SRTP retomada do journal (crash): o ROC de antes se perdeu e o
+# primeiro pacote é tentado com ROC 0..ROC_SEARCH (~6 h de fluxo a 50 pps)
+ROC_SEARCH = 16
+
+# Contagem de receptores abertos (raro: só no fim de cada fluxo); um lock
+# global em vez de um por sessão
+_media_lock = threading.Lock()
+
+
+class CallState(str, enum.Enum):
+    """
+    str: compara com "CONFIRMED" etc. e vai direto para o JSON do journal.
+    """
+    EARLY = "EARLY"
+    AWAITING_ACK = "AWAITING_ACK"
+    CONFIRMED = "CONFIRMED"
+    TERMINATED = "TERMINATED"
+
+
+def invite_path(call_id, out_dir):
+    return os.path.join(out_dir, f"{safe_call_id(call_id)}.invite.json")
+
+
+def metadata_path(call_id, out_dir=RECORDINGS_DIR):
+    return os.path.join(out_dir, f"{safe_call_id(call_id)}.meta.json")
+
+
+def media_key(streams):
+    """
+    O que a gravação de cada fluxo depende da oferta: m=, tipo, label,
+    aceito, formatos e a chave SRTP do SBC (sem a nossa, que é sorteada).
+    """
+    return [(st.index, st.kind, st.label, st.accepted, st.fmts,
+             st.crypto and st.crypto[:2]) for st in streams]
+
+
+def negotiated_codec(streams):
+    """
+    Codec preferido do primeiro fluxo de áudio aceito ("PCMU", "PCMA").
+    """
+    for st in streams:
+        if st.accepted and st.kind == "audio":
+            return AUDIO_CODECS[st.fmts[0]].split("/", 1)[0]
+    return None
 
 
 class SipSession:
 
+    __slots__ = (
+        "server", "peer", "server_ip", "call_id", "headers", "to_tag",
+        "state", "started", "refreshed", "timer", "streams", "trace_idx", "receivers",
+        "invite_file", "_media_open", "session_id", "codec", "participants",
+    )
+
     def __init__(self, server, sip_invite, peer_addr):
         self.server = server
-        self.invite = sip_invite
-        self.peer = peer_addr
+        self.peer = tuple(peer_addr)
         self.server_ip = server.get_external_ip()
 
         hdr = sip_invite["headers"]
-        self.call_id = hdr.get("Call-ID")
+        self.call_id = sys.intern(hdr.get("Call-ID") or "")
+        self.headers = {k: hdr[k] for k in DIALOG_HEADERS if k in hdr}
         self.to_tag = make_tag()          # ← tag da sessão
-        self.state = "EARLY"
-        self.ack_received = False
+        self.state = CallState.EARLY
+        self.started = server.clock.time()
+        self.refreshed = server.clock.monotonic()   # último INVITE/re-INVITE (timer)
+        # (segundos, refresher) do Session-Expires da resposta, ou None
+        self.timer = session_timer(hdr)
 
-        # SDP do INVITE
+        # SDP do INVITE: só os fluxos negociados ficam (media_policy.py)
         parts = parse_multipart(
             sip_invite["body"],
             hdr.get("Content-Type", "")
         )
         raw_sdp = parts.get("application/sdp", "")
-        self.sdp_info = parse_sdp(raw_sdp)
+        media = parse_sdp(raw_sdp)["media"]
+        self.streams = server.media_policy.negotiate(media)
+        self.codec = negotiated_codec(self.streams)
+
+        # Session-ID do SBC (RFC 7989, só o UUID local); sem o cabeçalho, o
+        # session_id do rs-metadata. Participantes só com catálogo ligado
+        # (é o único consumidor; evita o parse de XML por INVITE)
+        self.session_id = (hdr.get("Session-ID") or "").split(";", 1)[0].strip() or None
+        self.participants = ()
+        if server.catalog is not None:
+            meta = parse_rs_metadata(parts.get("application/rs-metadata+xml", ""))
+            self.session_id = self.session_id or meta["session_id"]
+            self.participants = tuple((p["aor"], p["name"]) for p in meta["participants"])
+
+        # Linha do tempo da chamada (ver call_trace.py)
+        self.trace_idx = TRACE.register(self.call_id, self.labels)
+        TRACE.record(INVITE_RX, self.trace_idx, ts=sip_invite.get("received_ns"))
+
+        self.receivers = []
+        self._media_open = 0
+        self.invite_file = self._spill(sip_invite)
+
+    # ---------------------------------------------------------------
+    def _spill(self, sip_invite):
+        """
+        Grava o INVITE original em disco (se server.invite_dir); a sessão
+        guarda só o caminho.
+        """
+        out_dir = self.server.invite_dir
+        if not out_dir:
+            return None
+        path = invite_path(self.call_id, out_dir)
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+            with open(path, "w") as f:
+                json.dump({k: sip_invite[k] for k in ("start_line", "headers", "body")}, f)
+        except OSError as e:
+            print(f"⚠ INVITE de {self.call_id} não gravado: {e}")
+            return None
+        return path
+
+    def load_invite(self):
+        """
+        INVITE original completo, relido do disco; None se não foi guardado.
+        """
+        if self.invite_file is None:
+            return None
+        with open(self.invite_file) as f:
+            return json.load(f)
+
+    # ---------------------------------------------------------------
+    @property
+    def invite(self):
+        """
+        INVITE reduzido aos cabeçalhos de diálogo, no formato do parser
+        (é o que os geradores de resposta e o build_bye leem).
+        """
+        return {"start_line": "INVITE", "headers": self.headers, "body": ""}
+
+    @property
+    def labels(self):
+        # Um por m= da oferta, aceito ou não (o trace indexa por m=)
+        return tuple(st.label for st in self.streams)
+
+    @property
+    def accepted(self):
+        return [st for st in self.streams if st.accepted]
+
+    @property
+    def ack_received(self):
+        return self.state == CallState.CONFIRMED
+
+    @property
+    def ports(self):
+        return [rx.port for rx in self.receivers]
+
+    @property
+    def stats(self):
+        """
+        Qualidade por label: perda, jitter e último SR/RR (rtcp.py).
+        """
+        return {rx.label: rx.stats.summary() for rx in self.receivers}
 
     # ---------------------------------------------------------------
     def send_trying(self):
         msg = sip_response_100_trying(self.invite, self.server_ip)
-        self.server.sock.sendto(msg.encode(), self.peer)
+        self.server.send(msg.encode(), self.peer)
+        TRACE.record(TRYING_TX, self.trace_idx)
+
+    # ---------------------------------------------------------------
+    def start_media(self):
+        """
+        Abre um receptor RTP por fluxo aceito, com as portas da chamada
+        tiradas do pool de uma vez. Precisa rodar antes do send_200_ok,
+        que usa as portas alocadas. Se algum fluxo não abre, fecha os que
+        já abriram, devolve as portas e repassa o erro (OSError ou
+        RuntimeError): quem chama responde ao INVITE.
+        """
+        accepted = self.accepted
+        ports = self.server.ports.allocate_many(len(accepted))
+        n = 0
+        try:
+            for n, (stream, port) in enumerate(zip(accepted, ports)):
+                try:
+                    rx = self._open_receiver(stream, port)
+                except OSError:
+                    # Porta ocupada fora do pool: devolvida pelo receptor;
+                    # este fluxo procura outra
+                    rx = self._open_receiver(stream)
+                self._add_receiver(rx)
+        except (OSError, RuntimeError):
+            for p in ports[n + 1:]:
+                self.server.ports.release(p)
+            self.abort_media()
+            raise
+
+    def abort_media(self):
+        """
+        Desfaz um start_media que falhou no meio: fecha os receptores
+        abertos (as portas voltam ao pool) sem metadados nem catálogo —
+        a chamada nunca foi aceita.
+        """
+        for rx in self.receivers:
+            rx.on_done = None
+            rx.stop()
+        self.receivers = []
+        with _media_lock:
+            self._media_open = 0
+        self.state = CallState.TERMINATED
+
+    def _open_receiver(self, stream, port=0, sock=None, rtcp_sock=None, roc_search=0):
+        """
+        Receptor de um fluxo: thread própria (RtpReceiver) ou um fluxo do
+        pipeline multiprocesso (media_pipeline.py), se o servidor tiver um.
+        A gravação (arquivo, VAD) só começa no primeiro pacote. sock e
+        rtcp_sock: sockets herdados num hot restart (só RtpReceiver).
+        Na rede simulada (sim_network.py) não há RTCP: o RtcpMonitor
+        espera sockets de verdade. Fluxo SRTP: o receptor decifra com a
+        chave da oferta (srtp.py).
+        """
+        pipeline = self.server.media_pipeline
+        if pipeline is not None:
+            return pipeline.open_stream(
+                self.call_id,
+                stream.label,
+                host=self.server.host,
+                port=port,
+                pool=self.server.ports,
+                trace_idx=self.trace_idx,
+                label_index=stream.index,
+                kind=stream.kind,
+                srtp=stream.crypto and (*stream.crypto[:2], roc_search),
+                clock_rate=clock_rate(stream)
+            )
+        srtp = None
+        if stream.crypto is not None:
+            suite, inline = stream.crypto[:2]
+            srtp = SrtpStream.from_inline(suite, inline, roc_search=roc_search)
+        audio = stream.kind == "audio"
+        network = self.server.network
+        rx = RtpReceiver(
+            self.call_id,
+            stream.label,
+            host=self.server.host,
+            port=port,
+            pool=self.server.ports,
+            trace_idx=self.trace_idx,
+            label_index=stream.index,
+            vad=self._vad() if audio else None,
+            fanout=self.server.fanout if audio else None,
+            rtcp=self.server.rtcp if network is None else None,
+            kind=stream.kind,
+            sock=sock,
+            rtcp_sock=rtcp_sock,
+            clock=self.server.clock,
+            network=network,
+            srtp=srtp,
+            clock_rate=clock_rate(stream)
+        )
+        if rx.fanout is not None:
+            codec = AUDIO_CODECS.get(stream.fmts[0], "PCMU/8000")
+            rx.fanout.open_stream(self.call_id, stream.label, codec.split("/")[0].lower())
+        return rx
+
+    # ---------------------------------------------------------------
+    def _add_receiver(self, rx):
+        rx.on_done = self._receiver_done
+        with _media_lock:
+            self._media_open += 1
+        rx.start()
+        self.receivers.append(rx)
+
+    def _receiver_done(self, rx):
+        # Roda na thread do receptor; o último a fechar encerra o registro
+        with _media_lock:
+            self._media_open -= 1
+            last = self._media_open == 0
+        if last and self.state == CallState.TERMINATED:
+            self._ended()
+
+    def _ended(self):
+        """
+        Mídia toda fechada: metadados em disco, entrada no catálogo e,
+        com arquivo ligado, a chamada no pacote do dia; sem arquivo e
+        com envio ligado, os arquivos da chamada vão para o S3.
+        """
+        summary = self.summary()
+        self.write_metadata(summary)
+        if self.server.catalog is not None:
+            self.server.catalog.add(summary)
+        if self.server.archive is not None:
+            self.server.archive.add(summary)
+        elif self.server.uploader is not None:
+            self.server.uploader.add_call(summary)
+
+    # ---------------------------------------------------------------
+    def summary(self):
+        """
+        Resumo da chamada encerrada: o conteúdo do .meta.json e o que o
+        catálogo (recording_catalog.py) indexa.
+        """
+        return {
+            "call_id": self.call_id,
+            "session_id": self.session_id,
+            "from": self.headers.get("From"),
+            "to": self.headers.get("To"),
+            "participants": [{"aor": aor, "name": name}
+                             for aor, name in self.participants],
+            "labels": list(self.labels),
+            "codec": self.codec,
+            "started": self.started,
+            "ended": self.server.clock.time(),
+            "invite_file": self.invite_file,
+            "streams": [
+                {
+                    "label": rx.label,
+                    "path": rx.path,
+                    "packets": rx.packets,
+                    "quality": rx.stats.summary(),
+                    **({"srtp": rx.srtp.stats()} if getattr(rx, "srtp", None) else {}),
+                }
+                for rx in self.receivers
+            ],
+        }
+
+    def write_metadata(self, meta=None):
+        """
+        <Call-ID>.meta.json ao lado das gravações: labels, arquivos e a
+        qualidade de cada fluxo no fim da chamada.
+        """
+        meta = meta or self.summary()
+        out_dir = (os.path.dirname(self.receivers[0].path)
+                   if self.receivers else RECORDINGS_DIR)
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+            with open(metadata_path(self.call_id, out_dir), "w") as f:
+                json.dump(meta, f, indent=2)
+        except OSError as e:
+            print(f"⚠ Metadados de {self.call_id} não gravados: {e}")
+
+    # ---------------------------------------------------------------
+    def _vad(self):
+        # server.vad: kwargs do VoiceActivityDetector, ou None (desligado)
+        vad = self.server.vad
+        return VoiceActivityDetector(**vad) if vad is not None else None
+
+    # ---------------------------------------------------------------
+    def stop_media(self):
+        for rx in self.receivers:
+            rx.stop()
+        if not self.receivers and self.state == CallState.TERMINATED:
+            # Chamada sem mídia: nenhum receptor vai chamar _receiver_done
+            self._ended()
 
     # ---------------------------------------------------------------
     def send_200_ok(self):
-        msg = sip_response_200_ok_invite_siprec(
+        self.server.send(self._200_ok().encode(), self.peer)
+        self.state = CallState.AWAITING_ACK
+        TRACE.record(OK_TX, self.trace_idx)
+        self._journal()
+
+    def _200_ok(self):
+        transport = self.server.transport_of(self.peer)
+        return sip_response_200_ok_invite_siprec(
             self.invite,
             self.server_ip,
             to_tag=self.to_tag,   # ← agora usa o mesmo tag da sessão
-            addr=self.peer
+            addr=self.peer,
+            transport=transport,
+            streams=self.streams,
+            ports={rx.label_index: rx.port for rx in self.receivers},
+            timer=self.timer,
+            contact_port=self.server.listen_ports.get(transport)
         )
-        self.server.sock.sendto(msg.encode(), self.peer)
-        self.state = "AWAITING_ACK"
+
+    # ---------------------------------------------------------------
+    def retransmitted(self):
+        """
+        Retransmissão do INVITE inicial (sem To-tag), talvez enquanto a
+        mídia ainda abre em outra thread: repete a última resposta sem
+        mexer em timer nem journal. A sessão não guarda o 200 OK; ele é
+        remontado do mesmo estado (mesmas portas, tag e cabeçalhos).
+        """
+        if self.state == CallState.EARLY:
+            self.send_trying()
+        elif self.state != CallState.TERMINATED:
+            self.server.send(self._200_ok().encode(), self.peer)
+
+    # ---------------------------------------------------------------
+    def refresh(self, sip):
+        """
+        re-INVITE no diálogo (To com o nosso tag). Sem SDP, ou com a
+        mesma mídia: refresh do Session-Expires — responde com o mesmo
+        SDP/portas e reinicia o timer, renegociado com os cabeçalhos do
+        re-INVITE (RFC 4028 §9). Oferta que muda os fluxos gravados
+        (codec, labels, chave SRTP) recebe 488 e a chamada segue como
+        estava.
+        """
+        parts = parse_multipart(sip["body"], sip["headers"].get("Content-Type", ""))
+        raw_sdp = parts.get("application/sdp", "")
+        if raw_sdp.strip():
+            offer = self.server.media_policy.negotiate(parse_sdp(raw_sdp)["media"])
+            if media_key(offer) != media_key(self.streams):
+                print(f"⚠ re-INVITE de {self.call_id} muda a mídia: 488")
+                self.server.send(sip_response_488(sip).encode(), self.peer)
+                return
+        self.headers.update(
+            (k, sip["headers"][k]) for k in ("Via", "CSeq") if k in sip["headers"]
+        )
+        self.refreshed = self.server.clock.monotonic()
+        self.timer = session_timer(sip["headers"])
+        self.send_200_ok()
+
+    @property
+    def expires(self):
+        """
+        Prazo do refresh que o SBC nos deve (segundos), ou None: sem
+        timer, ou com o refresh a nosso cargo.
+        """
+        timer = self.timer
+        return timer[0] if timer is not None and timer[1] == "uac" else None
+
+    # ---------------------------------------------------------------
+    def last_media(self):
+        """
+        Instante (monotônico) do pacote RTP mais recente em qualquer label.
+        """
+        return max((rx.last_rx for rx in self.receivers), default=self.refreshed)
 
     # ---------------------------------------------------------------
     def receive_ack(self):
-        self.ack_received = True
-        self.state = "CONFIRMED"
+        self.state = CallState.CONFIRMED
+        TRACE.record(ACK_RX, self.trace_idx)
+        self._journal()
 
     # ---------------------------------------------------------------
     def wait_for_ack(self, timeout=30):
-        waited = 0
-        while waited < timeout:
+        """
+        Espera bloqueante (scripts e testes). O servidor não usa: o prazo
+        do ACK é do reaper (session_reaper.py), sem thread por chamada.
+        """
+        clock = self.server.clock
+        deadline = clock.monotonic() + timeout
+        while clock.monotonic() < deadline:
             if self.ack_received:
                 print(f"✔ ACK confirmado ({self.call_id})")
-                return
-            time.sleep(0.5)
-            waited += 0.5
+                return True
+            clock.sleep(0.5)
         print(f"⚠ Timeout esperando ACK ({self.call_id})")
+        return False
 
     # ---------------------------------------------------------------
     def receive_bye(self, sip):
+        TRACE.record(BYE_RX, self.trace_idx)
         msg = sip_response_200_ok_bye(sip)
-        self.server.sock.sendto(msg.encode(), self.peer)
-        self.state = "TERMINATED"
+        self.server.send(msg.encode(), self.peer)
+        TRACE.record(BYE_OK_TX, self.trace_idx)
+        self.state = CallState.TERMINATED
+        self.stop_media()
+        if self.server.journal:
+            self.server.journal.remove(self.call_id)
+
+    # ---------------------------------------------------------------
+    def hang_up(self, reason):
+        """
+        Encerra a chamada do nosso lado (session_reaper.py): BYE para o
+        SBC, portas e gravações liberadas. Quem chama já tirou a sessão
+        de server.calls.
+        """
+        bye = build_bye(
+            self.invite,
+            self.server_ip,
+            addr=self.peer,
+            to_tag=self.to_tag,
+            reason=reason,
+            local_port=self.server.port
+        )
+        try:
+            self.server.send(bye.encode(), self.peer)
+        except OSError as e:
+            print(f"⚠ BYE não enviado para {self.peer}: {e}")
+        self.state = CallState.TERMINATED
+        self.stop_media()
+        if self.server.journal:
+            self.server.journal.remove(self.call_id)
+
+    # ---------------------------------------------------------------
+    def _journal(self):
+        if self.server.journal:
+            self.server.journal.record(self)
 
     # ---------------------------------------------------------------
+    def to_record(self):
+        """
+        Estado mínimo para retomar o diálogo após restart
+        (ver session_journal.py).
+        """
+        return {
+            "call_id": self.call_id,
+            "headers": self.headers,
+            "to_tag": self.to_tag,
+            "peer": list(self.peer),
+            "state": self.state.value,
+            "labels": list(self.labels),
+            "streams": [list(st) for st in self.streams],
+            "ports": self.ports,
+            "recordings": [rx.path for rx in self.receivers],
+            "started": self.started,
+            "timer": self.timer,
+            "invite_file": self.invite_file,
+            "session_id": self.session_id,
+            "codec": self.codec,
+            "participants": [list(p) for p in self.participants],
+        }
 
+    # ---------------------------------------------------------------
+    @classmethod
+    def restore(cls, server, record):
+        """
+        Recria a sessão a partir de um registro do journal, sem INVITE.
+        """
+        self = cls.__new__(cls)
+        self.server = server
+        self.headers = record["headers"]
+        self.peer = tuple(record["peer"])
+        self.server_ip = server.get_external_ip()
+        self.call_id = sys.intern(record["call_id"])
+        self.to_tag = record["to_tag"]
+        self.state = CallState(record["state"])
+        self.started = record["started"]
+        # O último refresh não está no registro: o prazo recomeça agora
+        self.refreshed = server.clock.monotonic()
+        timer = record.get("timer")
+        self.timer = tuple(timer) if timer else None
+        if "streams" in record:
+            # crypto (8º campo) só nos registros com SRTP
+            self.streams = tuple(
+                MediaStream(i, kind, label, ok, proto, tuple(fmts), tuple(attrs),
+                            tuple(crypto[0]) if crypto and crypto[0] else None)
+                for i, kind, label, ok, proto, fmts, attrs, *crypto in record["streams"]
+            )
+        else:
+            self.streams = legacy_streams(record["labels"])
+        self.trace_idx = TRACE.register(self.call_id, self.labels)
+        self.receivers = []
+        self._media_open = 0
+        self.invite_file = record.get("invite_file")
+        self.session_id = record.get("session_id")
+        self.codec = record.get("codec")
+        self.participants = tuple(tuple(p) for p in record.get("participants", ()))
+        return self
+
+    # ---------------------------------------------------------------
+    def resume_media(self, ports, handed=None):
+        """
+        Reabre os receptores nas mesmas portas; os arquivos são abertos
+        em append, então a gravação continua no mesmo lugar.
 
+        handed (hot restart, ver hot_restart.py): por fluxo, os sockets
+        herdados do processo anterior e a contagem até a passagem, no
+        lugar de um bind novo. Com SRTP, o ROC e a janela de replay vêm
+        junto; sem eles (journal), o ROC é procurado no primeiro pacote.
+        """
+        for n, (stream, port) in enumerate(zip(self.accepted, ports)):
+            if handed is None:
+                self._add_receiver(self._open_receiver(stream, port, roc_search=ROC_SEARCH))
+                continue
+            media = handed[n]
+            rx = self._open_receiver(stream, port, media["sock"], media["rtcp_sock"])
+            rx.packets = media["packets"]
+            rx.stats.load(media["stats"])
+            if rx.srtp is not None and media.get("srtp"):
+                rx.srtp.load(media["srtp"])
+            self._add_receiver(rx)
+
+    # ---------------------------------------------------------------
+    def close_out(self, recordings):
+        """
+        Encerra uma sessão recuperada que não pode continuar: o que foi
+        gravado até o crash fica como gravação final.
+        """
+        self.state = CallState.TERMINATED
+        for i, path in enumerate(recordings):
+            TRACE.record(FILE_DONE, self.trace_idx, i)
+            print(f"🗂 Gravação encerrada após restart: {path}")
+        if not self.receivers and self.server.catalog is not None:
+            self.server.catalog.add(self.summary())
+
+    # ---------------------------------------------------------------
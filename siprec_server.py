@@ -16,6 +16,8 @@ import threading
 import time
 import random
 
+from flood_guard import FloodGuard
+
 LISTEN_HOST = "0.0.0.0"
 LISTEN_PORT = 5060
 CRLF = "\r\n"
@@ -279,10 +281,14 @@ class SIPServer:
         self.sock.bind((self.host, self.port))
         print(f"📡 SIP UDP listener started on {self.host}:{self.port}")
         self.calls = {}
+        self.guard = FloodGuard()
 
     def start(self):
         while True:
             data, addr = self.sock.recvfrom(65535)
+            # Lixo e flood morrem aqui, antes de decode e de uma thread nova
+            if not self.guard.allow(data, addr):
+                continue
             text = data.decode("utf-8", errors="ignore")
             print(f"\n--- Received from {addr} ---\n{text}\n--- end ---\n")
             threading.Thread(target=self.handle_message, args=(text, addr), daemon=True).start()
@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""
+srtp.py
+
+SRTP (RFC 3711) na recepção das gravações, com chaves SDES (RFC 4568,
+linhas a=crypto do SDP): AES_CM_128_HMAC_SHA1_80 e _32, sem MKI e com
+taxa de derivação 0 (o que os SBCs mandam na prática).
+
+- parse_crypto / choose_crypto / answer_crypto: a=crypto da oferta e da
+  resposta (a nossa chave vai na resposta; não enviamos mídia)
+- SrtpStream: chaves de sessão derivadas e, por SSRC, o índice mais alto
+  autenticado (ROC + s_l) e a janela anti-replay de 64 pacotes
+- SRTCP (§3.4): a porta RTCP de um m= cifrado recebe SRTCP; o mesmo
+  SrtpStream confere e decifra (unprotect_rtcp) antes do parse_rtcp
+
+Em lote: unprotect_batch recebe os pacotes que o receptor tirou do
+socket de uma vez. Cabeçalho, replay e HMAC são conferidos pacote a
+pacote; o keystream de todos os autenticados sai numa chamada só de AES
+(os blocos de contador do lote inteiro concatenados) e o XOR é feito uma
+vez sobre os payloads do lote juntos. Com o pacote cryptography o AES é
+o do OpenSSL; sem ele, AES em Python puro — correto, mas ~50× mais lento
+(serve para testes e poucas chamadas).
+
+Uso (conferir um .rtp gravado cifrado não é o caso: o receptor grava em
+claro):
+    python srtp.py --selftest
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import struct
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:     # pragma: no cover - depende do ambiente
+    Cipher = None
+
+# Suíte → bytes de tag de autenticação
+SUITES = {
+    "AES_CM_128_HMAC_SHA1_80": 10,
+    "AES_CM_128_HMAC_SHA1_32": 4,
+}
+SAVP = ("RTP/SAVP", "RTP/SAVPF")
+
+KEY_LEN = 16
+SALT_LEN = 14
+REPLAY_WINDOW = 64
+# SRTCP autentica com 80 bits nas duas suítes (RFC 4568 §6.2)
+RTCP_TAG_LEN = 10
+_E_BIT = 1 << 31
+
+_RTP = struct.Struct("!BBHII")      # V/P/X/CC, M/PT, seq, timestamp, SSRC
+_ROC = struct.Struct("!I")
+_MASK = (1 << REPLAY_WINDOW) - 1
+
+# n → [b"", j=0, 1, ..., n-1 em 2 bytes]: prefixo.join(...) monta os n
+# blocos de contador de um pacote numa chamada só (datagramas até 2 KB,
+# o recvfrom dos receptores)
+_J = [j.to_bytes(2, "big") for j in range(129)]
+_COUNTERS = [[b""] + _J[:n] for n in range(129)]
+_PAD = [bytes(n) for n in range(16)]
+
+
+# ============================================================
+# SDES (a=crypto)
+# ============================================================
+def parse_crypto(value):
+    """
+    "1 AES_CM_128_HMAC_SHA1_80 inline:<base64>[|vida][|MKI:tam] [params]"
+    → (tag, suíte, chave mestra, sal mestre), ou None se não suportado
+    (suíte desconhecida, MKI, KDR, mídia sem cifra/autenticação).
+    """
+    parts = value.split()
+    if len(parts) < 3 or parts[1] not in SUITES:
+        return None
+    tag, suite, key_params = parts[0], parts[1], parts[2]
+    if len(parts) > 3:
+        return None         # KDR=, UNENCRYPTED_SRTP, FEC_ORDER...
+    if not key_params.startswith("inline:") or ";" in key_params:
+        return None         # várias chaves (por MKI)
+    fields = key_params[7:].split("|")
+    if any(":" in f for f in fields[1:]):
+        return None         # MKI
+    try:
+        raw = base64.b64decode(fields[0], validate=True)
+    except ValueError:
+        return None
+    if len(raw) != KEY_LEN + SALT_LEN:
+        return None
+    return tag, suite, raw[:KEY_LEN], raw[KEY_LEN:]
+
+
+def choose_crypto(values):
+    """
+    Primeira linha a=crypto utilizável da oferta (o ofertante lista em
+    ordem de preferência) → (tag, suíte, inline da oferta), ou None.
+    """
+    for value in values:
+        found = parse_crypto(value)
+        if found is not None:
+            tag, suite, key, salt = found
+            return tag, suite, base64.b64encode(key + salt).decode()
+    return None
+
+
+def answer_crypto(tag, suite):
+    """
+    Valor do a=crypto da resposta: mesma tag e suíte, chave nossa.
+    """
+    inline = base64.b64encode(os.urandom(KEY_LEN + SALT_LEN)).decode()
+    return f"{tag} {suite} inline:{inline}"
+
+
+# ============================================================
+# AES
+# ============================================================
+def _ecb(key):
+    """
+    Função bytes → bytes que cifra blocos de 16 bytes com a chave (ECB:
+    é o que o modo contador precisa, bloco de contador → keystream).
+    """
+    if Cipher is not None:
+        return Cipher(algorithms.AES(key), modes.ECB()).encryptor().update
+    return _PyAes(key).encrypt
+
+
+def _tables():
+    sbox = [0] * 256
+    p = q = 1
+    while True:
+        # p × 3 e q ÷ 3 em GF(2^8): percorre todos os não nulos
+        p ^= ((p << 1) ^ (0x1B if p & 0x80 else 0)) & 0xFF
+        q ^= q << 1
+        q ^= q << 2
+        q ^= q << 4
+        q &= 0xFF
+        if q & 0x80:
+            q ^= 0x09
+        x = q
+        for shift in (1, 2, 3, 4):
+            x ^= ((q << shift) | (q >> (8 - shift))) & 0xFF
+        sbox[p] = x ^ 0x63
+        if p == 1:
+            break
+    sbox[0] = 0x63
+
+    t0 = []
+    for s in sbox:
+        s2 = ((s << 1) ^ (0x1B if s & 0x80 else 0)) & 0xFF
+        t0.append((s2 << 24) | (s << 16) | (s << 8) | (s2 ^ s))
+    t1 = [(t >> 8) | ((t & 0xFF) << 24) for t in t0]
+    t2 = [(t >> 8) | ((t & 0xFF) << 24) for t in t1]
+    t3 = [(t >> 8) | ((t & 0xFF) << 24) for t in t2]
+    return sbox, t0, t1, t2, t3
+
+
+_AES_TABLES = None
+
+
+class _PyAes:
+    """
+    AES-128, só cifragem, por tabelas T (FIPS-197 §5.2 e 5.1).
+    """
+
+    def __init__(self, key):
+        global _AES_TABLES
+        if _AES_TABLES is None:
+            _AES_TABLES = _tables()
+        sbox = _AES_TABLES[0]
+        w = list(struct.unpack("!4I", key))
+        rcon = 1
+        for i in range(4, 44):
+            t = w[i - 1]
+            if i % 4 == 0:
+                t = ((sbox[(t >> 16) & 0xFF] << 24) | (sbox[(t >> 8) & 0xFF] << 16)
+                     | (sbox[t & 0xFF] << 8) | sbox[t >> 24]) ^ (rcon << 24)
+                rcon = ((rcon << 1) ^ (0x1B if rcon & 0x80 else 0)) & 0xFF
+            w.append(w[i - 4] ^ t)
+        self._rk = w
+
+    def encrypt(self, data):
+        s, t0, t1, t2, t3 = _AES_TABLES
+        rk = self._rk
+        out = []
+        for a, b, c, d in struct.iter_unpack("!4I", data):
+            a ^= rk[0]
+            b ^= rk[1]
+            c ^= rk[2]
+            d ^= rk[3]
+            for r in range(4, 40, 4):
+                a, b, c, d = (
+                    t0[a >> 24] ^ t1[(b >> 16) & 255] ^ t2[(c >> 8) & 255] ^ t3[d & 255] ^ rk[r],
+                    t0[b >> 24] ^ t1[(c >> 16) & 255] ^ t2[(d >> 8) & 255] ^ t3[a & 255] ^ rk[r + 1],
+                    t0[c >> 24] ^ t1[(d >> 16) & 255] ^ t2[(a >> 8) & 255] ^ t3[b & 255] ^ rk[r + 2],
+                    t0[d >> 24] ^ t1[(a >> 16) & 255] ^ t2[(b >> 8) & 255] ^ t3[c & 255] ^ rk[r + 3],
+                )
+            out.append(struct.pack(
+                "!4I",
+                ((s[a >> 24] << 24) | (s[(b >> 16) & 255] << 16)
+                 | (s[(c >> 8) & 255] << 8) | s[d & 255]) ^ rk[40],
+                ((s[b >> 24] << 24) | (s[(c >> 16) & 255] << 16)
+                 | (s[(d >> 8) & 255] << 8) | s[a & 255]) ^ rk[41],
+                ((s[c >> 24] << 24) | (s[(d >> 16) & 255] << 16)
+                 | (s[(a >> 8) & 255] << 8) | s[b & 255]) ^ rk[42],
+                ((s[d >> 24] << 24) | (s[(a >> 16) & 255] << 16)
+                 | (s[(b >> 8) & 255] << 8) | s[c & 255]) ^ rk[43],
+            ))
+        return b"".join(out)
+
+
+def backend():
+    return "openssl" if Cipher is not None else "python"
+
+
+# ============================================================
+# CHAVES DE SESSÃO (RFC 3711 §4.3)
+# ============================================================
+def derive(master_key, master_salt, label, length):
+    """
+    PRF AES-CM com taxa de derivação 0: IV = (rótulo << 48 ⊕ sal) << 16.
+    """
+    x = (label << 48) ^ int.from_bytes(master_salt, "big")
+    iv = x << 16
+    blocks = (length + 15) // 16
+    counters = b"".join((iv + j).to_bytes(16, "big") for j in range(blocks))
+    return _ecb(master_key)(counters)[:length]
+
+
+# ============================================================
+# FLUXO
+# ============================================================
+class SrtpStream:
+    """
+    Recepção SRTP de um m=: as chaves da oferta e o estado por SSRC.
+    roc_search > 0: o primeiro pacote de cada SSRC também é tentado com
+    ROC até roc + roc_search (sessão retomada do journal depois de um
+    crash, sem o ROC de antes).
+    """
+
+    def __init__(self, master_key, master_salt, suite="AES_CM_128_HMAC_SHA1_80",
+                 roc=0, roc_search=0):
+        self.suite = suite
+        self.tag_len = SUITES[suite]
+        self._aes = _ecb(derive(master_key, master_salt, 0, KEY_LEN))
+        # HMAC-SHA1 com os dois blocos de chave (ipad/opad) já processados:
+        # por pacote só copia o estado (hmac.digest refaz tudo a cada chamada)
+        auth_key = derive(master_key, master_salt, 1, 20).ljust(64, b"\0")
+        self._inner = hashlib.sha1(bytes(b ^ 0x36 for b in auth_key))
+        self._outer = hashlib.sha1(bytes(b ^ 0x5C for b in auth_key))
+        self._salt = int.from_bytes(derive(master_key, master_salt, 2, SALT_LEN), "big")
+        # SRTCP: rótulos 3, 4 e 5 da mesma chave mestra
+        self._rtcp_keys = (_ecb(derive(master_key, master_salt, 3, KEY_LEN)),
+                           int.from_bytes(derive(master_key, master_salt, 5, SALT_LEN), "big"))
+        rtcp_auth = derive(master_key, master_salt, 4, 20).ljust(64, b"\0")
+        self._rtcp_inner = hashlib.sha1(bytes(b ^ 0x36 for b in rtcp_auth))
+        self._rtcp_outer = hashlib.sha1(bytes(b ^ 0x5C for b in rtcp_auth))
+        self.roc = roc
+        self.roc_search = roc_search
+
+        # SSRC → [índice mais alto autenticado, janela de replay]
+        self._state = {}
+        self._send = {}         # SSRC → índice do último protegido (protect_batch)
+        self._rtcp_state = {}   # SSRC → [índice SRTCP mais alto, janela]
+        self._rtcp_send = {}    # SSRC → índice SRTCP do último protegido
+
+        self.decrypted = 0
+        self.auth_failed = 0
+        self.replayed = 0
+        self.malformed = 0
+        self.rtcp_decrypted = 0
+
+    @classmethod
+    def from_inline(cls, suite, inline, **kwargs):
+        raw = base64.b64decode(inline)
+        return cls(raw[:KEY_LEN], raw[KEY_LEN:], suite, **kwargs)
+
+    # ---------------------------------------------------------------
+    def _tag(self, data, index):
+        inner = self._inner.copy()
+        inner.update(data)
+        inner.update(_ROC.pack(index >> 16))
+        outer = self._outer.copy()
+        outer.update(inner.digest())
+        return outer.digest()[:self.tag_len]
+
+    def _rtcp_tag(self, data):
+        inner = self._rtcp_inner.copy()
+        inner.update(data)
+        outer = self._rtcp_outer.copy()
+        outer.update(inner.digest())
+        return outer.digest()[:RTCP_TAG_LEN]
+
+    def unprotect_batch(self, packets):
+        """
+        Pacotes SRTP → pacotes RTP em claro (cabeçalho + payload, sem a
+        tag), na mesma ordem; os que falham autenticação, replay ou
+        formato ficam de fora e só são contados.
+        """
+        tag_len = self.tag_len
+        state = self._state
+        inner_key, outer_key = self._inner, self._outer
+        unpack, pack_roc, equal = _RTP.unpack_from, _ROC.pack, hmac.compare_digest
+        jobs = []
+        for pkt in packets:
+            n = len(pkt) - tag_len
+            if n < 12:
+                self.malformed += 1
+                continue
+            b0, _, seq, _, ssrc = unpack(pkt)
+            hlen = 12 + 4 * (b0 & 0x0F)
+            if b0 & 0x10 and hlen + 4 <= n:
+                hlen += 4 + 4 * int.from_bytes(pkt[hlen + 2:hlen + 4], "big")
+            if b0 >> 6 != 2 or hlen > n:
+                self.malformed += 1
+                continue
+
+            st = state.get(ssrc)
+            if st is None:
+                index = self._first(pkt, n, seq, ssrc)
+                if index is not None:
+                    jobs.append((pkt, hlen, n, index, ssrc))
+                continue
+
+            # Índice: ROC de quem está mais perto de s_l (RFC 3711 §3.3.1)
+            highest, window = st
+            roc = highest >> 16
+            s_l = highest & 0xFFFF
+            if s_l < 32768:
+                if seq - s_l > 32768:
+                    roc -= 1
+            elif s_l - 32768 > seq:
+                roc += 1
+            index = (roc << 16) | seq
+            delta = highest - index
+            if index < 0 or delta >= REPLAY_WINDOW or (delta >= 0 and window >> delta & 1):
+                self.replayed += 1
+                continue
+
+            # Autentica antes de mexer no estado (RFC 3711 §3.3)
+            mac = inner_key.copy()
+            mac.update(pkt[:n])
+            mac.update(pack_roc(roc))
+            outer = outer_key.copy()
+            outer.update(mac.digest())
+            if not equal(outer.digest()[:tag_len], pkt[n:]):
+                self.auth_failed += 1
+                continue
+            if delta < 0:
+                st[0] = index
+                st[1] = (window << -delta | 1) & _MASK
+            else:
+                st[1] = window | 1 << delta
+            jobs.append((pkt, hlen, n, index, ssrc))
+
+        self.decrypted += len(jobs)
+        return self._crypt(jobs)
+
+    def _first(self, pkt, n, seq, ssrc):
+        # Primeiro pacote do SSRC: ROC conhecido (ou procurado até roc_search)
+        body, tag = pkt[:n], pkt[n:]
+        for roc in range(self.roc, self.roc + self.roc_search + 1):
+            index = (roc << 16) | seq
+            if hmac.compare_digest(self._tag(body, index), tag):
+                self._state[ssrc] = [index, 1]
+                return index
+        self.auth_failed += 1
+        return None
+
+    def _estimate(self, seq, highest):
+        # RFC 3711 §3.3.1 / apêndice A: ROC de quem está mais perto de s_l
+        roc, s_l = highest >> 16, highest & 0xFFFF
+        if s_l < 32768:
+            v = roc - 1 if seq - s_l > 32768 else roc
+        else:
+            v = roc + 1 if s_l - 32768 > seq else roc
+        return (v << 16) | seq
+
+    def protect_batch(self, packets):
+        """
+        Lado do SBC (testes e benchmarks): pacotes RTP → SRTP.
+        """
+        jobs = []
+        for pkt in packets:
+            b0, _, seq, _, ssrc = _RTP.unpack_from(pkt)
+            hlen = 12 + 4 * (b0 & 0x0F)
+            if b0 & 0x10:
+                hlen += 4 + 4 * int.from_bytes(pkt[hlen + 2:hlen + 4], "big")
+            last = self._send.get(ssrc)
+            index = seq if last is None else self._estimate(seq, last)
+            self._send[ssrc] = index if last is None else max(index, last)
+            jobs.append((pkt, hlen, len(pkt), index, ssrc))
+        return [p + self._tag(p, job[3]) for p, job in zip(self._crypt(jobs), jobs)]
+
+    # ---------------------------------------------------------------
+    # SRTCP (RFC 3711 §3.4): RTCP composto + E|índice de 31 bits + tag;
+    # cifrado a partir do 9º byte (depois do SSRC de quem envia)
+    def unprotect_rtcp(self, pkt):
+        """
+        Pacote SRTCP → RTCP composto em claro, ou None (formato,
+        replay ou autenticação; só contado).
+        """
+        n = len(pkt) - RTCP_TAG_LEN - 4
+        if n < 8 or pkt[0] >> 6 != 2:
+            self.malformed += 1
+            return None
+        ssrc = int.from_bytes(pkt[4:8], "big")
+        e_index = int.from_bytes(pkt[n:n + 4], "big")
+        index = e_index & ~_E_BIT
+
+        st = self._rtcp_state.get(ssrc)
+        delta = st[0] - index if st is not None else -1
+        if delta >= REPLAY_WINDOW or (delta >= 0 and st[1] >> delta & 1):
+            self.replayed += 1
+            return None
+        if not hmac.compare_digest(self._rtcp_tag(pkt[:n + 4]), pkt[n + 4:]):
+            self.auth_failed += 1
+            return None
+        if st is None:
+            self._rtcp_state[ssrc] = [index, 1]
+        elif delta < 0:
+            st[0] = index
+            st[1] = (st[1] << -delta | 1) & _MASK
+        else:
+            st[1] |= 1 << delta
+
+        self.rtcp_decrypted += 1
+        if not e_index & _E_BIT:
+            return pkt[:n]
+        return self._crypt([(pkt, 8, n, index, ssrc)], self._rtcp_keys)[0]
+
+    def protect_rtcp(self, pkt):
+        """
+        Lado do SBC (testes): RTCP composto → SRTCP cifrado.
+        """
+        ssrc = int.from_bytes(pkt[4:8], "big")
+        index = (self._rtcp_send.get(ssrc, -1) + 1) & ~_E_BIT
+        self._rtcp_send[ssrc] = index
+        sealed = self._crypt([(pkt, 8, len(pkt), index, ssrc)], self._rtcp_keys)[0]
+        sealed += (_E_BIT | index).to_bytes(4, "big")
+        return sealed + self._rtcp_tag(sealed)
+
+    # ---------------------------------------------------------------
+    def _crypt(self, jobs, keys=None):
+        """
+        Keystream AES-CM de todos os pacotes numa chamada só de AES e um
+        XOR só sobre os payloads concatenados (cada um completado com
+        zeros até o fim do bloco, alinhado com o seu keystream). keys:
+        (AES, sal) de outro contexto (SRTCP); padrão, os do SRTP.
+        """
+        if not jobs:
+            return []
+        aes, salt = keys or (self._aes, self._salt)
+        counters = []
+        payloads = []
+        for pkt, hlen, end, index, ssrc in jobs:
+            # Os 16 bits baixos do IV são zero: bloco j = 14 bytes fixos + j
+            prefix = (salt ^ (ssrc << 48) ^ index).to_bytes(14, "big")
+            blocks = (end - hlen + 15) >> 4
+            counters.append(prefix.join(_COUNTERS[blocks] if blocks < 129 else
+                                        [b""] + [j.to_bytes(2, "big") for j in range(blocks)]))
+            payloads.append(pkt[hlen:end])
+            payloads.append(_PAD[(hlen - end) & 15])
+        keystream = aes(b"".join(counters))
+        payload = b"".join(payloads)
+        clear = (int.from_bytes(payload, "big")
+                 ^ int.from_bytes(keystream, "big")).to_bytes(len(payload), "big")
+
+        out = []
+        pos = 0
+        for pkt, hlen, end, _, _ in jobs:
+            size = end - hlen
+            out.append(pkt[:hlen] + clear[pos:pos + size])
+            pos += (size + 15) & ~15
+        return out
+
+    # ---------------------------------------------------------------
+    # Estado para continuar em outro processo (hot_restart.py)
+    def snapshot(self):
+        return {"roc": self.roc, "ssrcs": {str(k): v for k, v in self._state.items()},
+                "rtcp": {str(k): v for k, v in self._rtcp_state.items()}}
+
+    def load(self, state):
+        self.roc = state["roc"]
+        self._state = {int(k): list(v) for k, v in state["ssrcs"].items()}
+        self._rtcp_state = {int(k): list(v) for k, v in state.get("rtcp", {}).items()}
+
+    def stats(self):
+        return {
+            "suite": self.suite,
+            "decrypted": self.decrypted,
+            "auth_failed": self.auth_failed,
+            "replayed": self.replayed,
+            "malformed": self.malformed,
+            "rtcp_decrypted": self.rtcp_decrypted,
+        }
+
+
+def _selftest():
+    # RFC 3711, apêndice B.2 (AES-CM) e B.3 (derivação de chaves)
+    aes = _ecb(bytes.fromhex("2B7E151628AED2A6ABF7158809CF4F3C"))
+    ks = aes(bytes.fromhex("F0F1F2F3F4F5F6F7F8F9FAFBFCFD0000"))
+    assert ks.hex().upper() == "E03EAD0935C95E80E166B16DD92B4EB4", ks.hex()
+    key = bytes.fromhex("E1F97A0D3E018BE0D64FA32C06DE4139")
+    salt = bytes.fromhex("0EC675AD498AFEEBB6960B3AABE6")
+    assert derive(key, salt, 0, 16).hex().upper() == "C61E7A93744F39EE10734AFE3FF7A087"
+    assert derive(key, salt, 2, 14).hex().upper() == "30CBBC08863D8C85D49DB34A9AE1"
+    print(f"✔ SRTP ok (AES: {backend()})")
+
+
+if __name__ == "__main__":
+    _selftest()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+tcp_transport.py
+
+Transporte SIP orientado a conexão (TCP e, opcionalmente, TLS).
+
+INVITEs SIPREC com rs-metadata passam fácil de 1300 bytes; em UDP isso
+vira fragmentação IP e chamada perdida quando um fragmento cai. Aqui cada
+SBC mantém uma conexão longa, as mensagens são delimitadas pelo
+Content-Length (mesmo vindo em pedaços) e entregues ao mesmo
+SIPServer.dispatch do UDP. As respostas voltam pela conexão de origem
+(SIPServer.send).
+"""
+
+import re
+import socket
+import ssl
+import threading
+
+_CONTENT_LENGTH = re.compile(rb"^(?:content-length|l)[ \t]*:[ \t]*(\d+)",
+                             re.IGNORECASE | re.MULTILINE)
+_HEADER_END = b"\r\n\r\n"
+
+
+# ============================================================
+# DELIMITAÇÃO DE MENSAGENS NO STREAM
+# ============================================================
+class StreamFramer:
+    """
+    Acumula bytes de um stream e devolve mensagens SIP completas.
+    """
+
+    def __init__(self, max_message=65535):
+        self.max_message = max_message
+        self.pings = 0
+        self._buf = bytearray()
+
+    def feed(self, data):
+        """
+        Retorna a lista de mensagens completas (bytes); o que sobrar fica
+        guardado para a próxima leitura. Keep-alives CRLF (RFC 5626) entre
+        mensagens são descartados e contados em `pings`.
+        """
+        self._buf += data
+        messages = []
+        self.pings = 0
+
+        while True:
+            # CRLFs soltos entre mensagens (ping "\r\n\r\n")
+            stripped = self._buf.lstrip(b"\r\n")
+            if len(stripped) != len(self._buf):
+                self.pings += (len(self._buf) - len(stripped)) // 4
+                self._buf = bytearray(stripped)
+
+            end = self._buf.find(_HEADER_END)
+            if end < 0:
+                if len(self._buf) > self.max_message:
+                    raise ValueError("Cabeçalho SIP grande demais no stream")
+                break
+
+            m = _CONTENT_LENGTH.search(self._buf, 0, end)
+            body_len = int(m.group(1)) if m else 0
+            total = end + len(_HEADER_END) + body_len
+            if total > self.max_message:
+                raise ValueError("Mensagem SIP grande demais no stream")
+            if len(self._buf) < total:
+                break
+
+            messages.append(bytes(self._buf[:total]))
+            del self._buf[:total]
+
+        return messages
+
+
+# ============================================================
+# CONEXÃO
+# ============================================================
+class StreamConnection:
+
+    def __init__(self, sock, addr, transport):
+        self.sock = sock
+        self.addr = addr
+        self.transport = transport
+        self._lock = threading.Lock()
+
+    def send(self, data):
+        # Várias threads respondem pela mesma conexão: uma escrita por vez
+        with self._lock:
+            self.sock.sendall(data)
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+# ============================================================
+# LISTENER
+# ============================================================
+class TcpTransport:
+
+    def __init__(self, server, host="0.0.0.0", port=5060,
+                 certfile=None, keyfile=None):
+        self.server = server
+        self.host = host
+        self.port = port
+        self.transport = "tls" if certfile else "tcp"
+
+        self.ssl_context = None
+        if certfile:
+            self.ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self.ssl_context.load_cert_chain(certfile, keyfile)
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.port = self.sock.getsockname()[1]
+
+    # ---------------------------------------------------------------
+    def start(self):
+        self.sock.listen(128)
+        print(f"📡 SIP {self.transport.upper()} listening on "
+              f"{self.host}:{self.port}")
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    # ---------------------------------------------------------------
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, addr = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(
+                target=self._serve, args=(conn, addr), daemon=True
+            ).start()
+
+    # ---------------------------------------------------------------
+    def _serve(self, conn, addr):
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+        if self.ssl_context is not None:
+            try:
+                conn = self.ssl_context.wrap_socket(conn, server_side=True)
+            except (ssl.SSLError, OSError) as e:
+                print(f"⚠ Handshake TLS falhou com {addr}: {e}")
+                conn.close()
+                return
+
+        stream = StreamConnection(conn, addr, self.transport)
+        self.server.streams[addr] = stream
+        framer = StreamFramer()
+        print(f"🔗 Conexão {self.transport.upper()} de {addr}")
+
+        try:
+            while True:
+                data = conn.recv(65535)
+                if not data:
+                    break
+
+                for msg in framer.feed(data):
+                    self.server.dispatch(msg, addr)
+
+                if framer.pings:
+                    stream.send(b"\r\n")      # pong (RFC 5626)
+
+        except (OSError, ValueError) as e:
+            print(f"⚠ Conexão {addr} encerrada: {e}")
+        finally:
+            if self.server.streams.get(addr) is stream:
+                del self.server.streams[addr]
+            stream.close()
+            print(f"🔌 Conexão {self.transport.upper()} de {addr} fechada")
+
+    # ---------------------------------------------------------------
+    def stop(self):
+        self.sock.close()
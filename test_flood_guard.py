@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Testes do FloodGuard (flood_guard.py): lixo descartado, token bucket por
+IP só quando ligado, allowlist e mensagens de diálogo existente passando
+mesmo com a origem acima da taxa.
+"""
+
+# ============================================================
+# IMPORTS
+# ============================================================
+
+from clock import SimClock
+from flood_guard import FloodGuard, call_id_of
+
+SBC = ("10.1.1.20", 5060)
+
+
+def _msg(method, call_id):
+    return (f"{method} sip:srs@10.0.0.10 SIP/2.0\r\n"
+            f"Via: SIP/2.0/UDP 10.1.1.20:5060;branch=z9hG4bK{call_id}\r\n"
+            f"Call-ID: {call_id}\r\n"
+            f"CSeq: 1 {method}\r\n\r\n").encode()
+
+
+# ============================================================
+# TESTES
+# ============================================================
+
+def test_descarta_nao_sip():
+    guard = FloodGuard(clock=SimClock())
+    assert not guard.allow(b"\x80\x00\x12\x34" + bytes(20), SBC)
+    assert not guard.allow(b"GET / HTTP/1.1\r\n", SBC)
+    assert guard.allow(b"SIP/2.0 200 OK\r\n", SBC)
+    assert guard.stats()["dropped"] == 2
+
+
+def test_sem_limite_por_padrao():
+    guard = FloodGuard(clock=SimClock())
+    assert all(guard.allow(_msg("INVITE", f"c{n}"), SBC) for n in range(10000))
+    assert guard.stats() == {"dropped": 0, "limited": 0, "sources": 0}
+
+
+def test_token_bucket_por_ip():
+    clock = SimClock()
+    guard = FloodGuard(rate=10, burst=5, clock=clock)
+    allowed = [guard.allow(_msg("INVITE", f"c{n}"), SBC) for n in range(8)]
+    assert allowed == [True] * 5 + [False] * 3
+    # Outro IP tem o próprio balde
+    assert guard.allow(_msg("INVITE", "x"), ("10.9.9.9", 5060))
+
+    clock.advance(0.25)                 # 2,5 fichas de volta
+    assert [guard.allow(_msg("INVITE", f"d{n}"), SBC) for n in range(3)] == \
+        [True, True, False]
+    assert guard.stats()["limited"] == 4
+
+
+def test_allowlist_e_dialogo_existente_passam():
+    calls = {"em-curso": object()}
+    guard = FloodGuard(rate=1, burst=1, allowlist=["10.0.0.1"],
+                       clock=SimClock(), dialogs=calls)
+    assert guard.allow(_msg("INVITE", "nova-1"), SBC)
+    assert not guard.allow(_msg("INVITE", "nova-2"), SBC)
+    # Acima da taxa, mas do diálogo aceito: ACK e BYE não se perdem
+    assert guard.allow(_msg("ACK", "em-curso"), SBC)
+    assert guard.allow(_msg("BYE", "em-curso"), SBC)
+    assert all(guard.allow(_msg("INVITE", f"a{n}"), ("10.0.0.1", 5060))
+               for n in range(50))
+
+
+def test_call_id_compacto():
+    assert call_id_of(b"BYE sip:a SIP/2.0\r\ni: abc@host \r\nCSeq: 2 BYE\r\n") == "abc@host"
+    assert call_id_of(b"BYE sip:a SIP/2.0\r\ncall-id:x\r\n") == "x"
+    assert call_id_of(b"BYE sip:a SIP/2.0\r\nVia: y\r\n") is None
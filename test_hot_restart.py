@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Testes do lado novo do hot restart (hot_restart.take_over) contra um
+processo antigo de mentira: recusa mantém o antigo no ar, e falha no
+meio só volta depois que ele saiu, sem deixar sockets herdados abertos.
+"""
+
+# ============================================================
+# IMPORTS
+# ============================================================
+
+import multiprocessing
+import os
+import socket
+import time
+
+import pytest
+
+from hot_restart import _recv_json, _send_json, take_over
+
+
+def _old_process(path, reply, ready, send_fds):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(1)
+    ready.set()
+    conn, _ = sock.accept()
+    _recv_json(conn)
+    _send_json(conn, reply)
+    if send_fds:
+        udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        socket.send_fds(conn, [b"F"], [udp.fileno()])
+    # Cai antes de mandar o resto (ou fica no ar, se recusou)
+    if not reply["ok"]:
+        time.sleep(30)
+    conn.close()
+
+
+def _start(tmp_path, reply, send_fds=False):
+    path = str(tmp_path / "handover.sock")
+    ready = multiprocessing.Event()
+    old = multiprocessing.Process(target=_old_process,
+                                  args=(path, reply, ready, send_fds))
+    old.start()
+    assert ready.wait(5)
+    return path, old
+
+
+def _open_fds():
+    return set(os.listdir("/proc/self/fd"))
+
+
+# ============================================================
+# TESTES
+# ============================================================
+
+def test_falha_no_meio_espera_o_antigo_sair(tmp_path):
+    path, old = _start(tmp_path, {"ok": True, "fds": 3, "sessions": []}, send_fds=True)
+    before = _open_fds()
+    t0 = time.monotonic()
+    with pytest.raises(ConnectionError):
+        take_over(path, timeout=5)
+    assert time.monotonic() - t0 < 5
+    # take_over só volta com o antigo fora (portas livres para o bind)
+    old.join(1)
+    assert old.exitcode == 0
+    assert _open_fds() <= before
+
+
+def test_recusa_mantem_o_antigo(tmp_path):
+    path, old = _start(tmp_path, {"ok": False, "error": "pipeline"})
+    try:
+        with pytest.raises(RuntimeError, match="recusado"):
+            take_over(path, timeout=5)
+        assert old.is_alive()
+    finally:
+        old.kill()
+        old.join()
+
+
+def test_sem_processo_antigo(tmp_path):
+    assert take_over(str(tmp_path / "ninguem.sock")) is None
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Testes do áudio ao vivo (media_fanout.py): assinatura só de perna que
+existe (nada fica para trás por Call-ID desconhecido), codec do OK vindo
+do SDP negociado e PCM decodificado com a tabela do codec certo.
+"""
+
+# ============================================================
+# IMPORTS
+# ============================================================
+
+import io
+import socket
+import threading
+import time
+
+import pytest
+
+from media_fanout import MediaFanout, consume, g711_to_pcm
+
+
+@pytest.fixture
+def fanout(tmp_path):
+    f = MediaFanout(str(tmp_path / "live.sock"), batch_packets=2)
+    f.start()
+    yield f
+    f.stop()
+
+
+def _sub(fanout, call_id, label, fmt="g711"):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(fanout.path)
+    sock.sendall(f"SUB {call_id} {label} {fmt}\n".encode())
+    reply = sock.makefile("rb").readline().decode().strip()
+    sock.close()
+    return reply
+
+
+def _rtp(pt, payload, ts=0):
+    return {"payload_type": pt, "payload": payload, "timestamp": ts}
+
+
+def _wait_subscribers(fanout, n):
+    deadline = time.monotonic() + 3
+    while fanout.stats()["subscribers"] < n and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+# ============================================================
+# TESTES
+# ============================================================
+
+def test_call_id_desconhecido_recusado_sem_deixar_fluxo(fanout):
+    for n in range(20):
+        assert _sub(fanout, f"nao-existe-{n}", "1") == "ERR fluxo desconhecido"
+    assert fanout.stats()["streams"] == 0
+    assert fanout.subscribe("nao-existe", "1", None) is None
+
+    # Perna encerrada: some, e a assinatura seguinte é recusada
+    fanout.open_stream("c1", "1")
+    fanout.close_stream("c1", "1")
+    assert _sub(fanout, "c1", "1") == "ERR fluxo desconhecido"
+    assert fanout.stats()["streams"] == 0
+
+
+def test_codec_negociado_no_ok(fanout):
+    fanout.open_stream("alaw", "1", "pcma")
+    fanout.open_stream("ulaw", "1")
+    assert _sub(fanout, "alaw", "1") == "OK pcma"
+    assert _sub(fanout, "alaw", "1", "ulaw") == "OK pcma"     # nome antigo
+    assert _sub(fanout, "ulaw", "1") == "OK pcmu"
+    assert _sub(fanout, "alaw", "1", "pcm") == "OK pcm"
+    assert _sub(fanout, "alaw", "1", "opus").startswith("ERR")
+
+
+@pytest.mark.parametrize("fmt", ["g711", "pcm"])
+def test_quadros_pcma(fanout, fmt):
+    fanout.open_stream("c2", "1", "pcma")
+    out = io.BytesIO()
+    t = threading.Thread(target=consume, args=(fanout.path, "c2", "1", fmt, out))
+    t.start()
+    _wait_subscribers(fanout, 1)
+
+    payload = bytes(range(160))
+    fanout.publish("c2", "1", _rtp(8, payload, 1000))
+    fanout.publish("c2", "1", _rtp(8, payload, 1160))
+    fanout.close_stream("c2", "1")
+    t.join(3)
+
+    expected = payload * 2
+    if fmt == "pcm":
+        expected = g711_to_pcm(expected, alaw=True)
+    assert out.getvalue() == expected
+    assert fanout.stats()["streams"] == 0
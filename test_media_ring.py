@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Testes do ring em memória compartilhada (media_ring.py): com o ring cheio
+só conta como descarte o pacote que foi de fato lido e jogado fora.
+"""
+
+# ============================================================
+# IMPORTS
+# ============================================================
+
+from media_ring import ShmRing
+
+
+def test_ring_cheio_conta_so_pacote_lido():
+    ring = ShmRing(slots=4, slot_size=64, consumers=1)
+    try:
+        assert all(ring.push(1, 0, b"x" * 10, 0.0) for _ in range(4))
+        # Cheio: reservar não descarta nada por si
+        for _ in range(10):
+            assert ring.reserve() is None
+        assert ring.dropped == 0
+
+        assert not ring.push(1, 0, b"y", 0.0)
+        assert ring.dropped == 1
+    finally:
+        ring.close(unlink=True)
+
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Testes do envio para object storage (object_upload.py) contra o S3 em
+memória de bench/fake_s3.py: multipart com várias partes em paralelo,
+retomada depois de falha só com as partes que faltavam, limite de banda,
+assinatura SigV4, arquivo que muda durante o envio (multipart abortado),
+resposta sem ETag ou erro inesperado voltando para a fila, e pacotes
+diários selados (uma chamada atrasada não sobrescreve o dia já enviado).
+"""
+
+# ============================================================
+# IMPORTS
+# ============================================================
+
+import os
+import time
+
+import pytest
+
+from bench.fake_s3 import ACCESS_KEY, SECRET_KEY, FakeS3
+from object_upload import S3Client, S3Error, Uploader
+from recording_pack import PackArchive, parse_block
+
+PART = 64 << 10
+
+
+@pytest.fixture
+def s3():
+    server = FakeS3().start()
+    yield server
+    server.stop()
+
+
+def _client(s3, secret=SECRET_KEY):
+    return S3Client(s3.endpoint, "gravacoes", ACCESS_KEY, secret, "us-east-1")
+
+
+def _file(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(os.urandom(size))
+    return str(path)
+
+
+def _uploader(s3, tmp_path, **kwargs):
+    kwargs.setdefault("workers", 4)
+    return Uploader(_client(s3), str(tmp_path / "uploads.db"), part_size=PART,
+                    retry_after=3600, sweep_interval=0, **kwargs)
+
+
+# ============================================================
+# TESTES
+# ============================================================
+
+def test_multipart_e_put_simples(s3, tmp_path):
+    big = _file(tmp_path, "perna_1.raw", 5 * PART + 1000)
+    small = _file(tmp_path, "perna_2.raw", 1000)
+    expected = {os.path.basename(p): open(p, "rb").read() for p in (big, small)}
+
+    up = _uploader(s3, tmp_path)
+    up.start()
+    up.add(big, "2024/01/02/perna_1.raw")
+    up.add(small, "2024/01/02/perna_2.raw")
+    assert up.wait(30)
+    assert up.uploaded == 2 and up.pending() == 0
+    up.close()
+
+    for name, data in expected.items():
+        assert s3.objects[("gravacoes", f"2024/01/02/{name}")] == data
+    assert s3.requests["upload_part"] == 6 and s3.requests["put"] == 1
+    assert not os.path.exists(big) and not os.path.exists(small)
+    # Conexões keep-alive reaproveitadas: no máximo uma por worker
+    assert s3.connections <= 4
+
+
+def test_retoma_so_as_partes_que_faltavam(s3, tmp_path):
+    path = _file(tmp_path, "longa.raw", 6 * PART)
+    data = open(path, "rb").read()
+    s3.fail = lambda method, query: 500 if query.get("partNumber") == "4" else None
+
+    up = _uploader(s3, tmp_path, retries=2)
+    up.start()
+    up.add(path, "longa.raw")
+    assert up.wait(30)
+    assert up.failed == 1 and up.pending() == 1
+    up.close()
+    assert os.path.exists(path) and ("gravacoes", "longa.raw") not in s3.objects
+
+    # "Processo novo": mesmo SQLite, S3 de volta ao normal
+    s3.fail = lambda method, query: None
+    sent = s3.requests["upload_part"]
+    up = _uploader(s3, tmp_path)
+    up.start()
+    assert up.wait(30)
+    assert up.pending() == 0
+    up.close()
+
+    assert s3.requests["upload_part"] - sent == 1
+    assert s3.requests["create"] == 1
+    assert s3.objects[("gravacoes", "longa.raw")] == data
+    assert not os.path.exists(path)
+
+
+def test_limite_de_banda(s3, tmp_path):
+    path = _file(tmp_path, "limitada.raw", 4 * PART)
+    up = _uploader(s3, tmp_path, bandwidth=1_000_000)
+    up.start()
+    t0 = time.monotonic()
+    up.add(path, "limitada.raw")
+    assert up.wait(30)
+    elapsed = time.monotonic() - t0
+    up.close()
+    # 256 KB a 1 MB/s, com 0,1 s de rajada
+    assert elapsed >= 0.15
+    assert s3.objects[("gravacoes", "limitada.raw")]
+
+
+def test_assinatura_errada_recusada(s3):
+    with pytest.raises(S3Error) as err:
+        _client(s3, secret="outra").put_object("x", b"abc")
+    assert err.value.status == 403 and err.value.code == "SignatureDoesNotMatch"
+    assert not err.value.retryable
+    _client(s3).put_object("chave com espaço@host.raw", b"abc")
+    assert _client(s3).get_object("chave com espaço@host.raw") == b"abc"
+
+
+def test_arquivo_que_cresce_durante_o_envio_sobe_de_novo(s3, tmp_path):
+    path = _file(tmp_path, "crescendo.raw", 1000)
+    grown = []
+
+    def append_once(method, query):
+        if not grown:
+            with open(path, "ab") as f:
+                f.write(b"mais")
+            grown.append(True)
+
+    s3.fail = append_once
+    up = _uploader(s3, tmp_path)
+    up.start()
+    up.add(path, "crescendo.raw")
+    deadline = time.monotonic() + 30
+    while up.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    up.close()
+
+    assert s3.requests["put"] == 2 and up.uploaded == 1
+    assert len(s3.objects[("gravacoes", "crescendo.raw")]) == 1004
+    assert not os.path.exists(path)
+
+
+def _call(tmp_path, call_id, ended):
+    leg = tmp_path / "recordings" / f"{call_id}_1.raw"
+    leg.parent.mkdir(exist_ok=True)
+    leg.write_bytes(call_id.encode() * 100)
+    return {"call_id": call_id, "ended": ended, "streams": [{"label": "1", "path": str(leg)}]}
+
+
+def _calls_in(pack):
+    calls, pos = [], 0
+    while pos < len(pack):
+        header, parts = parse_block(pack[pos:])
+        calls.append(header["call_id"])
+        pos += 8 + int.from_bytes(pack[pos + 4:pos + 8], "big") + sum(map(len, parts.values()))
+    return calls
+
+
+def test_chamada_atrasada_nao_sobrescreve_dia_enviado(s3, tmp_path):
+    archive = PackArchive(str(tmp_path / "archive"))
+    ended = time.time() - 2 * 86400
+    up = _uploader(s3, tmp_path)
+    up.start()
+
+    archive.add(_call(tmp_path, "a@sbc", ended))
+    archive.delete(())                  # espera a escrita da fila
+    assert up.add_sealed_days(archive) == 2
+    assert up.wait(30)
+    # Chega depois do dia já selado e enviado: geração nova do mesmo dia
+    archive.add(_call(tmp_path, "b@sbc", ended))
+    archive.delete(())
+    assert up.add_sealed_days(archive) == 2
+    assert up.wait(30)
+    up.close()
+    archive.close()
+
+    packs = sorted(k for (_, k) in s3.objects if k.endswith(".pack"))
+    assert len(packs) == 2 and len({k for (_, k) in s3.objects if k.endswith(".idx")}) == 2
+    assert [_calls_in(s3.objects[("gravacoes", k)]) for k in packs] == [["a@sbc"], ["b@sbc"]]
+    assert os.listdir(tmp_path / "archive") == []
+
+
+def test_resposta_sem_etag_e_erro_inesperado_tentam_de_novo(s3, tmp_path):
+    client = _client(s3)
+    request = client.request
+
+    def without_headers(*args, **kwargs):
+        status, _, data = request(*args, **kwargs)
+        return status, {}, data
+
+    client.request = without_headers
+    with pytest.raises(S3Error) as err:
+        client.put_object("sem-etag.raw", b"abc")
+    assert err.value.code == "MissingETag" and err.value.retryable
+
+    # Erro fora de S3Error/OSError no worker: não prende o arquivo
+    path = _file(tmp_path, "inesperado.raw", 1000)
+    up = Uploader(_client(s3), str(tmp_path / "uploads.db"), part_size=PART,
+                  retry_after=0.1, sweep_interval=0, workers=1)
+    put_object = up.client.put_object
+    calls = []
+
+    def flaky(*args):
+        calls.append(args[0])
+        if len(calls) == 1:
+            raise KeyError("ETag")
+        return put_object(*args)
+
+    up.client.put_object = flaky
+    up.start()
+    up.add(path, "inesperado.raw")
+    deadline = time.monotonic() + 30
+    while up.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    up.close()
+    assert up.failed == 1 and up.uploaded == 1 and len(calls) == 2
+    assert s3.objects[("gravacoes", "inesperado.raw")]
+
+
+def test_multipart_que_cresce_e_abortado(s3, tmp_path):
+    path = _file(tmp_path, "crescendo.raw", 3 * PART)
+    grown = []
+
+    def append_on_complete(method, query):
+        if method == "POST" and "uploadId" in query and not grown:
+            with open(path, "ab") as f:
+                f.write(b"mais")
+            grown.append(True)
+
+    s3.fail = append_on_complete
+    up = _uploader(s3, tmp_path)
+    up.start()
+    up.add(path, "crescendo.raw")
+    deadline = time.monotonic() + 30
+    while up.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    up.close()
+
+    assert s3.requests["abort"] == 1 and s3.requests["create"] == 2
+    assert len(s3.objects[("gravacoes", "crescendo.raw")]) == 3 * PART + 4
+    assert s3.uploads == {} and not os.path.exists(path)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Testes do diagnóstico em produção (profiler.py, admin_socket.py): o
+profiler por amostragem encontra a função que queima CPU numa thread, o
+watchdog grava um único dump por travamento de um loop e os comandos do
+socket de operação respondem (inclusive com erro) sem derrubar nada.
+"""
+
+# ============================================================
+# IMPORTS
+# ============================================================
+
+import os
+import threading
+import time
+
+from admin_socket import AdminSocket, send_command
+from profiler import SamplingProfiler, StallWatchdog
+
+
+def _queima_cpu(stop):
+    n = 0
+    while not stop.is_set():
+        n += 1
+    return n
+
+
+def _preso_no_handler(probe, seconds):
+    probe.busy_since = time.monotonic()
+    time.sleep(seconds)
+    probe.busy_since = 0.0
+
+
+# ============================================================
+# PROFILER POR AMOSTRAGEM
+# ============================================================
+
+def test_profiler_encontra_a_funcao_quente(tmp_path):
+    stop = threading.Event()
+    worker = threading.Thread(target=_queima_cpu, args=(stop,), name="quente")
+    worker.start()
+
+    profiler = SamplingProfiler(interval=0.005, out_dir=str(tmp_path))
+    try:
+        assert profiler.start()
+        assert not profiler.start()          # já ligado
+        time.sleep(0.3)
+    finally:
+        path = profiler.stop()
+        stop.set()
+        worker.join()
+
+    assert not profiler.running
+    assert profiler.samples > 0
+    folded = profiler.collapsed()
+    hot = [line for line in folded.splitlines() if line.startswith("quente;")]
+    # A pilha passa pelo cache de prefixos: a thread fica no mesmo frame
+    # de uma amostra para a outra e a contagem tem que continuar somando
+    assert any(line.split(" ")[0].endswith("test_profiler:_queima_cpu") for line in hot)
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in hot) > 1
+    with open(path) as f:
+        assert f.read() == folded
+    assert profiler.stop() is None           # já desligado
+
+
+# ============================================================
+# WATCHDOG DE TRAVAMENTO
+# ============================================================
+
+def test_watchdog_um_dump_por_travamento(tmp_path):
+    watchdog = StallWatchdog(threshold_ms=50, out_dir=str(tmp_path))
+    probe = watchdog.probe("recv")
+    stuck = threading.Thread(target=_preso_no_handler, args=(probe, 0.4), name="preso")
+
+    watchdog.start()
+    try:
+        stuck.start()
+        stuck.join()
+        time.sleep(0.1)
+    finally:
+        watchdog.stop()
+
+    loop_dumps = []
+    for path in watchdog.dumps:
+        with open(path) as f:
+            text = f.read()
+        if text.startswith("# loop recv"):
+            loop_dumps.append(text)
+    # O travamento durou vários períodos do watchdog, mas só um dump
+    assert len(loop_dumps) == 1
+    assert "--- preso" in loop_dumps[0]
+    assert "_preso_no_handler" in loop_dumps[0]
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(p) for p in watchdog.dumps)
+
+
+# ============================================================
+# COMANDOS DE OPERAÇÃO
+# ============================================================
+
+def test_comandos_do_socket_de_operacao(tmp_path):
+    admin = AdminSocket(str(tmp_path / "admin.sock"))
+    admin.command("eco", lambda args: " ".join(args))
+    admin.command("quebra", lambda args: 1 / 0)
+    admin.start()
+    try:
+        assert admin.execute("") == "ERR comando vazio"
+        assert admin.execute("nada").startswith("ERR comando desconhecido: nada (há: eco, quebra)")
+        assert admin.execute("quebra") == "ERR ZeroDivisionError: division by zero"
+        assert send_command(admin.path, "eco a b") == "a b\n"
+        # O erro anterior não derrubou o loop de aceitação
+        assert send_command(admin.path, "quebra") == "ERR ZeroDivisionError: division by zero\n"
+    finally:
+        admin.stop()
+    assert not os.path.exists(admin.path)
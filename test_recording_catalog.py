@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Testes do catálogo (recording_catalog.py): normalização de AoR, consulta
+por participante com janela de tempo e participante repetido, Call-ID e
+Session-ID, carga retroativa dos .meta.json (reimportar não duplica) e
+banco antigo sem a coluna archive e com linhas repetidas.
+"""
+
+# ============================================================
+# IMPORTS
+# ============================================================
+
+import json
+import sqlite3
+
+import pytest
+
+from recording_catalog import RecordingCatalog, normalize_aor
+
+ALICE = "sip:+551130001000@carrier.example.com"
+BOB = "sip:+551130002000@carrier.example.com"
+
+
+def _summary(call_id, started, people, **extra):
+    s = {
+        "call_id": call_id,
+        "started": started,
+        "ended": started + 60,
+        "from": f"<{people[0]}>;tag=1",
+        "to": f"<{people[-1]}>",
+        "codec": "PCMU",
+        "labels": ["1", "2"],
+        "streams": [{"label": "1", "path": f"{call_id}_1.raw", "packets": 3000,
+                     "extra": "fica de fora"}],
+        "participants": [{"aor": p, "name": None} for p in people],
+    }
+    s.update(extra)
+    return s
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "catalog.db")
+
+
+def _filled(db, summaries):
+    catalog = RecordingCatalog(db, flush_interval=0.05)
+    for s in summaries:
+        catalog.add(s)
+    catalog.close()          # esvazia a fila do write-behind
+    return RecordingCatalog(db)
+
+
+# ============================================================
+# TESTES
+# ============================================================
+
+@pytest.mark.parametrize("uri, aor", [
+    ("Fulano <sip:+5511@Carrier.com;user=phone>", "sip:+5511@carrier.com"),
+    ("SIP:Ana@Example.COM", "sip:Ana@example.com"),
+    ("<sips:bob@host>;tag=9", "sips:bob@host"),
+    ("tel:+5511", "tel:+5511"),
+    ("", None),
+    (None, None),
+])
+def test_normalize_aor(uri, aor):
+    assert normalize_aor(uri) == aor
+
+
+def test_consulta_por_aor_e_janela(db):
+    catalog = _filled(db, [
+        _summary("c1", 1000.0, [ALICE, BOB]),
+        _summary("c2", 2000.0, [ALICE]),
+        _summary("c3", 3000.0, [BOB]),
+        # AoR repetido no metadata vira um participante só
+        _summary("c4", 4000.0, [ALICE, "Alice <sip:+551130001000@Carrier.Example.com;user=phone>"]),
+    ])
+    try:
+        assert catalog.count() == 4
+        rows = catalog.by_aor(f"Alice <{ALICE};user=phone>")
+        assert [r["call_id"] for r in rows] == ["c4", "c2", "c1"]
+        assert [r["call_id"] for r in catalog.by_aor(ALICE, since=1500, until=4000)] == ["c2"]
+        assert [r["call_id"] for r in catalog.by_aor(BOB, limit=1)] == ["c3"]
+        assert catalog.by_aor("sip:ninguem@example.com") == []
+    finally:
+        catalog.close()
+
+
+def test_linha_completa_por_call_id(db):
+    catalog = _filled(db, [_summary("c1", 1000.0, [ALICE, BOB], session_id="S-1")])
+    try:
+        (row,) = catalog.by_call_id("c1")
+        assert row == {
+            "call_id": "c1", "session_id": "S-1",
+            "from_uri": ALICE, "to_uri": BOB,
+            "started": 1000.0, "ended": 1060.0, "duration": 60.0,
+            "codec": "PCMU", "labels": ["1", "2"],
+            "files": [{"label": "1", "path": "c1_1.raw", "packets": 3000}],
+            "archive": None,
+            "participants": [{"aor": ALICE, "name": None}, {"aor": BOB, "name": None}],
+        }
+        assert catalog.by_session_id("S-1")[0]["call_id"] == "c1"
+        assert [r["call_id"] for r in catalog.between(0, 2000)] == ["c1"]
+    finally:
+        catalog.close()
+
+
+def test_import_dir(db, tmp_path, capsys):
+    rec = tmp_path / "recordings"
+    rec.mkdir()
+    for n in range(3):
+        (rec / f"c{n}.meta.json").write_text(json.dumps(_summary(f"c{n}", 100.0 * n, [ALICE])))
+    (rec / "quebrado.meta.json").write_text("{")
+    (rec / "c0_1.raw").write_bytes(b"\xff" * 160)
+
+    catalog = RecordingCatalog(db, flush_interval=0.05)
+    assert catalog.import_dir(str(rec)) == 3
+    catalog.close()
+    assert "quebrado.meta.json ignorado" in capsys.readouterr().out
+
+    catalog = RecordingCatalog(db)
+    try:
+        assert catalog.count() == 3
+        assert len(catalog.by_aor(ALICE)) == 3
+    finally:
+        catalog.close()
+
+
+def test_banco_antigo_ganha_coluna_archive(db):
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE calls (id INTEGER PRIMARY KEY, call_id TEXT NOT NULL,"
+                 " session_id TEXT, from_uri TEXT, to_uri TEXT, started REAL NOT NULL,"
+                 " ended REAL, duration REAL, codec TEXT, labels TEXT, files TEXT)")
+    conn.execute("INSERT INTO calls (call_id, started) VALUES ('velha', 1.0)")
+    conn.commit()
+    conn.close()
+
+    catalog = RecordingCatalog(db)
+    try:
+        (row,) = catalog.by_call_id("velha")
+        assert row["archive"] is None and row["files"] == []
+    finally:
+        catalog.close()
+
+
+def test_reimportar_nao_duplica(db, tmp_path):
+    rec = tmp_path / "recordings"
+    rec.mkdir()
+    (rec / "c0.meta.json").write_text(json.dumps(_summary("c0", 100.0, [ALICE, BOB])))
+    for _ in range(2):
+        catalog = RecordingCatalog(db, flush_interval=0.05)
+        assert catalog.import_dir(str(rec)) == 1
+        catalog.close()
+
+    catalog = RecordingCatalog(db)
+    try:
+        assert catalog.count() == 1
+        (row,) = catalog.by_call_id("c0")
+        assert len(row["participants"]) == 2
+        assert len(catalog.by_aor(BOB)) == 1
+    finally:
+        catalog.close()
+
+
+def test_banco_antigo_com_linhas_repetidas(db):
+    catalog = _filled(db, [_summary("c1", 1000.0, [ALICE])])
+    catalog.close()
+    conn = sqlite3.connect(db)
+    conn.execute("DROP INDEX calls_unique")
+    conn.execute("INSERT INTO calls (call_id, started) VALUES ('c1', 1000.0)")
+    conn.execute("INSERT INTO participants VALUES (?, 1000.0, last_insert_rowid(), NULL)", (BOB,))
+    conn.commit()
+    conn.close()
+
+    catalog = RecordingCatalog(db)
+    try:
+        (row,) = catalog.by_call_id("c1")
+        assert row["participants"] == [{"aor": ALICE, "name": None}]
+        assert catalog.by_aor(BOB) == []
+    finally:
+        catalog.close()
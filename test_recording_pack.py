@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Testes dos pacotes diários (recording_pack.py): append e leitura, Call-ID
+repetido (mesma chamada reenfileirada × outra chamada com o mesmo
+Call-ID), índice refeito depois de crash, compactação e o catálogo
+apontando para o pacote depois que os arquivos soltos somem.
+"""
+
+# ============================================================
+# IMPORTS
+# ============================================================
+
+import json
+import os
+
+import pytest
+
+from recording_catalog import RecordingCatalog
+from recording_pack import PackArchive, day_of
+from sip_session import metadata_path
+
+ENDED = 1700000000.0
+DAY = day_of(ENDED)
+
+
+def _call(rec_dir, call_id, legs, started=ENDED - 30, suffix=""):
+    streams = []
+    for label, data in legs.items():
+        path = os.path.join(str(rec_dir), f"{call_id}{suffix}_{label}.raw")
+        with open(path, "wb") as f:
+            f.write(data)
+        streams.append({"label": label, "path": path, "packets": len(data) // 160})
+    summary = {"call_id": call_id, "started": started, "ended": ENDED,
+               "labels": list(legs), "invite_file": None, "streams": streams}
+    with open(metadata_path(call_id, str(rec_dir)), "w") as f:
+        json.dump(summary, f)
+    return summary
+
+
+def _sync(archive):
+    # Fila do arquivo processada (add é assíncrono)
+    archive.delete(())
+
+
+@pytest.fixture
+def rec_dir(tmp_path):
+    d = tmp_path / "recordings"
+    d.mkdir()
+    return d
+
+
+# ============================================================
+# TESTES
+# ============================================================
+
+def test_append_e_leitura(tmp_path, rec_dir):
+    archive = PackArchive(str(tmp_path / "archive"))
+    a = _call(rec_dir, "a@sbc", {"1": b"\x01" * 800, "2": b"\x02" * 480})
+    b = _call(rec_dir, "b@sbc", {"1": b"\x03" * 160})
+    archive.add(a)
+    archive.add(b)
+    _sync(archive)
+
+    summary, parts = archive.read("a@sbc")
+    assert summary == a
+    assert bytes(parts["a@sbc_1.raw"]) == b"\x01" * 800
+    assert bytes(parts["a@sbc_2.raw"]) == b"\x02" * 480
+    assert bytes(archive.read("b@sbc", DAY)[1]["b@sbc_1.raw"]) == b"\x03" * 160
+    # Arquivos soltos apagados só depois do pacote em disco
+    assert os.listdir(rec_dir) == []
+    archive.close()
+
+
+def test_call_id_repetido_com_outras_partes_nao_se_perde(tmp_path, rec_dir):
+    archive = PackArchive(str(tmp_path / "archive"))
+    archive.add(_call(rec_dir, "dup@sbc", {"1": b"\x01" * 320}))
+    _sync(archive)
+    # Mesmo Call-ID, outra chamada (SBC reusando): entra com chave própria
+    second = _call(rec_dir, "dup@sbc", {"1": b"\x07" * 640}, started=ENDED - 10)
+    archive.add(second)
+    _sync(archive)
+
+    assert archive.keys("dup@sbc") == ["dup@sbc", "dup@sbc#2"]
+    assert bytes(archive.read("dup@sbc")[1]["dup@sbc_1.raw"]) == b"\x01" * 320
+    summary, parts = archive.read("dup@sbc#2")
+    assert summary == second and bytes(parts["dup@sbc_1.raw"]) == b"\x07" * 640
+    archive.close()
+
+
+def test_mesma_chamada_reenfileirada_so_limpa(tmp_path, rec_dir):
+    archive = PackArchive(str(tmp_path / "archive"))
+    legs = {"1": b"\x01" * 320, "2": b"\x02" * 320}
+    archive.add(_call(rec_dir, "c@sbc", legs))
+    _sync(archive)
+    size = os.path.getsize(archive.pack_path(DAY))
+
+    # Crash antes de apagar: os mesmos arquivos voltam pelo pack_dir
+    _call(rec_dir, "c@sbc", legs)
+    assert archive.pack_dir(str(rec_dir)) == 1
+    _sync(archive)
+    assert archive.keys("c@sbc") == ["c@sbc"]
+    assert os.path.getsize(archive.pack_path(DAY)) == size
+    assert os.listdir(rec_dir) == []
+    archive.close()
+
+
+def test_indice_refeito_depois_de_crash(tmp_path, rec_dir):
+    arc_dir = str(tmp_path / "archive")
+    archive = PackArchive(arc_dir)
+    for n in range(3):
+        archive.add(_call(rec_dir, f"r{n}@sbc", {"1": bytes([n]) * 400}))
+    _sync(archive)
+    archive.close()
+
+    # Crash entre o fsync do .pack e o do .idx: a última entrada não foi,
+    # e sobrou meio bloco de uma escrita seguinte no fim do .pack
+    with open(archive.index_path(DAY), "rb+") as f:
+        raw = f.read()
+        f.truncate(len(raw) - (18 + len("r2@sbc")))
+    with open(archive.pack_path(DAY), "ab") as f:
+        f.write(b"SRPK\x00\x00\x01\x00{\"call_id\"")
+
+    archive = PackArchive(arc_dir)
+    archive.add(_call(rec_dir, "r3@sbc", {"1": b"\x09" * 400}))
+    _sync(archive)
+    for n in range(4):
+        assert archive.read(f"r{n}@sbc") is not None
+    archive.close()
+    # E o .idx em disco voltou a bater com o .pack
+    assert set(PackArchive(arc_dir).keys("r2@sbc")) == {"r2@sbc"}
+
+
+def test_compactacao(tmp_path, rec_dir):
+    arc_dir = str(tmp_path / "archive")
+    archive = PackArchive(arc_dir)
+    for n in range(3):
+        archive.add(_call(rec_dir, f"k{n}@sbc", {"1": bytes([n]) * 1000}))
+    _sync(archive)
+    before = os.path.getsize(archive.pack_path(DAY))
+
+    removed, freed = archive.compact(DAY, lambda cid, ended: cid == "k1@sbc")
+    assert removed == 1
+    assert os.path.getsize(archive.pack_path(DAY)) == before - freed
+    assert archive.read("k1@sbc") is None
+    assert bytes(archive.read("k2@sbc")[1]["k2@sbc_1.raw"]) == b"\x02" * 1000
+    archive.close()
+
+    # Outro processo lê o dia compactado pelo .idx novo
+    archive = PackArchive(arc_dir)
+    assert archive.read("k0@sbc") is not None and archive.read("k1@sbc") is None
+    archive.close()
+
+
+def test_catalogo_aponta_para_o_pacote(tmp_path, rec_dir):
+    catalog = RecordingCatalog(str(tmp_path / "catalog.db"))
+    archive = PackArchive(str(tmp_path / "archive"), catalog=catalog)
+    for started in (ENDED - 60, ENDED - 20):
+        summary = _call(rec_dir, "cat@sbc", {"1": os.urandom(160 + int(started) % 7)},
+                        started=started)
+        catalog.add(summary)
+        archive.add(summary)
+        _sync(archive)
+    archive.close()
+    catalog.close()
+
+    rows = RecordingCatalog(str(tmp_path / "catalog.db")).by_call_id("cat@sbc")
+    assert sorted((r["started"], r["archive"]["key"]) for r in rows) == [
+        (ENDED - 60, "cat@sbc"), (ENDED - 20, "cat@sbc#2")]
+    assert all(r["archive"]["day"] == DAY for r in rows)
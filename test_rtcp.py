@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Testes da qualidade dos fluxos (rtcp.py): perda, virada do número de
+sequência e jitter do RtpStats (RFC 3550, apêndice A), parse de SR/RR com
+pacotes montados byte a byte, e jitter na unidade do clock do codec de
+cada fluxo (vídeo a 90 kHz, áudio a 8 kHz).
+"""
+
+# ============================================================
+# IMPORTS
+# ============================================================
+
+import struct
+
+from media_policy import MediaPolicy, MediaStream, clock_rate
+from rtcp import RTCP_RR, RTCP_SR, RtpStats, parse_rtcp
+
+
+def _m(kind, codecs, rtpmap=None):
+    return {"type": kind, "label": None, "port": 4000, "protocol": "RTP/AVP",
+            "codecs": codecs, "attributes": {"rtpmap": rtpmap or {}}}
+
+
+# ============================================================
+# CLOCK POR FLUXO
+# ============================================================
+
+def test_clock_rate_do_rtpmap():
+    audio, video, vp8 = MediaPolicy().negotiate([
+        _m("audio", ["8", "0"]),
+        _m("video", ["96"], {"96": "H264/90000"}),
+        _m("video", ["100"], {"100": "VP8/90000"}),
+    ])
+    assert clock_rate(audio) == 8000
+    assert clock_rate(video) == 90000 and clock_rate(vp8) == 90000
+    # Payload type estático sem rtpmap: pelo tipo de mídia
+    assert clock_rate(MediaStream(0, "video", "1", True, "RTP/AVP", ("34",), ())) == 90000
+    assert clock_rate(MediaStream(0, "audio", "1", True, "RTP/AVP", ("9",),
+                                  ("rtpmap:9 G722/8000",))) == 8000
+
+
+def test_jitter_de_video_a_90khz():
+    # 30 quadros/s chegando em cadência perfeita: jitter zero só no clock certo
+    right, wrong = RtpStats(90000), RtpStats()
+    for n in range(300):
+        for st in (right, wrong):
+            st.update(0x1234, n, n * 3000, 10.0 + n / 30)
+    assert right.jitter < 1
+    assert wrong.jitter > 2000
+
+
+# ============================================================
+# PERDA E SEQUÊNCIA
+# ============================================================
+
+def _feed(st, seqs, ssrc=0x1234):
+    for n, seq in enumerate(seqs):
+        st.update(ssrc, seq, n * 160, n * 0.02)
+
+
+def test_perda_conta_os_buracos():
+    st = RtpStats()
+    _feed(st, [s for s in range(100) if s % 10 != 3])
+    assert (st.expected, st.received, st.lost) == (100, 90, 10)
+    assert st.summary()["loss_pct"] == 10.0
+
+
+def test_duplicado_e_fora_de_ordem_nao_viram_perda():
+    st = RtpStats()
+    _feed(st, [0, 1, 3, 2, 4, 4, 5])
+    assert st.expected == 6 and st.max_seq == 5
+    assert st.lost == 0             # duplicado compensa, nunca negativo
+
+
+def test_virada_do_numero_de_sequencia():
+    st = RtpStats()
+    _feed(st, [65533, 65534, 65535, 0, 1, 3])
+    assert st.cycles == 1 << 16 and st.max_seq == 3
+    assert (st.expected, st.lost) == (7, 1)
+
+
+def test_salto_grande_so_vale_confirmado():
+    st = RtpStats()
+    _feed(st, [10, 11, 20000])
+    assert st.max_seq == 11 and st.received == 2
+    # Segundo pacote em sequência confirma: o SBC recomeçou a numeração
+    st.update(0x1234, 20001, 0, 1.0)
+    assert st.base_seq == 20001 and st.expected == 1
+
+
+def test_troca_de_ssrc_recomeca():
+    st = RtpStats()
+    _feed(st, [0, 5])
+    _feed(st, [700, 701], ssrc=0x9999)
+    assert (st.ssrc, st.expected, st.lost) == (0x9999, 2, 0)
+
+
+# ============================================================
+# JITTER
+# ============================================================
+
+def test_jitter_passo_a_passo():
+    # Um pacote 20 ms atrasado (160 unidades a 8 kHz): J = 160/16, depois
+    # volta ao ritmo e a diferença de trânsito seguinte também é 160
+    st = RtpStats()
+    st.update(1, 0, 0, 0.0)
+    st.update(1, 1, 160, 0.04)
+    assert st.jitter == 10.0
+    st.update(1, 2, 320, 0.04)
+    assert st.jitter == 10.0 + (160 - 10.0) / 16
+    assert st.summary()["jitter_ms"] == round(1000 * st.jitter / 8000, 3)
+
+
+def test_jitter_com_timestamp_virando_32_bits():
+    st = RtpStats()
+    base = (1 << 32) - 160
+    for n in range(4):
+        st.update(1, n, (base + n * 160) % (1 << 32), 5.0 + n * 0.02)
+    assert st.jitter < 1
+
+
+# ============================================================
+# PARSE DE SR/RR
+# ============================================================
+
+def _header(count, pt, body):
+    return struct.pack("!BBH", 0x80 | count, pt, len(body) // 4) + body
+
+
+def _block(ssrc, fraction, cumulative, seq, jitter, lsr, dlsr):
+    word = (fraction << 24) | (cumulative & 0xFFFFFF)
+    return struct.pack("!IIIIII", ssrc, word, seq, jitter, lsr, dlsr)
+
+
+def test_sr_com_bloco():
+    sr = bytes.fromhex(
+        "81c8000c"                      # V=2 RC=1 SR, 13 palavras
+        "11223344"                      # SSRC do remetente
+        "e8b7a4c0" "80000000"           # NTP: 3904349376.5
+        "00012c00"                      # RTP ts
+        "000003e8" "0001f400"           # 1000 pacotes, 128000 octetos
+        "55667788" "40000005"           # bloco: fração 64/256, 5 perdidos
+        "0001000a" "00000020"           # seq estendido, jitter
+        "a4c08000" "00018000"           # LSR, DLSR
+    )
+    (report,) = parse_rtcp(sr)
+    assert report["type"] == RTCP_SR and report["ssrc"] == 0x11223344
+    assert report["ntp"] == 3904349376.5
+    assert (report["rtp_ts"], report["packets"], report["octets"]) == (76800, 1000, 128000)
+    assert report["blocks"] == [{
+        "ssrc": 0x55667788, "fraction_lost": 0.25, "cumulative_lost": 5,
+        "highest_seq": 0x1000A, "jitter": 32, "lsr": 0xA4C08000, "dlsr": 0x18000,
+    }]
+
+
+def test_rr_composto_com_sdes():
+    rr = _header(2, RTCP_RR, struct.pack("!I", 0xAABBCCDD)
+                 + _block(1, 0, 0xFFFFFF, 65536, 7, 0, 0)
+                 + _block(2, 255, 3, 12, 0, 0, 0))
+    sdes = _header(1, 202, struct.pack("!I", 0xAABBCCDD) + b"\x01\x03abc\x00\x00")
+    (report,) = parse_rtcp(rr + sdes)
+    assert report["type"] == RTCP_RR and report["ssrc"] == 0xAABBCCDD
+    first, second = report["blocks"]
+    assert first["cumulative_lost"] == -1          # 24 bits com sinal
+    assert second["fraction_lost"] == 255 / 256 and second["cumulative_lost"] == 3
+
+
+def test_pacote_truncado_ou_de_outra_versao():
+    sr = _header(0, RTCP_SR, struct.pack("!IIIIII", 1, 2, 3, 4, 5, 6))
+    rr = _header(0, RTCP_RR, struct.pack("!I", 9))
+    assert [r["ssrc"] for r in parse_rtcp(rr + sr[:-4])] == [9]
+    assert parse_rtcp(b"\x40" + rr[1:]) == []
+    assert parse_rtcp(b"") == []
+
+
+def test_on_rtcp_guarda_remetente_e_blocos():
+    st = RtpStats()
+    sr = _header(1, RTCP_SR, struct.pack("!IIIIII", 7, 1, 0, 160, 10, 1600)
+                 + _block(7, 0, 2, 99, 4, 0, 0))
+    st.on_rtcp(parse_rtcp(sr))
+    assert st.sender == {"ssrc": 7, "ntp": 1.0, "rtp_ts": 160, "packets": 10, "octets": 1600}
+    assert st.summary()["remote_reports"][0]["cumulative_lost"] == 2
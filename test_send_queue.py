@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Testes da fila de envio SIP (send_queue.py): quem chama send() — o loop
+UDP inclusive — nunca espera o buffer do socket nem envia mais que
+max_batch; o resto sai pela thread de contrapressão, na ordem.
+"""
+
+# ============================================================
+# IMPORTS
+# ============================================================
+
+import errno
+import socket
+import threading
+import time
+
+from send_queue import SendQueue
+
+PEER = ("127.0.0.1", 9)
+
+
+class _Sock:
+    """
+    Socket UDP de verdade (o select precisa do fileno) que responde
+    EAGAIN enquanto full estiver ligado e guarda o que foi enviado.
+    """
+
+    def __init__(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.full = False
+        self.sent = []
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def sendto(self, data, flags, addr):
+        if self.full:
+            raise BlockingIOError(errno.EAGAIN, "Resource temporarily unavailable")
+        self.sent.append(data)
+
+    def close(self):
+        self._sock.close()
+
+
+def _wait(cond, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not cond() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return cond()
+
+
+# ============================================================
+# TESTES
+# ============================================================
+
+def test_buffer_cheio_nao_segura_quem_envia():
+    sock = _Sock()
+    q = SendQueue(sock)
+    sock.full = True
+    t0 = time.monotonic()
+    for n in range(50):
+        assert q.send(b"%d" % n, PEER)
+    # Antes: até BLOCK_TIMEOUT (1 s) por mensagem no dono
+    assert time.monotonic() - t0 < 0.2
+    assert q.stats()["handoffs"] == 1
+
+    sock.full = False
+    assert _wait(lambda: len(sock.sent) == 50)
+    assert sock.sent == [b"%d" % n for n in range(50)]
+    assert q.depth == 0 and q.expired == 0
+    sock.close()
+
+
+def test_dono_envia_no_maximo_max_batch():
+    sock = _Sock()
+    q = SendQueue(sock, max_batch=10)
+    # Outra thread é dona enquanto a rajada chega
+    q._owner.acquire()
+    for n in range(100):
+        q.send(b"%d" % n, PEER)
+    q._owner.release()
+
+    senders = []
+    original = sock.sendto
+
+    def sendto(data, flags, addr):
+        senders.append(threading.current_thread())
+        original(data, flags, addr)
+
+    sock.sendto = sendto
+    q.send(b"ultima", PEER)
+    assert _wait(lambda: len(sock.sent) == 101)
+    assert sock.sent == [b"%d" % n for n in range(100)] + [b"ultima"]
+    # Quem chamou send() mandou um lote só; o resto, a contrapressão
+    assert senders.count(threading.current_thread()) == 10
+    assert q.handoffs == 1
+    sock.close()
+
+
+def test_flush_envia_o_que_restou():
+    sock = _Sock()
+    q = SendQueue(sock)
+    q._owner.acquire()
+    for n in range(5):
+        q.send(b"%d" % n, PEER)
+    q._owner.release()
+    q.flush()
+    assert sock.sent == [b"%d" % n for n in range(5)]
+    sock.close()
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Cenários de escala em tempo virtual: o servidor inteiro (handlers,
+sessões, reaper, receptores RTP) sob SimClock + SimNetwork, com um SBC
+simulado do outro lado. Minutos de tráfego rodam em segundos e o
+resultado é o mesmo a cada execução.
+"""
+
+# ============================================================
+# IMPORTS
+# ============================================================
+
+import os
+import re
+import struct
+from collections import Counter
+
+import sip_session
+from admission import AdmissionControl
+from bench.loadgen import build_invite, build_in_dialog
+from clock import SimClock
+from handlers.invite_handler import handle_invite
+from media_ports import PortPool
+from server_siprec import SIPServer
+from session_journal import SessionJournal
+from sim_network import SimNetwork
+from sip_parser import parse_sip_message
+
+SRS = ("10.0.0.10", 5060)
+SBC_IP = "10.1.1.20"
+
+RTP_HEADER = struct.Struct("!BBHII")
+PAYLOAD = b"\xff" * 160             # 20 ms de PCMU
+
+
+# ============================================================
+# SBC SIMULADO
+# ============================================================
+
+class Sbc:
+    """
+    Abre chamadas SIPREC, confirma (ou não) com ACK, manda RTP e BYE;
+    anota as respostas e os BYEs vindos do servidor.
+    """
+
+    def __init__(self, clock, net, ack=True):
+        self.clock = clock
+        self.local = (SBC_IP, 5060)
+        self.ack = ack
+        self.sock = net.socket()
+        self.sock.bind(self.local)
+        self.sock.on_datagram = self._on_datagram
+        self.rtp_sock = net.socket()
+        self.rtp_sock.bind((SBC_IP, 0))
+
+        self.calls = {}         # Call-ID → chamada (formato do loadgen) + portas
+        self.ok = Counter()     # 200 OK por método
+        self.failed = Counter()  # respostas finais de erro por código
+        self.byes = set()       # Call-IDs encerrados pelo servidor
+
+    def invite(self, n):
+        call_id, from_tag, data = build_invite(n, self.local, SRS)
+        self.calls[call_id] = {"call_id": call_id, "from_tag": from_tag, "ports": []}
+        self.sock.sendto(data, SRS)
+
+    def reinvite(self, n, sdp=None):
+        """
+        re-INVITE no diálogo da chamada n (To com o tag do servidor);
+        sdp(corpo) → corpo alterado, de mesmo tamanho.
+        """
+        call_id, _, data = build_invite(n, self.local, SRS)
+        call = self.calls[call_id]
+        data = re.sub(rb"(?m)^To: [^\r\n]*", f"To: {call['to']}".encode(), data)
+        data = data.replace(b"CSeq: 101 INVITE", b"CSeq: 102 INVITE")
+        if sdp is not None:
+            data = sdp(data)
+        self.sock.sendto(data, SRS)
+
+    def bye_all(self):
+        for call in self.calls.values():
+            if "to" in call:
+                self.sock.sendto(build_in_dialog(
+                    "BYE", call, self.local, SRS, 102, f"z9hG4bKbye{call['call_id']}"
+                ), SRS)
+
+    def send_rtp(self, seconds):
+        """
+        20 ms de PCMU por fluxo aceito, a cada 20 ms, por `seconds`.
+        """
+        ports = [p for call in self.calls.values() for p in call["ports"]]
+        ticks = round(seconds / 0.020)
+
+        def tick(i):
+            for ssrc, port in enumerate(ports):
+                header = RTP_HEADER.pack(0x80, 0, i & 0xFFFF, i * 160, ssrc)
+                self.rtp_sock.sendto(header + PAYLOAD, (SRS[0], port))
+            if i + 1 < ticks:
+                self.clock.call_later(0.020, tick, i + 1)
+
+        self.clock.spawn(tick, 0)
+
+    def _on_datagram(self, data, addr):
+        msg = parse_sip_message(data.decode())
+        hdr = msg["headers"]
+        call = self.calls.get(hdr.get("Call-ID"))
+        if call is None:
+            return
+        if msg["start_line"].startswith("BYE"):
+            self.byes.add(call["call_id"])
+            return
+        if not msg["start_line"].startswith("SIP/2.0 200"):
+            code = int(msg["start_line"].split()[1])
+            if code >= 300:
+                self.failed[code] += 1
+            return
+
+        method = hdr["CSeq"].split()[1]
+        self.ok[method] += 1
+        if method == "INVITE":
+            call["to"] = hdr["To"]
+            call["ports"] = [int(p) for p in re.findall(r"m=audio (\d+)", msg["body"])]
+            if self.ack:
+                self.sock.sendto(build_in_dialog(
+                    "ACK", call, self.local, SRS, 101, f"z9hG4bKack{call['call_id']}"
+                ), SRS)
+
+
+def _world(ack=True, loss=0.0, seed=0, **server_kw):
+    clock = SimClock()
+    net = SimNetwork(clock, latency=0.002, loss=loss, seed=seed)
+    server = SIPServer(
+        *SRS, clock=clock, network=net,
+        admission=AdmissionControl(max_pending=100000, max_sessions=100000),
+        **server_kw
+    )
+    server.ports = PortPool(10000, 60000)
+    return clock, net, server, Sbc(clock, net, ack=ack)
+
+
+def _open(clock, sbc, calls, cps):
+    for n in range(calls):
+        clock.call_at(n / cps, sbc.invite, n)
+    clock.advance(calls / cps + 1.0)
+
+
+# ============================================================
+# CENÁRIOS
+# ============================================================
+
+def test_ack_timeout_storm(tmp_path, monkeypatch):
+    # 10.000 INVITEs a 1000/s, nenhum ACK: todos caem no prazo do ACK
+    monkeypatch.chdir(tmp_path)
+    clock, net, server, sbc = _world(ack=False)
+    free = server.ports.free
+
+    _open(clock, sbc, 10000, cps=1000)
+    assert sbc.ok["INVITE"] == 10000
+    assert len(server.calls) == 10000
+
+    clock.advance(20.0)         # 31 s depois do primeiro INVITE: ainda vivos
+    assert server.reaper.reaped["ack"] == 0
+
+    clock.advance(15.0)
+    assert server.reaper.reaped["ack"] == 10000
+    assert len(sbc.byes) == 10000
+    assert server.calls == {}
+    assert server.ports.free == free
+
+
+def test_mass_bye_closes_every_recording(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    clock, net, server, sbc = _world()
+
+    _open(clock, sbc, 200, cps=100)
+    sbc.send_rtp(10.0)
+    clock.advance(10.5)
+    sbc.bye_all()
+    clock.advance(1.0)
+
+    assert sbc.ok["BYE"] == 200
+    assert server.calls == {}
+    raws = [f for f in os.listdir("recordings") if f.endswith(".raw")]
+    metas = [f for f in os.listdir("recordings") if f.endswith(".meta.json")]
+    assert len(raws) == 400 and len(metas) == 200
+    assert {os.path.getsize(os.path.join("recordings", f)) for f in raws} == {500 * 160}
+
+
+def test_rtp_timeout_reaps_silent_calls(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    clock, net, server, sbc = _world(rtp_timeout=60.0)
+
+    _open(clock, sbc, 50, cps=50)         # ACK: o prazo do ACK não dispara
+    clock.advance(57.0)
+    assert server.reaper.reaped == {"ack": 0, "rtp": 0, "timer": 0}
+
+    clock.advance(3.0)
+    assert server.reaper.reaped["rtp"] == 50
+    assert len(sbc.byes) == 50
+
+
+def test_session_timer_only_when_sbc_refreshes(tmp_path, monkeypatch):
+    # O 200 OK deixa o refresh com o SBC (refresher=uac): sem re-INVITE a
+    # chamada cai no Session-Expires; com ele, segue
+    monkeypatch.chdir(tmp_path)
+    clock, net, server, sbc = _world(rtp_timeout=10 ** 6)
+    seen = []
+    on_datagram = sbc._on_datagram
+    sbc.sock.on_datagram = lambda data, addr: (seen.append(data), on_datagram(data, addr))
+
+    _open(clock, sbc, 10, cps=10)
+    ok = [d for d in seen if d.startswith(b"SIP/2.0 200")][0]
+    assert b"Session-Expires: 1800;refresher=uac" in ok and b"Require: timer" in ok
+    clock.advance(1000.0)
+    sbc.reinvite(0)                         # re-INVITE de refresh
+    clock.advance(798.0)
+    assert server.reaper.reaped["timer"] == 0
+
+    clock.advance(3.0)
+    assert server.reaper.reaped["timer"] == 9
+    assert len(server.calls) == 1 and len(sbc.byes) == 9
+
+
+def test_no_session_timer_without_uac_support(tmp_path, monkeypatch):
+    # UAC sem "timer" no Supported: ninguém faria refresh, não há prazo
+    monkeypatch.chdir(tmp_path)
+    clock, net, server, sbc = _world(rtp_timeout=10 ** 6)
+    seen = []
+    on_datagram = sbc._on_datagram
+    sbc.sock.on_datagram = lambda data, addr: (seen.append(data), on_datagram(data, addr))
+    call_id, from_tag, data = build_invite(0, sbc.local, SRS)
+    sbc.calls[call_id] = {"call_id": call_id, "from_tag": from_tag, "ports": []}
+    sbc.sock.sendto(data.replace(b"100rel,timer,", b"100rel,"), SRS)
+    clock.advance(2 * 3600.0)
+
+    ok = [d for d in seen if d.startswith(b"SIP/2.0 200")][0]
+    assert b"Session-Expires" not in ok
+    assert server.reaper.reaped["timer"] == 0 and call_id in server.calls
+
+
+def test_same_seed_same_outcome(tmp_path, monkeypatch):
+    def run(name):
+        os.makedirs(tmp_path / name)
+        monkeypatch.chdir(tmp_path / name)
+        clock, net, server, sbc = _world(loss=0.05, seed=7)
+        _open(clock, sbc, 300, cps=300)
+        sbc.send_rtp(2.0)
+        clock.advance(40.0)
+        sizes = sorted(os.path.getsize(os.path.join("recordings", f))
+                       for f in os.listdir("recordings") if f.endswith(".raw"))
+        return (net.lost, net.delivered, dict(server.reaper.reaped),
+                sorted(sbc.byes), sizes, clock.events)
+
+    first = run("a")
+    assert first[0] > 0                 # houve perda (INVITE, ACK, RTP)
+    assert first == run("b")
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+
+def test_midia_que_nao_abre_recusa_e_libera(tmp_path, monkeypatch):
+    # Pool com as portas de uma chamada só, e a segunda delas ocupada por
+    # fora: o 1º fluxo abre, o 2º não acha porta — a chamada é recusada
+    # sem deixar receptor, porta nem sessão para trás
+    monkeypatch.chdir(tmp_path)
+    clock, net, server, sbc = _world()
+    server.ports = PortPool(10000, 10004)
+    server.admission.min_free_ports = 0     # passou pelo controle de entrada
+    squatter = net.socket()
+    squatter.bind((SRS[0], 10002))
+
+    _open(clock, sbc, 1, cps=10)
+    assert sbc.failed[503] == 1 and sbc.ok["INVITE"] == 0
+    assert server.calls == {} and server.ports.free == 2
+    assert server.admission.rejected == {"midia": 1}
+    clock.advance(40.0)
+    assert sbc.byes == set()            # nada para o reaper encerrar
+
+    # Sem o intruso a mesma retransmissão vira chamada normal
+    squatter.close()
+    sbc.invite(0)
+    clock.advance(1.0)
+    assert sbc.ok["INVITE"] == 1 and len(server.calls) == 1
+
+
+def test_retransmissao_do_invite_durante_a_resposta(tmp_path, monkeypatch):
+    # A retransmissão do INVITE inicial chega enquanto a mídia abre (no
+    # servidor real, outra thread): só 100 Trying de novo; depois do 200,
+    # o mesmo 200 — sem refresh do timer nem sessão nova
+    monkeypatch.chdir(tmp_path)
+    clock, net, server, sbc = _world(rtp_timeout=10 ** 6)
+    seen = []
+    on_datagram = sbc._on_datagram
+    sbc.sock.on_datagram = lambda data, addr: (seen.append(data), on_datagram(data, addr))
+    _, _, data = build_invite(0, sbc.local, SRS)
+
+    start_media = sip_session.SipSession.start_media
+
+    def racing(session):
+        handle_invite(server, parse_sip_message(data.decode()), sbc.local)
+        start_media(session)
+
+    monkeypatch.setattr(sip_session.SipSession, "start_media", racing)
+    sbc.invite(0)
+    clock.advance(0.5)
+    monkeypatch.setattr(sip_session.SipSession, "start_media", start_media)
+
+    (session,) = server.calls.values()
+    refreshed = session.refreshed
+    assert [d.split(b"\r\n", 1)[0] for d in seen] == [
+        b"SIP/2.0 100 Trying", b"SIP/2.0 100 Trying", b"SIP/2.0 200 OK"]
+
+    clock.advance(1.0)
+    sbc.sock.sendto(data, SRS)
+    clock.advance(0.5)
+    oks = [d for d in seen if d.startswith(b"SIP/2.0 200")]
+    assert len(oks) == 2 and oks[0] == oks[1]
+    assert session.refreshed == refreshed and len(server.calls) == 1
+
+
+def test_reinvite_que_muda_a_midia_recebe_488(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    clock, net, server, sbc = _world(rtp_timeout=10 ** 6)
+    seen = []
+    on_datagram = sbc._on_datagram
+    sbc.sock.on_datagram = lambda data, addr: (seen.append(data), on_datagram(data, addr))
+
+    _open(clock, sbc, 1, cps=10)
+    (session,) = server.calls.values()
+    streams = session.streams
+    sbc.reinvite(0, lambda d: d.replace(b"m=audio 8088 RTP/AVP 0 ", b"m=audio 8088 RTP/AVP 8 "))
+    clock.advance(0.5)
+    assert seen[-1].startswith(b"SIP/2.0 488 Not Acceptable Here")
+    assert b"CSeq: 102 INVITE" in seen[-1]
+    assert session.streams == streams and server.calls == {session.call_id: session}
+
+    # Mesma mídia: refresh normal
+    sbc.reinvite(0)
+    clock.advance(0.5)
+    assert seen[-1].startswith(b"SIP/2.0 200 OK")
+
+
+def test_recuperacao_pelo_journal(tmp_path, monkeypatch):
+    # Crash com chamadas no ar: o processo novo (outra rede, portas
+    # livres) retoma as estabelecidas e encerra as que não podiam seguir
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / "journal.db")
+    clock, net, server, sbc = _world(journal=SessionJournal(path, flush_interval=0.01))
+    _open(clock, sbc, 3, cps=10)
+    live = {cid: (s.to_tag, s.ports) for cid, s in server.calls.items()}
+    dead = next(iter(live))
+    # Morreu entre o BYE e a saída do journal
+    server.calls[dead].state = sip_session.CallState.TERMINATED
+    server.journal.record(server.calls[dead])
+    server.journal.close()
+    del live[dead]
+
+    records = SessionJournal(path).load()
+    assert sorted(r["call_id"] for r in records) == sorted([dead, *live])
+
+    clock, net, server, sbc = _world(journal=SessionJournal(path, flush_interval=0.01))
+    server.recover()
+    assert {cid: (s.to_tag, s.ports) for cid, s in server.calls.items()} == live
+    assert all(s.state == "CONFIRMED" and len(s.receivers) == 2
+               for s in server.calls.values())
+    # A encerrada saiu do journal; as retomadas continuam nele
+    server.journal.close()
+    assert sorted(r["call_id"] for r in SessionJournal(path).load()) == sorted(live)
+
+    # De volta sob o reaper: sem RTP depois da volta, caem pelo prazo
+    server.journal = SessionJournal(path, flush_interval=0.01)
+    clock.advance(61.0)
+    assert server.reaper.reaped["rtp"] == 2 and server.calls == {}
+    server.journal.close()
+    assert SessionJournal(path).load() == []
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Testes do sip_dispatcher.py em loopback: backend removido pelo socket de
+comandos para de receber chamadas novas e continua recebendo o diálogo
+que já tem (Route com bk=), o anel muda sem parar o loop de recepção, e
+mensagem malformada é descartada sem derrubar o loop.
+"""
+
+# ============================================================
+# IMPORTS
+# ============================================================
+
+import socket
+import threading
+
+import pytest
+
+from admin_socket import AdminSocket, send_command
+from sip_dispatcher import Dispatcher, backend_name, install_admin
+
+
+def _udp():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(2.0)
+    return sock
+
+
+def _request(method, call_id, route=None):
+    lines = [
+        f"{method} sip:srs@127.0.0.1 SIP/2.0",
+        f"Via: SIP/2.0/UDP 127.0.0.1:5060;branch=z9hG4bK{call_id};rport",
+        "From: <sip:sbc@127.0.0.1>;tag=sbc",
+        "To: <sip:srs@127.0.0.1>" + (";tag=srs" if route else ""),
+        f"Call-ID: {call_id}",
+        f"CSeq: 1 {method}",
+        "Max-Forwards: 70",
+        "Content-Length: 0",
+    ]
+    if route:
+        lines.insert(1, f"Route: {route}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+def _received(sock):
+    """
+    Requisições que chegaram ao backend, ignorando o OPTIONS de saúde.
+    """
+    seen = []
+    sock.settimeout(0.3)
+    try:
+        while True:
+            text = sock.recv(65535).decode()
+            if not text.startswith("OPTIONS"):
+                seen.append(text)
+    except socket.timeout:
+        pass
+    return seen
+
+
+@pytest.fixture
+def cluster(tmp_path):
+    backends = [_udp(), _udp()]
+    dispatcher = Dispatcher("127.0.0.1", 0,
+                            [b.getsockname() for b in backends],
+                            check_interval=60)
+    admin = AdminSocket(str(tmp_path / "dispatcher.sock"))
+    install_admin(dispatcher, admin)
+    admin.start()
+    threading.Thread(target=dispatcher.start, daemon=True).start()
+    yield dispatcher, backends, admin.path
+    admin.stop()
+    for b in backends:
+        b.close()
+
+
+# ============================================================
+# TESTES
+# ============================================================
+
+def test_remove_pelo_socket_drena_backend(cluster):
+    dispatcher, backends, path = cluster
+    sbc = _udp()
+    target = ("127.0.0.1", dispatcher.port)
+
+    sbc.sendto(_request("INVITE", "antes"), target)
+    first = next(b for b in backends if _received(b))
+    other = next(b for b in backends if b is not first)
+    name = backend_name(first.getsockname())
+    host, port = first.getsockname()
+
+    assert send_command(path, f"remove {host}:{port}").strip() == "OK drenando"
+    assert f"{name} draining" in send_command(path, "backends")
+
+    # Chamadas novas: só o backend que ficou
+    for n in range(20):
+        sbc.sendto(_request("INVITE", f"nova-{n}"), target)
+    assert _received(first) == []
+    assert len(_received(other)) == 20
+
+    # O diálogo aberto antes continua no backend que drena
+    route = f"<sip:127.0.0.1:{dispatcher.port};lr;bk={name}>"
+    sbc.sendto(_request("BYE", "antes", route), target)
+    bye = _received(first)
+    assert len(bye) == 1 and bye[0].startswith("BYE ")
+    assert _received(other) == []
+
+    # E volta ao anel com add
+    assert send_command(path, f"add {host}:{port}").strip() == "OK"
+    assert f"{name} active" in send_command(path, "backends")
+    sbc.close()
+
+
+def test_comandos_invalidos(cluster):
+    _, _, path = cluster
+    assert send_command(path, "remove 10.9.9.9:5060").startswith("ERR")
+    assert send_command(path, "add sem-porta").startswith("ERR")
+
+
+def test_anel_muda_durante_o_trafego(cluster):
+    dispatcher, backends, path = cluster
+    sbc = _udp()
+    target = ("127.0.0.1", dispatcher.port)
+    stop = threading.Event()
+    spare_sock = _udp()
+    spare = spare_sock.getsockname()
+
+    def churn():
+        while not stop.is_set():
+            dispatcher.add_backend(spare)
+            dispatcher.remove_backend(spare)
+            with dispatcher._lock:
+                del dispatcher.backends[backend_name(spare)]
+                dispatcher._rebuild()
+
+    t = threading.Thread(target=churn, daemon=True)
+    t.start()
+    for n in range(200):
+        sbc.sendto(_request("INVITE", f"c{n}"), target)
+    stop.set()
+    t.join()
+
+    # O loop de recepção sobreviveu: depois de escoar a rajada (que pode
+    # transbordar o buffer UDP), uma chamada nova ainda é encaminhada
+    for b in backends:
+        _received(b)
+    sbc.sendto(_request("INVITE", "depois"), target)
+    assert any("Call-ID: depois" in m for b in backends for m in _received(b))
+    sbc.close()
+    spare_sock.close()
+
+
+def test_mensagem_malformada_nao_derruba_o_loop(cluster):
+    dispatcher, backends, _ = cluster
+    sbc = _udp()
+    target = ("127.0.0.1", dispatcher.port)
+
+    bad_mf = _request("INVITE", "mf").replace(b"Max-Forwards: 70", b"Max-Forwards: x")
+    sbc.sendto(bad_mf, target)
+    # Resposta com a nossa Via no topo e uma Via seguinte sem sent-by
+    sbc.sendto((f"SIP/2.0 200 OK\r\n"
+                f"Via: SIP/2.0/UDP 127.0.0.1:{dispatcher.port};branch=z9hG4bKx\r\n"
+                f"Via: SIP/2.0/UDP\r\n"
+                f"Call-ID: via\r\nCSeq: 1 INVITE\r\n\r\n").encode(), target)
+
+    sbc.sendto(_request("INVITE", "valida"), target)
+    assert any("Call-ID: valida" in m for b in backends for m in _received(b))
+    assert dispatcher.malformed == 2
+    sbc.close()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Testes do SRTP (srtp.py): vetores do RFC 3711 (apêndice B) nos dois AES
+(OpenSSL via cryptography, se instalado, e Python puro), ROC na virada da
+sequência, janela de replay, negociação a=crypto no 200 OK, um receptor
+gravando em claro um fluxo cifrado recebido em lotes, o SRTCP da porta
+RTCP chegando decifrado ao RtpStats e o journal (que guarda as chaves)
+legível só pelo dono.
+"""
+
+# ============================================================
+# IMPORTS
+# ============================================================
+
+import base64
+import os
+import re
+import socket
+import struct
+import time
+
+import pytest
+
+import srtp
+from rtcp import RtcpMonitor, RtpStats, parse_rtcp
+from rtp_receiver import RtpReceiver
+from session_journal import SessionJournal
+from sip_parser import CRLF, parse_sip_message
+from sip_responses import sip_response_200_ok_invite_siprec
+from srtp import SrtpStream, derive
+from test_bye_response import sip_invite_raw_cisco
+
+MASTER_KEY = bytes.fromhex("E1F97A0D3E018BE0D64FA32C06DE4139")
+MASTER_SALT = bytes.fromhex("0EC675AD498AFEEBB6960B3AABE6")
+
+BACKENDS = ["python"] + (["openssl"] if srtp.Cipher is not None else [])
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(srtp, "Cipher", None)
+    return request.param
+
+
+def _rtp(seq, ssrc=0x1234, payload=None):
+    return struct.pack("!BBHII", 0x80, 0, seq & 0xFFFF, seq * 160, ssrc) + (
+        payload if payload is not None else bytes([seq & 0xFF]) * 160)
+
+
+# ============================================================
+# VETORES (RFC 3711, apêndice B)
+# ============================================================
+
+def test_keystream_aes_cm(backend):
+    # B.2: contador = sal deslocado, blocos 0, 1, 2 e os da virada 0xFEFF/0xFF00
+    aes = srtp._ecb(bytes.fromhex("2B7E151628AED2A6ABF7158809CF4F3C"))
+    iv = int("F0F1F2F3F4F5F6F7F8F9FAFBFCFD0000", 16)
+    expected = {
+        0x0000: "E03EAD0935C95E80E166B16DD92B4EB4",
+        0x0001: "D23513162B02D0F72A43A2FE4A5F97AB",
+        0x0002: "41E95B3BB0A2E8DD477901E4FCA894C0",
+        0xFEFF: "EC8CDF7398607CB0F2D21675EA9EA1E4",
+        0xFF00: "362B7C3C6773516318A077D7FC5073AE",
+        0xFF01: "6A2CC3787889374FBEB4C81B17BA6C44",
+    }
+    for j, block in expected.items():
+        assert aes((iv + j).to_bytes(16, "big")).hex().upper() == block
+
+
+def test_derivacao_de_chaves(backend):
+    # B.3
+    assert derive(MASTER_KEY, MASTER_SALT, 0, 16).hex().upper() == \
+        "C61E7A93744F39EE10734AFE3FF7A087"
+    assert derive(MASTER_KEY, MASTER_SALT, 2, 14).hex().upper() == \
+        "30CBBC08863D8C85D49DB34A9AE1"
+    assert derive(MASTER_KEY, MASTER_SALT, 1, 20).hex().upper() == \
+        "CEBE321F6FF7716B6FD4AB49AF256A156D38BAA4"
+
+
+def test_pacote_conhecido(backend):
+    # Pacote de referência do libsrtp com as chaves de B.3 (SHA1_80)
+    clear = bytes.fromhex("800f1234decafbadcafebabe" + "ab" * 16)
+    sealed = bytes.fromhex("800f1234decafbadcafebabe4e55dc4ce79978d88ca4d215949d2402"
+                           "b78d6acc99ea179b8dbb")
+    assert SrtpStream(MASTER_KEY, MASTER_SALT).protect_batch([clear]) == [sealed]
+    assert SrtpStream(MASTER_KEY, MASTER_SALT).unprotect_batch([sealed]) == [clear]
+
+
+# ============================================================
+# ESTADO DO FLUXO
+# ============================================================
+
+@pytest.mark.parametrize("suite", sorted(srtp.SUITES))
+def test_roc_replay_e_autenticacao(suite):
+    tx = SrtpStream(MASTER_KEY, MASTER_SALT, suite)
+    rx = SrtpStream(MASTER_KEY, MASTER_SALT, suite)
+    clear = [_rtp(seq) for seq in range(65500, 65600)]       # vira o ROC
+    sealed = tx.protect_batch(clear)
+
+    assert rx.unprotect_batch(sealed[:60]) == clear[:60]
+    # Fora de ordem dentro da janela entra; repetido e velho demais, não
+    late = [sealed[70], sealed[65], sealed[65], sealed[2]]
+    assert rx.unprotect_batch(sealed[60:65] + late) == clear[60:65] + [clear[70], clear[65]]
+    assert rx.replayed == 2
+    tampered = bytearray(sealed[71])
+    tampered[20] ^= 1
+    assert rx.unprotect_batch([bytes(tampered)]) == []
+    assert rx.auth_failed == 1
+    assert rx.unprotect_batch(sealed[71:]) == clear[71:]
+    assert rx._state[0x1234][0] == (1 << 16) | (65599 & 0xFFFF)
+
+    # Outro processo continua do mesmo ponto (hot restart)
+    more = tx.protect_batch([_rtp(65600 + i) for i in range(5)])
+    moved = SrtpStream(MASTER_KEY, MASTER_SALT, suite)
+    moved.load(rx.snapshot())
+    assert len(moved.unprotect_batch(more)) == 5 and moved.auth_failed == 0
+
+
+def test_roc_procurado_depois_de_crash():
+    tx = SrtpStream(MASTER_KEY, MASTER_SALT)
+    tx.protect_batch([_rtp(seq) for seq in range(0, 3 * 65536, 4096)])
+    sealed = tx.protect_batch([_rtp(3 * 65536 + 10)])           # ROC 3
+    assert SrtpStream(MASTER_KEY, MASTER_SALT).unprotect_batch(sealed) == []
+    rx = SrtpStream(MASTER_KEY, MASTER_SALT, roc_search=16)
+    assert rx.unprotect_batch(sealed) == [_rtp(3 * 65536 + 10)]
+
+
+# ============================================================
+# SDP E RECEPTOR
+# ============================================================
+
+def _srtp_invite(crypto):
+    head, body = sip_invite_raw_cisco.split(CRLF + CRLF, 1)
+    body = body.replace("RTP/AVP", "RTP/SAVP").replace(
+        "a=ptime:20\r\n", "a=ptime:20\r\n" + "".join(f"a=crypto:{c}\r\n" for c in crypto))
+    return parse_sip_message(head + CRLF + CRLF + body)
+
+
+def test_resposta_a_crypto():
+    key = base64.b64encode(MASTER_KEY + MASTER_SALT).decode()
+    invite = _srtp_invite([
+        "1 AES_CM_256_HMAC_SHA1_80 inline:" + base64.b64encode(os.urandom(46)).decode(),
+        f"2 AES_CM_128_HMAC_SHA1_32 inline:{key}|2^31",
+    ])
+    ok = sip_response_200_ok_invite_siprec(invite, "10.0.0.10", "srs1")
+    assert re.findall(r"m=audio [1-9]\d* RTP/SAVP 0", ok) and len(re.findall("m=audio", ok)) == 2
+    answers = re.findall(r"a=crypto:(\d+) (\S+) inline:(\S+)", ok)
+    assert len(answers) == 2
+    for tag, suite, inline in answers:
+        assert (tag, suite) == ("2", "AES_CM_128_HMAC_SHA1_32")
+        assert inline != key and len(base64.b64decode(inline)) == 30
+
+    # Nada que saibamos decifrar (MKI): fluxo recusado
+    refused = sip_response_200_ok_invite_siprec(
+        _srtp_invite([f"1 AES_CM_128_HMAC_SHA1_80 inline:{key}|2^20|1:4"]), "10.0.0.10", "srs1")
+    assert len(re.findall(r"m=audio 0 RTP/SAVP", refused)) == 2
+    assert "a=crypto" not in refused
+
+
+def test_receptor_grava_em_claro(tmp_path):
+    rx = RtpReceiver("srtp-call", "1", host="127.0.0.1", out_dir=str(tmp_path),
+                     srtp=SrtpStream(MASTER_KEY, MASTER_SALT))
+    rx.start()
+    tx = SrtpStream(MASTER_KEY, MASTER_SALT)
+    clear = [_rtp(seq, payload=os.urandom(160)) for seq in range(200)]
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for packet in tx.protect_batch(clear):
+        sock.sendto(packet, ("127.0.0.1", rx.port))
+    sock.sendto(b"\x80" * 40, ("127.0.0.1", rx.port))        # lixo: descartado
+    deadline = time.monotonic() + 5
+    while rx.packets < len(clear) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    rx.stop()
+    rx.join()
+    sock.close()
+
+    assert rx.packets == len(clear)
+    assert rx.srtp.auth_failed == 1
+    with open(rx.path, "rb") as f:
+        assert f.read() == b"".join(p[12:] for p in clear)
+
+
+# ============================================================
+# SRTCP
+# ============================================================
+
+def _sr(ssrc=0x1234, packets=200):
+    return struct.pack("!BBHIIIIII", 0x80, 200, 6, ssrc, 0xE1234567, 0x89ABCDEF,
+                       32000, packets, packets * 160)
+
+
+@pytest.mark.parametrize("suite", sorted(srtp.SUITES))
+def test_srtcp_replay_e_autenticacao(suite):
+    tx = SrtpStream(MASTER_KEY, MASTER_SALT, suite)
+    rx = SrtpStream(MASTER_KEY, MASTER_SALT, suite)
+    sealed = [tx.protect_rtcp(_sr(packets=n)) for n in range(1, 4)]
+    # Cifrado depois do SSRC, E|índice e tag de 80 bits nas duas suítes
+    assert sealed[0][:8] == _sr(packets=1)[:8] and sealed[0][8:28] != _sr(packets=1)[8:]
+    assert len(sealed[0]) == len(_sr()) + 4 + 10
+
+    assert rx.unprotect_rtcp(sealed[1]) == _sr(packets=2)
+    assert rx.unprotect_rtcp(sealed[0]) == _sr(packets=1)       # atrasado, na janela
+    assert rx.unprotect_rtcp(sealed[0]) is None                 # repetido
+    tampered = bytearray(sealed[2])
+    tampered[12] ^= 1
+    assert rx.unprotect_rtcp(bytes(tampered)) is None
+    assert rx.unprotect_rtcp(sealed[2]) == _sr(packets=3)
+    assert (rx.rtcp_decrypted, rx.replayed, rx.auth_failed) == (3, 1, 1)
+    # O SRTP do mesmo fluxo segue com o próprio estado
+    assert rx.unprotect_batch(tx.protect_batch([_rtp(1)])) == [_rtp(1)]
+
+
+def test_srtcp_sem_cifra():
+    # E = 0: só autenticado (RTCP em claro, índice e tag no fim)
+    tx = SrtpStream(MASTER_KEY, MASTER_SALT)
+    body = _sr() + (7).to_bytes(4, "big")
+    packet = body + tx._rtcp_tag(body)
+    assert SrtpStream(MASTER_KEY, MASTER_SALT).unprotect_rtcp(packet) == _sr()
+
+
+def test_monitor_decifra_srtcp():
+    monitor = RtcpMonitor()
+    monitor.start()
+    stats = RtpStats()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    monitor.add(sock, stats, SrtpStream(MASTER_KEY, MASTER_SALT))
+    tx = SrtpStream(MASTER_KEY, MASTER_SALT)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sender.sendto(tx.protect_rtcp(_sr(packets=321)), sock.getsockname())
+        deadline = time.monotonic() + 5
+        while stats.sender is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        monitor.remove(sock)
+        monitor.stop()
+        sender.close()
+    assert stats.sender == {k: parse_rtcp(_sr(packets=321))[0][k]
+                            for k in ("ssrc", "ntp", "rtp_ts", "packets", "octets")}
+
+
+# ============================================================
+# CHAVES EM DISCO
+# ============================================================
+
+def test_journal_so_para_o_dono(tmp_path):
+    old = os.umask(0o022)
+    try:
+        stale = tmp_path / "antigo.db"
+        stale.touch(0o644)
+        for path in (tmp_path / "novo.db", stale):
+            journal = SessionJournal(str(path))
+            try:
+                # Com o banco aberto em WAL os três arquivos existem
+                for suffix in ("", "-wal", "-shm"):
+                    assert os.stat(f"{path}{suffix}").st_mode & 0o777 == 0o600, suffix
+            finally:
+                journal.close()
+    finally:
+        os.umask(old)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Testes do transporte TCP: delimitação por Content-Length em leituras
+parciais, INVITE SIPREC completo pela conexão persistente e Contact do
+200 OK com a porta em que o servidor escuta em cada transporte.
+"""
+
+# ============================================================
+# IMPORTS
+# ============================================================
+
+import re
+import socket
+import threading
+
+from server_siprec import SIPServer
+from sip_parser import CRLF, parse_sip_message
+from sip_responses import sip_response_200_ok_invite_siprec
+from tcp_transport import StreamFramer, TcpTransport
+from test_bye_response import sip_invite_raw_cisco
+
+
+def _invite():
+    # O fixture declara Content-Length 2470; em stream ele precisa ser exato
+    head, body = sip_invite_raw_cisco.split(CRLF + CRLF, 1)
+    head = re.sub(r"Content-Length: \d+", f"Content-Length: {len(body.encode())}", head)
+    return (head + CRLF + CRLF + body).encode()
+
+
+OPTIONS = (
+    "OPTIONS sip:srs@127.0.0.1 SIP/2.0\r\n"
+    "Via: SIP/2.0/TCP 127.0.0.1:5099;branch=z9hG4bKtcp\r\n"
+    "From: <sip:ping@127.0.0.1>;tag=1\r\n"
+    "To: <sip:srs@127.0.0.1>\r\n"
+    "Call-ID: tcp-ping@127.0.0.1\r\n"
+    "CSeq: 1 OPTIONS\r\n"
+    "l: 0\r\n"
+    "\r\n"
+).encode()
+
+
+# ============================================================
+# TESTE FRAMER
+# ============================================================
+
+def test_framer_partial_reads():
+    invite = _invite()
+    stream = b"\r\n\r\n" + invite + OPTIONS + invite
+
+    framer = StreamFramer()
+    messages = []
+    for i in range(0, len(stream), 97):
+        messages += framer.feed(stream[i:i + 97])
+
+    assert messages == [invite, OPTIONS, invite]
+
+
+# ============================================================
+# TESTE CONEXÃO PERSISTENTE
+# ============================================================
+
+class _FakeServer:
+    def __init__(self):
+        self.streams = {}
+        self.got = []
+        self.done = threading.Event()
+
+    def dispatch(self, data, addr):
+        self.got.append(data)
+        self.streams[addr].send(b"SIP/2.0 200 OK\r\nContent-Length: 0\r\n\r\n")
+        self.done.set()
+
+
+def test_tcp_dispatch_and_reply_on_same_connection():
+    server = _FakeServer()
+    transport = TcpTransport(server, "127.0.0.1", 0)
+    transport.start()
+
+    c = socket.create_connection(("127.0.0.1", transport.port), timeout=2)
+    invite = _invite()
+    c.sendall(invite[:700])
+    c.sendall(invite[700:])
+
+    assert server.done.wait(2)
+    assert server.got == [invite]
+    assert c.recv(100).startswith(b"SIP/2.0 200 OK")
+
+    c.close()
+    transport.stop()
+
+
+# ============================================================
+# TESTE CONTACT
+# ============================================================
+
+def _contact(transport, contact_port=None):
+    ok = sip_response_200_ok_invite_siprec(
+        parse_sip_message(_invite().decode()), "10.0.0.10", "srs1",
+        transport=transport, contact_port=contact_port)
+    return re.search(r"Contact: (.*)\r\n", ok).group(1)
+
+
+def test_contact_usa_a_porta_de_cada_transporte():
+    assert _contact("udp", 5080) == "<sip:10.0.0.10:5080>;sip.srs"
+    assert _contact("tcp", 5070) == "<sip:10.0.0.10:5070;transport=tcp>;sip.srs"
+    assert _contact("tls", 5071) == "<sip:10.0.0.10:5071;transport=tls>;sip.srs"
+    # Sem porta conhecida: as padrão do RFC 3261
+    assert _contact("tls") == "<sip:10.0.0.10:5061;transport=tls>;sip.srs"
+    assert _contact(None) == "<sip:10.0.0.10:5060>;sip.srs"
+
+
+def test_servidor_conhece_as_portas_reais():
+    server = SIPServer("127.0.0.1", 0)
+    try:
+        udp = server.sock.getsockname()[1]
+        assert udp != 0 and server.port == udp
+        assert server.listen_ports == {"udp": udp}
+    finally:
+        server.sock.close()
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+if __name__ == "__main__":
+    test_framer_partial_reads()
+    test_tcp_dispatch_and_reply_on_same_connection()
+    print("✔ OK")
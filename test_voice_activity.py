@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Testes do VAD (voice_activity.py): valores conhecidos das tabelas G.711,
+os dois caminhos de cálculo (NumPy e Python puro) concordando, fala ×
+silêncio × ruído, hangover, corte de silêncio longo com o mapa de offsets
+e A-law escolhido pelo payload type.
+"""
+
+# ============================================================
+# IMPORTS
+# ============================================================
+
+import json
+import math
+
+import pytest
+
+import voice_activity
+from voice_activity import (
+    ALAW_TABLE, PT_PCMA, SAMPLE_RATE, ULAW_TABLE, VoiceActivityDetector,
+    frame_features_python,
+)
+
+FRAME = 160                 # 20 ms a 8 kHz
+
+
+def _encode(samples, table=ULAW_TABLE):
+    # Codificador de teste: o byte cuja amostra decodificada é a mais próxima
+    return bytes(min(range(256), key=lambda b: abs(table[b] - s)) for s in samples)
+
+
+def _tone(ms, amplitude=8000, freq=400, table=ULAW_TABLE):
+    n = SAMPLE_RATE * ms // 1000
+    return _encode([round(amplitude * math.sin(2 * math.pi * freq * i / SAMPLE_RATE))
+                    for i in range(n)], table)
+
+
+def _silence(ms):
+    return b"\xff" * (SAMPLE_RATE * ms // 1000)     # μ-law de 0
+
+
+# ============================================================
+# G.711
+# ============================================================
+
+def test_tabelas_g711():
+    assert len(ULAW_TABLE) == len(ALAW_TABLE) == 256
+    assert (ULAW_TABLE[0xFF], ULAW_TABLE[0x7F]) == (0, 0)
+    assert (ULAW_TABLE[0x80], ULAW_TABLE[0x00]) == (32124, -32124)
+    assert (ALAW_TABLE[0xD5], ALAW_TABLE[0x55]) == (8, -8)
+    assert (ALAW_TABLE[0xAA], ALAW_TABLE[0x2A]) == (32256, -32256)
+
+
+def test_caracteristicas_do_quadro():
+    energies, zcrs = frame_features_python(_silence(20) + _tone(20), FRAME)
+    assert energies[0] < -100 and zcrs[0] == 0
+    # Seno de amplitude 8000: potência 8000²/2 → cerca de −18 dBFS
+    assert energies[1] == pytest.approx(10 * math.log10(8000 ** 2 / 2 / 32768 ** 2), abs=0.5)
+    assert zcrs[1] == pytest.approx(2 * 400 / SAMPLE_RATE, abs=0.01)
+
+
+@pytest.mark.skipif(voice_activity.np is None, reason="sem NumPy")
+def test_numpy_e_python_concordam():
+    data = _silence(100) + _tone(200) + _tone(100, amplitude=300, freq=3000)
+    fast = voice_activity.frame_features_numpy(data, FRAME)
+    slow = frame_features_python(data, FRAME)
+    for a, b in zip(fast, slow):
+        assert a == pytest.approx(b, abs=1e-3)
+
+
+# ============================================================
+# DETECTOR
+# ============================================================
+
+def test_fala_silencio_e_hangover():
+    vad = VoiceActivityDetector()
+    audio = _silence(1000) + _tone(1000) + _silence(1000)
+    out = b""
+    for i in range(0, len(audio), FRAME):
+        out += vad.feed(audio[i:i + FRAME])
+    out += vad.finish()
+    assert out == audio                         # sem max_silence grava tudo
+    stats = vad.stats()
+    # 1 s de fala + 200 ms de hangover
+    assert stats["duration_ms"] == 3000 and stats["talk_ms"] == 1200
+    assert stats["segments"] == [[1000, 2200]]
+    assert stats["dropped_ms"] == 0 and stats["offset_map"] == [[0, 0]]
+
+
+def test_ruido_fraco_nao_e_fala():
+    vad = VoiceActivityDetector()
+    # Chiado agudo: muitos cruzamentos por zero e pouca energia
+    vad.feed(_tone(1000, amplitude=300, freq=3000))
+    vad.finish()
+    assert vad.stats()["talk_ms"] == 0 and vad.segments == []
+
+
+def test_corta_silencio_longo(tmp_path):
+    vad = VoiceActivityDetector(max_silence_ms=300)
+    audio = _silence(1000) + _tone(1000) + _silence(1000)
+    out = vad.feed(audio) + vad.finish()
+    # Mantidos: 300 ms de silêncio, 1 s de fala, 200 ms de hangover, 300 ms
+    assert len(out) == (15 + 50 + 10 + 15) * FRAME
+    assert out[15 * FRAME:65 * FRAME] == audio[50 * FRAME:100 * FRAME]
+    stats = vad.stats()
+    assert stats["dropped_ms"] == (35 + 25) * 20
+    # Byte gravado 15 quadros ↔ byte original 50 quadros
+    assert stats["offset_map"] == [[0, 0], [15 * FRAME, 50 * FRAME]]
+
+    path = tmp_path / "leg.vad.json"
+    vad.write_stats(str(path))
+    assert json.loads(path.read_text())["segments"] == [[1000, 2200]]
+
+
+def test_alaw_pelo_payload_type():
+    tone = _tone(1000, table=ALAW_TABLE)
+    vad = VoiceActivityDetector()
+    vad.feed(tone, payload_type=PT_PCMA)
+    vad.finish()
+    assert vad.alaw and vad.stats()["talk_ms"] == 1000
+
+    # Os mesmos bytes lidos como μ-law dão outra energia
+    alaw, _ = frame_features_python(tone[:FRAME], FRAME, alaw=True)
+    ulaw, _ = frame_features_python(tone[:FRAME], FRAME)
+    assert abs(alaw[0] - ulaw[0]) > 1
+
+
+def test_resto_menor_que_um_quadro():
+    vad = VoiceActivityDetector()
+    assert vad.feed(_silence(100) + b"\xff" * 10) == b""     # abaixo do lote
+    assert len(vad.finish()) == 5 * FRAME + 10
+    assert vad.stats()["duration_ms"] == 100
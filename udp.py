@@ -1,7 +1,5 @@
 import socket
 
-import socket
-
 def decode_rtp_packet(packet):
     """Decodifica um pacote RTP a partir de bytes"""
     header = {}
@@ -37,51 +35,37 @@ def decode_rtp_packet(packet):
 IP = "127.0.0.1"
 PORT = 10000
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind((IP, PORT))
-
-print(f"📡 Servidor UDP ouvindo em {IP}:{PORT}...")
-
-while True:
-    data, addr = sock.recvfrom(4096)
 
-    print("\n==============================================")
-    print(f"📩 Pacote recebido de {addr}")
-    print(f"📦 Tamanho total: {len(data)} bytes")
-    print(f"🔢 Primeiro 32 bytes (hex): {data[:32].hex()}")
+def main():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((IP, PORT))
 
-    rtp = decode_rtp_packet(data)
+    print(f"📡 Servidor UDP ouvindo em {IP}:{PORT}...")
 
-    # ----- IMPRIME TODOS OS CAMPOS DO RTP -----
-    print("\n🧩 **DECODE COMPLETO DO RTP**")
-    print(f"• Version.............: {rtp['version']}")
-    print(f"• Padding.............: {rtp['padding']}")
-    print(f"• Extension...........: {rtp['extension']}")
-    print(f"• CSRC Count..........: {rtp['csrc_count']}")
-    print(f"• Marker..............: {rtp['marker']}")
-    print(f"• Payload Type........: {rtp['payload_type']}")
-    print(f"• Sequence Number.....: {rtp['sequence_number']}")
-    print(f"• Timestamp...........: {rtp['timestamp']}")
-    print(f"• SSRC................: {hex(rtp['ssrc'])} ({rtp['ssrc']})")
-    print(f"• Payload bytes.......: {len(rtp['payload'])} bytes")
-    print("==============================================\n")
-
-
-IP = "127.0.0.1"
-PORT = 10000
+    while True:
+        data, addr = sock.recvfrom(4096)
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind((IP, PORT))
+        print("\n==============================================")
+        print(f"📩 Pacote recebido de {addr}")
+        print(f"📦 Tamanho total: {len(data)} bytes")
+        print(f"🔢 Primeiro 32 bytes (hex): {data[:32].hex()}")
 
-print(f"📡 Servidor UDP ouvindo em {IP}:{PORT}...")
+        rtp = decode_rtp_packet(data)
 
-while True:
-    data, addr = sock.recvfrom(2048)
-    print(f"\n📩 Pacote recebido de {addr}")
-    print(f"📦 Tamanho: {len(data)} bytes")
-    print(f"🔢 Hex: {data[:40].hex()}...")  # primeiros bytes
+        # ----- IMPRIME TODOS OS CAMPOS DO RTP -----
+        print("\n🧩 **DECODE COMPLETO DO RTP**")
+        print(f"• Version.............: {rtp['version']}")
+        print(f"• Padding.............: {rtp['padding']}")
+        print(f"• Extension...........: {rtp['extension']}")
+        print(f"• CSRC Count..........: {rtp['csrc_count']}")
+        print(f"• Marker..............: {rtp['marker']}")
+        print(f"• Payload Type........: {rtp['payload_type']}")
+        print(f"• Sequence Number.....: {rtp['sequence_number']}")
+        print(f"• Timestamp...........: {rtp['timestamp']}")
+        print(f"• SSRC................: {hex(rtp['ssrc'])} ({rtp['ssrc']})")
+        print(f"• Payload bytes.......: {len(rtp['payload'])} bytes")
+        print("==============================================\n")
 
-    packet = decode_rtp_packet(data.hex())
-    audio = bytes.fromhex(packet['payload'])
 
-    print(f"{packet['ssrc']}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+voice_activity.py
+
+Detecção de voz (VAD) e corte de silêncio durante a gravação.
+
+Em cada perna SIPREC, metade do tempo é silêncio (um lado só escuta).
+O detector decodifica o G.711 em lotes de quadros de 20 ms e calcula, por
+quadro, energia (dBFS) e taxa de cruzamentos por zero. Quadro com voz é
+quadro com energia acima do limiar; ruído de fundo com muitos cruzamentos
+e pouca energia fica de fora. Um "hangover" mantém a voz por alguns
+quadros depois da última fala, para não picotar finais de palavra.
+
+Com max_silence_ms, silêncios mais longos que isso são cortados do
+arquivo; o mapa de offsets (gravado → original) permite reconstituir a
+linha do tempo. As estatísticas (tempo de fala, segmentos) vão para um
+.vad.json ao lado da gravação.
+
+NumPy é opcional: sem ele o mesmo cálculo roda quadro a quadro em Python
+puro (bem mais lento — ver bench/vad_cost.py).
+"""
+
+import json
+import math
+
+try:
+    import numpy as np
+except ImportError:      # pragma: no cover - depende do ambiente
+    np = None
+
+SAMPLE_RATE = 8000
+PT_PCMA = 8
+
+
+# ============================================================
+# DECODIFICAÇÃO G.711 (tabelas de 256 entradas)
+# ============================================================
+def _ulaw_sample(b):
+    b = ~b & 0xFF
+    exp = (b >> 4) & 0x07
+    s = (((b & 0x0F) << 3) + 0x84) << exp
+    s -= 0x84
+    return -s if b & 0x80 else s
+
+
+def _alaw_sample(b):
+    b ^= 0x55
+    exp = (b >> 4) & 0x07
+    mant = b & 0x0F
+    if exp == 0:
+        s = (mant << 4) + 8
+    else:
+        s = ((mant << 4) + 0x108) << (exp - 1)
+    return s if b & 0x80 else -s
+
+
+ULAW_TABLE = [_ulaw_sample(b) for b in range(256)]
+ALAW_TABLE = [_alaw_sample(b) for b in range(256)]
+
+if np is not None:
+    _NP_TABLES = {
+        False: np.array(ULAW_TABLE, dtype=np.float32),
+        True: np.array(ALAW_TABLE, dtype=np.float32),
+    }
+
+_FULL_SCALE = 32768.0 ** 2
+
+
+# ============================================================
+# CARACTERÍSTICAS POR QUADRO
+# ============================================================
+def frame_features_numpy(data, frame_bytes, alaw=False):
+    """
+    (energias em dBFS, taxas de cruzamento por zero) de todos os quadros
+    completos de data, num único passo vetorizado.
+    """
+    n = len(data) // frame_bytes
+    x = _NP_TABLES[alaw][np.frombuffer(data, np.uint8, n * frame_bytes)]
+    x = x.reshape(n, frame_bytes)
+    energy = 10 * np.log10((x * x).mean(axis=1) / _FULL_SCALE + 1e-12)
+    sign = np.signbit(x)
+    zcr = (sign[:, 1:] != sign[:, :-1]).mean(axis=1)
+    return energy.tolist(), zcr.tolist()
+
+
+def frame_features_python(data, frame_bytes, alaw=False):
+    table = ALAW_TABLE if alaw else ULAW_TABLE
+    energies, zcrs = [], []
+    for start in range(0, len(data) - frame_bytes + 1, frame_bytes):
+        x = [table[b] for b in data[start:start + frame_bytes]]
+        power = sum(s * s for s in x) / frame_bytes
+        energies.append(10 * math.log10(power / _FULL_SCALE + 1e-12))
+        crossings = sum((a < 0) != (b < 0) for a, b in zip(x, x[1:]))
+        zcrs.append(crossings / (frame_bytes - 1))
+    return energies, zcrs
+
+
+frame_features = frame_features_numpy if np is not None else frame_features_python
+
+
+# ============================================================
+# DETECTOR POR PERNA
+# ============================================================
+class VoiceActivityDetector:
+    """
+    Um por RtpReceiver. feed() recebe o payload G.711 e devolve os bytes a
+    gravar (tudo, ou só fala + silêncios curtos se max_silence_ms).
+    """
+
+    def __init__(self, frame_ms=20, batch_frames=50, energy_db=-45.0,
+                 zcr_max=0.35, hangover_ms=200, max_silence_ms=None):
+        self.frame_bytes = SAMPLE_RATE * frame_ms // 1000
+        self.frame_ms = frame_ms
+        self.batch_bytes = self.frame_bytes * batch_frames
+        self.energy_db = energy_db
+        self.zcr_max = zcr_max
+        self.hangover = hangover_ms // frame_ms
+        self.max_silence = (None if max_silence_ms is None
+                            else max_silence_ms // frame_ms)
+        self.alaw = None
+
+        self._buf = bytearray()
+        self._frames = 0          # quadros já classificados
+        self._since_speech = self.hangover + 1
+        self._silence_run = 0
+        self._speech_start = None
+
+        self.speech_frames = 0
+        self.dropped_frames = 0
+        self.segments = []        # [início_ms, fim_ms] na linha do tempo original
+        self.offset_map = [[0, 0]]  # [byte gravado, byte original] a cada corte
+        self._stored = 0
+        self._dropping = False
+
+    # ---------------------------------------------------------------
+    def feed(self, payload, payload_type=0):
+        if self.alaw is None:
+            self.alaw = payload_type == PT_PCMA
+
+        self._buf += payload
+        if len(self._buf) < self.batch_bytes:
+            return b""
+        return self._process(len(self._buf) // self.frame_bytes * self.frame_bytes)
+
+    def finish(self):
+        """
+        Classifica o que sobrou no buffer; o pedaço final menor que um
+        quadro é gravado como está.
+        """
+        out = self._process(len(self._buf) // self.frame_bytes * self.frame_bytes)
+        tail = bytes(self._buf)
+        self._buf.clear()
+        if tail and not self._dropping:
+            self._stored += len(tail)
+            out += tail
+        if self._speech_start is not None:
+            self._close_segment(self._frames)
+        return out
+
+    # ---------------------------------------------------------------
+    def _process(self, nbytes):
+        if nbytes == 0:
+            return b""
+
+        data = bytes(self._buf[:nbytes])
+        del self._buf[:nbytes]
+        energies, zcrs = frame_features(data, self.frame_bytes, self.alaw)
+
+        out = bytearray()
+        fb = self.frame_bytes
+        for i, (energy, zcr) in enumerate(zip(energies, zcrs)):
+            frame_idx = self._frames + i
+            voiced = energy > self.energy_db and (
+                zcr < self.zcr_max or energy > self.energy_db + 10
+            )
+            self._since_speech = 0 if voiced else self._since_speech + 1
+            speech = self._since_speech <= self.hangover
+
+            if speech:
+                self.speech_frames += 1
+                self._silence_run = 0
+                if self._speech_start is None:
+                    self._speech_start = frame_idx
+            else:
+                self._silence_run += 1
+                if self._speech_start is not None:
+                    self._close_segment(frame_idx)
+
+            keep = self.max_silence is None or self._silence_run <= self.max_silence
+            if keep:
+                if self._dropping:
+                    self.offset_map.append([self._stored, frame_idx * fb])
+                    self._dropping = False
+                out += data[i * fb:(i + 1) * fb]
+                self._stored += fb
+            else:
+                self._dropping = True
+                self.dropped_frames += 1
+
+        self._frames += len(energies)
+        return bytes(out)
+
+    def _close_segment(self, end_frame):
+        self.segments.append([self._speech_start * self.frame_ms,
+                              end_frame * self.frame_ms])
+        self._speech_start = None
+
+    # ---------------------------------------------------------------
+    def stats(self):
+        total_ms = self._frames * self.frame_ms
+        talk_ms = self.speech_frames * self.frame_ms
+        return {
+            "backend": "numpy" if np is not None else "python",
+            "duration_ms": total_ms,
+            "talk_ms": talk_ms,
+            "silence_ms": total_ms - talk_ms,
+            "talk_ratio": round(talk_ms / total_ms, 3) if total_ms else 0.0,
+            "dropped_ms": self.dropped_frames * self.frame_ms,
+            "segments": self.segments,
+            "offset_map": self.offset_map,
+        }
+
+    def write_stats(self, path):
+        with open(path, "w") as f:
+            json.dump(self.stats(), f)